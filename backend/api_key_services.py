@@ -13,20 +13,42 @@ Security design:
   - Only the SHA-256 hash is stored in the database (never the plaintext)
   - The plaintext is shown exactly once at creation time
   - Keys are prefixed with "wsk_live_" so they're recognisable in logs
+
+Verification is served from the in-memory key cache in auth_cache.py, and
+last_used_at is batched there rather than committed per request.
+
+Signed device tokens (X-Device-Token):
+  An API key still needs a shared store to stay consistent across workers.
+  A device token instead carries its own claims — key id, device label, the
+  bins it may report for, expiry — signed with HMAC-SHA256 under a key
+  derived from SECRET_KEY, and is checked in CPU alone:
+
+      wsd_live_<base64url(json claims)>.<base64url(signature)>
+
+  Each token is backed by an api_keys row so it is listed, and revoked,
+  through the same admin flow.  Revocation puts "api_key:<id>" in the JWT
+  revocation set (memory on every worker, token_blacklist for restarts).
 """
 
+import base64
 import hashlib
+import hmac
+import json
 import secrets
-from datetime import datetime, timezone
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import FrozenSet, Iterable, Optional
 
 from sqlalchemy.orm import Session
 
-from database import APIKeyDB
+from auth_cache import api_keys, key_usage, revoked_tokens, share_api_key_revocation, share_revocation
+from database import APIKeyDB, TokenBlacklistDB
 from config import get_settings
 
 settings = get_settings()
 
+_DEVICE_SIGNING_KEY = hmac.new(settings.secret_key.encode(), b"smartwaste-device-token", hashlib.sha256).digest()
+
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
@@ -60,6 +82,7 @@ def generate_api_key(label: str, db: Session) -> dict:
     db.add(record)
     db.commit()
     db.refresh(record)
+    api_keys.put(record)
 
     return {
         "key": plain_key,       # shown once — not stored
@@ -73,30 +96,137 @@ def verify_api_key(plain_key: str, db: Session) -> Optional[APIKeyDB]:
     """
     Verify an API key from the X-API-Key header.
 
-    Returns the APIKeyDB record if valid and active, else None.
-    Updates last_used_at on every successful verification.
+    Returns the APIKeyDB record if valid and active, else None.  Known keys
+    are answered from memory; last_used_at is queued for the next bulk write.
     """
     if not plain_key or not plain_key.startswith(settings.api_key_prefix):
         return None
 
     key_hash = _hash_key(plain_key)
-    record = db.query(APIKeyDB).filter(
-        APIKeyDB.key_hash == key_hash,
-        APIKeyDB.is_active == True,  # noqa: E712
-    ).first()
+    record = api_keys.get(key_hash)
+    if record is None:
+        record = db.query(APIKeyDB).filter(
+            APIKeyDB.key_hash == key_hash,
+            APIKeyDB.is_active == True,  # noqa: E712
+        ).first()
+        if record is None:
+            return None
+        api_keys.put(record)
+
+    key_usage.touch(record.id, _now())
+    return record
 
-    if record:
-        record.last_used_at = _now()
-        db.commit()
 
-    return record
+def rate_limit_identity(api_key: Optional[str], device_token: Optional[str]) -> Optional[str]:
+    """
+    The credential an ingestion request is rate limited as, without the
+    database: "key:<id>" for a valid device token or a cached API key, else
+    None (the limiter falls back to the client IP).  Both kinds of credential
+    are api_keys rows, so each row gets one budget.
+    """
+    if device_token:
+        claims = verify_device_token(device_token)
+        return f"key:{claims.key_id}" if claims is not None else None
+    if api_key and api_key.startswith(settings.api_key_prefix):
+        record = api_keys.peek(_hash_key(api_key))
+        return f"key:{record.id}" if record is not None else None
+    return None
 
 
 def revoke_api_key(key_id: int, db: Session) -> bool:
-    """Deactivate an API key by its DB id."""
+    """Deactivate an API key by its DB id, along with any device token minted for it."""
     record = db.query(APIKeyDB).filter(APIKeyDB.id == key_id).first()
     if not record:
         return False
     record.is_active = False
+    # Device tokens are checked without the database, so they are revoked by
+    # id until the longest token minted for this row could have expired.
+    jti = device_token_jti(key_id)
+    revoke_until = _now() + timedelta(days=settings.device_token_max_days)
+    if not db.query(TokenBlacklistDB.id).filter(TokenBlacklistDB.token_jti == jti).first():
+        db.add(TokenBlacklistDB(token_jti=jti, revoked_at=_now(), expires_at=revoke_until))
+    db.commit()
+    share_api_key_revocation(record.key_hash)
+    share_revocation(jti, revoke_until)
+    return True
+
+
+# ─── Signed device tokens ─────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class DeviceClaims:
+    key_id: int
+    device: str
+    bin_ids: FrozenSet[str]
+    expires_at: datetime
+
+    def may_report(self, bin_id: str) -> bool:
+        return bin_id in self.bin_ids
+
+
+def device_token_jti(key_id: int) -> str:
+    return f"api_key:{key_id}"
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_DEVICE_SIGNING_KEY, payload.encode(), hashlib.sha256).digest())
+
+
+def mint_device_token(label: str, bin_ids: Iterable[str], db: Session, expires_in_days: Optional[int] = None) -> dict:
+    """
+    Issue a signed device token bound to `bin_ids`.
+
+    The lifetime is capped at settings.device_token_max_days.  Like an API
+    key, the token is returned once; only its hash is stored.
+    """
+    bins = sorted(set(bin_ids))
+    if not bins:
+        raise ValueError("A device token must be bound to at least one bin")
+    days = min(expires_in_days or settings.device_token_max_days, settings.device_token_max_days)
+    expires_at = (_now() + timedelta(days=days)).replace(microsecond=0)
+
+    record = APIKeyDB(label=label, is_active=True, created_at=_now())
+    db.add(record)
+    db.flush()      # assigns the id the token is signed for
+
+    claims = {"k": record.id, "d": label, "b": bins, "e": int(expires_at.timestamp())}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    token = f"{settings.device_token_prefix}{payload}.{_sign(payload)}"
+    record.key_hash = _hash_key(token)
     db.commit()
-    return True
\ No newline at end of file
+
+    return {
+        "token": token,         # shown once — not stored
+        "key_id": record.id,
+        "label": label,
+        "bin_ids": bins,
+        "expires_at": expires_at,
+        "note": "Send as X-Device-Token. Store it securely; it will not be shown again.",
+    }
+
+
+def verify_device_token(token: str) -> Optional[DeviceClaims]:
+    """Check signature, expiry and revocation of a device token; no database access."""
+    if not token or not token.startswith(settings.device_token_prefix):
+        return None
+    payload, _, signature = token[len(settings.device_token_prefix):].partition(".")
+    # Header values are attacker-controlled: compare bytes, so non-ASCII input fails cleanly
+    if not hmac.compare_digest(signature.encode("utf-8", "surrogateescape"), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+        key_id, expires = int(claims["k"]), int(claims["e"])
+        device, bins = str(claims["d"]), frozenset(claims["b"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    if expires <= _now().timestamp() or device_token_jti(key_id) in revoked_tokens:
+        return None
+    return DeviceClaims(key_id, device, bins, datetime.fromtimestamp(expires, tz=timezone.utc))
\ No newline at end of file
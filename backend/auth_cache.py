@@ -0,0 +1,356 @@
+"""
+auth_cache.py — In-memory auth state shared by HTTP and WebSocket auth.
+
+Three caches keep the common credential checks off the database:
+
+  revoked_tokens  Revoked JWT ids.  Loaded from token_blacklist at startup,
+                  updated by /auth/logout and refresh rotation, and relayed to
+                  the other workers over the real-time bus.  Until it has been
+                  loaded (e.g. under tests, where startup is skipped) a miss
+                  still falls through to the table.
+
+  active_users    Short-TTL cache of active users, keyed by email.  Entries are
+                  detached copies of the row; HTTP dependencies merge them into
+                  the request session without a SELECT.  A user disabled in the
+                  database by another process is locked out after at most
+                  `ttl` seconds.  Changes made through the ORM in this process
+                  (role, active flag, email, profile) are caught by a session
+                  hook and invalidated on every worker once they commit.
+
+  api_keys        Active IoT API keys by SHA-256 hash, so a sensor POST is a
+                  dictionary lookup.  Misses still query the table (keys
+                  created on another worker); revoke_api_key drops the entry
+                  on every worker.  `key_usage` collects last_used_at per key
+                  and writes it back in one bulk UPDATE every
+                  `api_key_usage_flush_seconds`.
+
+Revoked ids are kept until the token's own `exp`; expired ones are pruned every
+PRUNE_EVERY revocations or PRUNE_INTERVAL seconds, whichever comes first.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from config import get_settings
+from database import APIKeyDB, SessionLocal, TokenBlacklistDB, UserDB
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _detached_copy(row):
+    """A session-less copy of `row`'s column values that can be merged back without a SELECT."""
+    copy = type(row)(**{attr.key: getattr(row, attr.key) for attr in type(row).__mapper__.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# ─── Revoked tokens ───────────────────────────────────────────────────────────
+
+class RevocationSet:
+    """jti → expiry (epoch seconds, None = never).  Expired entries are pruned lazily."""
+
+    PRUNE_EVERY = 1000
+    PRUNE_INTERVAL = 600
+
+    def __init__(self):
+        self._revoked: Dict[str, Optional[float]] = {}
+        self._lock = threading.Lock()
+        self._adds = 0
+        self._next_prune = time.time() + self.PRUNE_INTERVAL
+        self.loaded = False
+
+    def load(self, db: Session) -> int:
+        now = datetime.now(timezone.utc)
+        rows = (
+            db.query(TokenBlacklistDB.token_jti, TokenBlacklistDB.expires_at)
+            .filter((TokenBlacklistDB.expires_at.is_(None)) | (TokenBlacklistDB.expires_at >= now))
+            .all()
+        )
+        with self._lock:
+            self._revoked = {jti: _epoch(expires_at) for jti, expires_at in rows}
+            self.loaded = True
+        return len(rows)
+
+    def add(self, jti: str, expires_at: Optional[datetime] = None) -> None:
+        with self._lock:
+            self._revoked[jti] = _epoch(expires_at)
+            self._adds += 1
+            now = time.time()
+            if self._adds % self.PRUNE_EVERY == 0 or now >= self._next_prune:
+                self._revoked = {j: exp for j, exp in self._revoked.items() if exp is None or exp >= now}
+                self._next_prune = now + self.PRUNE_INTERVAL
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, jti: str, db: Optional[Session] = None) -> bool:
+        """Memory first; the table is consulted only while the set is not loaded."""
+        if jti in self._revoked:
+            return True
+        if self.loaded:
+            return False
+        if db is None:
+            with SessionLocal() as session:
+                return _revoked_in_db(jti, session)
+        return _revoked_in_db(jti, db)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._revoked.clear()
+            self.loaded = False
+
+
+def _revoked_in_db(jti: str, db: Session) -> bool:
+    return db.query(TokenBlacklistDB.id).filter(TokenBlacklistDB.token_jti == jti).first() is not None
+
+
+# ─── Active users ─────────────────────────────────────────────────────────────
+
+class ActiveUserCache:
+    """email → (detached UserDB copy, expires_at monotonic)."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._entries: Dict[str, Tuple[UserDB, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str) -> Optional[UserDB]:
+        entry = self._entries.get(email)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user: UserDB) -> None:
+        if self.ttl <= 0 or not user.is_active:
+            return
+        self._entries[user.email] = (_detached_copy(user), time.monotonic() + self.ttl)
+
+    def invalidate(self, email: Optional[str] = None) -> None:
+        if email is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(email, None)
+
+    def is_active(self, email: str) -> bool:
+        """Session-less check for the WebSocket handshake."""
+        if self.get(email) is not None:
+            return True
+        with SessionLocal() as db:
+            user = db.query(UserDB).filter(UserDB.email == email).first()
+            if user is None or not user.is_active:
+                return False
+            self.put(user)
+            return True
+
+    def load_into(self, email: str, db: Session) -> Optional[UserDB]:
+        """The active user bound to `db`: merged from cache without a SELECT, else queried."""
+        cached = self.get(email)
+        if cached is not None:
+            return db.merge(cached, load=False)
+        user = db.query(UserDB).filter(UserDB.email == email).first()
+        if user is None or not user.is_active:
+            return None
+        self.put(user)
+        return user
+
+
+# ─── API keys ─────────────────────────────────────────────────────────────────
+
+class APIKeyCache:
+    """key hash → detached APIKeyDB copy of an active key."""
+
+    def __init__(self):
+        self._keys: Dict[str, APIKeyDB] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, db: Session) -> int:
+        rows = db.query(APIKeyDB).filter(APIKeyDB.is_active == True).all()  # noqa: E712
+        self._keys = {row.key_hash: _detached_copy(row) for row in rows}
+        return len(rows)
+
+    def get(self, key_hash: str) -> Optional[APIKeyDB]:
+        record = self._keys.get(key_hash)
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def peek(self, key_hash: str) -> Optional[APIKeyDB]:
+        """Like get, without counting a hit or miss (for the rate limiter)."""
+        return self._keys.get(key_hash)
+
+    def put(self, record: APIKeyDB) -> None:
+        if record.is_active:
+            self._keys[record.key_hash] = _detached_copy(record)
+
+    def invalidate(self, key_hash: Optional[str] = None) -> None:
+        if key_hash is None:
+            self._keys.clear()
+        else:
+            self._keys.pop(key_hash, None)
+
+
+class APIKeyUsage:
+    """key id → most recent use, written back in one bulk UPDATE per flush."""
+
+    def __init__(self, interval_seconds: float):
+        self.interval = interval_seconds
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+
+    def touch(self, key_id: int, when: datetime) -> None:
+        with self._lock:
+            self._pending[key_id] = when
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """Write pending last_used_at values; returns the number of keys updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        session = db if db is not None else SessionLocal()
+        try:
+            session.execute(update(APIKeyDB), [
+                {"id": key_id, "last_used_at": when} for key_id, when in pending.items()
+            ])
+            session.commit()
+        except Exception:
+            session.rollback()
+            with self._lock:
+                for key_id, when in pending.items():    # retried next time; newer uses win
+                    self._pending.setdefault(key_id, when)
+            raise
+        finally:
+            if db is None:
+                session.close()
+        self.flushed += len(pending)
+        return len(pending)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="api-key-usage", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"[auth] API key usage flush failed: {e}")
+
+    def stop(self) -> None:
+        """Stop the flusher and write what is still pending."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
+
+
+revoked_tokens = RevocationSet()
+active_users = ActiveUserCache(settings.auth_user_cache_ttl_seconds)
+api_keys = APIKeyCache()
+key_usage = APIKeyUsage(settings.api_key_usage_flush_seconds)
+
+
+# ─── Cross-worker propagation ─────────────────────────────────────────────────
+
+def share_revocation(jti: str, expires_at: Optional[datetime]) -> None:
+    """Record a revocation here and tell the other workers."""
+    revoked_tokens.add(jti, expires_at)
+    _publish("token_revoked", {"jti": jti, "expires_at": _epoch(expires_at)})
+
+
+def share_user_change(email: str) -> None:
+    """Drop a changed user from this worker's cache and the others'."""
+    active_users.invalidate(email)
+    _publish("user_changed", {"email": email})
+
+
+def share_api_key_revocation(key_hash: str) -> None:
+    """Stop accepting a revoked API key here and on the other workers."""
+    api_keys.invalidate(key_hash)
+    _publish("api_key_revoked", {"key_hash": key_hash})
+
+
+_CHANGED_USERS = "auth_cache.changed_users"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session: Session, flush_context) -> None:
+    """Remember the emails of users changed or deleted by this flush (old and new)."""
+    users = [obj for obj in session.deleted if isinstance(obj, UserDB)]
+    users += [
+        obj for obj in session.dirty
+        if isinstance(obj, UserDB) and session.is_modified(obj, include_collections=False)
+    ]
+    if not users:
+        return
+    changed = session.info.setdefault(_CHANGED_USERS, set())
+    for user in users:
+        history = inspect(user).attrs.email.history
+        changed.update(e for e in (*history.deleted, *history.unchanged, *history.added) if e)
+
+
+@event.listens_for(Session, "after_commit")
+def _share_user_changes(session: Session) -> None:
+    for email in session.info.pop(_CHANGED_USERS, ()):
+        share_user_change(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_user_changes(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS, None)
+
+
+def apply_bus_event(kind: str, data: dict) -> bool:
+    """Apply a relayed auth event; False if `kind` is not an auth event."""
+    if kind == "token_revoked":
+        expires_at = data.get("expires_at")
+        revoked_tokens.add(
+            data["jti"],
+            datetime.fromtimestamp(expires_at, tz=timezone.utc) if expires_at is not None else None,
+        )
+        return True
+    if kind == "user_changed":
+        active_users.invalidate(data.get("email"))
+        return True
+    if kind == "api_key_revoked":
+        api_keys.invalidate(data["key_hash"])
+        return True
+    return False
+
+
+def _publish(kind: str, data: dict) -> None:
+    try:
+        from routers.websocket_router import manager
+        manager.bus.publish(kind, data)
+    except Exception as e:
+        logger.warning(f"[auth] Could not relay {kind} to other workers: {e}")
@@ -0,0 +1,252 @@
+"""
+benchmarks/middleware_overhead.py
+
+Per-request cost of the security middleware, measured by calling the ASGI
+app directly (no sockets, no HTTP parsing) so the middleware is most of what
+is timed.  Three stacks wrap the same small FastAPI app:
+
+  bare     : no middleware — the floor
+  legacy   : the former four BaseHTTPMiddleware layers (SecurityHeaders,
+             InputValidation, AuthRateLimit, RateLimit), rebuilt here on the
+             same limiter classes so only the middleware mechanism differs
+  asgi     : security.SecurityMiddleware
+
+Scenarios: a JSON GET, a failing POST /auth/login (401, counted towards the
+lockout) and a 64-chunk streaming download.  Limits are set high enough
+that nothing is rejected.  Overhead is reported per request against `bare`;
+`speedup` (legacy overhead / asgi overhead) is null when the asgi overhead is
+not clearly above the run-to-run noise of the two means, since dividing by a
+difference of ~0 (or a negative one) says nothing.
+
+Usage (from backend/):
+    python -m benchmarks.middleware_overhead
+    python -m benchmarks.middleware_overhead --requests 10000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI, HTTPException, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from security import (  # noqa: E402
+    _SECURITY_HEADERS,
+    AuthRateLimiter,
+    RequestRateLimiter,
+    SecurityMiddleware,
+)
+
+UNLIMITED = 10 ** 9
+SCENARIOS = {
+    "json": ("GET", "/bins", b""),
+    "auth_401": ("POST", "/auth/login", b'{"email": "x@example.com", "password": "nope"}'),
+    "stream": ("GET", "/reports/export", b""),
+}
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/bins")
+    def bins():
+        return [{"id": f"bin{i}", "fill_level_percent": i} for i in range(5)]
+
+    @app.post("/auth/login")
+    def login():
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    @app.get("/reports/export")
+    def export():
+        return StreamingResponse((b"x" * 1024 for _ in range(64)), media_type="application/octet-stream")
+
+    return app
+
+
+def _unlocked(limiter: AuthRateLimiter) -> AuthRateLimiter:
+    limiter.lockout_threshold = UNLIMITED     # failures are still counted
+    return limiter
+
+
+class _BenchSecurityMiddleware(SecurityMiddleware):
+    def __init__(self, app):
+        super().__init__(app, requests_per_minute=UNLIMITED, auth_requests_per_minute=UNLIMITED)
+        _unlocked(self.auth)
+
+
+# ─── The former BaseHTTPMiddleware stack ──────────────────────────────────────
+
+class _LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in _SECURITY_HEADERS:
+            response.headers[name.decode()] = value.decode()
+        return response
+
+
+class _LegacyInputValidation(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        content_length = request.headers.get("content-length")
+        if content_length and int(content_length) > 10 * 1024 * 1024:
+            return JSONResponse(status_code=413, content={"error": "Payload too large"})
+        return await call_next(request)
+
+
+class _LegacyAuthRateLimit(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self.limiter = _unlocked(AuthRateLimiter(UNLIMITED))
+
+    async def dispatch(self, request: Request, call_next):
+        if not request.url.path.startswith("/auth/"):
+            return await call_next(request)
+        client_ip, now = request.client.host, time.time()
+        rejection, remaining = await self.limiter.check(client_ip, now)
+        if rejection is not None:
+            return rejection
+        response = await call_next(request)
+        if response.status_code in (400, 401, 422):
+            await self.limiter.record_failure(client_ip, now)
+        for name, value in self.limiter.headers(remaining):
+            response.headers[name.decode()] = value.decode()
+        return response
+
+
+class _LegacyRateLimit(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self.limiter = RequestRateLimiter(UNLIMITED)
+
+    async def dispatch(self, request: Request, call_next):
+        remaining = await self.limiter.hit(request.client.host, time.time())
+        if remaining is None:
+            return self.limiter.rejection()
+        response = await call_next(request)
+        for name, value in self.limiter.headers(remaining):
+            response.headers[name.decode()] = value.decode()
+        return response
+
+
+def build_stacks() -> dict:
+    bare = _app()
+
+    legacy = _app()
+    for layer in (_LegacySecurityHeaders, _LegacyInputValidation, _LegacyAuthRateLimit, _LegacyRateLimit):
+        legacy.add_middleware(layer)
+
+    asgi = _app()
+    asgi.add_middleware(_BenchSecurityMiddleware)
+    return {"bare": bare, "legacy": legacy, "asgi": asgi}
+
+
+# ─── Driver ───────────────────────────────────────────────────────────────────
+
+def _scope(method: str, path: str, body: bytes) -> dict:
+    headers = [(b"host", b"bench"), (b"user-agent", b"middleware-overhead")]
+    if body:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("10.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+
+async def _one(app, scope: dict, body: bytes) -> int:
+    sent = False
+    status = 0
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await finished.wait()           # the client disconnects only after the response
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not message.get("more_body", False):
+            finished.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _measure(app, scenario: str, requests: int) -> dict:
+    method, path, body = SCENARIOS[scenario]
+    scope = _scope(method, path, body)
+    for _ in range(min(200, requests)):                # warm-up
+        await _one(app, dict(scope), body)
+
+    samples = []
+    statuses = set()
+    for _ in range(requests):
+        started = time.perf_counter_ns()
+        statuses.add(await _one(app, dict(scope), body))
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    samples.sort()
+    return {
+        "status": sorted(statuses),
+        "mean_us": round(statistics.fmean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p99_us": round(samples[int(len(samples) * 0.99)], 1),
+        "stderr_us": round(statistics.stdev(samples) / len(samples) ** 0.5, 2) if len(samples) > 1 else 0.0,
+    }
+
+
+def _speedup(bare: dict, legacy: dict, asgi: dict) -> Optional[float]:
+    """legacy/asgi overhead ratio, or None if the asgi overhead is within two standard errors of zero."""
+    noise = 2 * (bare["stderr_us"] ** 2 + asgi["stderr_us"] ** 2) ** 0.5
+    if asgi["overhead_us"] <= max(noise, 0.1):
+        return None
+    return round(legacy["overhead_us"] / asgi["overhead_us"], 1)
+
+
+async def run(requests: int, repeat: int) -> dict:
+    stacks = build_stacks()
+    report = {}
+    for scenario in SCENARIOS:
+        best = {}
+        for _ in range(repeat):                     # best of `repeat` runs, per stack
+            for name, app in stacks.items():
+                result = await _measure(app, scenario, requests)
+                if name not in best or result["mean_us"] < best[name]["mean_us"]:
+                    best[name] = result
+        floor = best["bare"]["mean_us"]
+        for name in ("legacy", "asgi"):
+            best[name]["overhead_us"] = round(best[name]["mean_us"] - floor, 1)
+        best["speedup"] = _speedup(best["bare"], best["legacy"], best["asgi"])
+        report[scenario] = best
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per stack and scenario")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "scenarios": asyncio.run(run(args.requests, args.repeat)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
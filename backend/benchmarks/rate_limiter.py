@@ -0,0 +1,116 @@
+"""
+benchmarks/rate_limiter.py
+
+Per-request cost and memory of the general rate limiter:
+
+  lists   : the former per-IP list of timestamps, rebuilt by a comprehension
+            on every request and swept every five minutes
+  sliding : security.RequestRateLimiter — sliding-window counter over the
+            memory or shared (mmap) store
+
+"steady" sends one IP at its limit for a minute (the list holds `limit`
+timestamps, so each request copies them); "flood" sends one request from
+each of `--ips` distinct addresses and reports the memory left behind.
+
+Usage (from backend/):
+    python -m benchmarks.rate_limiter
+    python -m benchmarks.rate_limiter --limits 60 200 1000 --ips 500000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from security import RequestRateLimiter  # noqa: E402
+from services.rate_limit_store import MemoryRateLimitStore, SharedMemoryRateLimitStore  # noqa: E402
+
+
+class _ListLimiter:
+    """The former RateLimitMiddleware bookkeeping."""
+
+    def __init__(self, requests_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.requests = defaultdict(list)
+        self.last_cleanup = time.time()
+
+    async def hit(self, client_ip: str, now: float):
+        if now - self.last_cleanup > 300:
+            cutoff = now - 3600
+            for ip in list(self.requests):
+                self.requests[ip] = [t for t in self.requests[ip] if t > cutoff]
+                if not self.requests[ip]:
+                    del self.requests[ip]
+            self.last_cleanup = now
+        minute_ago = now - 60
+        self.requests[client_ip] = [t for t in self.requests[client_ip] if t > minute_ago]
+        if len(self.requests[client_ip]) >= self.requests_per_minute:
+            return None
+        self.requests[client_ip].append(now)
+        return self.requests_per_minute - len(self.requests[client_ip])
+
+
+def _limiters(limit: int, shared_path: str) -> dict:
+    return {
+        "lists": _ListLimiter(limit),
+        "sliding_memory": RequestRateLimiter(limit, MemoryRateLimitStore()),
+        "sliding_shared": RequestRateLimiter(limit, SharedMemoryRateLimitStore(shared_path, 1 << 16)),
+    }
+
+
+async def _steady(limiter, limit: int) -> float:
+    """µs per request with one IP sending `limit` requests spread over each minute."""
+    step = 60.0 / limit
+    requests = max(limit * 5, 5000)
+    now = 1_700_000_000.0
+    for _ in range(limit):                      # fill the window first
+        await limiter.hit("10.0.0.1", now)
+        now += step
+    started = time.perf_counter_ns()
+    for _ in range(requests):
+        await limiter.hit("10.0.0.1", now)
+        now += step
+    return round((time.perf_counter_ns() - started) / requests / 1000, 2)
+
+
+async def _flood(limiter, ips: int) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter_ns()
+    for i in range(ips):
+        await limiter.hit(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 1_700_000_000.0)
+    elapsed = time.perf_counter_ns() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_request": round(elapsed / ips / 1000, 2), "retained_mb": round(current / 2 ** 20, 1)}
+
+
+async def run(limits, ips: int) -> dict:
+    shared_path = os.path.join(tempfile.mkdtemp(prefix="swrl"), "ratelimit.bin")
+    report = {"steady_us": {}, "flood": {}}
+    for limit in limits:
+        limiters = _limiters(limit, f"{shared_path}.{limit}")
+        report["steady_us"][limit] = {name: await _steady(limiter, limit) for name, limiter in limiters.items()}
+    report["flood"] = {
+        name: await _flood(limiter, ips) for name, limiter in _limiters(200, shared_path + ".flood").items()
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--limits", type=int, nargs="+", default=[60, 200, 1000])
+    parser.add_argument("--ips", type=int, default=250_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.limits, args.ips)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+benchmarks/route_optimizer_bench.py
+
+Speed and quality harness for every algorithm in services/route_optimizer.py.
+
+Synthetic bin layouts are generated inside the Nagpur and Amravati bounding
+boxes in three patterns:
+  uniform   : bins spread evenly over the city
+  clustered : bins grouped around a handful of market/ward centres
+  corridor  : bins strung along a few arterial roads
+
+For each (city, pattern, size, algorithm) the harness records wall time,
+peak traced memory, tour length and the gap versus the best known tour for
+that instance (best of this run, or of --best-known if given). Results are
+written as JSON plus a CSV summary.
+
+Regression mode (--baseline) compares against an earlier JSON report and
+exits non-zero when time, memory or gap exceed the given thresholds.
+
+Usage (from backend/):
+    python -m benchmarks.route_optimizer_bench
+    python -m benchmarks.route_optimizer_bench --sizes 10,100,1000 --cities nagpur
+    python -m benchmarks.route_optimizer_bench --sizes 10,100 --baseline benchmarks/results/route_bench.json
+"""
+
+import argparse
+import csv
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np  # noqa: E402
+
+from services.route_optimizer import CollectionPoints, Location, RouteOptimizer  # noqa: E402
+
+# lat_min, lat_max, lon_min, lon_max
+CITY_BBOXES: Dict[str, Tuple[float, float, float, float]] = {
+    "nagpur": (21.05, 21.25, 78.95, 79.20),
+    "amravati": (20.90, 20.97, 77.73, 77.82),
+}
+CITY_DEPOTS: Dict[str, Tuple[float, float]] = {
+    "nagpur": (21.1458, 79.0882),     # same as routers/routes.py DEPOT_LAT/LON
+    "amravati": (20.9374, 77.7796),   # Rajkamal Chowk
+}
+PATTERNS = ("uniform", "clustered", "corridor")
+ALGORITHMS = ("greedy", "priority", "hybrid", "two_opt")
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_OUT_DIR = Path(__file__).resolve().parent / "results"
+
+
+# ─── Layout generation ────────────────────────────────────────────────────────
+
+def _priority_from_fill(fill: np.ndarray) -> np.ndarray:
+    """Same thresholds as routers/routes.py determine_priority()."""
+    return np.where(fill >= 90, 3, np.where(fill >= 70, 2, 1))
+
+
+def generate_layout(city: str, pattern: str, n: int, seed: int = 0) -> CollectionPoints:
+    """Deterministic synthetic bin layout for one benchmark instance."""
+    lat_min, lat_max, lon_min, lon_max = CITY_BBOXES[city]
+    rng = np.random.default_rng([seed, n, PATTERNS.index(pattern), list(CITY_BBOXES).index(city)])
+
+    if pattern == "uniform":
+        lat = rng.uniform(lat_min, lat_max, n)
+        lon = rng.uniform(lon_min, lon_max, n)
+    elif pattern == "clustered":
+        k = int(np.clip(n // 50, 2, 12))
+        centre_lat = rng.uniform(lat_min, lat_max, k)
+        centre_lon = rng.uniform(lon_min, lon_max, k)
+        spread = 0.03 * (lat_max - lat_min)
+        which = rng.integers(0, k, n)
+        lat = centre_lat[which] + rng.normal(0, spread, n)
+        lon = centre_lon[which] + rng.normal(0, spread, n)
+    elif pattern == "corridor":
+        roads = 3
+        ends_lat = rng.uniform(lat_min, lat_max, (roads, 2))
+        ends_lon = rng.uniform(lon_min, lon_max, (roads, 2))
+        which = rng.integers(0, roads, n)
+        t = rng.uniform(0, 1, n)
+        jitter = 0.005 * (lat_max - lat_min)
+        lat = ends_lat[which, 0] + t * (ends_lat[which, 1] - ends_lat[which, 0]) + rng.normal(0, jitter, n)
+        lon = ends_lon[which, 0] + t * (ends_lon[which, 1] - ends_lon[which, 0]) + rng.normal(0, jitter, n)
+    else:
+        raise ValueError(f"Unknown pattern: {pattern}")
+
+    lat = np.clip(lat, lat_min, lat_max)
+    lon = np.clip(lon, lon_min, lon_max)
+    fill = rng.integers(0, 101, n)
+
+    return CollectionPoints(
+        bin_ids=[f"{city[:3]}_{i:05d}" for i in range(n)],
+        names=[f"{city.title()} {pattern} {i}" for i in range(n)],
+        lat=lat,
+        lon=lon,
+        fill=fill,
+        priority=_priority_from_fill(fill),
+        service_time=np.full(n, 10),
+    )
+
+
+# ─── Running ──────────────────────────────────────────────────────────────────
+
+def _instance_key(row: dict) -> str:
+    return f"{row['city']}/{row['pattern']}/{row['stops']}/{row['seed']}"
+
+
+def _case_key(row: dict) -> str:
+    return f"{_instance_key(row)}/{row['algorithm']}"
+
+
+def run_case(points: CollectionPoints, city: str, algorithm: str) -> dict:
+    depot = Location(*CITY_DEPOTS[city], "Depot")
+    optimizer = RouteOptimizer()
+    optimizer.set_depot(depot)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = optimizer.optimize_arrays(points, depot, algorithm)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if sorted(result["order"].tolist()) != list(range(len(points))):
+        raise AssertionError(f"{algorithm} did not return a permutation of the input")
+
+    return {
+        "algorithm": algorithm,
+        "result_algorithm": result["algorithm"],
+        "wall_ms": round(elapsed * 1000, 2),
+        "peak_kib": round(peak / 1024, 1),
+        "tour_km": result["total_distance"],
+        "total_time_min": result["total_time"],
+    }
+
+
+def run_benchmark(
+    cities: List[str],
+    patterns: List[str],
+    sizes: List[int],
+    algorithms: List[str],
+    seed: int = 0,
+    best_known: Optional[Dict[str, float]] = None,
+    verbose: bool = True,
+) -> List[dict]:
+    best_known = dict(best_known or {})
+    rows: List[dict] = []
+
+    for city in cities:
+        for pattern in patterns:
+            for n in sizes:
+                points = generate_layout(city, pattern, n, seed)
+                instance = []
+                for algorithm in algorithms:
+                    row = {"city": city, "pattern": pattern, "stops": n, "seed": seed}
+                    row.update(run_case(points, city, algorithm))
+                    instance.append(row)
+                    if verbose:
+                        print(
+                            f"  {city:9s} {pattern:9s} {n:6d} {algorithm:9s} "
+                            f"{row['wall_ms']:10.1f} ms {row['tour_km']:10.2f} km",
+                            file=sys.stderr,
+                        )
+
+                key = _instance_key(instance[0])
+                best = min([r["tour_km"] for r in instance] + ([best_known[key]] if key in best_known else []))
+                best_known[key] = best
+                for row in instance:
+                    row["best_known_km"] = best
+                    row["gap"] = round(row["tour_km"] / best - 1, 4) if best > 0 else 0.0
+                rows.extend(instance)
+
+    return rows
+
+
+# ─── Reporting ────────────────────────────────────────────────────────────────
+
+CSV_FIELDS = [
+    "city", "pattern", "stops", "seed", "algorithm",
+    "wall_ms", "peak_kib", "tour_km", "best_known_km", "gap", "total_time_min",
+]
+
+
+def write_reports(rows: List[dict], out_dir: Path, name: str = "route_bench") -> Tuple[Path, Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    json_path = out_dir / f"{name}.json"
+    csv_path = out_dir / f"{name}_summary.csv"
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": rows,
+    }
+    json_path.write_text(json.dumps(report, indent=2))
+
+    with csv_path.open("w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    return json_path, csv_path
+
+
+def check_regressions(
+    rows: List[dict],
+    baseline_rows: List[dict],
+    max_time_ratio: float,
+    max_memory_ratio: float,
+    max_gap_increase: float,
+    min_time_ms: float,
+) -> List[str]:
+    """Return human-readable failures; an empty list means no regression."""
+    baseline = {_case_key(r): r for r in baseline_rows}
+    failures = []
+
+    for row in rows:
+        old = baseline.get(_case_key(row))
+        if not old:
+            continue
+        key = _case_key(row)
+        # Sub-threshold timings are noise; only compare meaningful durations
+        if old["wall_ms"] >= min_time_ms and row["wall_ms"] > old["wall_ms"] * max_time_ratio:
+            failures.append(f"{key}: time {old['wall_ms']} → {row['wall_ms']} ms")
+        if old["peak_kib"] > 0 and row["peak_kib"] > old["peak_kib"] * max_memory_ratio:
+            failures.append(f"{key}: peak memory {old['peak_kib']} → {row['peak_kib']} KiB")
+        if row["tour_km"] > old["tour_km"] * (1 + max_gap_increase):
+            failures.append(f"{key}: tour length {old['tour_km']} → {row['tour_km']} km")
+
+    return failures
+
+
+def _csv_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Route optimizer benchmark and quality harness")
+    parser.add_argument("--cities", default=",".join(CITY_BBOXES))
+    parser.add_argument("--patterns", default=",".join(PATTERNS))
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--algorithms", default=",".join(ALGORITHMS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    parser.add_argument("--best-known", type=Path, help="JSON map of instance key → best tour km")
+    parser.add_argument("--update-best-known", action="store_true",
+                        help="write improved best tours back to --best-known")
+    parser.add_argument("--baseline", type=Path, help="earlier JSON report to check for regressions")
+    parser.add_argument("--max-time-ratio", type=float, default=1.5)
+    parser.add_argument("--max-memory-ratio", type=float, default=1.5)
+    parser.add_argument("--max-gap-increase", type=float, default=0.02,
+                        help="allowed relative tour length growth per case")
+    parser.add_argument("--min-time-ms", type=float, default=20.0,
+                        help="ignore timing regressions below this baseline duration")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    for city in _csv_list(args.cities):
+        if city not in CITY_BBOXES:
+            parser.error(f"unknown city {city!r}")
+    for algorithm in _csv_list(args.algorithms):
+        if algorithm not in ALGORITHMS:
+            parser.error(f"unknown algorithm {algorithm!r}")
+
+    # Read the baseline first — it may be the report this run overwrites
+    baseline_rows = json.loads(args.baseline.read_text())["results"] if args.baseline else None
+
+    best_known = {}
+    if args.best_known and args.best_known.exists():
+        best_known = json.loads(args.best_known.read_text())
+
+    rows = run_benchmark(
+        cities=_csv_list(args.cities),
+        patterns=_csv_list(args.patterns),
+        sizes=[int(s) for s in _csv_list(args.sizes)],
+        algorithms=_csv_list(args.algorithms),
+        seed=args.seed,
+        best_known=best_known,
+        verbose=not args.quiet,
+    )
+    json_path, csv_path = write_reports(rows, args.out_dir)
+    print(f"Wrote {json_path} and {csv_path}")
+
+    if args.best_known and args.update_best_known:
+        for row in rows:
+            best_known[_instance_key(row)] = row["best_known_km"]
+        args.best_known.write_text(json.dumps(best_known, indent=2, sort_keys=True))
+
+    if baseline_rows is not None:
+        failures = check_regressions(
+            rows, baseline_rows,
+            max_time_ratio=args.max_time_ratio,
+            max_memory_ratio=args.max_memory_ratio,
+            max_gap_increase=args.max_gap_increase,
+            min_time_ms=args.min_time_ms,
+        )
+        if failures:
+            print("REGRESSIONS:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print("No regressions against baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+benchmarks/route_points_memory.py
+
+Compares memory and allocation counts of the two route point models for a
+large /routes/optimize request:
+
+  objects : one WasteCollectionPoint + Location per bin, then a waypoint
+            dict per stop (the pre-CollectionPoints request path)
+  arrays  : CollectionPoints parallel arrays + an index permutation, with
+            waypoint dicts built once at the response boundary
+
+"model" measures the optimizer input plus a route ordering; "response"
+adds the waypoint dicts returned to the client.
+
+Usage (from backend/):
+    python -m benchmarks.route_points_memory --stops 10000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np  # noqa: E402
+
+from benchmarks.route_optimizer_bench import CITY_BBOXES  # noqa: E402
+from services.route_optimizer import (  # noqa: E402
+    CollectionPoints,
+    Location,
+    RouteOptimizer,
+    WasteCollectionPoint,
+)
+
+
+def _rows(n: int, seed: int):
+    rng = random.Random(seed)
+    lat_min, lat_max, lon_min, lon_max = CITY_BBOXES["nagpur"]
+    return [
+        (
+            f"bin_{i:05d}",
+            f"Ward {i % 97} collection point",
+            rng.uniform(lat_min, lat_max),
+            rng.uniform(lon_min, lon_max),
+            rng.randint(0, 100),
+            rng.randint(1, 3),
+        )
+        for i in range(n)
+    ]
+
+
+def _objects_path(rows, response: bool = True):
+    points = [
+        WasteCollectionPoint(bin_id, Location(lat, lon, name), fill, priority, 10)
+        for bin_id, name, lat, lon, fill, priority in rows
+    ]
+    # Route = permutation of the same objects; waypoint dicts built per point
+    route = sorted(points, key=lambda p: p.urgency_score(), reverse=True)
+    if not response:
+        return points, route, None
+    waypoints = [
+        {
+            "bin_id": p.bin_id,
+            "location": p.location.name,
+            "latitude": p.location.lat,
+            "longitude": p.location.lon,
+            "fill_level": p.fill_level,
+            "order": i + 1,
+            "estimated_collection_time": p.estimated_time,
+            "done": False,
+        }
+        for i, p in enumerate(route)
+    ]
+    return points, route, waypoints
+
+
+def _arrays_path(rows, response: bool = True):
+    points = CollectionPoints(
+        bin_ids=[r[0] for r in rows],
+        names=[r[1] for r in rows],
+        lat=[r[2] for r in rows],
+        lon=[r[3] for r in rows],
+        fill=[r[4] for r in rows],
+        priority=[r[5] for r in rows],
+        service_time=[10] * len(rows),
+    )
+    order = np.argsort(-points.urgency_scores(), kind="stable")
+    if not response:
+        return points, order, None
+    lat, lon = points.lat[order].tolist(), points.lon[order].tolist()
+    fill, service = points.fill[order].tolist(), points.service_time[order].tolist()
+    waypoints = [
+        {
+            "bin_id": points.bin_ids[i],
+            "location": points.names[i],
+            "latitude": lat[k],
+            "longitude": lon[k],
+            "fill_level": fill[k],
+            "order": k + 1,
+            "estimated_collection_time": service[k],
+            "done": False,
+        }
+        for k, i in enumerate(order.tolist())
+    ]
+    return points, order, waypoints
+
+
+def _measure(fn, rows, response: bool) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    result = fn(rows, response)
+    elapsed = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in diff if stat.count_diff > 0)
+    retained = sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    del result
+    return {
+        "wall_ms": round(elapsed * 1000, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib": round(retained / 1024, 1),
+        "live_allocations": blocks,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stops", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--optimize", action="store_true",
+                        help="also time the array greedy + 2-opt core on the same points")
+    args = parser.parse_args()
+
+    rows = _rows(args.stops, args.seed)
+    report = {"stops": args.stops}
+    for stage, response in (("model", False), ("response", True)):
+        report[stage] = {
+            "objects": _measure(_objects_path, rows, response),
+            "arrays": _measure(_arrays_path, rows, response),
+        }
+
+    if args.optimize:
+        points, _, _ = _arrays_path(rows)
+        optimizer = RouteOptimizer()
+        optimizer.set_depot(Location(21.1458, 79.0882, "Depot"))
+        start = Location(21.1458, 79.0882, "Depot")
+        for algorithm in ("greedy", "hybrid", "two_opt"):
+            started = time.perf_counter()
+            result = optimizer.optimize_arrays(points, start, algorithm)
+            report[f"optimize_{algorithm}"] = {
+                "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+                "total_distance_km": result["total_distance"],
+            }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,706 @@
+"""
+benchmarks/ws_load.py
+
+Scale test for the real-time feed.  Opens many asyncio WebSocket clients
+against a server, authenticates each with the {"type": "auth"} handshake,
+then drives telemetry through POST /telemetry/ at a fixed rate and measures:
+
+  latency      ingest → client delivery, per (reading, client) pair, matched
+               on the bin id + reading timestamp echoed in bin_updates deltas
+  ingest       POST /telemetry/ response time and error counts
+  connections  failed handshakes and connections dropped mid-run (with the
+               close codes, e.g. 1013 from the slow-consumer policy)
+  server       CPU % and resident memory of the server process tree, sampled
+               from /proc, plus the server's own /ws/stats at the end
+
+Server modes:
+  (default)     spawn `uvicorn main:app` on a throwaway SQLite database seeded
+                with --bins bins spread over --zones zones; --workers > 1 turns
+                on the unix socket bus so every worker fans out every reading
+  --in-process  run uvicorn inside this event loop (CPU/memory then include
+                the load clients themselves)
+  --url         an already running server; needs --token (access JWT) and
+                ideally --api-key, and --server-pid for CPU/memory sampling
+
+Delivered readings are only a fraction of the expected deliveries when a bin
+reports more than once per batch window (ws_batch_window_ms) — the feed sends
+the latest state, not every reading — so keep bins / rate well above the
+window when comparing delivery ratios.
+
+The JSON report is stable across releases; --baseline compares against an
+earlier one and exits non-zero on latency, drop or CPU regressions.
+
+Usage (from backend/):
+    python -m benchmarks.ws_load
+    python -m benchmarks.ws_load --clients 2000 --rate 500 --duration 60 --workers 4
+    python -m benchmarks.ws_load --format msgpack --zone-filter --batch-window-ms 100
+    python -m benchmarks.ws_load --url http://10.0.0.5:8000 --token <jwt> --api-key wsk_live_...
+    python -m benchmarks.ws_load --baseline benchmarks/results/ws_load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+import websockets  # noqa: E402
+
+from utils import format_timestamp_response  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_OUT_DIR = Path(__file__).resolve().parent / "results"
+BENCH_EMAIL = "ws-load@benchmark.local"
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+# ─── Measurement ──────────────────────────────────────────────────────────────
+
+class LatencyTracker:
+    """Send times of each reading, keyed by (bin_id, timestamp as echoed by the feed)."""
+
+    def __init__(self):
+        self.sent: Dict[Tuple[str, str], float] = {}
+        self.samples_ms: List[float] = []
+        self.unmatched = 0
+
+    def mark_sent(self, bin_id: str, timestamp: str, at: float) -> None:
+        self.sent[(bin_id, timestamp)] = at
+
+    def observe(self, update: dict, at: float) -> Optional[float]:
+        sent_at = self.sent.get((update.get("bin_id"), update.get("timestamp")))
+        if sent_at is None:
+            self.unmatched += 1
+            return None
+        latency = (at - sent_at) * 1000
+        self.samples_ms.append(latency)
+        return latency
+
+
+def summarize(samples: List[float]) -> dict:
+    """count / mean / max plus the PERCENTILES of a list of millisecond samples."""
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples, dtype=np.float64)
+    summary = {"count": int(arr.size), "mean": round(float(arr.mean()), 3), "max": round(float(arr.max()), 3)}
+    for p, value in zip(PERCENTILES, np.percentile(arr, PERCENTILES)):
+        summary[f"p{p:g}"] = round(float(value), 3)
+    return summary
+
+
+class ProcessSampler:
+    """CPU % and RSS of a process and its descendants, read from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.available = Path(f"/proc/{pid}/stat").exists()
+        self.cpu_percent: List[float] = []
+        self.rss_mib: List[float] = []
+        self._tick = os.sysconf("SC_CLK_TCK") if self.available else 100
+
+    def _tree(self) -> List[int]:
+        pids, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            for children in Path(f"/proc/{pid}/task").glob("*/children"):
+                try:
+                    stack.extend(int(c) for c in children.read_text().split())
+                except OSError:
+                    continue
+        return pids
+
+    def _read(self) -> Tuple[float, float]:
+        cpu_seconds, rss_kib = 0.0, 0.0
+        for pid in self._tree():
+            try:
+                stat = Path(f"/proc/{pid}/stat").read_text()
+                status = Path(f"/proc/{pid}/status").read_text()
+            except OSError:
+                continue
+            fields = stat.rsplit(")", 1)[1].split()
+            cpu_seconds += (int(fields[11]) + int(fields[12])) / self._tick   # utime + stime
+            for line in status.splitlines():
+                if line.startswith("VmRSS:"):
+                    rss_kib += float(line.split()[1])
+                    break
+        return cpu_seconds, rss_kib
+
+    async def run(self, stop: asyncio.Event) -> None:
+        if not self.available:
+            return
+        last_cpu, last_at = self._read()[0], time.perf_counter()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            cpu, rss = self._read()
+            now = time.perf_counter()
+            self.cpu_percent.append(100 * (cpu - last_cpu) / max(now - last_at, 1e-6))
+            self.rss_mib.append(rss / 1024)
+            last_cpu, last_at = cpu, now
+
+    def report(self) -> dict:
+        if not self.available or not self.cpu_percent:
+            return {"sampled": False}
+        return {
+            "sampled": True,
+            "cpu_percent_mean": round(float(np.mean(self.cpu_percent)), 1),
+            "cpu_percent_max": round(float(np.max(self.cpu_percent)), 1),
+            "rss_mib_peak": round(max(self.rss_mib), 1),
+            "rss_mib_end": round(self.rss_mib[-1], 1),
+        }
+
+
+class LoadStats:
+    def __init__(self):
+        self.connected = 0
+        self.handshake_failures: Counter = Counter()
+        self.dropped: Counter = Counter()          # close code → count
+        self.frames = 0
+        self.bytes = 0
+        self.snapshots = 0
+        self.readings_sent = 0
+        self.expected_deliveries = 0
+        self.ingest_ms: List[float] = []
+        self.ingest_errors: Counter = Counter()    # status code / exception name → count
+
+
+# ─── Clients ──────────────────────────────────────────────────────────────────
+
+def _decode(raw) -> dict:
+    if isinstance(raw, bytes):
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+
+async def run_client(
+    ws_url: str,
+    token: str,
+    frame_format: str,
+    zone: Optional[str],
+    tracker: LatencyTracker,
+    stats: LoadStats,
+    interest: Counter,
+    stop: asyncio.Event,
+    gate: asyncio.Semaphore,
+    connect_timeout: float = 30.0,
+) -> None:
+    """One dashboard client: handshake (at most `gate` at a time), then read frames until `stop`."""
+    auth = {"type": "auth", "token": token, "format": frame_format}
+    if zone is not None:
+        auth["zones"] = [zone]
+    try:
+        async with gate:
+            ws = await websockets.connect(ws_url, max_size=None, open_timeout=connect_timeout)
+            await ws.send(json.dumps(auth))
+            reply = _decode(await asyncio.wait_for(ws.recv(), timeout=connect_timeout))
+    except Exception as e:
+        stats.handshake_failures[type(e).__name__] += 1
+        return
+    if reply.get("event") != "connected":
+        stats.handshake_failures[reply.get("reason", reply.get("event", "unknown"))] += 1
+        await ws.close()
+        return
+
+    stats.connected += 1
+    interest[zone] += 1
+    reader = asyncio.create_task(_read_frames(ws, tracker, stats))
+    stopper = asyncio.create_task(stop.wait())
+    try:
+        await asyncio.wait({reader, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if reader.done():
+            code = ws.close_code if ws.close_code is not None else "error"
+            stats.dropped[str(code)] += 1
+    finally:
+        interest[zone] -= 1
+        stopper.cancel()
+        reader.cancel()
+        await ws.close()
+
+
+async def _read_frames(ws, tracker: LatencyTracker, stats: LoadStats) -> None:
+    try:
+        async for raw in ws:
+            at = time.perf_counter()
+            stats.frames += 1
+            stats.bytes += len(raw)
+            msg = _decode(raw)
+            event = msg.get("event")
+            if event == "bin_updates":
+                for update in msg.get("updates", ()):
+                    if "timestamp" in update:
+                        tracker.observe(update, at)
+            elif event == "snapshot":
+                stats.snapshots += 1
+    except websockets.ConnectionClosed:
+        pass
+
+
+# ─── Telemetry driver ─────────────────────────────────────────────────────────
+
+async def drive_telemetry(
+    base_url: str,
+    headers: dict,
+    bins: List[Tuple[str, Optional[str]]],
+    rate: float,
+    duration: float,
+    tracker: LatencyTracker,
+    stats: LoadStats,
+    interest: Counter,
+    max_inflight: int = 256,
+    seed: int = 0,
+) -> None:
+    """POST one reading every 1/rate seconds, round-robin over `bins`."""
+    rng = random.Random(seed)
+    inflight = asyncio.Semaphore(max_inflight)
+    tasks = set()
+    limits = httpx.Limits(max_connections=max_inflight, max_keepalive_connections=max_inflight)
+
+    async def post(client: httpx.AsyncClient, bin_id: str, zone: Optional[str]) -> None:
+        async with inflight:
+            ts = datetime.now(timezone.utc)
+            body = {
+                "bin_id": bin_id,
+                "fill_level_percent": rng.randint(0, 100),
+                "battery_percent": rng.randint(20, 100),
+                "timestamp": ts.isoformat(),
+            }
+            started = time.perf_counter()
+            tracker.mark_sent(bin_id, format_timestamp_response(ts), started)
+            stats.readings_sent += 1
+            stats.expected_deliveries += interest[None] + (interest[zone] if zone is not None else 0)
+            try:
+                resp = await client.post("/telemetry/", json=body, headers=headers)
+                if resp.status_code != 202:
+                    stats.ingest_errors[str(resp.status_code)] += 1
+                    return
+            except httpx.HTTPError as e:
+                stats.ingest_errors[type(e).__name__] += 1
+                return
+            stats.ingest_ms.append((time.perf_counter() - started) * 1000)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        interval = 1.0 / rate
+        start = time.perf_counter()
+        i = 0
+        while True:
+            due = start + i * interval
+            if due - start >= duration:
+                break
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bin_id, zone = bins[i % len(bins)]
+            task = asyncio.create_task(post(client, bin_id, zone))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            i += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+# ─── Server setup ─────────────────────────────────────────────────────────────
+
+def seed_database(n_bins: int, n_zones: int) -> dict:
+    """Bins, an admin user, an access token and an API key for a fresh database.
+
+    Must run after DATABASE_URL points at the benchmark database — config and
+    database read it at import time.
+    """
+    from api_key_services import generate_api_key
+    from database import Base, BinDB, SessionLocal, UserDB, engine
+    from routers.auth import _create_jwt
+
+    Base.metadata.create_all(bind=engine)
+    bins = [(f"ws_load_{i:05d}", f"zone_{i % n_zones:02d}" if n_zones else None) for i in range(n_bins)]
+    with SessionLocal() as db:
+        if db.query(UserDB).filter(UserDB.email == BENCH_EMAIL).first() is None:
+            db.add(UserDB(email=BENCH_EMAIL, full_name="WS load test", role="admin",
+                          is_active=True, created_at=datetime.now(timezone.utc)))
+        for bin_id, zone in bins:
+            db.merge(BinDB(id=bin_id, location=f"Load test bin {bin_id}", capacity_liters=240,
+                           fill_level_percent=0, status="ok", zone_id=zone))
+        db.commit()
+        api_key = generate_api_key("ws_load benchmark", db)["key"]
+    return {"token": _create_jwt(BENCH_EMAIL, "admin"), "api_key": api_key, "bins": bins}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_env(args, workdir: str) -> Dict[str, str]:
+    env = {
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/ws_load.db",
+        "ENVIRONMENT": "benchmark",
+        "LOG_LEVEL": "WARNING",
+        # The tool sends every reading with one API key; don't let the per-credential
+        # ingest budgets throttle it
+        "RATE_LIMIT_PER_MINUTE": str(10 ** 9),
+        "RATE_LIMIT_DEVICE_PER_MINUTE": str(10 ** 9),
+        "RATE_LIMIT_GATEWAY_PER_MINUTE": str(10 ** 9),
+        "WS_SEND_QUEUE_SIZE": str(args.send_queue_size),
+        "WS_SLOW_CONSUMER_POLICY": args.slow_consumer_policy,
+        "WS_BATCH_WINDOW_MS": str(args.batch_window_ms),
+    }
+    if args.workers > 1:
+        env["REALTIME_BUS"] = "unix"
+        env["REALTIME_BUS_SOCKET"] = os.path.join(workdir, "bus.sock")
+    return env
+
+
+def spawn_server(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env={**os.environ, **env})
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60.0, proc: Optional[subprocess.Popen] = None) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2.0) as client:
+        while time.perf_counter() < deadline:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} not ready after {timeout:.0f}s")
+
+
+async def fetch_bins(base_url: str, token: str) -> List[Tuple[str, Optional[str]]]:
+    bins, offset = [], 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        while True:
+            resp = await client.get("/bins/", params={"limit": 500, "offset": offset},
+                                    headers={"Authorization": f"Bearer {token}"})
+            resp.raise_for_status()
+            page = resp.json()
+            bins.extend((b["id"], b.get("zone_id")) for b in page)
+            if len(page) < 500:
+                return bins
+            offset += 500
+
+
+# ─── Run ──────────────────────────────────────────────────────────────────────
+
+async def run_load(
+    base_url: str,
+    token: str,
+    headers: dict,
+    bins: List[Tuple[str, Optional[str]]],
+    clients: int,
+    rate: float,
+    duration: float,
+    frame_format: str = "json",
+    zone_filter: bool = False,
+    connect_concurrency: int = 100,
+    drain: float = 2.0,
+    server_pid: Optional[int] = None,
+    seed: int = 0,
+    verbose: bool = True,
+) -> dict:
+    """Connect `clients`, drive telemetry for `duration` s, and return the report body."""
+    ws_url = base_url.replace("http", "ws", 1).rstrip("/") + "/ws"
+    zones = sorted({zone for _, zone in bins if zone is not None})
+    tracker, stats, interest = LatencyTracker(), LoadStats(), Counter()
+    stop, sampling_done = asyncio.Event(), asyncio.Event()
+    sampler = ProcessSampler(server_pid) if server_pid else None
+    sampler_task = asyncio.create_task(sampler.run(sampling_done)) if sampler else None
+
+    gate = asyncio.Semaphore(connect_concurrency)
+
+    connect_started = time.perf_counter()
+    client_tasks = [
+        asyncio.create_task(run_client(
+            ws_url, token, frame_format, zones[i % len(zones)] if zone_filter and zones else None,
+            tracker, stats, interest, stop, gate,
+        ))
+        for i in range(clients)
+    ]
+    while stats.connected + sum(stats.handshake_failures.values()) < clients:
+        await asyncio.sleep(0.05)
+    connect_s = time.perf_counter() - connect_started
+    if verbose:
+        print(f"  {stats.connected}/{clients} clients connected in {connect_s:.1f}s")
+
+    await drive_telemetry(base_url, headers, bins, rate, duration, tracker, stats, interest, seed=seed)
+    await asyncio.sleep(drain)
+
+    server_stats = None
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as http:
+            server_stats = (await http.get("/ws/stats")).json()
+    except (httpx.HTTPError, ValueError):
+        pass
+
+    stop.set()
+    await asyncio.gather(*client_tasks, return_exceptions=True)
+    sampling_done.set()
+    if sampler_task:
+        await sampler_task
+
+    delivered = len(tracker.samples_ms)
+    return {
+        "config": {
+            "clients": clients, "rate_per_s": rate, "duration_s": duration, "bins": len(bins),
+            "zones": len(zones), "format": frame_format, "zone_filter": zone_filter,
+        },
+        "connections": {
+            "connected": stats.connected,
+            "handshake_failures": dict(stats.handshake_failures),
+            "dropped": sum(stats.dropped.values()),
+            "dropped_by_code": dict(stats.dropped),
+            "connect_s": round(connect_s, 3),
+        },
+        "ingest": {
+            "readings_sent": stats.readings_sent,
+            "errors": dict(stats.ingest_errors),
+            "rate_limited": stats.ingest_errors.get("429", 0),
+            "latency_ms": summarize(stats.ingest_ms),
+        },
+        "delivery": {
+            "expected": stats.expected_deliveries,
+            "delivered": delivered,
+            "ratio": round(delivered / stats.expected_deliveries, 4) if stats.expected_deliveries else None,
+            "unmatched_updates": tracker.unmatched,
+            "frames": stats.frames,
+            "bytes": stats.bytes,
+            "snapshots": stats.snapshots,
+            "latency_ms": summarize(tracker.samples_ms),
+        },
+        "server": {
+            **(sampler.report() if sampler else {"sampled": False}),
+            "ws_stats": server_stats,
+        },
+    }
+
+
+def write_report(result: dict, out_dir: Path, name: str = "ws_load") -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{name}.json"
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "websockets": websockets.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        **result,
+    }
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def check_validity(result: dict) -> List[str]:
+    """
+    Reasons the run doesn't measure what it claims to.  Readings the server
+    rejected with 429 were never delivered, so delivery counts and latencies
+    would only describe the accepted ones.
+    """
+    problems = []
+    rate_limited = result["ingest"].get("rate_limited", 0)
+    if rate_limited:
+        problems.append(f"{rate_limited} of {result['ingest']['readings_sent']} readings were rate limited (429)")
+    return problems
+
+
+def check_regressions(
+    result: dict,
+    baseline: dict,
+    max_latency_ratio: float,
+    max_cpu_ratio: float,
+    min_latency_ms: float,
+) -> List[str]:
+    """Return human-readable failures; an empty list means no regression."""
+    failures = []
+    new_lat, old_lat = result["delivery"]["latency_ms"], baseline["delivery"]["latency_ms"]
+    for key in ("p50", "p99"):
+        old, new = old_lat.get(key), new_lat.get(key)
+        if old is None or new is None:
+            continue
+        # Sub-threshold latencies are scheduler noise; only compare meaningful ones
+        if max(old, min_latency_ms) * max_latency_ratio < new:
+            failures.append(f"delivery {key}: {old} → {new} ms")
+
+    if result["connections"]["dropped"] > baseline["connections"]["dropped"]:
+        failures.append(f"dropped connections: {baseline['connections']['dropped']} → "
+                        f"{result['connections']['dropped']}")
+
+    old_cpu, new_cpu = baseline["server"].get("cpu_percent_mean"), result["server"].get("cpu_percent_mean")
+    if old_cpu and new_cpu and new_cpu > old_cpu * max_cpu_ratio:
+        failures.append(f"server CPU: {old_cpu} → {new_cpu} %")
+    return failures
+
+
+async def _run_in_process(args, seeded: dict) -> dict:
+    import uvicorn
+
+    port = args.port or _free_port()
+    server = uvicorn.Server(uvicorn.Config("main:app", host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url)
+        return await run_load(
+            base_url, seeded["token"], {"X-API-Key": seeded["api_key"]}, seeded["bins"],
+            args.clients, args.rate, args.duration, args.format, args.zone_filter,
+            args.connect_concurrency, args.drain, os.getpid(), args.seed, not args.quiet,
+        )
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def _run_spawned(args, seeded: dict, env: Dict[str, str]) -> dict:
+    port = args.port or _free_port()
+    proc = spawn_server(port, args.workers, env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url, proc=proc)
+        return await run_load(
+            base_url, seeded["token"], {"X-API-Key": seeded["api_key"]}, seeded["bins"],
+            args.clients, args.rate, args.duration, args.format, args.zone_filter,
+            args.connect_concurrency, args.drain, proc.pid, args.seed, not args.quiet,
+        )
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def _run_remote(args) -> dict:
+    base_url = args.url.rstrip("/")
+    await wait_until_ready(base_url, timeout=10.0)
+    bins = await fetch_bins(base_url, args.token)
+    if not bins:
+        raise RuntimeError("the server has no bins to send telemetry for")
+    headers = {"X-API-Key": args.api_key} if args.api_key else {"Authorization": f"Bearer {args.token}"}
+    return await run_load(
+        base_url, args.token, headers, bins,
+        args.clients, args.rate, args.duration, args.format, args.zone_filter,
+        args.connect_concurrency, args.drain, args.server_pid, args.seed, not args.quiet,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="WebSocket feed load test")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="telemetry readings per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of telemetry")
+    parser.add_argument("--bins", type=int, default=500)
+    parser.add_argument("--zones", type=int, default=10)
+    parser.add_argument("--format", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--zone-filter", action="store_true", help="each client subscribes to one zone")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for late frames")
+    parser.add_argument("--seed", type=int, default=0)
+    server = parser.add_argument_group("server")
+    server.add_argument("--url", help="existing server, e.g. http://localhost:8000")
+    server.add_argument("--token", help="access JWT for --url")
+    server.add_argument("--api-key", help="X-API-Key for --url (defaults to the JWT)")
+    server.add_argument("--server-pid", type=int, help="PID to sample CPU/memory from with --url")
+    server.add_argument("--in-process", action="store_true")
+    server.add_argument("--workers", type=int, default=1)
+    server.add_argument("--port", type=int)
+    server.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    server.add_argument("--batch-window-ms", type=int, default=250)
+    server.add_argument("--send-queue-size", type=int, default=256)
+    server.add_argument("--slow-consumer-policy", default="drop_oldest",
+                        choices=("drop_oldest", "coalesce", "disconnect"))
+    report = parser.add_argument_group("report")
+    report.add_argument("--out-dir", type=Path, default=DEFAULT_OUT_DIR)
+    report.add_argument("--name", default="ws_load")
+    report.add_argument("--baseline", type=Path, help="earlier JSON report to check for regressions")
+    report.add_argument("--max-latency-ratio", type=float, default=1.5)
+    report.add_argument("--max-cpu-ratio", type=float, default=1.5)
+    report.add_argument("--min-latency-ms", type=float, default=20.0,
+                        help="ignore latency regressions below this baseline value")
+    report.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.url and not args.token:
+        parser.error("--url needs --token")
+    if args.in_process and args.workers > 1:
+        parser.error("--in-process runs a single worker")
+    if args.format == "msgpack" and msgpack is None:
+        parser.error("--format msgpack needs the msgpack package")
+
+    # Read the baseline first — it may be the report this run overwrites
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+
+    if args.url:
+        result = asyncio.run(_run_remote(args))
+    else:
+        with tempfile.TemporaryDirectory(prefix="ws_load") as workdir:
+            env = server_env(args, workdir)
+            os.environ.update(env)   # before config / database are first imported
+            seeded = seed_database(args.bins, args.zones)
+            if args.in_process:
+                result = asyncio.run(_run_in_process(args, seeded))
+            else:
+                result = asyncio.run(_run_spawned(args, seeded, env))
+        result["config"]["server"] = "in-process" if args.in_process else f"spawned x{args.workers}"
+    if args.url:
+        result["config"]["server"] = args.url
+
+    problems = check_validity(result)
+    result["valid"] = not problems
+    path = write_report(result, args.out_dir, args.name)
+    if not args.quiet:
+        lat = result["delivery"]["latency_ms"]
+        print(f"  delivered {result['delivery']['delivered']}/{result['delivery']['expected']}  "
+              f"p50 {lat.get('p50')} ms  p99 {lat.get('p99')} ms  "
+              f"dropped {result['connections']['dropped']}")
+    print(f"Wrote {path}")
+    if problems:
+        print("Run is not valid:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+
+    if baseline is not None:
+        failures = check_regressions(
+            result, baseline,
+            max_latency_ratio=args.max_latency_ratio,
+            max_cpu_ratio=args.max_cpu_ratio,
+            min_latency_ms=args.min_latency_ms,
+        )
+        if failures:
+            print("Regressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,6 +26,22 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
+    # How long an active user may be served from memory by the auth dependencies
+    auth_user_cache_ttl_seconds: int = 30
+    # How often batched API key last_used_at values are written back
+    api_key_usage_flush_seconds: int = 60
+    # General per-IP API limit; load tests raise it to drive ingest
+    rate_limit_per_minute: int = 200
+    # Rate limit counters: memory (per worker) | shared (mmap file, every
+    # worker on the host) | redis (REDIS_URL, every host)
+    rate_limit_backend: str = "memory"
+    rate_limit_max_keys: int = 100_000
+    rate_limit_shared_path: str = "/tmp/smartwaste-ratelimit.bin"
+    # Sensor ingestion (/telemetry with X-API-Key or X-Device-Token) is limited
+    # per credential and per source IP instead of by the general limit, so a
+    # gateway fronting many bins behind one NAT address is not throttled
+    rate_limit_device_per_minute: int = 20
+    rate_limit_gateway_per_minute: int = 3000
 
     # ── Database ──────────────────────────────────────────────────────────────
     database_url: str = ""  # Must be set via DATABASE_URL env var (PostgreSQL)
@@ -49,10 +65,51 @@ class Settings(BaseSettings):
     firebase_credentials_json: Optional[str] = None
     # Your Firebase project ID (used to validate tokens)
     firebase_project_id: Optional[str] = None
+    # Revocation checks for /auth/firebase: always (SDK round trip per new
+    # token) | batch (bulk get_users at most every ..._check_seconds)
+    firebase_revocation_check: str = "always"
+    firebase_revocation_check_seconds: int = 300
+
+    # ── Push notifications ────────────────────────────────────────────────────
+    # fcm | fake (in-memory, for tests and local development)
+    notification_transport: str = "fcm"
+    notification_workers: int = 2
+    # Jobs beyond this are dropped (and counted) rather than blocking requests
+    notification_queue_size: int = 10000
+    notification_max_batch: int = 200
+    # How long a worker waits for more jobs before sending a batch
+    notification_batch_linger_ms: int = 50
+    # Re-sends after transient FCM errors; the wait doubles after each attempt
+    notification_retry_attempts: int = 3
+    notification_retry_backoff_ms: int = 500
+    # Per-recipient window folding bin alerts into one digest (0 = push every alert)
+    notification_digest_window_seconds: int = 120
+    # Alerts at or above this severity skip the digest: critical | warning | none
+    notification_digest_bypass_severity: str = "critical"
+    # Recipient index rebuild interval, a backstop for rows changed outside the API (0 = never)
+    notification_recipient_refresh_seconds: int = 300
+
+    # ── Real-time WebSocket feed ──────────────────────────────────────────────
+    # Outbound messages queued per client before the slow-consumer policy kicks in
+    ws_send_queue_size: int = 256
+    # drop_oldest | coalesce (keep latest per bin, then drop oldest) | disconnect
+    ws_slow_consumer_policy: str = "drop_oldest"
+    # Telemetry is folded into one bin_updates frame per window (0 = send each reading at once)
+    ws_batch_window_ms: int = 250
+    # Batch windows kept in memory so reconnecting clients resume without a snapshot
+    ws_replay_buffer_size: int = 1024
+    # Cross-worker fan-out: memory (single worker) | unix | redis
+    realtime_bus: str = "memory"
+    realtime_bus_socket: str = "/tmp/smartwaste-realtime.sock"
+    realtime_bus_channel: str = "smartwaste:realtime"
+    redis_url: Optional[str] = None
 
     # ── IoT API Keys ──────────────────────────────────────────────────────────
     # Prefix makes keys recognisable and prevents accidental use of other secrets
     api_key_prefix: str = "wsk_live_"
+    # Signed, bin-bound device tokens (verified without the database)
+    device_token_prefix: str = "wsd_live_"
+    device_token_max_days: int = 90
     iot_api_key: Optional[str] = None
 
     class Config:
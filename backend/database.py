@@ -1,7 +1,9 @@
 
+from datetime import datetime, timezone
+
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Float, DateTime,
-    Text, ForeignKey, JSON, Boolean,
+    create_engine, Column, Integer, String, Float, Date, DateTime,
+    Text, ForeignKey, JSON, Boolean, Index, UniqueConstraint,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
@@ -177,13 +179,100 @@ class RouteDB(Base):
     estimated_time_minutes = Column(Float)
     actual_time_minutes = Column(Float, nullable=True)
     bin_ids = Column(JSON)
-    waypoints = Column(JSON)
     created_at = Column(DateTime)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     zone_id = Column(String, nullable=True, index=True)  # Phase 6
 
+    __table_args__ = (
+        Index("ix_routes_created_at_id", "created_at", "id"),   # keyset pagination on /routes/
+    )
+
     crew = relationship("CrewDB", back_populates="routes")
+    waypoint_rows = relationship(
+        "RouteWaypointDB",
+        back_populates="route",
+        order_by="RouteWaypointDB.order",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    @property
+    def waypoints(self) -> list:
+        """Waypoint dicts in visit order — the shape the JSON column used to hold."""
+        return [row.to_dict() for row in self.waypoint_rows]
+
+    @waypoints.setter
+    def waypoints(self, waypoints: list) -> None:
+        self.waypoint_rows = [
+            RouteWaypointDB.from_dict(waypoint, index)
+            for index, waypoint in enumerate(waypoints or [], start=1)
+        ]
+
+
+class RouteWaypointDB(Base):
+    """One stop of a route. Completing a stop is a single-row UPDATE."""
+    __tablename__ = "route_waypoints"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    route_id = Column(String, ForeignKey("routes.id", ondelete="CASCADE"), nullable=False)
+    order = Column(Integer, nullable=False)
+    bin_id = Column(String, nullable=False)
+    location = Column(String, nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    fill_level = Column(Integer, default=0)
+    estimated_collection_time = Column(Integer, default=10)
+    done = Column(Boolean, default=False, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+    extra = Column(JSON, nullable=True)   # planner annotations, e.g. eta_minutes
+
+    route = relationship("RouteDB", back_populates="waypoint_rows")
+
+    __table_args__ = (
+        Index("ix_route_waypoints_route_order", "route_id", "order"),
+        Index("ix_route_waypoints_route_bin", "route_id", "bin_id"),
+    )
+
+    _COLUMNS = ("bin_id", "location", "latitude", "longitude", "fill_level", "order", "estimated_collection_time", "done")
+
+    @classmethod
+    def from_dict(cls, waypoint: dict, index: int) -> "RouteWaypointDB":
+        completed_at = waypoint.get("completed_at")
+        if isinstance(completed_at, str):
+            completed_at = datetime.fromisoformat(completed_at)
+        extra = {key: value for key, value in waypoint.items() if key not in cls._COLUMNS and key != "completed_at"}
+        return cls(
+            order=waypoint.get("order", index),
+            bin_id=waypoint.get("bin_id"),
+            location=waypoint.get("location"),
+            latitude=waypoint.get("latitude"),
+            longitude=waypoint.get("longitude"),
+            fill_level=waypoint.get("fill_level", 0),
+            estimated_collection_time=waypoint.get("estimated_collection_time", 10),
+            done=bool(waypoint.get("done", False)),
+            completed_at=completed_at,
+            extra=extra or None,
+        )
+
+    def to_dict(self) -> dict:
+        waypoint = {
+            "bin_id": self.bin_id,
+            "location": self.location,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "fill_level": self.fill_level,
+            "order": self.order,
+            "estimated_collection_time": self.estimated_collection_time,
+            "done": bool(self.done),
+        }
+        if self.completed_at is not None:
+            completed_at = self.completed_at
+            if completed_at.tzinfo is None:
+                completed_at = completed_at.replace(tzinfo=timezone.utc)
+            waypoint["completed_at"] = completed_at.isoformat()
+        if self.extra:
+            waypoint.update(self.extra)
+        return waypoint
 
 
 class RouteHistoryDB(Base):
@@ -197,6 +286,30 @@ class RouteHistoryDB(Base):
     fuel_efficiency_score = Column(Float, nullable=True)
     completion_date = Column(DateTime)
     notes = Column(Text, nullable=True)
+    zone_id = Column(String, nullable=True)
+
+
+class RouteDailyStatsDB(Base):
+    """
+    Per-day, per-crew, per-zone totals of completed routes. Maintained by
+    _record_route_history so analytics never scan the full history table.
+    Routes without a crew or zone are keyed by "" rather than NULL so the
+    unique key (and the upsert on it) covers them too.
+    """
+    __tablename__ = "route_daily_stats"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    crew_id = Column(String, nullable=False, default="", server_default="")
+    zone_id = Column(String, nullable=False, default="", server_default="")
+    routes_completed = Column(Integer, default=0, nullable=False)
+    bins_collected = Column(Integer, default=0, nullable=False)
+    total_distance_km = Column(Float, default=0.0, nullable=False)
+    total_time_minutes = Column(Float, default=0.0, nullable=False)
+    efficiency_sum = Column(Float, default=0.0, nullable=False)   # sum of fuel_efficiency_score
+
+    __table_args__ = (
+        UniqueConstraint("day", "crew_id", "zone_id", name="uq_route_daily_stats_day_crew_zone"),
+    )
 
 
 # ─── IoT API Keys ─────────────────────────────────────────────────────────────
@@ -4,36 +4,80 @@ firebase_service.py — updated for sgm-project-fc254.
 Key change: verify_id_token() now passes check_revoked=True and the
 project-specific audience so tokens from OTHER Firebase projects are
 rejected even if they're validly signed.
+
+Verification cache:
+  A verified ID token is remembered by its SHA-256 until its `exp`, so a
+  client retrying /auth/firebase (or several tabs logging in at once) costs
+  one SDK call.  How revocation is checked is set by
+  settings.firebase_revocation_check:
+
+    always — every cache miss is verified with check_revoked=True (a round
+             trip to Firebase); cached tokens are re-verified after
+             firebase_revocation_check_seconds.
+    batch  — tokens are verified locally (certificate, expiry, audience) and
+             the users behind cached tokens are checked for revoked or
+             disabled accounts in bulk, one get_users call per 100 users,
+             every firebase_revocation_check_seconds on a background thread.
+             A revoked token is honoured for at most that long.
+
+Initialisation:
+  An unconfigured or failing SDK is retried with backoff (30 s, doubling up
+  to 10 minutes) instead of on — and with a warning for — every call.
+
+Tests swap in a stand-in for firebase_admin.auth with verifier.use_auth().
 """
 
+import hashlib
 import json
 import logging
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from config import get_settings
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 _firebase_app = None
 
+INIT_RETRY_SECONDS = 30.0
+INIT_RETRY_MAX_SECONDS = 600.0
+_init_failures = 0
+_init_retry_at = 0.0
+
+REVOCATION_CHECKS = ("always", "batch")
+GET_USERS_LIMIT = 100   # identifiers per auth.get_users call
+
+
+def _init_failed(reason: str, level: int = logging.WARNING) -> None:
+    global _init_failures, _init_retry_at
+    delay = min(INIT_RETRY_SECONDS * 2 ** _init_failures, INIT_RETRY_MAX_SECONDS)
+    _init_failures += 1
+    _init_retry_at = time.monotonic() + delay
+    logger.log(level, f"{reason} — retrying in {delay:.0f}s")
+
 
 def _init_firebase():
-    global _firebase_app
+    global _firebase_app, _init_failures
 
     # Return cached app if already successfully initialized.
     if _firebase_app is not None:
         return _firebase_app
 
-    # Otherwise try to initialize (retries on every call until it succeeds,
-    # so a transient startup failure — e.g. .env loaded after first request —
-    # doesn't permanently disable Firebase for the lifetime of the process).
+    # Otherwise try to initialize — not on every call, but with backoff, so a
+    # transient startup failure (e.g. .env loaded after first request) doesn't
+    # permanently disable Firebase and an unconfigured server stays quiet.
+    if time.monotonic() < _init_retry_at:
+        return None
+
     try:
         import firebase_admin
         from firebase_admin import credentials
-        from config import get_settings
-
-        settings = get_settings()
 
         if not settings.firebase_configured():
-            logger.warning(
+            _init_failed(
                 "Firebase not configured. Set FIREBASE_SERVICE_ACCOUNT_PATH "
                 "in backend/.env to enable Firebase auth."
             )
@@ -53,6 +97,7 @@ def _init_firebase():
         else:
             _firebase_app = firebase_admin.get_app()
 
+        _init_failures = 0
         logger.info(
             f"Firebase Admin SDK initialised for project: "
             f"{settings.firebase_project_id or 'sgm-project-fc254'}"
@@ -60,16 +105,219 @@ def _init_firebase():
         return _firebase_app
 
     except ImportError:
-        logger.error(
+        _init_failed(
             "firebase-admin not installed. "
-            "Run: pip install firebase-admin==6.5.0"
+            "Run: pip install firebase-admin==6.5.0",
+            logging.ERROR,
         )
         return None
     except Exception as e:
-        logger.error(f"Firebase initialisation failed: {e}")
+        _init_failed(f"Firebase initialisation failed: {e}", logging.ERROR)
         return None
 
 
+# ─── Verification cache ───────────────────────────────────────────────────────
+
+class TokenRevoked(Exception):
+    """The token's user was revoked or disabled (batch revocation check)."""
+
+
+@dataclass
+class _Verified:
+    claims: dict
+    expires_at: float       # the token's exp
+    checked_at: float       # last verification with the SDK
+
+
+class TokenVerifier:
+    """
+    Verified ID tokens by SHA-256, each kept until its `exp`.  In batch mode
+    the revocation sweep never runs on a request: a started verifier sweeps
+    every `recheck_seconds` on its own thread, and a request that finds the
+    sweep overdue only hands it to a background thread.
+    """
+
+    def __init__(
+        self,
+        auth_module=None,
+        revocation_check: str = "always",
+        recheck_seconds: float = 300,
+        max_entries: int = 10000,
+        clock=time.time,
+    ):
+        if revocation_check not in REVOCATION_CHECKS:
+            raise ValueError(f"revocation_check must be one of {REVOCATION_CHECKS}")
+        self._auth = auth_module
+        self._injected = auth_module is not None
+        self.revocation_check = revocation_check
+        self.recheck = recheck_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: Dict[str, _Verified] = {}
+        # batch mode: uid → tokens issued before this (epoch s) are revoked
+        self._valid_after: Dict[str, float] = {}
+        self._disabled: Set[str] = set()
+        self._next_sweep = 0.0
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spawn = lambda job: threading.Thread(target=job, name="firebase-sweep", daemon=True).start()
+
+        self.hits = 0
+        self.misses = 0
+        self.sdk_calls = 0
+        self.revocation_batches = 0
+
+    @property
+    def auth(self):
+        if self._auth is None:
+            from firebase_admin import auth
+            self._auth = auth
+        return self._auth
+
+    def use_auth(self, auth_module) -> None:
+        """Swap the SDK (e.g. for a test stand-in) and forget everything cached."""
+        self._auth = auth_module
+        self._injected = True
+        self.clear()
+
+    def available(self) -> bool:
+        return self._injected or _init_firebase() is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._valid_after.clear()
+            self._disabled.clear()
+            self._next_sweep = 0.0
+
+    def verify(self, id_token: str) -> dict:
+        """Decoded claims of a valid token; raises like auth.verify_id_token otherwise."""
+        key = hashlib.sha256(id_token.encode()).hexdigest()
+        now = self._clock()
+        batch = self.revocation_check == "batch"
+        if batch and now >= self._next_sweep:
+            with self._lock:
+                due = now >= self._next_sweep
+                if due:
+                    self._next_sweep = now + self.recheck
+            if due:
+                self._spawn(self._sweep_quietly)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            fresh = entry is not None and now < entry.expires_at and (batch or now < entry.checked_at + self.recheck)
+            if fresh:
+                self.hits += 1
+        if fresh:
+            self._check_batch_revocation(entry.claims)
+            return dict(entry.claims)
+
+        with self._lock:
+            self.misses += 1
+            self.sdk_calls += 1
+        claims = self.auth.verify_id_token(id_token, check_revoked=not batch)
+        if batch:
+            self._check_batch_revocation(claims)
+        self._remember(key, claims, now)
+        return dict(claims)
+
+    def _check_batch_revocation(self, claims: dict) -> None:
+        uid = claims.get("uid")
+        if uid in self._disabled or claims.get("iat", 0) < self._valid_after.get(uid, 0):
+            raise TokenRevoked(f"Token for {uid} has been revoked")
+
+    def _remember(self, key: str, claims: dict, now: float) -> None:
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                self._cache = {k: e for k, e in self._cache.items() if e.expires_at > now}
+                while len(self._cache) >= self.max_entries:      # drop the oldest
+                    self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = _Verified(dict(claims), float(claims.get("exp", now)), now)
+
+    def sweep_revocations(self) -> int:
+        """
+        Batch mode: look up the users behind cached tokens (and those already
+        known to be revoked) in get_users batches; drop revoked tokens.
+        Returns the number of cache entries dropped.
+        """
+        now = self._clock()
+        with self._lock:
+            self._next_sweep = now + self.recheck
+            uids = sorted({e.claims.get("uid") for e in self._cache.values()} | set(self._valid_after) | self._disabled)
+        uids = [uid for uid in uids if uid]
+
+        valid_after: Dict[str, float] = {}
+        disabled: Set[str] = set()
+        for i in range(0, len(uids), GET_USERS_LIMIT):
+            chunk = uids[i: i + GET_USERS_LIMIT]
+            result = self.auth.get_users([self.auth.UidIdentifier(uid) for uid in chunk])
+            with self._lock:
+                self.revocation_batches += 1
+            found = {user.uid: user for user in result.users}
+            for uid in chunk:
+                user = found.get(uid)
+                if user is None or user.disabled:
+                    disabled.add(uid)
+                elif user.tokens_valid_after_timestamp:
+                    valid_after[uid] = user.tokens_valid_after_timestamp / 1000
+
+        with self._lock:
+            self._valid_after, self._disabled = valid_after, disabled
+            before = len(self._cache)
+            self._cache = {
+                k: e for k, e in self._cache.items()
+                if e.claims.get("uid") not in disabled
+                and e.claims.get("iat", 0) >= valid_after.get(e.claims.get("uid"), 0)
+            }
+            dropped = before - len(self._cache)
+        if dropped:
+            logger.info(f"[auth] Dropped {dropped} cached Firebase tokens of revoked or disabled users")
+        return dropped
+
+    def _sweep_quietly(self) -> None:
+        try:
+            self.sweep_revocations()
+        except Exception as e:
+            logger.warning(f"[auth] Firebase revocation sweep failed: {e}")
+
+    def start(self) -> None:
+        """Batch mode: sweep every recheck_seconds on a daemon thread."""
+        if self.revocation_check != "batch" or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="firebase-revocations", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.recheck):
+            if self._cache or self._valid_after or self._disabled:
+                self._sweep_quietly()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revocation_check": self.revocation_check,
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "sdk_calls": self.sdk_calls,
+                "revocation_batches": self.revocation_batches,
+            }
+
+
+verifier = TokenVerifier(
+    revocation_check=settings.firebase_revocation_check,
+    recheck_seconds=settings.firebase_revocation_check_seconds,
+)
+
+
 def verify_firebase_token(id_token: str) -> Optional[dict]:
     """
     Verify a Firebase ID token from the frontend.
@@ -78,25 +326,15 @@ def verify_firebase_token(id_token: str) -> Optional[dict]:
       - Token signature (using your service account)
       - Token expiry
       - Token was issued for sgm-project-fc254 specifically
-      - Token has not been revoked (check_revoked=True)
+      - Token has not been revoked (per settings.firebase_revocation_check)
 
     Returns decoded token dict on success, None on any failure.
     """
-    app = _init_firebase()
-    if app is None:
+    if not verifier.available():
         return None
 
     try:
-        from firebase_admin import auth
-        from config import get_settings
-
-        settings = get_settings()
-
-        decoded = auth.verify_id_token(
-            id_token,
-            check_revoked=True,          # rejects tokens revoked via Firebase console
-            # app= not needed since we only have one initialised app
-        )
+        decoded = verifier.verify(id_token)
 
         # Extra guard: confirm the token is for YOUR project
         # (protects against token substitution attacks)
@@ -116,4 +354,4 @@ def verify_firebase_token(id_token: str) -> Optional[dict]:
 
 
 def is_firebase_available() -> bool:
-    return _init_firebase() is not None
\ No newline at end of file
+    return verifier.available()
@@ -1,4 +1,5 @@
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -8,6 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base, SessionLocal
 from config import get_settings
 from security import add_security_to_app
+from api_key_services import rate_limit_identity
+from services.rate_limit_store import create_rate_limit_store
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -45,6 +48,32 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"[startup] Prediction service warm-up failed (non-fatal): {e}")
 
+        # ── WebSocket bin state cache (zones + live state) ─────────────────────
+        try:
+            from routers.websocket_router import manager as ws_manager
+            n = ws_manager.load_bin_state(db)
+            logger.info(f"[startup] WebSocket bin state cache loaded for {n} bins")
+        except Exception as e:
+            logger.warning(f"[startup] WebSocket bin state load failed (non-fatal): {e}")
+
+        # ── Real-time bus (cross-worker fan-out) ───────────────────────────────
+        try:
+            from routers.websocket_router import manager as ws_manager
+            from services.realtime_bus import create_bus
+            # Started even for "memory": publishes from threadpool endpoints
+            # are then handed to the event loop instead of running there
+            await ws_manager.use_bus(create_bus(settings))
+        except Exception as e:
+            logger.warning(f"[startup] Real-time bus failed, staying single-worker (non-fatal): {e}")
+
+        # ── Push recipient index (admins, crew users, tokens, preferences) ──────
+        try:
+            from services.recipients import recipients
+            n = recipients.load(db)
+            logger.info(f"[startup] Push recipient index built for {n} users")
+        except Exception as e:
+            logger.warning(f"[startup] Push recipient index load failed, building on first use (non-fatal): {e}")
+
         # ── Token blacklist pruning ────────────────────────────────────────────
         try:
             from datetime import datetime, timezone
@@ -60,11 +89,75 @@ async def lifespan(app: FastAPI):
                 logger.info(f"[startup] Pruned {deleted} expired token blacklist entries")
         except Exception as e:
             logger.warning(f"[startup] Blacklist pruning failed (non-fatal): {e}")
+
+        # ── In-memory revocation set (auth checks skip the blacklist table) ─────
+        try:
+            from auth_cache import revoked_tokens
+            n = revoked_tokens.load(db)
+            logger.info(f"[startup] Loaded {n} revoked tokens into memory")
+        except Exception as e:
+            logger.warning(f"[startup] Revocation set load failed, using the table (non-fatal): {e}")
+
+        # ── IoT API keys (device auth from memory) ──────────────────────────────
+        try:
+            from auth_cache import api_keys, key_usage
+            n = api_keys.load(db)
+            key_usage.start()
+            logger.info(f"[startup] Cached {n} active API keys")
+        except Exception as e:
+            logger.warning(f"[startup] API key cache load failed, filling on first use (non-fatal): {e}")
     finally:
         db.close()
 
+    # ── Firebase batch revocation sweeps (own thread) ───────────────────────────
+    try:
+        from firebase_service import verifier
+        verifier.start()
+    except Exception as e:
+        logger.warning(f"[startup] Firebase revocation sweeper failed to start (non-fatal): {e}")
+
+    # ── Push notification dispatcher (own threads + DB sessions) ───────────────
+    try:
+        from services.notifications import dispatcher
+        dispatcher.start()
+        logger.info(f"[startup] Notification dispatcher started ({dispatcher.workers} workers, "
+                    f"{dispatcher.transport.name} transport)")
+    except Exception as e:
+        logger.warning(f"[startup] Notification dispatcher failed to start (non-fatal): {e}")
+
     yield  # application runs here
 
+    try:
+        from routers.websocket_router import manager as ws_manager
+        await ws_manager.bus.stop()
+    except Exception as e:
+        logger.warning(f"[shutdown] Real-time bus stop failed: {e}")
+
+    try:
+        from firebase_service import verifier
+        verifier.stop()
+    except Exception as e:
+        logger.warning(f"[shutdown] Firebase revocation sweeper stop failed: {e}")
+
+    try:
+        await rate_limit_store.close()
+    except Exception as e:
+        logger.warning(f"[shutdown] Rate limit store close failed: {e}")
+
+    try:
+        from auth_cache import key_usage
+        await asyncio.to_thread(key_usage.stop)     # writes the last batch of last_used_at
+    except Exception as e:
+        logger.warning(f"[shutdown] API key usage flush failed: {e}")
+
+    try:
+        from services.notifications import alert_digest, dispatcher
+        alert_digest.stop()     # pending digests are queued, then sent by the drain below
+        # Drains queued notifications; off the loop so shutdown stays responsive
+        await asyncio.to_thread(dispatcher.stop)
+    except Exception as e:
+        logger.warning(f"[shutdown] Notification dispatcher stop failed: {e}")
+
     logger.info("[shutdown] Smart Waste API shutting down gracefully")
 
 
@@ -82,11 +175,16 @@ app = FastAPI(
 )
 
 # ── Security middleware ───────────────────────────────────────────────────────
+rate_limit_store = create_rate_limit_store(settings)
 add_security_to_app(
     app,
     enable_rate_limiting=not (settings.environment.lower() == "test"),
     enable_auth_rate_limiting=not (settings.environment.lower() == "test"),
-    requests_per_minute=200,
+    requests_per_minute=settings.rate_limit_per_minute,
+    store=rate_limit_store,
+    identify_device=rate_limit_identity,
+    device_requests_per_minute=settings.rate_limit_device_per_minute,
+    gateway_requests_per_minute=settings.rate_limit_gateway_per_minute,
 )
 
 # ── CORS ─────────────────────────────────────────────────────────────────────
@@ -120,15 +218,25 @@ app.include_router(driver.router,            prefix="/driver",      tags=["drive
 @app.get("/health", tags=["system"])
 def health_check():
     from routers.websocket_router import manager
+    from services.notifications import dispatcher
     return {
         "status": "ok",
         "service": "smart-waste-backend",
         "environment": settings.environment,
         "version": settings.api_version,
         "ws_connections": manager.connection_count,
+        "notification_queue_depth": dispatcher.queue_depth,
     }
 
 
+@app.get("/health/notifications", tags=["system"])
+def notification_stats():
+    """Push dispatcher queue depth, throughput and send latency, plus the recipient index."""
+    from services.notifications import alert_digest, dispatcher
+    from services.recipients import recipients
+    return {**dispatcher.stats(), "recipients": recipients.stats(), "digest": alert_digest.stats()}
+
+
 @app.get("/", tags=["system"])
 def root():
     return {
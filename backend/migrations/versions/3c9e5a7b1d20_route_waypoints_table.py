@@ -0,0 +1,137 @@
+"""route_waypoints table
+
+Moves route stops out of the routes.waypoints JSON column into one row per
+stop, backfilling existing routes, then drops the JSON column.
+
+Revision ID: 3c9e5a7b1d20
+Revises: 07da6f3101a5
+Create Date: 2026-10-18 21:40:12.118204
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e5a7b1d20'
+down_revision: Union[str, Sequence[str], None] = '07da6f3101a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_WAYPOINT_COLUMNS = ('bin_id', 'location', 'latitude', 'longitude', 'fill_level', 'order',
+                     'estimated_collection_time', 'done', 'completed_at')
+
+routes_table = sa.table(
+    'routes',
+    sa.column('id', sa.String),
+    sa.column('waypoints', sa.JSON),
+)
+
+waypoints_table = sa.table(
+    'route_waypoints',
+    sa.column('route_id', sa.String),
+    sa.column('order', sa.Integer),
+    sa.column('bin_id', sa.String),
+    sa.column('location', sa.String),
+    sa.column('latitude', sa.Float),
+    sa.column('longitude', sa.Float),
+    sa.column('fill_level', sa.Integer),
+    sa.column('estimated_collection_time', sa.Integer),
+    sa.column('done', sa.Boolean),
+    sa.column('completed_at', sa.DateTime),
+    sa.column('extra', sa.JSON),
+)
+
+
+def _parse_completed_at(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('route_waypoints',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('route_id', sa.String(), nullable=False),
+    sa.Column('order', sa.Integer(), nullable=False),
+    sa.Column('bin_id', sa.String(), nullable=False),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('fill_level', sa.Integer(), nullable=True),
+    sa.Column('estimated_collection_time', sa.Integer(), nullable=True),
+    sa.Column('done', sa.Boolean(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('extra', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_route_waypoints_route_order', 'route_waypoints', ['route_id', 'order'], unique=False)
+    op.create_index('ix_route_waypoints_route_bin', 'route_waypoints', ['route_id', 'bin_id'], unique=False)
+
+    # Backfill one row per JSON waypoint; missing order falls back to list position
+    bind = op.get_bind()
+    rows = []
+    for route_id, waypoints in bind.execute(sa.select(routes_table.c.id, routes_table.c.waypoints)):
+        for index, waypoint in enumerate(waypoints or [], start=1):
+            if not waypoint.get('bin_id'):
+                continue
+            extra = {key: value for key, value in waypoint.items() if key not in _WAYPOINT_COLUMNS}
+            rows.append({
+                'route_id': route_id,
+                'order': waypoint.get('order', index),
+                'bin_id': waypoint['bin_id'],
+                'location': waypoint.get('location'),
+                'latitude': waypoint.get('latitude'),
+                'longitude': waypoint.get('longitude'),
+                'fill_level': waypoint.get('fill_level', 0),
+                'estimated_collection_time': waypoint.get('estimated_collection_time', 10),
+                'done': bool(waypoint.get('done', False)),
+                'completed_at': _parse_completed_at(waypoint.get('completed_at')),
+                'extra': extra or None,
+            })
+    if rows:
+        op.bulk_insert(waypoints_table, rows)
+
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.drop_column('waypoints')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('routes') as batch_op:
+        batch_op.add_column(sa.Column('waypoints', sa.JSON(), nullable=True))
+
+    bind = op.get_bind()
+    by_route = {}
+    for row in bind.execute(sa.select(waypoints_table).order_by(waypoints_table.c.route_id, waypoints_table.c.order)):
+        waypoint = {
+            'bin_id': row.bin_id,
+            'location': row.location,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'fill_level': row.fill_level,
+            'order': row.order,
+            'estimated_collection_time': row.estimated_collection_time,
+            'done': bool(row.done),
+        }
+        if row.completed_at is not None:
+            waypoint['completed_at'] = row.completed_at.isoformat()
+        waypoint.update(row.extra or {})
+        by_route.setdefault(row.route_id, []).append(waypoint)
+
+    for route_id, waypoints in by_route.items():
+        bind.execute(
+            routes_table.update().where(routes_table.c.id == route_id).values(waypoints=waypoints)
+        )
+
+    op.drop_index('ix_route_waypoints_route_bin', table_name='route_waypoints')
+    op.drop_index('ix_route_waypoints_route_order', table_name='route_waypoints')
+    op.drop_table('route_waypoints')
@@ -0,0 +1,110 @@
+"""route_daily_stats rollup
+
+Adds the per-day/per-crew/per-zone route rollup used by route analytics,
+backfilled from route_history, plus route_history.zone_id and a
+(created_at, id) index for keyset pagination of /routes/.
+
+Revision ID: 8f2a4d6c0e13
+Revises: 3c9e5a7b1d20
+Create Date: 2026-10-18 22:05:47.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2a4d6c0e13'
+down_revision: Union[str, Sequence[str], None] = '3c9e5a7b1d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+routes_table = sa.table(
+    'routes',
+    sa.column('id', sa.String),
+    sa.column('zone_id', sa.String),
+)
+
+history_table = sa.table(
+    'route_history',
+    sa.column('route_id', sa.String),
+    sa.column('crew_id', sa.String),
+    sa.column('zone_id', sa.String),
+    sa.column('bins_collected', sa.Integer),
+    sa.column('total_distance_km', sa.Float),
+    sa.column('total_time_minutes', sa.Float),
+    sa.column('fuel_efficiency_score', sa.Float),
+    sa.column('completion_date', sa.DateTime),
+)
+
+stats_table = sa.table(
+    'route_daily_stats',
+    sa.column('day', sa.Date),
+    sa.column('crew_id', sa.String),
+    sa.column('zone_id', sa.String),
+    sa.column('routes_completed', sa.Integer),
+    sa.column('bins_collected', sa.Integer),
+    sa.column('total_distance_km', sa.Float),
+    sa.column('total_time_minutes', sa.Float),
+    sa.column('efficiency_sum', sa.Float),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('route_history', sa.Column('zone_id', sa.String(), nullable=True))
+    op.create_index('ix_routes_created_at_id', 'routes', ['created_at', 'id'], unique=False)
+    op.create_table('route_daily_stats',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('crew_id', sa.String(), server_default='', nullable=False),
+    sa.Column('zone_id', sa.String(), server_default='', nullable=False),
+    sa.Column('routes_completed', sa.Integer(), nullable=False),
+    sa.Column('bins_collected', sa.Integer(), nullable=False),
+    sa.Column('total_distance_km', sa.Float(), nullable=False),
+    sa.Column('total_time_minutes', sa.Float(), nullable=False),
+    sa.Column('efficiency_sum', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'crew_id', 'zone_id', name='uq_route_daily_stats_day_crew_zone')
+    )
+
+    # History rows inherit the zone of their route
+    op.execute(
+        history_table.update().values(
+            zone_id=sa.select(routes_table.c.zone_id)
+            .where(routes_table.c.id == history_table.c.route_id)
+            .scalar_subquery()
+        )
+    )
+
+    day = sa.func.date(history_table.c.completion_date)
+    crew_id = sa.func.coalesce(history_table.c.crew_id, '')
+    zone_id = sa.func.coalesce(history_table.c.zone_id, '')
+    op.execute(
+        stats_table.insert().from_select(
+            ['day', 'crew_id', 'zone_id', 'routes_completed', 'bins_collected',
+             'total_distance_km', 'total_time_minutes', 'efficiency_sum'],
+            sa.select(
+                day,
+                crew_id,
+                zone_id,
+                sa.func.count(),
+                sa.func.coalesce(sa.func.sum(history_table.c.bins_collected), 0),
+                sa.func.coalesce(sa.func.sum(history_table.c.total_distance_km), 0.0),
+                sa.func.coalesce(sa.func.sum(history_table.c.total_time_minutes), 0.0),
+                sa.func.coalesce(sa.func.sum(history_table.c.fuel_efficiency_score), 0.0),
+            )
+            .where(history_table.c.completion_date.isnot(None))
+            .group_by(day, crew_id, zone_id)
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('route_daily_stats')
+    op.drop_index('ix_routes_created_at_id', table_name='routes')
+    with op.batch_alter_table('route_history') as batch_op:
+        batch_op.drop_column('zone_id')
@@ -211,7 +211,23 @@ class Route(BaseModel):
     actual_time_minutes: Optional[float] = None
     bin_ids: List[str]
     waypoints: List[Dict]
-    created_at: datetime
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
+class RouteSummary(BaseModel):
+    """Route list projection without waypoints."""
+    id: str
+    crew_id: Optional[str] = None
+    zone_id: Optional[str] = None
+    status: str
+    algorithm_used: str
+    total_distance_km: float
+    estimated_time_minutes: float
+    actual_time_minutes: Optional[float] = None
+    bin_count: int
+    created_at: Optional[datetime] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
@@ -249,6 +265,33 @@ class RouteComparison(BaseModel):
     recommended: str   # algorithm name with best efficiency score
 
 
+class PlanCollectionRequest(BaseModel):
+    crew_ids: List[str] = Field(min_length=1, description="Crews to plan a shift route for")
+    shift_minutes: float = Field(default=480, gt=0, description="Per-crew time budget incl. return to depot")
+    truck_capacity_liters: float = Field(default=8000, gt=0, description="Per-crew truck volume")
+    zone_id: Optional[str] = Field(default=None, description="Only consider bins in this zone")
+    bin_ids: Optional[List[str]] = Field(default=None, description="Restrict candidates to these bins")
+    min_fill_level: int = Field(default=0, ge=0, le=100)
+    time_limit_ms: int = Field(default=500, ge=10, le=5000, description="Solver time limit")
+    save_routes: bool = Field(default=False, description="Persist one planned route per crew")
+
+
+class PlannedCrewRoute(RouteOptimizationResult):
+    crew_id: str
+    load_liters: float
+    urgency_collected: float
+    late_stops: int   # stops reached after their predicted overflow time
+
+
+class CollectionPlanResult(BaseModel):
+    routes: List[PlannedCrewRoute]
+    candidates_considered: int
+    bins_selected: int
+    urgency_available: float
+    urgency_collected: float
+    solve_time_ms: float
+
+
 class UpdateRouteStatusRequest(BaseModel):
     status: str   # planned | active | paused | completed | cancelled
     actual_time_minutes: Optional[float] = None
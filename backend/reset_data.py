@@ -32,9 +32,11 @@ print("Connecting to database...")
 
 with engine.begin() as conn:
     # Delete in dependency order so foreign-key constraints are satisfied.
-    # route_history → routes; tasks reference bins (SET NULL on delete, safe either way)
+    # route_history / route_waypoints → routes; tasks reference bins (SET NULL on delete, safe either way)
     tables = [
+        "route_daily_stats",
         "route_history",
+        "route_waypoints",
         "routes",
         "telemetry",
         "tasks",
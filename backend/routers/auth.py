@@ -6,16 +6,18 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from api_key_services import generate_api_key, revoke_api_key, verify_api_key
+from api_key_services import generate_api_key, mint_device_token, revoke_api_key, verify_api_key, verify_device_token
+from auth_cache import active_users, key_usage, revoked_tokens, share_revocation
 from config import get_settings
-from database import APIKeyDB, TokenBlacklistDB, UserDB, UserSettingsDB, get_db
+from database import APIKeyDB, BinDB, TokenBlacklistDB, UserDB, UserSettingsDB, get_db
 from firebase_service import is_firebase_available, verify_firebase_token
 from models import TokenRefreshRequest, TokenResponse, UserLogin, UserRegister, UserResponse, UserRole
 from security import PasswordPolicy
+from services.recipients import recipients
 
 settings = get_settings()
 SECRET_KEY = settings.secret_key
@@ -26,6 +28,7 @@ REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 http_bearer = HTTPBearer(auto_error=False)
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+device_token_header = APIKeyHeader(name="X-Device-Token", auto_error=False)
 
 router = APIRouter()
 
@@ -36,6 +39,9 @@ class FirebaseLoginRequest(BaseModel):
 
 class APIKeyCreateRequest(BaseModel):
     label: str
+    # Given bins, a signed device token bound to them is minted instead of a key
+    bin_ids: Optional[List[str]] = Field(default=None, min_length=1)
+    expires_in_days: Optional[int] = Field(default=None, ge=1)
 
 
 class APIKeyResponse(BaseModel):
@@ -108,6 +114,7 @@ def _create_jwt(email: str, role: str, token_type: str = "access") -> str:
 
 
 def _is_token_revoked(token_jti: str, db: Session) -> bool:
+    """Authoritative table check — kept for refresh rotation, where a token must be single-use."""
     return (
         db.query(TokenBlacklistDB)
         .filter(TokenBlacklistDB.token_jti == token_jti)
@@ -130,6 +137,7 @@ def _revoke_token(token_jti: str, email: str, expires_at: datetime, db: Session)
         )
     )
     db.commit()
+    share_revocation(token_jti, expires_at)
 
 
 def _user_to_response(user: UserDB) -> UserResponse:
@@ -161,9 +169,19 @@ def _get_or_create_settings(user_id: int, db: Session) -> UserSettingsDB:
     db.add(settings_row)
     db.commit()
     db.refresh(settings_row)
+    _share_preferences(settings_row)
     return settings_row
 
 
+def _share_preferences(settings_row: UserSettingsDB) -> None:
+    recipients.put_preferences(
+        settings_row.user_id,
+        critical_bins=settings_row.critical_bins,
+        route_updates=settings_row.route_updates,
+        push_enabled=settings_row.push_enabled,
+    )
+
+
 def _settings_to_response(user: UserDB, settings_row: UserSettingsDB) -> UserSettingsResponse:
     return UserSettingsResponse(
         full_name=user.full_name,
@@ -219,6 +237,7 @@ def _upsert_firebase_user(decoded_token: dict, db: Session) -> UserDB:
             )
             if not user:
                 raise HTTPException(status_code=500, detail="Failed to create user account")
+        recipients.put_user(user.id, user.email, user.role, user.is_active)
     else:
         # Issue 5 fix: keep full_name in sync with the Firebase profile so
         # display name updates made in Google/Firebase are reflected in the DB.
@@ -250,7 +269,7 @@ def get_current_user(
 
         if not email:
             raise ValueError("No subject in token")
-        if jti and _is_token_revoked(jti, db):
+        if jti and revoked_tokens.is_revoked(jti, db):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has been revoked",
@@ -265,8 +284,8 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.query(UserDB).filter(UserDB.email == email).first()
-    if not user or not user.is_active:
+    user = active_users.load_into(email, db)
+    if user is None:
         raise HTTPException(status_code=401, detail="User not found or disabled")
     return user
 
@@ -279,9 +298,20 @@ def require_admin(current_user: UserDB = Depends(get_current_user)) -> UserDB:
 
 def get_device_or_user(
     api_key: Optional[str] = Depends(api_key_header),
+    device_token: Optional[str] = Depends(device_token_header),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer),
     db: Session = Depends(get_db),
 ) -> dict:
+    """
+    Identify the caller.  Devices using a signed token also get "bin_ids",
+    the only bins they may report for; callers without it are unrestricted.
+    """
+    if device_token:
+        claims = verify_device_token(device_token)
+        if claims:
+            return {"type": "device", "identity": claims, "label": claims.device, "bin_ids": claims.bin_ids}
+        raise HTTPException(status_code=401, detail="Invalid or expired device token")
+
     if api_key:
         record = verify_api_key(api_key, db)
         if record:
@@ -297,18 +327,18 @@ def get_device_or_user(
 
             if token_type != "access":
                 raise ValueError("Not an access token")
-            if jti and _is_token_revoked(jti, db):
+            if jti and revoked_tokens.is_revoked(jti, db):
                 raise HTTPException(status_code=401, detail="Token has been revoked")
 
-            user = db.query(UserDB).filter(UserDB.email == email).first()
-            if user and user.is_active:
+            user = active_users.load_into(email, db) if email else None
+            if user is not None:
                 return {"type": "user", "identity": user, "label": user.email}
         except (JWTError, ValueError):
             pass
 
     raise HTTPException(
         status_code=401,
-        detail="Provide either X-API-Key header or Authorization: Bearer <token>",
+        detail="Provide an X-API-Key or X-Device-Token header, or Authorization: Bearer <token>",
     )
 
 
@@ -332,6 +362,7 @@ def signup(user_data: UserRegister, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    recipients.put_user(user.id, user.email, user.role, user.is_active)
     _get_or_create_settings(user.id, db)
 
     return TokenResponse(
@@ -416,6 +447,7 @@ def update_settings_for_user(
     db.commit()
     db.refresh(current_user)
     db.refresh(settings_row)
+    _share_preferences(settings_row)
     return _settings_to_response(current_user, settings_row)
 
 
@@ -506,6 +538,13 @@ def create_api_key(
     db: Session = Depends(get_db),
     _admin: UserDB = Depends(require_admin),
 ):
+    if body.bin_ids:
+        # A token bound to a mistyped bin could never report; catch it before signing
+        found = {bin_id for (bin_id,) in db.query(BinDB.id).filter(BinDB.id.in_(body.bin_ids))}
+        missing = sorted(set(body.bin_ids) - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Bins not found: {missing}")
+        return mint_device_token(body.label, body.bin_ids, db, body.expires_in_days)
     return generate_api_key(body.label, db)
 
 
@@ -514,6 +553,7 @@ def list_api_keys(
     db: Session = Depends(get_db),
     _admin: UserDB = Depends(require_admin),
 ):
+    key_usage.flush(db)     # this worker's pending last_used_at values
     keys = db.query(APIKeyDB).order_by(APIKeyDB.created_at.desc()).all()
     return [
         APIKeyResponse(
@@ -8,6 +8,7 @@ from database import get_db, BinDB
 from models import Bin, CreateBinRequest, UpdateBinRequest
 from utils import get_current_timestamp, determine_bin_status
 from auth_utils import get_current_user, require_admin
+from routers.websocket_router import manager as ws_manager
 
 router = APIRouter()
 
@@ -129,6 +130,7 @@ def assign_zone(
 
     bin_db.zone_id = zone_id
     db.commit()
+    ws_manager.publish_bin_zone(bin_id, zone_id)
     return {"bin_id": bin_id, "zone_id": zone_id, "updated": True}
 
 
@@ -139,4 +141,5 @@ def delete_bin(bin_id: str, db: Session = Depends(get_db), _admin=Depends(requir
         raise HTTPException(status_code=404, detail="Bin not found")
     db.delete(bin_db)
     db.commit()
+    ws_manager.publish_bin_zone(bin_id, None, removed=True)
     return None
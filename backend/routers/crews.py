@@ -14,6 +14,7 @@ from database import get_db, CrewDB
 from models import Crew, CreateCrewRequest, UpdateCrewRequest
 from utils import get_current_timestamp
 from auth_utils import require_admin, get_current_user
+from services.recipients import recipients
 
 router = APIRouter()
 
@@ -76,6 +77,7 @@ def create_crew(req: CreateCrewRequest, db: Session = Depends(get_db), _user = D
     db.add(crew_db)
     db.commit()
     db.refresh(crew_db)
+    recipients.put_crew(crew_db.id, crew_db.name, crew_db.email)
     return _crew_to_model(crew_db)
 
 
@@ -114,6 +116,8 @@ def update_crew(crew_id: str, req: UpdateCrewRequest, db: Session = Depends(get_
 
     db.commit()
     db.refresh(crew_db)
+    if req.name is not None or req.email is not None:
+        recipients.put_crew(crew_db.id, crew_db.name, crew_db.email)
     return _crew_to_model(crew_db)
 
 
@@ -143,6 +147,7 @@ def delete_crew(crew_id: str, db: Session = Depends(get_db), _admin=Depends(requ
         raise HTTPException(status_code=404, detail="Crew not found")
     db.delete(crew_db)
     db.commit()
+    recipients.remove_crew(crew_id)
     return None
 
 
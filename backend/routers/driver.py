@@ -7,7 +7,13 @@ from sqlalchemy.orm import Session
 
 from auth_utils import get_current_user
 from database import BinDB, CrewDB, RouteDB, TaskDB, UserDB, get_db
-from routers.routes import _finalize_route, _mark_bin_serviced, _mark_waypoint_done, _sync_crew_status
+from routers.routes import (
+    _finalize_route,
+    _mark_bin_serviced,
+    _mark_waypoint_done,
+    _sync_crew_status,
+    _waypoint_progress,
+)
 from utils import get_current_timestamp
 
 router = APIRouter()
@@ -78,35 +84,30 @@ def _select_current_route(crew_id: str, db: Session) -> Optional[RouteDB]:
 
 
 def _build_driver_route(route: RouteDB, db: Session) -> DriverRoute:
-    raw_waypoints = route.waypoints or []
-    bin_ids = [waypoint.get("bin_id") for waypoint in raw_waypoints if waypoint.get("bin_id")]
+    rows = route.waypoint_rows
+    bin_ids = [row.bin_id for row in rows]
     bins_map = {
         bin_db.id: bin_db for bin_db in db.query(BinDB).filter(BinDB.id.in_(bin_ids)).all()
     }
 
     waypoints = []
-    for waypoint in raw_waypoints:
-        bin_id = waypoint.get("bin_id", "")
-        bin_db = bins_map.get(bin_id)
+    for row in rows:
+        waypoint = row.to_dict()
+        bin_db = bins_map.get(row.bin_id)
         waypoints.append(
             DriverWaypoint(
-                bin_id=bin_id,
-                location=(
-                    (bin_db.location if bin_db else None)
-                    or waypoint.get("location")
-                    or bin_id
-                ),
-                latitude=waypoint.get("latitude") or (bin_db.latitude if bin_db else None),
-                longitude=waypoint.get("longitude") or (bin_db.longitude if bin_db else None),
-                fill_level=bin_db.fill_level_percent if bin_db else waypoint.get("fill_level", 0),
-                order=waypoint.get("order", 0),
-                estimated_collection_time=waypoint.get("estimated_collection_time", 10),
-                done=bool(waypoint.get("done", False)),
+                bin_id=row.bin_id,
+                location=(bin_db.location if bin_db else None) or row.location or row.bin_id,
+                latitude=row.latitude or (bin_db.latitude if bin_db else None),
+                longitude=row.longitude or (bin_db.longitude if bin_db else None),
+                fill_level=bin_db.fill_level_percent if bin_db else row.fill_level or 0,
+                order=row.order,
+                estimated_collection_time=row.estimated_collection_time or 10,
+                done=bool(row.done),
                 completed_at=waypoint.get("completed_at"),
             )
         )
 
-    waypoints = sorted(waypoints, key=lambda item: item.order)
     completed_waypoints = sum(1 for waypoint in waypoints if waypoint.done)
     total_waypoints = len(waypoints)
     progress_percent = int(round((completed_waypoints / total_waypoints) * 100)) if total_waypoints else 0
@@ -198,13 +199,9 @@ def complete_task(
             .order_by(RouteDB.created_at.desc())
             .first()
         )
-        if active_route and _mark_waypoint_done(active_route, task.bin_id, completed_at):
-            remaining = [
-                waypoint
-                for waypoint in active_route.waypoints or []
-                if not waypoint.get("done", False)
-            ]
-            if not remaining:
+        if active_route and _mark_waypoint_done(active_route, task.bin_id, completed_at, db):
+            total, completed = _waypoint_progress(db, active_route.id)
+            if completed >= total:
                 _finalize_route(active_route, db, completed_at=completed_at)
                 route_completed = True
 
@@ -244,7 +241,7 @@ def complete_waypoint(
         raise HTTPException(status_code=400, detail="Waypoint completion requires an active route")
 
     completed_at = get_current_timestamp()
-    if not _mark_waypoint_done(route, payload.bin_id, completed_at):
+    if not _mark_waypoint_done(route, payload.bin_id, completed_at, db):
         raise HTTPException(status_code=404, detail="Waypoint not found in this route")
 
     for task in (
@@ -261,13 +258,9 @@ def complete_waypoint(
 
     _mark_bin_serviced(db, payload.bin_id, completed_at)
 
-    remaining = [
-        waypoint
-        for waypoint in route.waypoints or []
-        if not waypoint.get("done", False)
-    ]
+    total, completed = _waypoint_progress(db, route.id)
     route_completed = False
-    if not remaining:
+    if completed >= total:
         _finalize_route(route, db, completed_at=completed_at)
         route_completed = True
 
@@ -1,22 +1,40 @@
-from datetime import datetime
-from typing import List, Optional
+import base64
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+import time
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, case, exists, func, insert, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
 
 from auth_utils import get_current_user, require_admin
-from database import BinDB, CrewDB, RouteDB, RouteHistoryDB, TaskDB, get_db
+from database import (
+    BinDB,
+    CrewDB,
+    RouteDailyStatsDB,
+    RouteDB,
+    RouteHistoryDB,
+    RouteWaypointDB,
+    TaskDB,
+    get_db,
+)
 from models import (
+    CollectionPlanResult,
     CompareRoutesRequest,
     OptimizeRouteRequest,
+    PlanCollectionRequest,
+    PlannedCrewRoute,
     Route,
     RouteComparison,
+    RouteSummary,
     RouteOptimizationResult,
     UpdateRouteStatusRequest,
 )
-from services.route_optimizer import Location, RouteOptimizer, WasteCollectionPoint
+from services.collection_planner import CollectionPlanner, prediction_inputs
+from services.route_optimizer import CollectionPoints, Location, RouteOptimizer
 from utils import determine_bin_status, get_current_timestamp
 
 router = APIRouter()
@@ -35,17 +53,22 @@ def parse_location_string(location_str: str):
     return None, None
 
 
-def get_bin_location(bin_db: BinDB) -> Location:
+def get_bin_coordinates(bin_db: BinDB) -> Tuple[float, float]:
     if bin_db.latitude and bin_db.longitude:
-        return Location(bin_db.latitude, bin_db.longitude, bin_db.location)
+        return bin_db.latitude, bin_db.longitude
 
     lat, lon = parse_location_string(bin_db.location)
     if lat and lon:
-        return Location(lat, lon, bin_db.location)
+        return lat, lon
 
     # Use depot coordinates as the fallback — random coordinates were removed
     # because they produced fabricated routes that silently diverged from reality.
-    return Location(DEPOT_LAT, DEPOT_LON, bin_db.location)
+    return DEPOT_LAT, DEPOT_LON
+
+
+def get_bin_location(bin_db: BinDB) -> Location:
+    lat, lon = get_bin_coordinates(bin_db)
+    return Location(lat, lon, bin_db.location)
 
 
 def determine_priority(fill_level: int, status: str) -> int:
@@ -56,6 +79,41 @@ def determine_priority(fill_level: int, status: str) -> int:
     return 1
 
 
+def _collection_points(bins: List[BinDB], estimated_time: int = 10) -> CollectionPoints:
+    """Column-wise view of the requested bins; no per-bin Location objects are built."""
+    coords = [get_bin_coordinates(bin_db) for bin_db in bins]
+    return CollectionPoints(
+        bin_ids=[bin_db.id for bin_db in bins],
+        names=[bin_db.location for bin_db in bins],
+        lat=[lat for lat, _ in coords],
+        lon=[lon for _, lon in coords],
+        fill=[bin_db.fill_level_percent for bin_db in bins],
+        priority=[determine_priority(bin_db.fill_level_percent, bin_db.status) for bin_db in bins],
+        service_time=[estimated_time] * len(bins),
+    )
+
+
+def _build_waypoints(points: CollectionPoints, order) -> List[Dict]:
+    """Materialise waypoint dicts for a visit order — only done at the response boundary."""
+    lat = points.lat[order].tolist()
+    lon = points.lon[order].tolist()
+    fill = points.fill[order].tolist()
+    service_time = points.service_time[order].tolist()
+    return [
+        {
+            "bin_id": points.bin_ids[i],
+            "location": points.names[i],
+            "latitude": lat[k],
+            "longitude": lon[k],
+            "fill_level": fill[k],
+            "order": k + 1,
+            "estimated_collection_time": service_time[k],
+            "done": False,
+        }
+        for k, i in enumerate(order.tolist())
+    ]
+
+
 def _route_db_to_model(route_db: RouteDB) -> Route:
     return Route(
         id=route_db.id,
@@ -73,193 +131,274 @@ def _route_db_to_model(route_db: RouteDB) -> Route:
     )
 
 
-def _set_waypoint_defaults(route: RouteDB) -> None:
-    next_waypoints = []
-    for index, waypoint in enumerate(route.waypoints or [], start=1):
-        next_waypoint = dict(waypoint)
-        next_waypoint.setdefault("order", index)
-        next_waypoint.setdefault("estimated_collection_time", 10)
-        next_waypoint.setdefault("done", False)
-        next_waypoints.append(next_waypoint)
-    route.waypoints = next_waypoints
-
-
 def _route_duration_minutes(route: RouteDB, completed_at: datetime) -> float:
     if route.actual_time_minutes is not None:
         return route.actual_time_minutes
 
     if route.started_at:
-        delta = completed_at - route.started_at
+        started_at = route.started_at
+        if started_at.tzinfo is None:
+            # DateTime columns come back naive from the database; they hold UTC
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        delta = completed_at - started_at
         return round(max(delta.total_seconds(), 0) / 60, 2)
 
     return round(route.estimated_time_minutes, 2)
 
 
-def _complete_open_tasks_for_bin(
+def _route_bin_ids(route: RouteDB) -> List[str]:
+    """Distinct bin ids of a route in waypoint order (from bin_ids, so no waypoint rows are loaded)."""
+    return list(dict.fromkeys(bin_id for bin_id in route.bin_ids or [] if bin_id))
+
+
+def _complete_open_tasks_for_bins(
     db: Session,
     *,
-    bin_id: str,
+    bin_ids: List[str],
     crew_id: Optional[str],
     completed_at: datetime,
 ) -> None:
-    query = db.query(TaskDB).filter(
-        TaskDB.bin_id == bin_id,
+    """Complete every open task on the given bins in one UPDATE, claiming unassigned ones for the crew."""
+    if not bin_ids:
+        return
+
+    stmt = update(TaskDB).where(
+        TaskDB.bin_id.in_(bin_ids),
         TaskDB.status.in_(["pending", "in-progress"]),
     )
+    values = {"status": "completed", "completed_at": completed_at}
     if crew_id:
-        query = query.filter(or_(TaskDB.crew_id == crew_id, TaskDB.crew_id.is_(None)))
+        stmt = stmt.where(or_(TaskDB.crew_id == crew_id, TaskDB.crew_id.is_(None)))
+        values["crew_id"] = func.coalesce(TaskDB.crew_id, crew_id)
 
-    for task_db in query.all():
-        if crew_id and task_db.crew_id is None:
-            task_db.crew_id = crew_id
-        task_db.status = "completed"
-        task_db.completed_at = completed_at
+    db.execute(stmt.values(**values).execution_options(synchronize_session="fetch"))
 
 
-def _mark_bin_serviced(db: Session, bin_id: str, completed_at: datetime) -> None:
-    bin_db = db.query(BinDB).filter(BinDB.id == bin_id).first()
-    if not bin_db:
+def _mark_bins_serviced(db: Session, bin_ids: List[str], completed_at: datetime) -> None:
+    """Reset fill level and status of all emptied bins in one UPDATE; offline bins keep their status."""
+    if not bin_ids:
         return
 
-    bin_db.fill_level_percent = 0
-    if bin_db.status != "offline":
-        bin_db.status = determine_bin_status(0)
-    bin_db.last_telemetry = completed_at
+    db.execute(
+        update(BinDB)
+        .where(BinDB.id.in_(bin_ids))
+        .values(
+            fill_level_percent=0,
+            status=case((BinDB.status == "offline", BinDB.status), else_=determine_bin_status(0)),
+            last_telemetry=completed_at,
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def _mark_bin_serviced(db: Session, bin_id: str, completed_at: datetime) -> None:
+    _mark_bins_serviced(db, [bin_id], completed_at)
 
 
 def _ensure_route_tasks(route: RouteDB, db: Session, activate: bool) -> None:
-    for waypoint in route.waypoints or []:
-        bin_id = waypoint.get("bin_id")
-        if not bin_id:
-            continue
-
-        query = db.query(TaskDB).filter(
-            TaskDB.bin_id == bin_id,
-            TaskDB.status.in_(["pending", "in-progress"]),
+    """
+    Make sure every route bin has an open task for the crew. Existing tasks are
+    prefetched in one query and claimed/activated with bulk UPDATEs; missing
+    ones are created with a single multi-row INSERT.
+    """
+    bin_ids = _route_bin_ids(route)
+    if not bin_ids:
+        return
+
+    query = db.query(TaskDB.id, TaskDB.bin_id).filter(
+        TaskDB.bin_id.in_(bin_ids),
+        TaskDB.status.in_(["pending", "in-progress"]),
+    )
+    if route.crew_id:
+        query = query.filter(or_(TaskDB.crew_id == route.crew_id, TaskDB.crew_id.is_(None)))
+
+    # Newest open task per bin, as the per-waypoint lookup used to pick
+    latest_task_ids: Dict[str, str] = {}
+    for task_id, bin_id in query.order_by(TaskDB.created_at.desc()).all():
+        latest_task_ids.setdefault(bin_id, task_id)
+
+    task_ids = list(latest_task_ids.values())
+    if task_ids and route.crew_id:
+        db.execute(
+            update(TaskDB)
+            .where(TaskDB.id.in_(task_ids), TaskDB.crew_id.is_(None))
+            .values(crew_id=route.crew_id)
+            .execution_options(synchronize_session="fetch")
         )
-        if route.crew_id:
-            query = query.filter(or_(TaskDB.crew_id == route.crew_id, TaskDB.crew_id.is_(None)))
-
-        task_db = query.order_by(TaskDB.created_at.desc()).first()
-        if task_db:
-            if route.crew_id and task_db.crew_id is None:
-                task_db.crew_id = route.crew_id
-            if activate and task_db.status == "pending":
-                task_db.status = "in-progress"
-            continue
-
-        bin_db = db.query(BinDB).filter(BinDB.id == bin_id).first()
-        created_at = get_current_timestamp()
-        db.add(
-            TaskDB(
-                id=f"task_{uuid.uuid4().hex[:8]}",
-                title=f"Collect {bin_id}",
-                description=f"Route-based collection task for {bin_id}",
-                priority=(
-                    "high"
-                    if (bin_db and bin_db.fill_level_percent >= 90)
-                    else "medium"
-                    if (bin_db and bin_db.fill_level_percent >= 70)
-                    else "low"
-                ),
-                status="in-progress" if activate else "pending",
-                bin_id=bin_id,
-                location=(
-                    bin_db.location
-                    if bin_db
-                    else waypoint.get("location", bin_id)
-                ),
-                estimated_time_minutes=waypoint.get("estimated_collection_time", 10),
-                crew_id=route.crew_id,
-                created_at=created_at,
-            )
+    if task_ids and activate:
+        db.execute(
+            update(TaskDB)
+            .where(TaskDB.id.in_(task_ids), TaskDB.status == "pending")
+            .values(status="in-progress")
+            .execution_options(synchronize_session="fetch")
+        )
+
+    missing = [bin_id for bin_id in bin_ids if bin_id not in latest_task_ids]
+    if not missing:
+        return
+
+    bins = {bin_db.id: bin_db for bin_db in db.query(BinDB).filter(BinDB.id.in_(missing)).all()}
+    waypoints = {
+        row.bin_id: row
+        for row in db.query(RouteWaypointDB).filter(
+            RouteWaypointDB.route_id == route.id,
+            RouteWaypointDB.bin_id.in_(missing),
         )
+    }
+    created_at = get_current_timestamp()
+    rows = []
+    for bin_id in missing:
+        bin_db = bins.get(bin_id)
+        waypoint = waypoints.get(bin_id)
+        fill = bin_db.fill_level_percent if bin_db else 0
+        rows.append({
+            "id": f"task_{uuid.uuid4().hex[:8]}",
+            "title": f"Collect {bin_id}",
+            "description": f"Route-based collection task for {bin_id}",
+            "priority": "high" if fill >= 90 else "medium" if fill >= 70 else "low",
+            "status": "in-progress" if activate else "pending",
+            "bin_id": bin_id,
+            "location": bin_db.location if bin_db else (waypoint and waypoint.location) or bin_id,
+            "estimated_time_minutes": (waypoint and waypoint.estimated_collection_time) or 10,
+            "crew_id": route.crew_id,
+            "created_at": created_at,
+        })
+    db.execute(insert(TaskDB), rows)
 
 
 def _pause_route_tasks(route: RouteDB, db: Session) -> None:
-    route_bin_ids = [waypoint.get("bin_id") for waypoint in route.waypoints or [] if waypoint.get("bin_id")]
+    route_bin_ids = _route_bin_ids(route)
     if not route_bin_ids:
         return
 
-    query = db.query(TaskDB).filter(
+    stmt = update(TaskDB).where(
         TaskDB.bin_id.in_(route_bin_ids),
         TaskDB.status == "in-progress",
     )
     if route.crew_id:
-        query = query.filter(TaskDB.crew_id == route.crew_id)
+        stmt = stmt.where(TaskDB.crew_id == route.crew_id)
+
+    db.execute(stmt.values(status="pending").execution_options(synchronize_session="fetch"))
+
 
-    for task_db in query.all():
-        task_db.status = "pending"
+def _rollup_key(history: RouteHistoryDB) -> Optional[Tuple[date, str, str]]:
+    if history.completion_date is None:
+        return None
+    return history.completion_date.date(), history.crew_id or "", history.zone_id or ""
+
+
+def _rollup_totals(history: RouteHistoryDB) -> Dict[str, float]:
+    return {
+        "routes_completed": 1,
+        "bins_collected": history.bins_collected or 0,
+        "total_distance_km": history.total_distance_km or 0.0,
+        "total_time_minutes": history.total_time_minutes or 0.0,
+        "efficiency_sum": history.fuel_efficiency_score or 0.0,
+    }
+
+
+# Production runs on PostgreSQL, the test suite on SQLite; both support upserts
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _bump_daily_stats(db: Session, key, deltas: Dict[str, float]) -> None:
+    """
+    Add deltas to one route_daily_stats row in a single INSERT … ON CONFLICT
+    DO UPDATE, so two workers completing routes for the same day, crew and
+    zone can't both insert the row.
+    """
+    if key is None or not any(deltas.values()):
+        return
+
+    day, crew_id, zone_id = key
+    insert_for_dialect = _UPSERT_INSERTS[db.get_bind().dialect.name]
+    statement = insert_for_dialect(RouteDailyStatsDB).values(day=day, crew_id=crew_id, zone_id=zone_id, **deltas)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["day", "crew_id", "zone_id"],
+        set_={column: getattr(RouteDailyStatsDB, column) + statement.excluded[column] for column in deltas},
+    ))
 
 
 def _record_route_history(route: RouteDB, db: Session, notes: Optional[str]) -> None:
+    bins_collected = len(route.bin_ids or [])
+    values = {
+        "crew_id": route.crew_id,
+        "zone_id": route.zone_id,
+        "bins_collected": bins_collected,
+        "total_distance_km": route.total_distance_km,
+        "total_time_minutes": route.actual_time_minutes or route.estimated_time_minutes,
+        "fuel_efficiency_score": (
+            bins_collected / route.total_distance_km if route.total_distance_km > 0 else 0
+        ),
+        "completion_date": route.completed_at,
+    }
+
     existing = db.query(RouteHistoryDB).filter(RouteHistoryDB.route_id == route.id).first()
     if existing:
-        existing.bins_collected = len(route.bin_ids or [])
-        existing.total_distance_km = route.total_distance_km
-        existing.total_time_minutes = route.actual_time_minutes or route.estimated_time_minutes
-        existing.fuel_efficiency_score = (
-            len(route.bin_ids or []) / route.total_distance_km if route.total_distance_km > 0 else 0
-        )
-        existing.completion_date = route.completed_at
+        old_key, old_totals = _rollup_key(existing), _rollup_totals(existing)
+        for column, value in values.items():
+            setattr(existing, column, value)
         existing.notes = notes or existing.notes
+        new_key, new_totals = _rollup_key(existing), _rollup_totals(existing)
+
+        # Move the route's contribution between rollup rows (or adjust in place)
+        if old_key == new_key:
+            _bump_daily_stats(db, new_key, {c: new_totals[c] - old_totals[c] for c in new_totals})
+        else:
+            _bump_daily_stats(db, old_key, {c: -v for c, v in old_totals.items()})
+            _bump_daily_stats(db, new_key, new_totals)
         return
 
-    db.add(
-        RouteHistoryDB(
-            route_id=route.id,
-            crew_id=route.crew_id,
-            bins_collected=len(route.bin_ids or []),
-            total_distance_km=route.total_distance_km,
-            total_time_minutes=route.actual_time_minutes or route.estimated_time_minutes,
-            fuel_efficiency_score=(
-                len(route.bin_ids or []) / route.total_distance_km if route.total_distance_km > 0 else 0
-            ),
-            completion_date=route.completed_at,
-            notes=notes,
-        )
-    )
+    history = RouteHistoryDB(route_id=route.id, notes=notes, **values)
+    db.add(history)
+    _bump_daily_stats(db, _rollup_key(history), _rollup_totals(history))
 
 
 def _sync_crew_status(crew_id: Optional[str], db: Session) -> None:
     if not crew_id:
         return
 
-    crew_db = db.query(CrewDB).filter(CrewDB.id == crew_id).first()
-    if not crew_db:
-        return
-
-    active_routes = (
-        db.query(RouteDB)
-        .filter(RouteDB.crew_id == crew_id, RouteDB.status == "active")
-        .count()
-    )
-    open_tasks = (
-        db.query(TaskDB)
-        .filter(TaskDB.crew_id == crew_id, TaskDB.status.in_(["pending", "in-progress"]))
-        .count()
+    # Sessions don't autoflush — make this request's route/task changes visible first
+    db.flush()
+    has_active_route = exists().where(RouteDB.crew_id == crew_id, RouteDB.status == "active")
+    has_open_task = exists().where(TaskDB.crew_id == crew_id, TaskDB.status.in_(["pending", "in-progress"]))
+    row = (
+        db.query(CrewDB, has_active_route, has_open_task)
+        .filter(CrewDB.id == crew_id)
+        .first()
     )
+    if not row:
+        return
 
-    if active_routes > 0 or open_tasks > 0:
+    crew_db, active_route, open_task = row
+    if active_route or open_task:
         crew_db.status = "active"
     elif crew_db.status != "offline":
         crew_db.status = "available"
 
 
-def _mark_waypoint_done(route: RouteDB, bin_id: str, completed_at: datetime) -> bool:
-    updated = False
-    next_waypoints = []
-    for waypoint in route.waypoints or []:
-        next_waypoint = dict(waypoint)
-        if next_waypoint.get("bin_id") == bin_id:
-            next_waypoint["done"] = True
-            next_waypoint["completed_at"] = completed_at.isoformat()
-            updated = True
-        next_waypoints.append(next_waypoint)
+def _mark_waypoint_done(route: RouteDB, bin_id: str, completed_at: datetime, db: Session) -> bool:
+    """Mark one stop done with a single-row UPDATE. False if the bin isn't on the route."""
+    result = db.execute(
+        update(RouteWaypointDB)
+        .where(RouteWaypointDB.route_id == route.id, RouteWaypointDB.bin_id == bin_id)
+        .values(done=True, completed_at=completed_at)
+        .execution_options(synchronize_session="evaluate")
+    )
+    return result.rowcount > 0
 
-    if updated:
-        route.waypoints = next_waypoints
-    return updated
+
+def _waypoint_progress(db: Session, route_id: str) -> Tuple[int, int]:
+    """(total, completed) stop counts of a route, counted in SQL."""
+    total, completed = (
+        db.query(
+            func.count(RouteWaypointDB.id),
+            func.coalesce(func.sum(case((RouteWaypointDB.done.is_(True), 1), else_=0)), 0),
+        )
+        .filter(RouteWaypointDB.route_id == route_id)
+        .one()
+    )
+    return int(total), int(completed)
 
 
 def _finalize_route(
@@ -279,23 +418,21 @@ def _finalize_route(
         else _route_duration_minutes(route, route.completed_at)
     )
 
-    next_waypoints = []
-    for waypoint in route.waypoints or []:
-        next_waypoint = dict(waypoint)
-        next_waypoint["done"] = True
-        next_waypoint.setdefault("completed_at", route.completed_at.isoformat())
-        next_waypoints.append(next_waypoint)
-        bin_id = next_waypoint.get("bin_id")
-        if bin_id:
-            _complete_open_tasks_for_bin(
-                db,
-                bin_id=bin_id,
-                crew_id=route.crew_id,
-                completed_at=route.completed_at,
-            )
-            _mark_bin_serviced(db, bin_id, route.completed_at)
+    db.execute(
+        update(RouteWaypointDB)
+        .where(RouteWaypointDB.route_id == route.id)
+        .values(done=True, completed_at=func.coalesce(RouteWaypointDB.completed_at, route.completed_at))
+        .execution_options(synchronize_session="fetch")
+    )
 
-    route.waypoints = next_waypoints
+    bin_ids = _route_bin_ids(route)
+    _complete_open_tasks_for_bins(
+        db,
+        bin_ids=bin_ids,
+        crew_id=route.crew_id,
+        completed_at=route.completed_at,
+    )
+    _mark_bins_serviced(db, bin_ids, route.completed_at)
     _record_route_history(route, db, notes)
     _sync_crew_status(route.crew_id, db)
 
@@ -320,34 +457,13 @@ def optimize_route(req: OptimizeRouteRequest, db: Session = Depends(get_db), _us
     else:
         start_location = Location(DEPOT_LAT, DEPOT_LON, "Depot")
 
-    collection_points = [
-        WasteCollectionPoint(
-            bin_id=bin_db.id,
-            location=get_bin_location(bin_db),
-            fill_level=bin_db.fill_level_percent,
-            priority=determine_priority(bin_db.fill_level_percent, bin_db.status),
-            estimated_time=10,
-        )
-        for bin_db in bins
-    ]
+    points = _collection_points(bins)
 
     optimizer = RouteOptimizer()
     optimizer.set_depot(Location(DEPOT_LAT, DEPOT_LON, "Depot"))
-    result = optimizer.optimize(collection_points, start_location, req.algorithm)
+    result = optimizer.optimize_arrays(points, start_location, req.algorithm)
 
-    waypoints = [
-        {
-            "bin_id": point.bin_id,
-            "location": point.location.name,
-            "latitude": point.location.lat,
-            "longitude": point.location.lon,
-            "fill_level": point.fill_level,
-            "order": index + 1,
-            "estimated_collection_time": point.estimated_time,
-            "done": False,
-        }
-        for index, point in enumerate(result["route"])
-    ]
+    waypoints = _build_waypoints(points, result["order"])
 
     efficiency_score = len(waypoints) / result["total_distance"] if result["total_distance"] > 0 else 0
 
@@ -361,7 +477,7 @@ def optimize_route(req: OptimizeRouteRequest, db: Session = Depends(get_db), _us
             algorithm_used=result["algorithm"],
             total_distance_km=result["total_distance"],
             estimated_time_minutes=result["total_time"],
-            bin_ids=[point.bin_id for point in result["route"]],
+            bin_ids=[waypoint["bin_id"] for waypoint in waypoints],
             waypoints=waypoints,
             created_at=get_current_timestamp(),
         )
@@ -391,35 +507,15 @@ def compare_routes(req: CompareRoutesRequest, db: Session = Depends(get_db), _us
         else Location(DEPOT_LAT, DEPOT_LON, "Depot")
     )
 
-    collection_points = [
-        WasteCollectionPoint(
-            bin_id=bin_db.id,
-            location=get_bin_location(bin_db),
-            fill_level=bin_db.fill_level_percent,
-            priority=determine_priority(bin_db.fill_level_percent, bin_db.status),
-        )
-        for bin_db in bins
-    ]
+    points = _collection_points(bins)
 
     optimizer = RouteOptimizer()
     optimizer.set_depot(Location(DEPOT_LAT, DEPOT_LON, "Depot"))
-    results = optimizer.compare_algorithms(collection_points, start_location)
+    results = optimizer.compare_arrays(points, start_location)
 
     algorithm_results = []
     for result in results:
-        waypoints = [
-            {
-                "bin_id": point.bin_id,
-                "location": point.location.name,
-                "latitude": point.location.lat,
-                "longitude": point.location.lon,
-                "fill_level": point.fill_level,
-                "order": index + 1,
-                "estimated_collection_time": 10,
-                "done": False,
-            }
-            for index, point in enumerate(result["route"])
-        ]
+        waypoints = _build_waypoints(points, result["order"])
         efficiency_score = len(waypoints) / result["total_distance"] if result["total_distance"] > 0 else 0
         algorithm_results.append(
             RouteOptimizationResult(
@@ -437,26 +533,217 @@ def compare_routes(req: CompareRoutesRequest, db: Session = Depends(get_db), _us
     return RouteComparison(algorithms=algorithm_results, recommended=best_result.algorithm)
 
 
-@router.get("/", response_model=List[Route])
+@router.post("/plan", response_model=CollectionPlanResult)
+def plan_collection(req: PlanCollectionRequest, db: Session = Depends(get_db), _user = Depends(get_current_user)):
+    """
+    Choose which bins each crew should collect this shift, and in what order,
+    maximising prediction-weighted urgency within the shift and truck limits.
+    """
+    from routers.predictions import prediction_service
+
+    crews = db.query(CrewDB).filter(CrewDB.id.in_(req.crew_ids)).all()
+    crews_by_id = {crew_db.id: crew_db for crew_db in crews}
+    missing_crews = set(req.crew_ids) - set(crews_by_id)
+    if missing_crews:
+        raise HTTPException(status_code=404, detail=f"Crews not found: {missing_crews}")
+    crews = [crews_by_id[crew_id] for crew_id in dict.fromkeys(req.crew_ids)]
+
+    query = db.query(BinDB).filter(
+        BinDB.status != "maintenance",
+        BinDB.fill_level_percent >= req.min_fill_level,
+    )
+    if req.zone_id:
+        query = query.filter(BinDB.zone_id == req.zone_id)
+    if req.bin_ids is not None:
+        query = query.filter(BinDB.id.in_(req.bin_ids))
+    bins = query.all()
+
+    points = _collection_points(bins)
+    predictions = {
+        bin_db.id: prediction_service.fill_predictor.predict_full_time(bin_db.id, bin_db.fill_level_percent)
+        for bin_db in bins
+    }
+    inputs = prediction_inputs(points.bin_ids, points.fill, predictions)
+    # Volume the truck picks up at each stop; bins without a capacity count as 240 L
+    volumes = points.fill / 100.0 * np.array([bin_db.capacity_liters or 240 for bin_db in bins], dtype=np.float64)
+
+    starts = [
+        Location(crew_db.current_latitude, crew_db.current_longitude, crew_db.name)
+        if crew_db.current_latitude and crew_db.current_longitude
+        else Location(DEPOT_LAT, DEPOT_LON, "Depot")
+        for crew_db in crews
+    ]
+
+    planner = CollectionPlanner(Location(DEPOT_LAT, DEPOT_LON, "Depot"))
+    started = time.perf_counter()
+    plans = planner.plan(
+        points,
+        weights=inputs["weight"],
+        deadlines_minutes=inputs["deadline_minutes"],
+        volumes_liters=volumes,
+        crew_starts=starts,
+        budgets_minutes=[req.shift_minutes] * len(crews),
+        capacities_liters=[req.truck_capacity_liters] * len(crews),
+        time_limit_s=req.time_limit_ms / 1000,
+    )
+    solve_time_ms = (time.perf_counter() - started) * 1000
+
+    routes = []
+    for crew_db, plan in zip(crews, plans):
+        waypoints = _build_waypoints(points, plan.order)
+        for waypoint, eta, i in zip(waypoints, plan.eta_minutes.tolist(), plan.order.tolist()):
+            waypoint["eta_minutes"] = round(eta, 1)
+            waypoint["hours_until_full"] = float(inputs["hours_until_full"][i])
+
+        route_id = None
+        if req.save_routes and waypoints:
+            route_id = f"route_{uuid.uuid4().hex[:8]}"
+            db.add(RouteDB(
+                id=route_id,
+                crew_id=crew_db.id,
+                zone_id=req.zone_id,
+                status="planned",
+                algorithm_used="prediction_orienteering",
+                total_distance_km=round(plan.distance_km, 2),
+                estimated_time_minutes=round(plan.minutes, 1),
+                bin_ids=[waypoint["bin_id"] for waypoint in waypoints],
+                waypoints=waypoints,
+                created_at=get_current_timestamp(),
+            ))
+
+        efficiency_score = len(waypoints) / plan.distance_km if plan.distance_km > 0 else 0
+        routes.append(PlannedCrewRoute(
+            route_id=route_id,
+            crew_id=crew_db.id,
+            algorithm="prediction_orienteering",
+            total_distance_km=round(plan.distance_km, 2),
+            estimated_time_minutes=round(plan.minutes, 1),
+            bin_count=len(waypoints),
+            waypoints=waypoints,
+            efficiency_score=round(efficiency_score, 3),
+            load_liters=round(plan.load_liters, 1),
+            urgency_collected=round(plan.reward, 3),
+            late_stops=plan.late_stops,
+        ))
+
+    if req.save_routes:
+        db.commit()
+
+    return CollectionPlanResult(
+        routes=routes,
+        candidates_considered=len(points),
+        bins_selected=sum(route.bin_count for route in routes),
+        urgency_available=round(float(inputs["weight"].sum()), 3),
+        urgency_collected=round(sum(route.urgency_collected for route in routes), 3),
+        solve_time_ms=round(solve_time_ms, 1),
+    )
+
+
+def _encode_cursor(route_db: RouteDB) -> str:
+    # Routes without created_at sort first; an empty timestamp marks them
+    created_at = route_db.created_at.isoformat() if route_db.created_at else ""
+    return base64.urlsafe_b64encode(f"{created_at}|{route_db.id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    try:
+        created_at, route_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return (datetime.fromisoformat(created_at) if created_at else None), route_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _route_db_to_summary(route_db: RouteDB) -> RouteSummary:
+    return RouteSummary(
+        id=route_db.id,
+        crew_id=route_db.crew_id,
+        zone_id=route_db.zone_id,
+        status=route_db.status,
+        algorithm_used=route_db.algorithm_used,
+        total_distance_km=route_db.total_distance_km,
+        estimated_time_minutes=route_db.estimated_time_minutes,
+        actual_time_minutes=route_db.actual_time_minutes,
+        bin_count=len(route_db.bin_ids or []),
+        created_at=route_db.created_at,
+        started_at=route_db.started_at,
+        completed_at=route_db.completed_at,
+    )
+
+
+@router.get("/", response_model=Union[List[Route], List[RouteSummary]])
 def list_routes(
+    response: Response,
     status: Optional[str] = Query(default=None, description="Filter by status"),
     crew_id: Optional[str] = Query(default=None, description="Filter by crew"),
+    view: str = Query(default="full", pattern="^(full|summary)$", description="full | summary (no waypoints)"),
+    limit: int = Query(default=100, ge=1, le=500, description="Max records to return"),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor value from the previous page"),
     db: Session = Depends(get_db),
     _user = Depends(get_current_user),
 ):
+    """Newest first (undated routes before all others), keyset-paginated on (created_at, id); the next page cursor is sent in X-Next-Cursor."""
     query = db.query(RouteDB)
+    if view == "full":
+        query = query.options(selectinload(RouteDB.waypoint_rows))
     if status:
         query = query.filter(RouteDB.status == status)
     if crew_id:
         query = query.filter(RouteDB.crew_id == crew_id)
+    if cursor:
+        created_at, route_id = _decode_cursor(cursor)
+        if created_at is None:
+            query = query.filter(or_(
+                RouteDB.created_at.is_not(None),
+                and_(RouteDB.created_at.is_(None), RouteDB.id < route_id),
+            ))
+        else:
+            query = query.filter(or_(
+                RouteDB.created_at < created_at,
+                and_(RouteDB.created_at == created_at, RouteDB.id < route_id),
+            ))
+
+    # NULLS FIRST is PostgreSQL's default for DESC, so the (created_at, id) index still serves it
+    routes = (
+        query.order_by(RouteDB.created_at.desc().nulls_first(), RouteDB.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(routes) > limit:
+        routes = routes[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(routes[-1])
 
-    return [_route_db_to_model(route_db) for route_db in query.order_by(RouteDB.created_at.desc()).all()]
+    to_model = _route_db_to_model if view == "full" else _route_db_to_summary
+    return [to_model(route_db) for route_db in routes]
 
 
 @router.get("/analytics/performance")
-def get_route_analytics(db: Session = Depends(get_db), _user = Depends(get_current_user)):
-    history_rows = db.query(RouteHistoryDB).all()
-    if not history_rows:
+def get_route_analytics(
+    from_date: Optional[date] = Query(default=None, alias="from", description="First completion day (inclusive)"),
+    to_date: Optional[date] = Query(default=None, alias="to", description="Last completion day (inclusive)"),
+    crew_id: Optional[str] = Query(default=None, description="Filter by crew"),
+    zone_id: Optional[str] = Query(default=None, description="Filter by zone"),
+    db: Session = Depends(get_db),
+    _user = Depends(get_current_user),
+):
+    """Totals over the daily rollup table — cost depends on days × crews, not on route history size."""
+    query = db.query(
+        func.coalesce(func.sum(RouteDailyStatsDB.routes_completed), 0),
+        func.coalesce(func.sum(RouteDailyStatsDB.bins_collected), 0),
+        func.coalesce(func.sum(RouteDailyStatsDB.total_distance_km), 0.0),
+        func.coalesce(func.sum(RouteDailyStatsDB.total_time_minutes), 0.0),
+        func.coalesce(func.sum(RouteDailyStatsDB.efficiency_sum), 0.0),
+    )
+    if from_date:
+        query = query.filter(RouteDailyStatsDB.day >= from_date)
+    if to_date:
+        query = query.filter(RouteDailyStatsDB.day <= to_date)
+    if crew_id:
+        query = query.filter(RouteDailyStatsDB.crew_id == crew_id)
+    if zone_id:
+        query = query.filter(RouteDailyStatsDB.zone_id == zone_id)
+
+    total_routes, bins_collected, distance_km, time_minutes, efficiency_sum = query.one()
+    if not total_routes:
         return {
             "total_routes_completed": 0,
             "total_bins_collected": 0,
@@ -465,17 +752,12 @@ def get_route_analytics(db: Session = Depends(get_db), _user = Depends(get_curre
             "average_time_minutes": 0,
         }
 
-    total_routes = len(history_rows)
     return {
-        "total_routes_completed": total_routes,
-        "total_bins_collected": sum(history.bins_collected for history in history_rows),
-        "total_distance_km": round(sum(history.total_distance_km for history in history_rows), 2),
-        "average_efficiency": round(
-            sum(history.fuel_efficiency_score or 0 for history in history_rows) / total_routes, 3
-        ),
-        "average_time_minutes": round(
-            sum(history.total_time_minutes for history in history_rows) / total_routes, 2
-        ),
+        "total_routes_completed": int(total_routes),
+        "total_bins_collected": int(bins_collected),
+        "total_distance_km": round(float(distance_km), 2),
+        "average_efficiency": round(float(efficiency_sum) / total_routes, 3),
+        "average_time_minutes": round(float(time_minutes) / total_routes, 2),
     }
 
 
@@ -533,7 +815,6 @@ def update_route_status(
 
         route_db.status = "active"
         route_db.started_at = route_db.started_at or now
-        _set_waypoint_defaults(route_db)
         _ensure_route_tasks(route_db, db, activate=True)
         if route_db.crew_id:
             try:
@@ -543,7 +824,6 @@ def update_route_status(
                     route_id=route_db.id,
                     crew_id=route_db.crew_id,
                     bin_count=len(route_db.bin_ids or []),
-                    db=db,
                 )
             except Exception:
                 pass
@@ -559,7 +839,6 @@ def update_route_status(
                 crew_db.status = "break"
 
     elif req.status == "completed":
-        _set_waypoint_defaults(route_db)
         _ensure_route_tasks(route_db, db, activate=True)
         if route_db.started_at is None:
             route_db.started_at = now
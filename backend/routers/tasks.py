@@ -183,22 +183,11 @@ def delete_task(task_id: str, db: Session = Depends(get_db), _admin=Depends(requ
 # ─── Internal helpers ─────────────────────────────────────────────────────────
 
 def _notify_assignment(task_id: str, task_title: str, location: str | None, crew_id: str | None) -> None:
-    """Fire an FCM push notification when a task is assigned. Runs as a background task. Non-fatal."""
+    """Queue an FCM push notification when a task is assigned. Non-blocking, non-fatal."""
     if not crew_id:
         return
     try:
-        from database import SessionLocal
         from services.notifications import notify_task_assigned
-        db = SessionLocal()
-        try:
-            notify_task_assigned(
-                task_id=task_id,
-                task_title=task_title,
-                location=location,
-                crew_id=crew_id,
-                db=db,
-            )
-        finally:
-            db.close()
+        notify_task_assigned(task_id=task_id, task_title=task_title, location=location, crew_id=crew_id)
     except Exception as e:
         logger.warning(f"[FCM] Task assignment notification failed: {e}")
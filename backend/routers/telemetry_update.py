@@ -1,18 +1,22 @@
 """
 routers/telemetry_update.py  —  Phase 2 + Phase 3 update.
 
-Phase 2: IoT devices authenticate with X-API-Key; dashboard/testing with JWT.
+Phase 2: IoT devices authenticate with X-API-Key or a signed X-Device-Token
+         (bound to specific bins); dashboard/testing with JWT.
 Phase 3: After persisting telemetry, broadcast to WebSocket clients and
          fire FCM notifications when a bin crosses the warning threshold.
 Phase 7: Refresh predictions immediately and auto-create pending
          collection tasks for bins predicted to fill soon.
 
-Important: The WebSocket broadcast is fire-and-forget (asyncio.create_task).
-  This keeps the HTTP response fast even if there are many WS clients.
+Important: The WebSocket update is only queued here — readings are folded
+  into one bin_updates frame per batch window, so the HTTP response stays
+  fast and the feed's message rate does not follow the ingest rate.
+  Threshold-crossing push notifications are likewise handed to the
+  notification dispatcher; FCM is never called on the event loop.
 """
 
-import asyncio
 import logging
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from sqlalchemy.orm import Session
@@ -30,6 +34,13 @@ _WARN_THRESHOLD = 80
 _CRIT_THRESHOLD = 90
 
 
+def _require_bin_binding(auth: dict, bin_id: str) -> None:
+    """Signed device tokens may only touch the bins they were minted for."""
+    allowed = auth.get("bin_ids")
+    if allowed is not None and bin_id not in allowed:
+        raise HTTPException(status_code=403, detail=f"Device is not bound to bin {bin_id}")
+
+
 @router.post("/", status_code=202)
 async def ingest_telemetry(
     payload: TelemetryPayload,
@@ -37,6 +48,7 @@ async def ingest_telemetry(
     db: Session = Depends(get_db),
     _auth: dict = Depends(get_device_or_user),
 ):
+    _require_bin_binding(_auth, payload.bin_id)
     bin_db = db.query(BinDB).filter(BinDB.id == payload.bin_id).first()
     if not bin_db:
         raise HTTPException(status_code=404, detail="Bin not registered")
@@ -71,30 +83,26 @@ async def ingest_telemetry(
 
     ts_str = format_timestamp_response(effective_timestamp)
 
-    # ── Phase 3: WebSocket broadcast (non-blocking) ────────────────────────
+    # ── Phase 3: WebSocket feed (batched, non-blocking) ────────────────────
     try:
         from routers.websocket_router import manager
-        asyncio.create_task(
-            manager.broadcast_bin_update(
-                bin_id=payload.bin_id,
-                fill_level_percent=payload.fill_level_percent,
-                status=bin_db.status,
-                battery_percent=bin_db.battery_percent,
-                temperature_c=bin_db.temperature_c,
-                humidity_percent=bin_db.humidity_percent,
-                timestamp=ts_str,
-            )
+        manager.publish_bin_update(
+            bin_id=payload.bin_id,
+            fill_level_percent=payload.fill_level_percent,
+            status=bin_db.status,
+            battery_percent=bin_db.battery_percent,
+            temperature_c=bin_db.temperature_c,
+            humidity_percent=bin_db.humidity_percent,
+            timestamp=ts_str,
+            zone_id=bin_db.zone_id,
         )
     except Exception as e:
-        logger.warning(f"[WS] Broadcast failed for {payload.bin_id}: {e}")
+        logger.warning(f"[WS] Publishing update failed for {payload.bin_id}: {e}")
 
     # ── Phase 3: FCM push notification on threshold crossing (non-blocking) ─
     # Only notify on the crossing event (old < threshold, new >= threshold)
     # to avoid spamming every 30-second reading while bin is already full.
-    new_fill = payload.fill_level_percent
-    asyncio.create_task(
-        _trigger_push_notification_async(old_fill, new_fill, bin_db, db)
-    )
+    _queue_push_notification(old_fill, payload.fill_level_percent, bin_db.id, bin_db.location, bin_db.zone_id)
 
     # ── Feed prediction models (non-blocking via BackgroundTasks) ──────────
     # BUG-01 fix: was a direct sync call inside this async handler, blocking
@@ -121,13 +129,14 @@ async def ingest_telemetry(
     }
 
 
-async def _trigger_push_notification_async(
-    old_fill: int, new_fill: int, bin_db: BinDB, db: Session
+def _queue_push_notification(
+    old_fill: int, new_fill: int, bin_id: str, location: str, zone_id: Optional[str] = None,
 ) -> None:
     """
-    Fire an FCM notification only when the bin crosses a threshold for the
+    Queue an FCM notification only when the bin crosses a threshold for the
     first time (not on every reading while it's already above the threshold).
-    Runs as a background task to avoid blocking the HTTP response.
+    Only enqueues — recipients are resolved and FCM is called on the
+    notification dispatcher's threads with their own DB session.
     """
     try:
         from services.notifications import notify_bin_fill_warning
@@ -136,14 +145,9 @@ async def _trigger_push_notification_async(
         crossed_warning = old_fill < _WARN_THRESHOLD <= new_fill and new_fill < _CRIT_THRESHOLD
 
         if crossed_critical or crossed_warning:
-            notify_bin_fill_warning(
-                bin_id=bin_db.id,
-                location=bin_db.location,
-                fill_level=new_fill,
-                db=db,
-            )
+            notify_bin_fill_warning(bin_id=bin_id, location=location, fill_level=new_fill, zone_id=zone_id)
     except Exception as e:
-        logger.warning(f"[FCM] Notification failed for {bin_db.id}: {e}")
+        logger.warning(f"[FCM] Queueing notification failed for {bin_id}: {e}")
 
 
 def _ingest_prediction_and_sync_tasks(bin_id: str, telemetry_data: dict) -> None:
@@ -166,7 +170,7 @@ def _ingest_prediction_and_sync_tasks(bin_id: str, telemetry_data: dict) -> None
 
 
 # BUG-02 fix: removed dead _trigger_push_notification() (sync variant, was
-# never called — _trigger_push_notification_async is the live version above).
+# never called).  The async variant is now _queue_push_notification above.
 
 
 @router.get("/{bin_id}")
@@ -177,6 +181,7 @@ def get_telemetry_history(
     _auth: dict = Depends(get_device_or_user),
 ):
     """Return the last N telemetry readings for a bin. Requires JWT or IoT API key."""
+    _require_bin_binding(_auth, bin_id)
     bin_db = db.query(BinDB).filter(BinDB.id == bin_id).first()
     if not bin_db:
         raise HTTPException(status_code=404, detail="Bin not found")
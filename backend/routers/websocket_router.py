@@ -5,12 +5,29 @@ How it works:
   1. Dashboard client connects to  ws://host/ws?token=<jwt>
   2. Server validates the JWT; rejects unauthenticated connections.
   3. When a bin's telemetry is ingested (POST /telemetry/), the telemetry
-     router calls  manager.broadcast_bin_update(...)  which pushes the
-     updated state to ALL connected dashboard clients instantly.
+     router calls  manager.queue_bin_update(...).  Readings are folded per
+     bin over a short window (ws_batch_window_ms) and pushed as a single
+     bin_updates frame carrying only the fields that changed since the
+     previous frame, so the feed's message rate is bounded by the window,
+     not by the ingest rate.
   4. The global `manager` instance is imported by telemetry_update.py so
      both modules share the same in-process connection list.
+  5. With several workers, readings and bin→zone changes go through a
+     pub/sub bus (services/realtime_bus.py): every worker publishes and
+     every worker relays what the bus delivers to its own sockets.
 
 Message format sent to clients:
+  {
+    "event": "bin_updates",
+    "updates": [
+      {"bin_id": "bin01", "fill_level_percent": 87, "status": "warning", "timestamp": "..."},
+      {"bin_id": "bin02", "battery_percent": 40, "timestamp": "..."}
+    ]
+  }
+
+  The first frame after a bin is seen carries its full state; later ones
+  only the changed fields (the reading timestamp is always included).
+  broadcast_bin_update() still emits the single-bin, full-state form:
   {
     "event": "bin_update",
     "bin_id": "bin01",
@@ -29,25 +46,241 @@ Message format sent to clients:
     "message": "Bin bin01 is 87% full",
     "timestamp": "..."
   }
+
+After auth a client may narrow its feed (an empty or missing list means
+"no filter" for that dimension; sending a new subscribe replaces the old one):
+  {"type": "subscribe", "zones": ["north"], "bins": ["bin07"], "events": ["bin_alert"]}
+  → {"event": "subscribed", "zones": [...], "bins": [...], "events": [...]}
+followed by a "snapshot" when the new filters cover bins the old ones didn't.
+A bin message reaches a client if the bin is in its `bins` or the bin's zone
+is in its `zones`.  Zones are resolved from an in-memory bin→zone map that is
+loaded at startup and kept current by the bins and telemetry routers.
+
+Frames are JSON text by default.  A client may ask for binary MessagePack
+frames with {"type": "auth", ..., "format": "msgpack"}; the "connected"
+reply echoes the format actually in use (json if msgpack isn't installed).
+Each broadcast is encoded at most once per format, however many clients
+are connected.
 """
 
 import asyncio
 import json
 import logging
-from typing import Dict, List, Optional
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
+import auth_cache
 from config import get_settings
-from database import SessionLocal, UserDB
+from database import BinDB
+from services.realtime_bus import BroadcastBus, InProcessBus
+from utils import format_timestamp_response
+
+try:
+    import orjson
+except ImportError:   # optional — stdlib json is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:   # optional — binary frames are unavailable without it
+    msgpack = None
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 router = APIRouter()
 
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+FRAME_FORMATS = ("json", "msgpack")
+SUBSCRIBABLE_EVENTS = ("bin_update", "bin_updates", "bin_alert")
+# Subscribing to "bin_update" also covers its batched form
+_EVENT_ALIASES = {"bin_updates": "bin_update"}
+BIN_STATE_FIELDS = (
+    "fill_level_percent", "status", "battery_percent", "temperature_c", "humidity_percent", "timestamp",
+)
+MAX_SUBSCRIPTION_ITEMS = 500
+# Frames that carry bin state; losing one leaves the client's view stale
+_STATE_EVENTS = frozenset({"bin_updates", "snapshot"})
+
+
+# ─── Frame encoding ───────────────────────────────────────────────────────────
+
+def _encode_json(message: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+
+def _encode_msgpack(message: dict) -> bytes:
+    return msgpack.packb(message, use_bin_type=True)
+
+
+def negotiate_format(requested: Optional[str]) -> str:
+    """Frame format for a client's request; unknown or unavailable formats fall back to json."""
+    if requested == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+class _Frame:
+    """
+    A message shared by every outbox it is queued in.  The wire encoding for
+    each format is produced on first use and then reused for all clients.
+    """
+
+    __slots__ = ("message", "_text", "_binary")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._text: Optional[str] = None
+        self._binary: Optional[bytes] = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = _encode_json(self.message)
+        return self._text
+
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = _encode_msgpack(self.message)
+        return self._binary
+
+
+def _alert_level(fill_level_percent: int) -> Optional[str]:
+    if fill_level_percent >= 90:
+        return "critical"
+    if fill_level_percent >= 80:
+        return "warning"
+    return None
+
+
+# ─── Per-connection outbox ────────────────────────────────────────────────────
+
+class _ClientConnection:
+    """
+    One connected client: a bounded outbound queue drained by its own writer
+    task, so a client on a slow link only ever delays itself.
+
+    When the queue is full the slow-consumer policy decides what happens:
+      drop_oldest — discard the oldest queued message
+      coalesce    — replace a queued message for the same bin/event with the
+                    newer one; if nothing can be merged, drop the oldest
+      disconnect  — close the connection (the client reconnects and resyncs)
+
+    bin_updates frames only carry the fields that changed, so dropping one
+    would leave the client stale.  A dropped state frame sets `needs_resync`;
+    the manager then replaces the client's queued state frames with one
+    snapshot (see `resync`).
+    """
+
+    def __init__(self, websocket: WebSocket, email: str, max_queue: int, policy: str,
+                 frame_format: str = "json"):
+        self.websocket = websocket
+        self.email = email
+        self.max_queue = max_queue
+        self.policy = policy
+        self.frame_format = frame_format
+        # Subscription filters; empty means "everything" for that dimension
+        self.zones: Set[str] = set()
+        self.bins: Set[str] = set()
+        self.events: Set[str] = set()
+        # Entries are [coalesce_key, frame, enqueued_at]; lists so coalescing can swap the frame in place
+        self._queue: Deque[list] = deque()
+        self._by_key: Dict[tuple, list] = {}
+        self._wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.needs_resync = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.resyncs = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def filters_location(self) -> bool:
+        return bool(self.zones or self.bins)
+
+    def wants_event(self, event: Optional[str]) -> bool:
+        if not self.events or event is None or event in self.events:
+            return True
+        return _EVENT_ALIASES.get(event) in self.events
+
+    def enqueue(self, frame: _Frame, key: Optional[tuple] = None) -> bool:
+        """Queue a frame without blocking. Returns False if the client must be disconnected."""
+        if key is not None and self.policy == "coalesce":
+            pending = self._by_key.get(key)
+            if pending is not None:
+                pending[1] = frame   # keeps its queue position and original enqueue time
+                self.coalesced += 1
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                return False
+            oldest = self._queue.popleft()
+            if oldest[0] is not None and self._by_key.get(oldest[0]) is oldest:
+                del self._by_key[oldest[0]]
+            if oldest[1].message.get("event") in _STATE_EVENTS:
+                self.needs_resync = True
+            self.dropped += 1
+
+        entry = [key, frame, time.monotonic()]
+        self._queue.append(entry)
+        if key is not None:
+            self._by_key[key] = entry
+        self._wakeup.set()
+        return True
+
+    def resync(self, snapshot: _Frame) -> bool:
+        """Replace every queued state frame with `snapshot`, which supersedes them all."""
+        self.needs_resync = False
+        self._queue = deque(e for e in self._queue if e[1].message.get("event") not in _STATE_EVENTS)
+        self.resyncs += 1
+        return self.enqueue(snapshot)
+
+    async def run(self) -> None:
+        """Writer loop: the only coroutine that sends on this socket."""
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            entry = self._queue.popleft()
+            if entry[0] is not None and self._by_key.get(entry[0]) is entry:
+                del self._by_key[entry[0]]
+
+            if self.frame_format == "msgpack":
+                await self.websocket.send_bytes(entry[1].binary())
+            else:
+                await self.websocket.send_text(entry[1].text())
+            self.sent += 1
+            self.last_lag_ms = (time.monotonic() - entry[2]) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "resyncs": self.resyncs,
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+        }
+
 
 # ─── Connection Manager ───────────────────────────────────────────────────────
 
@@ -55,53 +288,280 @@ class ConnectionManager:
     """
     Manages all active WebSocket connections.
 
+    Broadcasting never awaits a socket: messages are appended to each
+    client's bounded outbox and written by that client's writer task.
+
+    Subscriptions are indexed by zone and by bin, so a bin message only
+    touches the clients that asked for that bin or its zone plus the
+    clients with no location filter.
+
     Thread/async safety:
-      FastAPI runs each WebSocket in the same event loop, so the list
-      operations are safe without locks.  For multi-process deployments
-      (e.g. Gunicorn with multiple workers) you'd replace this with
-      Redis Pub/Sub — left as a future improvement comment.
+      FastAPI runs each WebSocket in the same event loop, so the dict
+      operations are safe without locks.  Across processes, publish_*()
+      goes through `self.bus`; its deliveries (this worker's own included)
+      are applied by _on_bus_event.  The default in-process bus keeps the
+      single-worker path a direct call.
     """
 
-    def __init__(self):
-        # Keyed by websocket object; value is the connected user email
-        self._connections: Dict[WebSocket, str] = {}
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        policy: Optional[str] = None,
+        batch_window_ms: Optional[int] = None,
+        replay_size: Optional[int] = None,
+    ):
+        self.max_queue = max_queue or settings.ws_send_queue_size
+        self.policy = policy or settings.ws_slow_consumer_policy
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {self.policy}")
+        # Keyed by websocket object
+        self._connections: Dict[WebSocket, _ClientConnection] = {}
+        self.slow_disconnects = 0
+        # Subscriber index
+        self._unfiltered: Set[_ClientConnection] = set()
+        self._by_zone: Dict[str, Set[_ClientConnection]] = {}
+        self._by_bin: Dict[str, Set[_ClientConnection]] = {}
+        # bin_id → zone_id, so routing a bin message never hits the database
+        self._bin_zones: Dict[str, Optional[str]] = {}
+        # Telemetry batching: latest unsent state per bin, last state sent per bin
+        self.batch_window_ms = settings.ws_batch_window_ms if batch_window_ms is None else batch_window_ms
+        self._pending_updates: Dict[str, dict] = {}
+        self._sent_state: Dict[str, dict] = {}
+        self._alert_levels: Dict[str, Optional[str]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.readings_batched = 0
+        self.batches_flushed = 0
+        # Feed sequence: one number per flushed window, with a replay ring of
+        # (seq, deltas, alerts) so reconnecting clients can catch up from memory
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._replay: Deque[tuple] = deque(maxlen=replay_size or settings.ws_replay_buffer_size)
+        self._snapshot_frame: Optional[tuple] = None   # (seq, frame) for unfiltered clients
+        self.replays = 0
+        self.snapshots = 0
+        self.bus: BroadcastBus = InProcessBus()
+        self.bus.attach(self._on_bus_event)
+
+    # ── Cross-worker bus ──────────────────────────────────────────────────
+
+    async def use_bus(self, bus: BroadcastBus) -> None:
+        """Start `bus` and route publishes through it, stopping the previous one."""
+        bus.attach(self._on_bus_event)
+        await bus.start()
+        previous, self.bus = self.bus, bus
+        await previous.stop()
+        logger.info(f"[WS] Real-time bus: {bus.name}")
+
+    def publish_bin_update(self, **reading) -> None:
+        """Share a telemetry reading with every worker; each one batches it for its clients."""
+        self.bus.publish("bin_update", reading)
+
+    def publish_bin_zone(self, bin_id: str, zone_id: Optional[str], removed: bool = False) -> None:
+        self.bus.publish("bin_zone", {"bin_id": bin_id, "zone_id": zone_id, "removed": removed})
+
+    def _on_bus_event(self, envelope: dict) -> None:
+        kind, data = envelope["kind"], envelope["data"]
+        if kind == "bin_update":
+            self.queue_bin_update(**data)
+        elif kind == "bin_zone":
+            if data.get("removed"):
+                self.forget_bin(data["bin_id"])
+            else:
+                self.set_bin_zone(data["bin_id"], data.get("zone_id"))
+        elif kind == "recipients_changed":
+            # Our own changes are already applied; rebuild only for other workers'
+            if envelope["origin"] != self.bus.origin:
+                from services.recipients import recipients
+                recipients.invalidate()
+        elif not auth_cache.apply_bus_event(kind, data):
+            logger.debug(f"[WS] Ignoring bus event {kind}")
+
+    # ── Bin state cache (zones, last sent state) ──────────────────────────
+
+    def load_bin_state(self, db: Session) -> int:
+        """
+        Seed the bin→zone map and the live-state cache from the bins table in
+        one query.  Called once at startup; afterwards both are kept current
+        from telemetry, so snapshots for reconnecting clients never hit the DB.
+        """
+        rows = db.query(
+            BinDB.id, BinDB.zone_id, BinDB.fill_level_percent, BinDB.status,
+            BinDB.battery_percent, BinDB.temperature_c, BinDB.humidity_percent, BinDB.last_telemetry,
+        ).all()
+        self._bin_zones = {row.id: row.zone_id for row in rows}
+        self._sent_state = {
+            row.id: {
+                "fill_level_percent": row.fill_level_percent,
+                "status": row.status,
+                "battery_percent": row.battery_percent,
+                "temperature_c": row.temperature_c,
+                "humidity_percent": row.humidity_percent,
+                "timestamp": format_timestamp_response(row.last_telemetry) if row.last_telemetry else None,
+            }
+            for row in rows
+        }
+        self._alert_levels = {row.id: _alert_level(row.fill_level_percent or 0) for row in rows}
+        self._snapshot_frame = None
+        return len(rows)
+
+    def set_bin_zone(self, bin_id: str, zone_id: Optional[str]) -> None:
+        self._bin_zones[bin_id] = zone_id
+        self._snapshot_frame = None
+
+    def forget_bin(self, bin_id: str) -> None:
+        self._bin_zones.pop(bin_id, None)
+        self._sent_state.pop(bin_id, None)
+        self._alert_levels.pop(bin_id, None)
+        self._snapshot_frame = None
+
+    def zone_for(self, bin_id: str) -> Optional[str]:
+        return self._bin_zones.get(bin_id)
+
+    # ── Subscriptions ─────────────────────────────────────────────────────
+
+    def _unindex(self, client: _ClientConnection) -> None:
+        self._unfiltered.discard(client)
+        for index, values in ((self._by_zone, client.zones), (self._by_bin, client.bins)):
+            for value in values:
+                subscribers = index.get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del index[value]
+
+    def _index(self, client: _ClientConnection) -> None:
+        if not client.filters_location:
+            self._unfiltered.add(client)
+            return
+        for zone in client.zones:
+            self._by_zone.setdefault(zone, set()).add(client)
+        for bin_id in client.bins:
+            self._by_bin.setdefault(bin_id, set()).add(client)
 
-    async def connect(self, websocket: WebSocket, user_email: str) -> None:
+    def subscribe(
+        self,
+        websocket: WebSocket,
+        zones: Iterable[str] = (),
+        bins: Iterable[str] = (),
+        events: Iterable[str] = (),
+    ) -> dict:
+        """Replace a client's subscription; returns the normalised filters."""
+        client = self._connections.get(websocket)
+        if client is None:
+            return {}
+        self._unindex(client)
+        client.zones, client.bins, client.events = set(zones), set(bins), set(events)
+        self._index(client)
+        return {
+            "zones": sorted(client.zones),
+            "bins": sorted(client.bins),
+            "events": sorted(client.events),
+        }
+
+    def resubscribe(self, websocket: WebSocket, **filters) -> None:
+        """
+        Handle a client's subscribe message: reply with the new filters, then
+        send a snapshot if they bring bins into view the old ones didn't —
+        otherwise those bins would only catch up as each one next reports.
+        """
+        client = self._connections.get(websocket)
+        if client is None:
+            return
+        before = self._followed_bins(client)
+        self._enqueue(client, _Frame({"event": "subscribed", **self.subscribe(websocket, **filters)}))
+        if not self._followed_bins(client) <= before:
+            self._enqueue(client, self._snapshot_for(client))
+
+    def _followed_bins(self, client: _ClientConnection) -> Set[str]:
+        if not client.wants_event("bin_updates"):
+            return set()
+        return {bin_id for bin_id in self._sent_state if self._wants_bin(client, bin_id)}
+
+    def _targets(self, bin_id: Optional[str]) -> Iterable[_ClientConnection]:
+        if bin_id is None:
+            return list(self._connections.values())
+        targets = set(self._unfiltered)
+        targets.update(self._by_bin.get(bin_id, ()))
+        zone_id = self._bin_zones.get(bin_id)
+        if zone_id is not None:
+            targets.update(self._by_zone.get(zone_id, ()))
+        return targets
+
+    async def connect(self, websocket: WebSocket, user_email: str, frame_format: str = "json") -> None:
         # NOTE: websocket.accept() is intentionally NOT called here.
         # The websocket_endpoint already accepts the connection before
         # calling this method, so calling accept() again would raise:
         #   RuntimeError: Expected 'websocket.send'/'websocket.close', got 'websocket.accept'
-        self._connections[websocket] = user_email
+        client = _ClientConnection(websocket, user_email, self.max_queue, self.policy, frame_format)
+        client.writer = asyncio.create_task(self._write(client))
+        self._connections[websocket] = client
+        self._unfiltered.add(client)
         logger.info(f"[WS] {user_email} connected — {len(self._connections)} clients online")
 
     def disconnect(self, websocket: WebSocket) -> None:
-        email = self._connections.pop(websocket, "unknown")
-        logger.info(f"[WS] {email} disconnected — {len(self._connections)} clients online")
+        client = self._connections.pop(websocket, None)
+        if client is None:
+            return
+        self._unindex(client)
+        if client.writer and not client.writer.done() and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        logger.info(f"[WS] {client.email} disconnected — {len(self._connections)} clients online")
+
+    async def _write(self, client: _ClientConnection) -> None:
+        try:
+            await client.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"[WS] Send failed, dropping {client.email}: {e}")
+            self.disconnect(client.websocket)
+
+    def _drop_slow_consumer(self, client: _ClientConnection) -> None:
+        self.slow_disconnects += 1
+        logger.warning(f"[WS] {client.email} fell {client.max_queue} messages behind — disconnecting")
+        self.disconnect(client.websocket)
+
+        async def _close() -> None:
+            try:
+                await client.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            except Exception:
+                pass
+
+        asyncio.create_task(_close())
 
     @property
     def connection_count(self) -> int:
         return len(self._connections)
 
-    async def broadcast(self, message: dict) -> None:
+    def send(self, websocket: WebSocket, message: dict) -> None:
+        """Queue a message for one client (goes through its writer like broadcasts do)."""
+        client = self._connections.get(websocket)
+        if client:
+            self._enqueue(client, _Frame(message))
+
+    async def broadcast(
+        self,
+        message: dict,
+        key: Optional[tuple] = None,
+        bin_id: Optional[str] = None,
+    ) -> None:
         """
-        Send a JSON message to every connected client; drop dead connections.
-        
-        FIXED: Race condition handling — safely removes dead connections even if
-        they were removed concurrently by a disconnect() call from another task.
+        Queue a message for every interested client and return immediately.
+        `key` identifies messages that supersede each other under the coalesce policy.
+        With `bin_id`, only clients subscribed to that bin, its zone, or everything
+        receive it.  The message is wrapped in one shared frame, so it is serialised
+        once per format by whichever writer sends it first.
         """
-        dead: List[WebSocket] = []
-        # Create snapshot of connections at broadcast time
-        for ws in list(self._connections):
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                logger.debug(f"[WS] Send failed, marking connection as dead: {e}")
-                dead.append(ws)
-        
-        # Safely remove dead connections — ignore if already removed
-        for ws in dead:
-            if ws in self._connections:
-                self.disconnect(ws)
+        self._broadcast_now(message, key, bin_id)
+
+    def _broadcast_now(self, message: dict, key: Optional[tuple] = None, bin_id: Optional[str] = None) -> None:
+        frame = _Frame(message)
+        event = message.get("event")
+        for client in list(self._targets(bin_id)):
+            if not client.wants_event(event):
+                continue
+            self._enqueue(client, frame, key)
 
     async def broadcast_bin_update(
         self,
@@ -112,8 +572,14 @@ class ConnectionManager:
         temperature_c: Optional[float],
         humidity_percent: Optional[int],
         timestamp: str,
+        zone_id: Optional[str] = None,
     ) -> None:
-        """Convenience wrapper called by the telemetry router."""
+        """
+        Push one reading immediately as a full-state bin_update (plus a bin_alert
+        at 80/90 %).  Telemetry goes through queue_bin_update() instead.
+        """
+        if zone_id is not None:
+            self._bin_zones[bin_id] = zone_id
         await self.broadcast({
             "event": "bin_update",
             "bin_id": bin_id,
@@ -123,7 +589,7 @@ class ConnectionManager:
             "temperature_c": temperature_c,
             "humidity_percent": humidity_percent,
             "timestamp": timestamp,
-        })
+        }, key=("bin_update", bin_id), bin_id=bin_id)
 
         # Emit a separate alert event if fill crosses a threshold
         if fill_level_percent >= 90:
@@ -133,7 +599,7 @@ class ConnectionManager:
                 "level": "critical",
                 "message": f"Bin {bin_id} is critically full ({fill_level_percent}%)",
                 "timestamp": timestamp,
-            })
+            }, key=("bin_alert", bin_id), bin_id=bin_id)
         elif fill_level_percent >= 80:
             await self.broadcast({
                 "event": "bin_alert",
@@ -141,7 +607,220 @@ class ConnectionManager:
                 "level": "warning",
                 "message": f"Bin {bin_id} is {fill_level_percent}% full — collection recommended",
                 "timestamp": timestamp,
-            })
+            }, key=("bin_alert", bin_id), bin_id=bin_id)
+
+    # ── Batched telemetry ─────────────────────────────────────────────────
+
+    def queue_bin_update(
+        self,
+        bin_id: str,
+        fill_level_percent: int,
+        status: str,
+        battery_percent: Optional[int],
+        temperature_c: Optional[float],
+        humidity_percent: Optional[int],
+        timestamp: str,
+        zone_id: Optional[str] = None,
+    ) -> None:
+        """
+        Record a reading for the next bin_updates frame.  Only the latest state
+        per bin survives the window.  Must be called from the event loop.
+        """
+        if zone_id is not None:
+            self._bin_zones[bin_id] = zone_id
+        self._pending_updates[bin_id] = {
+            "fill_level_percent": fill_level_percent,
+            "status": status,
+            "battery_percent": battery_percent,
+            "temperature_c": temperature_c,
+            "humidity_percent": humidity_percent,
+            "timestamp": timestamp,
+        }
+        self.readings_batched += 1
+
+        if self.batch_window_ms <= 0:
+            self.flush_bin_updates()
+            return
+        loop = asyncio.get_running_loop()
+        # A handle from another (since closed) loop would never fire, e.g. across test clients
+        if self._flush_handle is None or self._flush_loop is not loop:
+            self._flush_loop = loop
+            self._flush_handle = loop.call_later(self.batch_window_ms / 1000, self.flush_bin_updates)
+
+    def flush_bin_updates(self) -> int:
+        """Send the pending window as bin_updates frames. Returns the number of frames queued."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending_updates = self._pending_updates, {}
+        if not pending:
+            return 0
+
+        deltas: Dict[str, dict] = {}
+        alerts: List[dict] = []
+        for bin_id, state in pending.items():
+            previous = self._sent_state.get(bin_id)
+            if previous is None:
+                delta = dict(state)
+            else:
+                delta = {f: state[f] for f in BIN_STATE_FIELDS if previous.get(f) != state[f]}
+            self._sent_state[bin_id] = state
+            if delta:
+                deltas[bin_id] = delta
+
+            alert = self._alert_for(bin_id, state["fill_level_percent"], state["timestamp"])
+            if alert is not None:
+                alerts.append(alert)
+
+        if not deltas and not alerts:
+            return 0
+        self.seq += 1
+        self._replay.append((self.seq, deltas, alerts))
+        for alert in alerts:
+            alert["seq"] = self.seq
+
+        # Clients with the same interest share one frame (and one encoding)
+        wanted: Dict[_ClientConnection, List[str]] = {}
+        for bin_id in deltas:
+            for client in self._targets(bin_id):
+                if client.wants_event("bin_updates"):
+                    wanted.setdefault(client, []).append(bin_id)
+
+        frames: Dict[tuple, _Frame] = {}
+        for client, bin_ids in wanted.items():
+            group = tuple(bin_ids)
+            frame = frames.get(group)
+            if frame is None:
+                frame = frames[group] = _Frame({
+                    "event": "bin_updates",
+                    "seq": self.seq,
+                    "updates": [{"bin_id": bin_id, **deltas[bin_id]} for bin_id in group],
+                })
+            self._enqueue(client, frame)
+
+        for alert in alerts:
+            self._broadcast_now(alert, key=("bin_alert", alert["bin_id"]), bin_id=alert["bin_id"])
+
+        self.batches_flushed += 1
+        return len(frames)
+
+    def _alert_for(self, bin_id: str, fill_level_percent: int, timestamp: str) -> Optional[dict]:
+        """A bin_alert when the bin's alert level changed since the last window, else None."""
+        level = _alert_level(fill_level_percent)
+        if self._alert_levels.get(bin_id) == level:
+            return None
+        self._alert_levels[bin_id] = level
+        if level is None:
+            return None
+        if level == "critical":
+            text = f"Bin {bin_id} is critically full ({fill_level_percent}%)"
+        else:
+            text = f"Bin {bin_id} is {fill_level_percent}% full — collection recommended"
+        return {"event": "bin_alert", "bin_id": bin_id, "level": level, "message": text, "timestamp": timestamp}
+
+    # ── Resume: replay or snapshot ────────────────────────────────────────
+
+    def _wants_bin(self, client: _ClientConnection, bin_id: str) -> bool:
+        if not client.filters_location or bin_id in client.bins:
+            return True
+        zone_id = self._bin_zones.get(bin_id)
+        return zone_id is not None and zone_id in client.zones
+
+    def can_replay(self, last_seq: Optional[int], stream: Optional[str]) -> bool:
+        """True if everything after `last_seq` on `stream` is still in the replay ring."""
+        if stream != self.stream_id or last_seq is None or last_seq > self.seq:
+            return False
+        if last_seq == self.seq:
+            return True
+        return bool(self._replay) and self._replay[0][0] <= last_seq + 1
+
+    def resume(self, websocket: WebSocket, last_seq: Optional[int] = None, stream: Optional[str] = None) -> str:
+        """
+        Bring a freshly connected client up to date from memory: replay the
+        missed windows if they are still buffered, otherwise send a snapshot.
+        Returns "replay" or "snapshot".
+        """
+        client = self._connections.get(websocket)
+        if client is None:
+            return "snapshot"
+        if self.can_replay(last_seq, stream):
+            self._enqueue_replay(client, last_seq)
+            self.replays += 1
+            return "replay"
+        self._enqueue(client, self._snapshot_for(client))
+        self.snapshots += 1
+        return "snapshot"
+
+    def _enqueue(self, client: _ClientConnection, frame: _Frame, key: Optional[tuple] = None) -> None:
+        """Queue for one client; a client that lost a state frame gets a snapshot instead of more deltas."""
+        if not client.enqueue(frame, key):
+            self._drop_slow_consumer(client)
+        elif client.needs_resync and not client.resync(self._snapshot_for(client)):
+            self._drop_slow_consumer(client)
+
+    def _enqueue_replay(self, client: _ClientConnection, last_seq: int) -> None:
+        merged: Dict[str, dict] = {}
+        alerts: List[dict] = []
+        for seq, deltas, window_alerts in self._replay:
+            if seq <= last_seq:
+                continue
+            for bin_id, delta in deltas.items():
+                if self._wants_bin(client, bin_id):
+                    merged.setdefault(bin_id, {}).update(delta)
+            alerts.extend(a for a in window_alerts if self._wants_bin(client, a["bin_id"]))
+
+        if merged and client.wants_event("bin_updates"):
+            self._enqueue(client, _Frame({
+                "event": "bin_updates",
+                "seq": self.seq,
+                "replay": True,
+                "updates": [{"bin_id": bin_id, **delta} for bin_id, delta in merged.items()],
+            }))
+        if client.wants_event("bin_alert"):
+            for alert in alerts:
+                self._enqueue(client, _Frame(alert))
+
+    def _snapshot_for(self, client: _ClientConnection) -> _Frame:
+        """Current state of every bin the client follows; the unfiltered frame is shared per seq."""
+        unfiltered = not client.filters_location and client.wants_event("bin_updates")
+        if unfiltered and self._snapshot_frame is not None and self._snapshot_frame[0] == self.seq:
+            return self._snapshot_frame[1]
+
+        bins = []
+        if client.wants_event("bin_updates"):
+            bins = [
+                {"bin_id": bin_id, "zone_id": self._bin_zones.get(bin_id), **state}
+                for bin_id, state in self._sent_state.items()
+                if self._wants_bin(client, bin_id)
+            ]
+        frame = _Frame({"event": "snapshot", "seq": self.seq, "bins": bins})
+        if unfiltered:
+            self._snapshot_frame = (self.seq, frame)
+        return frame
+
+    def stats(self) -> dict:
+        """Aggregate fan-out metrics (no per-user details — /ws/stats is public)."""
+        clients = [client.stats() for client in self._connections.values()]
+        return {
+            "active_connections": len(clients),
+            "filtered_connections": len(self._connections) - len(self._unfiltered),
+            "slow_consumer_policy": self.policy,
+            "queued_messages": sum(c["queue_depth"] for c in clients),
+            "max_queue_depth": max((c["queue_depth"] for c in clients), default=0),
+            "dropped_messages": sum(c["dropped"] for c in clients),
+            "coalesced_messages": sum(c["coalesced"] for c in clients),
+            "resyncs": sum(c["resyncs"] for c in clients),
+            "slow_consumer_disconnects": self.slow_disconnects,
+            "max_lag_ms": max((c["max_lag_ms"] for c in clients), default=0.0),
+            "batch_window_ms": self.batch_window_ms,
+            "readings_batched": self.readings_batched,
+            "batches_flushed": self.batches_flushed,
+            "seq": self.seq,
+            "replay_buffered": len(self._replay),
+            "resumes_replayed": self.replays,
+            "resumes_snapshot": self.snapshots,
+            "bus": self.bus.stats(),
+        }
 
 
 # ── Singleton shared across this process ──────────────────────────────────────
@@ -151,7 +830,11 @@ manager = ConnectionManager()
 # ─── Auth helper ─────────────────────────────────────────────────────────────
 
 def _verify_ws_token(token: str) -> Optional[str]:
-    """Validate a WebSocket JWT; return the user email on success, None on failure."""
+    """
+    Validate a WebSocket JWT; return the user email on success, None on failure.
+    Revocation is checked against the in-memory set (BE-06: revoked tokens from
+    logout cannot open new connections), so this normally costs no DB round-trip.
+    """
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
@@ -159,25 +842,30 @@ def _verify_ws_token(token: str) -> Optional[str]:
             return None
         if payload.get("type", "access") != "access":
             return None
-        # BE-06 fix: check the token blacklist so revoked tokens (from logout)
-        # cannot be used to open new WebSocket connections.
         jti = payload.get("jti")
-        if jti:
-            db = SessionLocal()
-            try:
-                from database import TokenBlacklistDB
-                revoked = db.query(TokenBlacklistDB).filter(
-                    TokenBlacklistDB.token_jti == jti
-                ).first()
-                if revoked:
-                    return None
-            finally:
-                db.close()
+        if jti and auth_cache.revoked_tokens.is_revoked(jti):
+            return None
         return email
     except JWTError:
         return None
 
 
+def _parse_subscription(msg: dict) -> dict:
+    """Validate a subscribe message; raises ValueError with a client-facing reason."""
+    filters = {}
+    for field in ("zones", "bins", "events"):
+        values = msg.get(field) or []
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"'{field}' must be a list of strings")
+        if len(values) > MAX_SUBSCRIPTION_ITEMS:
+            raise ValueError(f"'{field}' may list at most {MAX_SUBSCRIPTION_ITEMS} items")
+        filters[field] = values
+    unknown = set(filters["events"]) - set(SUBSCRIBABLE_EVENTS)
+    if unknown:
+        raise ValueError(f"Unknown events: {', '.join(sorted(unknown))}")
+    return filters
+
+
 # ─── WebSocket endpoint ───────────────────────────────────────────────────────
 
 @router.websocket("/ws")
@@ -189,10 +877,19 @@ async def websocket_endpoint(websocket: WebSocket):
     logged in plaintext by every proxy and access log.  Instead the client
     sends the token as the first message after the connection is accepted:
       1. Connect to ws://host/ws  (no query params)
-      2. Send: {"type": "auth", "token": "<access_jwt>"}
-      3. Receive {"event": "connected", ...} on success, or
-               {"event": "auth_error", "reason": "..."} then connection closes.
-
+      2. Send: {"type": "auth", "token": "<access_jwt>"}, optionally with
+           "format": "msgpack"              binary frames
+           "zones"/"bins"/"events": [...]   initial subscription
+           "stream": "...", "last_seq": N   resume after a reconnect
+      3. Receive {"event": "connected", "stream", "seq", "resume", ...} on
+         success, or {"event": "auth_error", "reason": "..."} then the
+         connection closes.
+      4. Receive either the bin_updates/bin_alert frames missed since
+         last_seq (resume="replay") or {"event": "snapshot", "seq", "bins"}
+         with the current state of every followed bin (resume="snapshot").
+
+    Every bin_updates / bin_alert / snapshot frame carries `seq`; clients keep
+    the highest one and the `stream` id, and send both when reconnecting.
     The client should handle reconnection with exponential back-off.
     """
     # Accept the upgrade first so we can exchange messages for authentication.
@@ -202,44 +899,70 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         raw = await asyncio.wait_for(websocket.receive_text(), timeout=10.0)
         msg = json.loads(raw)
-        if msg.get("type") != "auth":
+        if not isinstance(msg, dict) or msg.get("type") != "auth":
             raise ValueError("First message must have type='auth'")
         token = msg.get("token", "")
+        frame_format = negotiate_format(msg.get("format"))
     except (asyncio.TimeoutError, ValueError, json.JSONDecodeError):
         await websocket.send_json({"event": "auth_error", "reason": "Authentication required"})
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
+    try:
+        filters = _parse_subscription(msg)
+    except ValueError as e:
+        await websocket.send_json({"event": "auth_error", "reason": str(e)})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    last_seq = msg.get("last_seq")
+    if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+        last_seq = None
+
     email = _verify_ws_token(token)
     if not email:
         await websocket.send_json({"event": "auth_error", "reason": "Invalid or expired token"})
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    # Verify user still exists and is active in DB.
-    db: Session = SessionLocal()
-    try:
-        user = db.query(UserDB).filter(UserDB.email == email, UserDB.is_active == True).first()
-        if not user:
-            await websocket.send_json({"event": "auth_error", "reason": "User not found or disabled"})
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-    finally:
-        db.close()
+    # Verify the user still exists and is active (served from the short-TTL user cache).
+    if not auth_cache.active_users.is_active(email):
+        await websocket.send_json({"event": "auth_error", "reason": "User not found or disabled"})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-    await manager.connect(websocket, email)
+    await manager.connect(websocket, email, frame_format)
 
     try:
-        await websocket.send_json({
+        if any(filters.values()):
+            manager.subscribe(websocket, **filters)
+        resume = "replay" if manager.can_replay(last_seq, msg.get("stream")) else "snapshot"
+        manager.send(websocket, {
             "event": "connected",
             "message": "Connected to Smart Waste real-time feed",
             "active_connections": manager.connection_count,
+            "format": frame_format,
+            "stream": manager.stream_id,
+            "seq": manager.seq,
+            "resume": resume,
         })
+        manager.resume(websocket, last_seq if resume == "replay" else None, msg.get("stream"))
 
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_json({"event": "pong"})
+                manager.send(websocket, {"event": "pong"})
+                continue
+            try:
+                msg = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "subscribe":
+                try:
+                    filters = _parse_subscription(msg)
+                except ValueError as e:
+                    manager.send(websocket, {"event": "error", "reason": str(e)})
+                    continue
+                manager.resubscribe(websocket, **filters)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -250,5 +973,5 @@ async def websocket_endpoint(websocket: WebSocket):
 
 @router.get("/ws/stats")
 def websocket_stats():
-    """Quick health check — how many clients are currently connected."""
-    return {"active_connections": manager.connection_count}
\ No newline at end of file
+    """Quick health check — connected clients plus send-queue / lag metrics."""
+    return manager.stats()
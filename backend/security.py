@@ -2,45 +2,58 @@
 security.py — Security hardening for the Smart Waste Management API.
 
 Includes:
-  - SecurityHeadersMiddleware   : adds standard HTTP security headers
-  - RateLimitMiddleware         : per-IP request throttling (general API)
-  - AuthRateLimitMiddleware     : stricter throttling on /auth/* endpoints
-  - InputValidationMiddleware   : rejects oversized request bodies
-  - PasswordPolicy              : enforces strong passwords at signup
-
-NOTE — rate limiter storage:
-  Request counters are stored in-memory per process. In a multi-worker
-  deployment (e.g. Gunicorn with 4 workers) each worker maintains its own
-  counter, so the effective limit is requests_per_minute × worker_count.
-  For single-worker or development use this is fine. For production with
-  multiple workers, replace the dict storage with Redis.
+  - SecurityMiddleware   : one pure-ASGI middleware doing, in order,
+      · per-IP request throttling (general API / dashboard), or, for sensor
+        ingestion on /telemetry with an API key or device token, throttling
+        per credential and per gateway IP instead
+      · stricter throttling and failure lockout on /auth/* endpoints
+      · rejection of oversized request bodies (Content-Length > 10 MB)
+      · standard HTTP security headers on every response
+  - PasswordPolicy       : enforces strong passwords at signup
+
+SecurityMiddleware replaces four BaseHTTPMiddleware layers.  It never wraps
+the request or response body — it only looks at the scope and rewrites the
+headers of http.response.start — so streaming responses (report downloads)
+pass straight through and a request costs a few dict operations.  WebSocket
+and lifespan scopes are not touched at all.
+
+Response headers, as before:
+  - app responses get the security headers plus X-RateLimit-*;
+  - 413 and /auth/* 429 responses get X-RateLimit-* only;
+  - general and ingestion 429 responses get neither.
+  X-RateLimit-* describe the per-device limit on identified ingestion
+  requests, otherwise the general limit when it is enabled, otherwise the
+  /auth/* limit on /auth/* paths.
+
+Rate limits are sliding-window counters (services/rate_limit_store.py): two
+counts per key, O(1) per request whatever the limit.  The store is chosen by
+settings.rate_limit_backend — `memory` keeps counters per worker (so with 4
+workers the effective limit is 4 × requests_per_minute), `shared` and
+`redis` share them between workers.  The memory store is LRU-bounded at
+settings.rate_limit_max_keys, so an IP flood cannot grow it without limit.
 """
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime
-from collections import defaultdict
+import logging
+import math
 import time
-from typing import Dict, Tuple
+from typing import Callable, List, Optional, Tuple
 
+from services.rate_limit_store import MemoryRateLimitStore, RateLimitStore
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Adds standard HTTP security headers to every response."""
+logger = logging.getLogger(__name__)
 
-    async def dispatch(self, request: Request, call_next):
-        # BaseHTTPMiddleware must not intercept WebSocket upgrade requests —
-        # doing so corrupts the ASGI send/receive channels for the WS protocol.
-        if request.scope["type"] == "websocket":
-            return await call_next(request)
+Headers = List[Tuple[bytes, bytes]]
 
-        response = await call_next(request)
-
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Content-Security-Policy"] = (
+_SECURITY_HEADERS: Headers = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in (
+        ("X-Content-Type-Options", "nosniff"),
+        ("X-Frame-Options", "DENY"),
+        ("X-XSS-Protection", "1; mode=block"),
+        ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+        ("Content-Security-Policy", (
             "default-src 'self'; "
             "script-src 'self' 'unsafe-inline' https://www.gstatic.com; "
             "style-src 'self' 'unsafe-inline' https://unpkg.com; "
@@ -48,108 +61,102 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "connect-src 'self' https://www.google-analytics.com https://*.vercel-insights.com wss:; "
             "font-src 'self' data:; "
             "frame-ancestors 'none'"
-        )
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        response.headers["Server"] = "SmartWaste/1.0"
+        )),
+        ("Referrer-Policy", "strict-origin-when-cross-origin"),
+        ("Permissions-Policy", "geolocation=(), microphone=(), camera=()"),
+        ("Server", "SmartWaste/1.0"),
+    )
+]
 
-        return response
+_AUTH_PREFIX = "/auth/"
+_INGEST_PATH = "/telemetry"
+_AUTH_FAILURE_STATUSES = frozenset({400, 401, 422})
+_MAX_BODY_BYTES = 10 * 1024 * 1024  # 10 MB
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """
-    Per-IP rate limiting for the general API.
-    Default: 200 requests per minute (set higher to accommodate IoT devices).
-    """
+def _is_ingest(path: str) -> bool:
+    return path.startswith(_INGEST_PATH) and (len(path) == len(_INGEST_PATH) or path[len(_INGEST_PATH)] == "/")
 
-    def __init__(self, app: FastAPI, requests_per_minute: int = 60):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = 300
-        self.last_cleanup = time.time()
 
-    async def dispatch(self, request: Request, call_next):
-        if request.scope["type"] == "websocket":
-            return await call_next(request)
+def _with_headers(raw: Headers, extra: Headers) -> Headers:
+    """`raw` with every header named in `extra` replaced by `extra`'s value."""
+    if not extra:
+        return raw
+    names = {name for name, _ in extra}
+    return [(name, value) for name, value in raw if name.lower() not in names] + extra
 
-        client_ip = request.client.host if request.client else "unknown"
 
-        now = time.time()
-        if now - self.last_cleanup > self.cleanup_interval:
-            self._cleanup_old_entries(now)
-            self.last_cleanup = now
+def _sliding_count(counts: Tuple[int, int], window: int, now: float) -> float:
+    """Requests in the last `window` seconds, estimated from two fixed windows."""
+    previous, current = counts
+    return previous * (1.0 - (now % window) / window) + current
 
-        minute_ago = now - 60
-        self.requests[client_ip] = [
-            t for t in self.requests[client_ip] if t > minute_ago
-        ]
 
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            return JSONResponse(
-                status_code=429,
-                content={
-                    "error": "Too many requests",
-                    "message": f"Rate limit exceeded: {self.requests_per_minute} requests per minute",
-                    "retry_after": 60,
-                },
-                headers={"Retry-After": "60"},
-            )
+async def _take(store: RateLimitStore, key: str, limit: int, window: int, now: float) -> Optional[int]:
+    """Count one request against `key`; requests remaining, or None if over `limit` (nothing counted)."""
+    used = _sliding_count(await store.add(key, window, 1, now), window, now)
+    if used > limit:
+        await store.add(key, window, -1, now)
+        return None
+    return max(0, limit - math.ceil(used))
+
+
+def _too_many(message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many requests", "message": message, "retry_after": 60},
+        headers={"Retry-After": "60"},
+    )
+
+
+class RequestRateLimiter:
+    """
+    Per-IP rate limiting for the general API.
+    Default: 200 requests per minute (set higher to accommodate IoT devices).
+    """
 
-        self.requests[client_ip].append(now)
+    window = 60
 
-        response = await call_next(request)
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(
-            self.requests_per_minute - len(self.requests[client_ip])
-        )
-        return response
+    def __init__(self, requests_per_minute: int = 60, store: Optional[RateLimitStore] = None):
+        self.requests_per_minute = requests_per_minute
+        self.store = store or MemoryRateLimitStore()
+        self._limit_header = str(requests_per_minute).encode()
+
+    async def hit(self, client_ip: str, now: float) -> Optional[int]:
+        """Count the request; requests remaining, or None if the IP is over its limit (nothing counted)."""
+        return await _take(self.store, "req:" + client_ip, self.requests_per_minute, self.window, now)
+
+    def rejection(self) -> JSONResponse:
+        return _too_many(f"Rate limit exceeded: {self.requests_per_minute} requests per minute")
 
-    def _cleanup_old_entries(self, current_time: float):
-        cutoff = current_time - 3600
-        for ip in list(self.requests.keys()):
-            self.requests[ip] = [t for t in self.requests[ip] if t > cutoff]
-            if not self.requests[ip]:
-                del self.requests[ip]
+    def headers(self, remaining: int) -> Headers:
+        return [(b"x-ratelimit-limit", self._limit_header), (b"x-ratelimit-remaining", str(remaining).encode())]
 
 
-class AuthRateLimitMiddleware(BaseHTTPMiddleware):
+class AuthRateLimiter:
     """
     Stricter rate limiting for /auth/* endpoints.
     Limits: 5 requests per minute per IP.
     Progressive lockout: 5-minute lockout after 10 failed attempts.
     """
 
-    def __init__(self, app: FastAPI, requests_per_minute: int = 5):
-        super().__init__(app)
+    window = 60
+
+    def __init__(self, requests_per_minute: int = 5, store: Optional[RateLimitStore] = None):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.failed_attempts: Dict[str, list] = defaultdict(list)
+        self.store = store or MemoryRateLimitStore()
         self.lockout_threshold = 10
         self.lockout_duration = 300   # 5 minutes
-        self.cleanup_interval = 300
-        self.last_cleanup = time.time()
-
-    async def dispatch(self, request: Request, call_next):
-        if request.scope["type"] == "websocket":
-            return await call_next(request)
-
-        if not request.url.path.startswith("/auth/"):
-            return await call_next(request)
-
-        client_ip = request.client.host if request.client else "unknown"
-        now = time.time()
-
-        if now - self.last_cleanup > self.cleanup_interval:
-            self._cleanup_old_entries(now)
-            self.last_cleanup = now
+        self._limit_header = str(requests_per_minute).encode()
 
+    async def check(self, client_ip: str, now: float) -> Tuple[Optional[JSONResponse], int]:
+        """
+        Count the request.  Returns (the 429 to send instead if the IP is
+        locked out or over its limit, requests remaining).
+        """
         # Check lockout
-        recent_failures = [
-            t for t in self.failed_attempts.get(client_ip, [])
-            if t > now - self.lockout_duration
-        ]
-        if len(recent_failures) >= self.lockout_threshold:
+        failures = await self.store.add("fail:" + client_ip, self.lockout_duration, 0, now)
+        if _sliding_count(failures, self.lockout_duration, now) >= self.lockout_threshold:
             return JSONResponse(
                 status_code=429,
                 content={
@@ -158,15 +165,11 @@ class AuthRateLimitMiddleware(BaseHTTPMiddleware):
                     "retry_after": self.lockout_duration,
                 },
                 headers={"Retry-After": str(self.lockout_duration)},
-            )
+            ), 0
 
         # Check per-minute rate limit
-        minute_ago = now - 60
-        self.requests[client_ip] = [
-            t for t in self.requests[client_ip] if t > minute_ago
-        ]
-
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
+        remaining = await _take(self.store, "auth:" + client_ip, self.requests_per_minute, self.window, now)
+        if remaining is None:
             return JSONResponse(
                 status_code=429,
                 content={
@@ -175,51 +178,173 @@ class AuthRateLimitMiddleware(BaseHTTPMiddleware):
                     "retry_after": 60,
                 },
                 headers={"Retry-After": "60"},
-            )
-
-        self.requests[client_ip].append(now)
-
-        response = await call_next(request)
-
-        if response.status_code in (400, 401, 422):
-            self.failed_attempts[client_ip].append(now)
+            ), 0
 
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(
-            max(0, self.requests_per_minute - len(self.requests[client_ip]))
-        )
-        return response
+        return None, remaining
 
-    def _cleanup_old_entries(self, current_time: float):
-        cutoff = current_time - 3600
-        for mapping in (self.requests, self.failed_attempts):
-            for ip in list(mapping.keys()):
-                mapping[ip] = [t for t in mapping[ip] if t > cutoff]
-                if not mapping[ip]:
-                    del mapping[ip]
+    async def record_failure(self, client_ip: str, now: float) -> None:
+        await self.store.add("fail:" + client_ip, self.lockout_duration, 1, now)
 
+    def headers(self, remaining: int) -> Headers:
+        return [(b"x-ratelimit-limit", self._limit_header), (b"x-ratelimit-remaining", str(remaining).encode())]
 
-class InputValidationMiddleware(BaseHTTPMiddleware):
-    """Rejects requests with a Content-Length above 10 MB."""
 
-    _MAX_BYTES = 10 * 1024 * 1024  # 10 MB
+class IngestRateLimiter:
+    """
+    Budgets for sensor ingestion on /telemetry, keyed by credential instead of
+    IP.  Each API key or device token gets `device_per_minute`; each source
+    address gets `gateway_per_minute` across all of its devices, so a gateway
+    fronting hundreds of bins behind one NAT address is not throttled like a
+    single browser.  Ingestion does not draw on the per-IP dashboard budget.
+
+    `identify(api_key, device_token)` names the credential ("key:<id>") or
+    returns None; it must not touch the database.  Requests it cannot
+    identify, including any it raises on, are limited per IP like any other
+    request.
+    """
 
-    async def dispatch(self, request: Request, call_next):
-        if request.scope["type"] == "websocket":
-            return await call_next(request)
+    window = 60
+
+    def __init__(
+        self,
+        identify: Callable[[Optional[str], Optional[str]], Optional[str]],
+        device_per_minute: int = 20,
+        gateway_per_minute: int = 3000,
+        store: Optional[RateLimitStore] = None,
+    ):
+        self.identify = identify
+        self.device_per_minute = device_per_minute
+        self.gateway_per_minute = gateway_per_minute
+        self.store = store or MemoryRateLimitStore()
+        self._limit_header = str(device_per_minute).encode()
+
+    def identity(self, scope) -> Optional[str]:
+        api_key = device_token = None
+        for name, value in scope["headers"]:
+            if name == b"x-device-token":
+                device_token = value.decode("latin-1")
+            elif name == b"x-api-key":
+                api_key = value.decode("latin-1")
+        if api_key is None and device_token is None:
+            return None
+        try:
+            return self.identify(api_key, device_token)
+        except Exception as e:
+            # A header that cannot be parsed is just unidentified: limit it per IP
+            logger.debug(f"[ratelimit] Could not identify ingestion credential: {e!r}")
+            return None
+
+    async def hit(self, identity: str, client_ip: str, now: float) -> Tuple[Optional[JSONResponse], int]:
+        """Count the request against the device and its gateway; (the 429 to send instead, requests remaining)."""
+        device_key = "dev:" + identity
+        remaining = await _take(self.store, device_key, self.device_per_minute, self.window, now)
+        if remaining is None:
+            return _too_many(f"Device rate limit exceeded: {self.device_per_minute} requests per minute"), 0
+        if await _take(self.store, "gw:" + client_ip, self.gateway_per_minute, self.window, now) is None:
+            await self.store.add(device_key, self.window, -1, now)
+            return _too_many(f"Gateway rate limit exceeded: {self.gateway_per_minute} requests per minute"), 0
+        return None, remaining
+
+    def headers(self, remaining: int) -> Headers:
+        return [(b"x-ratelimit-limit", self._limit_header), (b"x-ratelimit-remaining", str(remaining).encode())]
+
+
+class SecurityMiddleware:
+    """Rate limits, body size check and security headers as one ASGI layer."""
+
+    def __init__(
+        self,
+        app,
+        enable_rate_limiting: bool = True,
+        enable_auth_rate_limiting: bool = True,
+        requests_per_minute: int = 60,
+        auth_requests_per_minute: int = 5,
+        max_body_bytes: int = _MAX_BODY_BYTES,
+        store: Optional[RateLimitStore] = None,
+        identify_device: Optional[Callable[[Optional[str], Optional[str]], Optional[str]]] = None,
+        device_requests_per_minute: int = 20,
+        gateway_requests_per_minute: int = 3000,
+    ):
+        self.app = app
+        store = store or MemoryRateLimitStore()
+        self.general = RequestRateLimiter(requests_per_minute, store) if enable_rate_limiting else None
+        self.auth = AuthRateLimiter(auth_requests_per_minute, store) if enable_auth_rate_limiting else None
+        self.ingest = None
+        if enable_rate_limiting and identify_device is not None:
+            self.ingest = IngestRateLimiter(
+                identify_device, device_requests_per_minute, gateway_requests_per_minute, store
+            )
+        self.max_body_bytes = max_body_bytes
 
-        content_length = request.headers.get("content-length")
-        if content_length:
-            try:
-                if int(content_length) > self._MAX_BYTES:
-                    return JSONResponse(
-                        status_code=413,
-                        content={"error": "Payload too large", "max_bytes": self._MAX_BYTES},
-                    )
-            except (ValueError, TypeError):
-                pass
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        return await call_next(request)
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        now = time.time()
+        general = self.general
+        auth = self.auth if self.auth is not None and scope["path"].startswith(_AUTH_PREFIX) else None
+
+        rate_headers: Headers = []
+        ingest = self.ingest
+        device = ingest.identity(scope) if ingest is not None and _is_ingest(scope["path"]) else None
+        if device is not None:
+            rejection, remaining = await ingest.hit(device, client_ip, now)
+            if rejection is not None:
+                await rejection(scope, receive, send)
+                return
+            rate_headers = ingest.headers(remaining)
+            general = None
+        elif general is not None:
+            remaining = await general.hit(client_ip, now)
+            if remaining is None:
+                await general.rejection()(scope, receive, send)
+                return
+            rate_headers = general.headers(remaining)
+
+        async def send_with(message, extra: Headers):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": _with_headers(list(message.get("headers", ())), extra)}
+            await send(message)
+
+        if auth is not None:
+            rejection, remaining = await auth.check(client_ip, now)
+            if rejection is not None:
+                await rejection(scope, receive, lambda m: send_with(m, rate_headers))
+                return
+            if not rate_headers:
+                rate_headers = auth.headers(remaining)
+
+        if self._too_large(scope):
+            too_large = JSONResponse(
+                status_code=413,
+                content={"error": "Payload too large", "max_bytes": self.max_body_bytes},
+            )
+            await too_large(scope, receive, lambda m: send_with(m, rate_headers))
+            return
+
+        async def send_response(message):
+            if message["type"] == "http.response.start":
+                if auth is not None and message["status"] in _AUTH_FAILURE_STATUSES:
+                    await auth.record_failure(client_ip, now)
+                message = {
+                    **message,
+                    "headers": _with_headers(_with_headers(list(message.get("headers", ())), _SECURITY_HEADERS), rate_headers),
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_response)
+
+    def _too_large(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    return int(value) > self.max_body_bytes
+                except ValueError:
+                    return False
+        return False
 
 
 def add_security_to_app(
@@ -227,22 +352,36 @@ def add_security_to_app(
     enable_rate_limiting: bool = True,
     enable_auth_rate_limiting: bool = True,
     requests_per_minute: int = 60,
+    store: Optional[RateLimitStore] = None,
+    identify_device: Optional[Callable[[Optional[str], Optional[str]], Optional[str]]] = None,
+    device_requests_per_minute: int = 20,
+    gateway_requests_per_minute: int = 3000,
 ):
     """
-    Attach all security middleware to the FastAPI application.
+    Attach the security middleware to the FastAPI application.
 
     Args:
         app: FastAPI application instance
-        enable_rate_limiting: Whether to enable general rate limiting
+        enable_rate_limiting: Whether to enable general and ingestion rate limiting
         enable_auth_rate_limiting: Whether to enable /auth/* throttling
-        requests_per_minute: General API rate limit (per IP, per worker)
+        requests_per_minute: General (dashboard) API rate limit (per IP)
+        store: Counter storage shared by all limiters (default: per-worker memory)
+        identify_device: Credential identity for /telemetry ingestion budgets;
+            None limits ingestion per IP like everything else
+        device_requests_per_minute: Ingestion limit per API key / device token
+        gateway_requests_per_minute: Ingestion limit per source IP
     """
-    app.add_middleware(SecurityHeadersMiddleware)
-    app.add_middleware(InputValidationMiddleware)
-    if enable_auth_rate_limiting:
-        app.add_middleware(AuthRateLimitMiddleware, requests_per_minute=5)
-    if enable_rate_limiting:
-        app.add_middleware(RateLimitMiddleware, requests_per_minute=requests_per_minute)
+    app.add_middleware(
+        SecurityMiddleware,
+        enable_rate_limiting=enable_rate_limiting,
+        enable_auth_rate_limiting=enable_auth_rate_limiting,
+        requests_per_minute=requests_per_minute,
+        auth_requests_per_minute=5,
+        store=store,
+        identify_device=identify_device,
+        device_requests_per_minute=device_requests_per_minute,
+        gateway_requests_per_minute=gateway_requests_per_minute,
+    )
 
 
 class PasswordPolicy:
@@ -0,0 +1,221 @@
+"""
+services/alert_digest.py  —  Coalescing of bin fill alerts per recipient.
+
+On market days dozens of bins cross 80 % within minutes, and one push per bin
+per admin wakes every phone dozens of times.  Each recipient instead gets a
+window of `window_seconds`:
+
+  - the first alert of a window is sent at once (quiet periods keep their
+    latency),
+  - further alerts in the window are held,
+  - when the window closes, one digest covering every bin of the window —
+    "12 bins need collection in Zone North" with the bins in the data
+    payload — is sent if it held a bin that wasn't already delivered in the
+    window (a bin crossing again after its own alert doesn't warrant one).
+
+Alerts at or above `bypass_severity` ("critical" by default, "warning" to
+bypass everything, "none" to coalesce everything) are never held.  A window
+length of 0 disables coalescing.
+
+A single daemon thread waits for the earliest window to close and hands the
+closed windows to `on_due` (the notification dispatcher), so nothing here
+talks to FCM or the database.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+SEVERITIES = ("warning", "critical")
+BYPASS_CHOICES = ("critical", "warning", "none")
+MAX_DIGEST_BINS = 50        # keeps the data payload well under FCM's 4 KB limit
+
+
+def severity_for(fill_level: int) -> str:
+    return "critical" if fill_level >= 90 else "warning"
+
+
+def zone_label(zone_id: Optional[str]) -> str:
+    return f"Zone {zone_id.replace('_', ' ').title()}" if zone_id else "unassigned zones"
+
+
+@dataclass
+class BinAlert:
+    bin_id: str
+    location: str
+    fill_level: int
+    zone_id: Optional[str] = None
+
+    @property
+    def severity(self) -> str:
+        return severity_for(self.fill_level)
+
+
+@dataclass
+class _Window:
+    closes_at: float
+    tokens: Tuple[str, ...]
+    alerts: Dict[str, BinAlert] = field(default_factory=dict)
+    sent: Set[str] = field(default_factory=set)      # bins delivered immediately
+    held: Set[str] = field(default_factory=set)      # bins held for the digest
+
+    @property
+    def needs_digest(self) -> bool:
+        return bool(self.held - self.sent)
+
+
+# (recipient, tokens, alerts of the window)
+ClosedWindow = Tuple[Hashable, Tuple[str, ...], List[BinAlert]]
+
+
+class AlertCoalescer:
+
+    def __init__(
+        self,
+        window_seconds: float,
+        bypass_severity: str = "critical",
+        on_due: Optional[Callable[[List[ClosedWindow]], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if bypass_severity not in BYPASS_CHOICES:
+            raise ValueError(f"bypass_severity must be one of {BYPASS_CHOICES}")
+        self.window = window_seconds
+        self.bypass_severity = bypass_severity
+        self._on_due = on_due
+        self._clock = clock
+        self._windows: Dict[Hashable, _Window] = {}
+        self._closed: List[ClosedWindow] = []       # superseded before the flusher got to them
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        self.sent_now = 0
+        self.held = 0
+        self.digests = 0
+
+    def bypasses(self, alert: BinAlert) -> bool:
+        if self.bypass_severity == "none":
+            return False
+        return SEVERITIES.index(alert.severity) >= SEVERITIES.index(self.bypass_severity)
+
+    def offer(self, recipient: Hashable, tokens: Sequence[str], alert: BinAlert) -> bool:
+        """True if `alert` should go to `recipient` now, False if it is held for the digest."""
+        if self.window <= 0:
+            self.sent_now += 1
+            return True
+        now = self._clock()
+        with self._cond:
+            window = self._windows.get(recipient)
+            if window is None or now >= window.closes_at:
+                if window is not None and window.needs_digest:
+                    self._closed.append((recipient, window.tokens, list(window.alerts.values())))
+                self._windows[recipient] = _Window(
+                    now + self.window, tuple(tokens), {alert.bin_id: alert}, sent={alert.bin_id}
+                )
+                self._ensure_flusher()
+                self._cond.notify()
+                self.sent_now += 1
+                return True
+            window.alerts[alert.bin_id] = alert      # latest reading per bin
+            window.tokens = tuple(tokens)
+            if self.bypasses(alert):
+                window.sent.add(alert.bin_id)
+                self.sent_now += 1
+                return True
+            window.held.add(alert.bin_id)
+            self.held += 1
+            return False
+
+    def take_due(self, everything: bool = False) -> List[ClosedWindow]:
+        """Remove closed windows; return those that need a digest."""
+        now = self._clock()
+        with self._cond:
+            return self._take_due_locked(now, everything)
+
+    def _take_due_locked(self, now: float, everything: bool) -> List[ClosedWindow]:
+        closed, self._closed = self._closed, []
+        for recipient in [r for r, w in self._windows.items() if everything or w.closes_at <= now]:
+            window = self._windows.pop(recipient)
+            if window.needs_digest:
+                closed.append((recipient, window.tokens, list(window.alerts.values())))
+        self.digests += len(closed)
+        return closed
+
+    # ── Flusher thread ─────────────────────────────────────────────────────────
+
+    def _ensure_flusher(self) -> None:
+        if self._on_due is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="alert-digest", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._windows and not self._closed:
+                    self._cond.wait()
+                    continue
+                delay = 0 if self._closed else min(w.closes_at for w in self._windows.values()) - self._clock()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                closed = self._take_due_locked(self._clock(), everything=False)
+            if closed:
+                self._on_due(closed)
+
+    def stop(self) -> None:
+        """Stop the flusher and hand over every window still holding alerts."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            closed = self._take_due_locked(self._clock(), everything=True)
+        if closed and self._on_due is not None:
+            self._on_due(closed)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "window_s": self.window,
+                "bypass_severity": self.bypass_severity,
+                "open_windows": len(self._windows),
+                "sent_now": self.sent_now,
+                "held": self.held,
+                "digests": self.digests,
+            }
+
+
+# ─── Digest text ──────────────────────────────────────────────────────────────
+
+def digest_content(alerts: Sequence[BinAlert]) -> Tuple[str, str, Dict[str, str]]:
+    """Title, body and data payload summarising the alerts of one window."""
+    alerts = sorted(alerts, key=lambda a: (-a.fill_level, a.bin_id))
+    zones = Counter(a.zone_id for a in alerts)
+    critical = sum(1 for a in alerts if a.severity == "critical")
+
+    title = f"{len(alerts)} bins need collection" if len(alerts) != 1 else "1 bin needs collection"
+    if len(zones) == 1:
+        title += f" in {zone_label(next(iter(zones)))}"
+        where = ""
+    else:
+        parts = [f"{zone_label(z)} ({n})" for z, n in zones.most_common(3)]
+        if len(zones) > 3:
+            parts.append(f"{len(zones) - 3} more zones")
+        where = ", ".join(parts) + " — "
+    body = f"{where}{critical} critical, fullest {alerts[0].location} at {alerts[0].fill_level}%"
+
+    data = {
+        "type": "bin_alert_digest",
+        "count": str(len(alerts)),
+        "zone_id": (next(iter(zones)) or "") if len(zones) == 1 else "",
+        "bins": json.dumps([
+            {"bin_id": a.bin_id, "fill_level": a.fill_level, "zone_id": a.zone_id}
+            for a in alerts[:MAX_DIGEST_BINS]
+        ]),
+    }
+    return title, body, data
@@ -0,0 +1,307 @@
+"""
+services/collection_planner.py
+
+Prediction-aware bin selection under a shift budget (a team orienteering
+problem). Given candidate bins and one or more crews, decide WHICH bins each
+crew visits and in what order so that the collected urgency is maximised
+while every crew finishes its stops and drives back to the depot within its
+shift, and never loads more than its truck volume.
+
+Urgency comes from the ML fill predictions:
+  - weight   : current fill plus a confidence-scaled deadline pressure term,
+               so bins predicted to overflow soon count for more
+  - deadline : hours_until_full — a stop reached after its deadline only
+               earns LATE_REWARD_FACTOR of its weight
+
+The solver is a two-phase heuristic working on CollectionPoints arrays:
+  1. Construction — every crew repeatedly takes the feasible candidate with
+     the best reward / (travel + service) ratio. All crews are scored in one
+     (crews × candidates) NumPy step; a bin two crews want goes to the crew
+     with the higher ratio.
+  2. Improvement — until the time limit: 2-opt each route to free up shift
+     time, then cheapest-insertion of the remaining candidates.
+"""
+
+import math
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.route_optimizer import (
+    AVERAGE_SPEED_KMH,
+    CollectionPoints,
+    Location,
+    RouteOptimizer,
+    haversine_km,
+)
+
+LATE_REWARD_FACTOR = 0.5          # share of a bin's weight earned after it overflowed
+DEADLINE_PRESSURE_HOURS = 6.0     # hours_until_full at which pressure is halved
+NO_PREDICTION_HOURS = 72.0        # assumed horizon when there is no usable prediction
+
+
+def urgency_weights(
+    fill: np.ndarray,
+    hours_until_full: np.ndarray,
+    confidence: np.ndarray,
+) -> np.ndarray:
+    """
+    Per-bin reward. Fill alone contributes up to 1.0; a confident prediction
+    that the bin fills soon adds up to 2.0 more.
+    """
+    fill = np.asarray(fill, dtype=np.float64)
+    pressure = 1.0 / (1.0 + np.asarray(hours_until_full, dtype=np.float64) / DEADLINE_PRESSURE_HOURS)
+    return fill / 100.0 + 2.0 * np.asarray(confidence, dtype=np.float64) * pressure
+
+
+class CrewPlan:
+    """One crew's selected stops plus summary figures."""
+
+    def __init__(self, order: np.ndarray, distance_km: float, minutes: float,
+                 load_liters: float, reward: float, late_stops: int, eta_minutes: np.ndarray):
+        self.order = order
+        self.distance_km = distance_km
+        self.minutes = minutes
+        self.load_liters = load_liters
+        self.reward = reward
+        self.late_stops = late_stops
+        self.eta_minutes = eta_minutes
+
+
+class CollectionPlanner:
+    """Selects and orders bins for a fleet of crews within shift and truck limits."""
+
+    def __init__(self, depot: Location, speed_kmh: float = AVERAGE_SPEED_KMH):
+        self.depot = depot
+        self.minutes_per_km = 60.0 / speed_kmh
+        self._depot_lat = math.radians(depot.lat)
+        self._depot_lon = math.radians(depot.lon)
+
+    # ── Evaluation ────────────────────────────────────────────────────────────
+
+    def _path(self, points: CollectionPoints, order: np.ndarray, start_lat: float, start_lon: float):
+        lat = np.concatenate(([start_lat], points.rad_lat[order], [self._depot_lat]))
+        lon = np.concatenate(([start_lon], points.rad_lon[order], [self._depot_lon]))
+        return lat, lon
+
+    def evaluate(self, points: CollectionPoints, order: np.ndarray, start_lat: float, start_lon: float,
+                 weights: np.ndarray, deadlines: np.ndarray, volumes: np.ndarray) -> CrewPlan:
+        """Distance, shift minutes, arrival times and earned reward of one route (start in radians)."""
+        order = np.asarray(order, dtype=np.intp)
+        if len(order) == 0:
+            return CrewPlan(order, 0.0, 0.0, 0.0, 0.0, 0, np.empty(0))
+
+        lat, lon = self._path(points, order, start_lat, start_lon)
+        legs = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        leg_minutes = legs * self.minutes_per_km
+        service = points.service_time[order].astype(np.float64)
+
+        # Arrival at stop k = all earlier legs + all earlier service times
+        eta = np.cumsum(leg_minutes[:-1]) + np.concatenate(([0.0], np.cumsum(service)[:-1]))
+        late = eta > deadlines[order]
+        reward = float(np.where(late, LATE_REWARD_FACTOR, 1.0) @ weights[order])
+
+        return CrewPlan(
+            order=order,
+            distance_km=float(legs.sum()),
+            minutes=float(leg_minutes.sum() + service.sum()),
+            load_liters=float(volumes[order].sum()),
+            reward=reward,
+            late_stops=int(late.sum()),
+            eta_minutes=eta,
+        )
+
+    # ── Solver ────────────────────────────────────────────────────────────────
+
+    def plan(
+        self,
+        points: CollectionPoints,
+        weights: Sequence[float],
+        deadlines_minutes: Sequence[float],
+        volumes_liters: Sequence[float],
+        crew_starts: Sequence[Location],
+        budgets_minutes: Sequence[float],
+        capacities_liters: Sequence[float],
+        time_limit_s: float = 0.5,
+    ) -> List[CrewPlan]:
+        """Return one CrewPlan per crew (same order as crew_starts)."""
+        started = time.perf_counter()
+        deadline_at = started + time_limit_s
+
+        weights = np.asarray(weights, dtype=np.float64)
+        deadlines = np.asarray(deadlines_minutes, dtype=np.float64)
+        volumes = np.asarray(volumes_liters, dtype=np.float64)
+        budgets = np.asarray(budgets_minutes, dtype=np.float64)
+        capacities = np.asarray(capacities_liters, dtype=np.float64)
+        start_lat = np.radians([s.lat for s in crew_starts])
+        start_lon = np.radians([s.lon for s in crew_starts])
+
+        routes = self._construct(points, weights, deadlines, volumes,
+                                 start_lat, start_lon, budgets, capacities, deadline_at)
+        routes = self._improve(points, routes, weights, deadlines, volumes,
+                               start_lat, start_lon, budgets, capacities, deadline_at)
+
+        return [
+            self.evaluate(points, np.asarray(route, dtype=np.intp), start_lat[k], start_lon[k],
+                          weights, deadlines, volumes)
+            for k, route in enumerate(routes)
+        ]
+
+    def _construct(self, points, weights, deadlines, volumes,
+                   start_lat, start_lon, budgets, capacities, deadline_at) -> List[List[int]]:
+        n_crews, n = len(budgets), len(points)
+        routes: List[List[int]] = [[] for _ in range(n_crews)]
+        if n == 0 or n_crews == 0:
+            return routes
+
+        cur_lat, cur_lon = start_lat.copy(), start_lon.copy()
+        used = np.zeros(n_crews)
+        load = np.zeros(n_crews)
+        active = np.ones(n_crews, dtype=bool)
+        free = weights > 0
+        service = points.service_time.astype(np.float64)
+        home = haversine_km(points.rad_lat, points.rad_lon, self._depot_lat, self._depot_lon) * self.minutes_per_km
+
+        while active.any() and free.any() and time.perf_counter() < deadline_at:
+            travel = haversine_km(
+                cur_lat[:, None], cur_lon[:, None], points.rad_lat[None, :], points.rad_lon[None, :]
+            ) * self.minutes_per_km
+            arrive = used[:, None] + travel
+            feasible = (
+                free[None, :]
+                & active[:, None]
+                & (arrive + service + home <= budgets[:, None])
+                & (load[:, None] + volumes <= capacities[:, None])
+            )
+            reward = weights * np.where(arrive <= deadlines, 1.0, LATE_REWARD_FACTOR)
+            score = np.where(feasible, reward / (travel + service + 1e-6), -np.inf)
+
+            best = np.argmax(score, axis=1)
+            best_score = score[np.arange(n_crews), best]
+            active &= np.isfinite(best_score)
+
+            # Resolve clashes: highest ratio wins, the rest retry next round
+            taken = set()
+            for k in np.argsort(-best_score):
+                if not active[k]:
+                    continue
+                j = int(best[k])
+                if j in taken:
+                    continue
+                taken.add(j)
+                routes[k].append(j)
+                used[k] = arrive[k, j] + service[j]
+                load[k] += volumes[j]
+                cur_lat[k], cur_lon[k] = points.rad_lat[j], points.rad_lon[j]
+                free[j] = False
+
+        return routes
+
+    def _improve(self, points, routes, weights, deadlines, volumes,
+                 start_lat, start_lon, budgets, capacities, deadline_at) -> List[List[int]]:
+        optimizer = RouteOptimizer()
+        optimizer.set_depot(self.depot)
+        assigned = np.zeros(len(points), dtype=bool)
+        for route in routes:
+            assigned[route] = True
+        rejected = np.zeros((len(routes), len(points)), dtype=bool)   # crew k found bin j not worth it
+
+        for k, route in enumerate(routes):
+            remaining = deadline_at - time.perf_counter()
+            if remaining <= 0 or len(route) < 3:
+                continue
+            start = Location(math.degrees(start_lat[k]), math.degrees(start_lon[k]))
+            current = self.evaluate(points, np.asarray(route), start_lat[k], start_lon[k],
+                                    weights, deadlines, volumes)
+            candidate = optimizer.two_opt_order(points, np.asarray(route), start, time_limit_s=remaining)
+            shorter = self.evaluate(points, candidate, start_lat[k], start_lon[k], weights, deadlines, volumes)
+            # Only keep the shorter tour if it doesn't make stops late
+            if shorter.minutes < current.minutes and shorter.reward >= current.reward:
+                routes[k] = candidate.tolist()
+
+        progress = True
+        while progress and time.perf_counter() < deadline_at and not assigned.all():
+            progress = False
+            for k in range(len(routes)):
+                if time.perf_counter() >= deadline_at:
+                    break
+                j, position = self._best_insertion(points, routes[k], start_lat[k], start_lon[k],
+                                                   weights, volumes, assigned | rejected[k],
+                                                   budgets[k], capacities[k])
+                if j is None:
+                    continue
+                trial = routes[k][:position] + [j] + routes[k][position:]
+                before = self.evaluate(points, np.asarray(routes[k]), start_lat[k], start_lon[k],
+                                       weights, deadlines, volumes)
+                after = self.evaluate(points, np.asarray(trial), start_lat[k], start_lon[k],
+                                      weights, deadlines, volumes)
+                if after.reward > before.reward:
+                    routes[k] = trial
+                    assigned[j] = True
+                else:
+                    rejected[k, j] = True   # another crew may still take it
+                progress = True
+
+        return routes
+
+    def _best_insertion(self, points, route, start_lat, start_lon, weights, volumes,
+                        assigned, budget, capacity):
+        """Cheapest feasible insertion (by reward per added minute) into one route."""
+        candidates = np.flatnonzero(~assigned & (weights > 0))
+        if len(candidates) == 0:
+            return None, None
+
+        order = np.asarray(route, dtype=np.intp)
+        lat, lon = self._path(points, order, start_lat, start_lon)
+        legs = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]) * self.minutes_per_km
+        used = legs.sum() + points.service_time[order].sum()
+        load = volumes[order].sum()
+
+        c_lat, c_lon = points.rad_lat[candidates], points.rad_lon[candidates]
+        to_c = haversine_km(lat[:-1, None], lon[:-1, None], c_lat[None, :], c_lon[None, :])
+        from_c = haversine_km(c_lat[None, :], c_lon[None, :], lat[1:, None], lon[1:, None])
+        detour = (to_c + from_c) * self.minutes_per_km - legs[:, None]   # (positions × candidates)
+
+        position = np.argmin(detour, axis=0)
+        added = detour[position, np.arange(len(candidates))] + points.service_time[candidates]
+        feasible = (used + added <= budget) & (load + volumes[candidates] <= capacity)
+        if not feasible.any():
+            return None, None
+
+        ratio = np.where(feasible, weights[candidates] / np.maximum(added, 1e-6), -np.inf)
+        best = int(np.argmax(ratio))
+        return int(candidates[best]), int(position[best])
+
+
+def prediction_inputs(
+    bin_ids: List[str],
+    fills: Sequence[int],
+    predictions: Dict[str, Optional[dict]],
+) -> Dict[str, np.ndarray]:
+    """
+    Turn BinFillPredictor.predict_full_time() results into solver arrays:
+    hours_until_full, confidence, deadline (minutes) and weight per bin.
+    Bins without a prediction get a far-off deadline and zero confidence,
+    so only their current fill counts.
+    """
+    fills = np.asarray(fills, dtype=np.float64)
+    hours = np.full(len(bin_ids), NO_PREDICTION_HOURS)
+    confidence = np.zeros(len(bin_ids))
+    for i, bin_id in enumerate(bin_ids):
+        prediction = predictions.get(bin_id)
+        if prediction:
+            hours[i] = prediction.get("hours_until_full", NO_PREDICTION_HOURS)
+            confidence[i] = prediction.get("confidence", 0.0)
+
+    # Already full — due now, no prediction needed
+    full = fills >= 100
+    hours[full] = 0.0
+    confidence[full] = 1.0
+
+    return {
+        "hours_until_full": hours,
+        "confidence": confidence,
+        "deadline_minutes": hours * 60.0,
+        "weight": urgency_weights(fills, hours, confidence),
+    }
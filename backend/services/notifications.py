@@ -6,154 +6,138 @@ Notification triggers:
   - A task is assigned to a crew
   - A route is marked active (crew is on the way)
 
+Delivery:
+  - The notify_* functions only queue a job on `dispatcher` (see
+    services/push_dispatch.py) and return; they are safe to call from async
+    handlers.  Messages are built on a dispatcher thread, so pass plain
+    values, never ORM objects.
+  - Recipients come from the in-memory index in services/recipients.py and
+    honour each user's push_enabled / critical_bins / route_updates settings.
+  - Bin alerts are coalesced per admin (services/alert_digest.py): bursts of
+    threshold crossings become one "N bins need collection" digest.
+
 Token management:
   - Device tokens are stored in DeviceTokenDB.
   - POST /auth/device-token  →  register or refresh a token
+  - Tokens FCM reports as unregistered are deleted by the dispatcher
+    (prune_device_tokens).
   - Tokens are scoped to a user so we can target notifications
     (e.g., only the assigned crew gets "new task" notification).
 """
 
 import logging
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional
 
 from sqlalchemy.orm import Session
 
-from database import DeviceTokenDB, UserDB, CrewDB
-from firebase_service import _init_firebase
-from models import UserRole
+from config import get_settings
+from database import DeviceTokenDB
+from services.alert_digest import AlertCoalescer, BinAlert, ClosedWindow, digest_content
+from services.push_dispatch import NotificationDispatcher, PushMessage, create_transport
+from services.recipients import TOPIC_BINS, TOPIC_ROUTES, recipients
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+dispatcher = NotificationDispatcher(
+    create_transport(settings),
+    workers=settings.notification_workers,
+    max_queue=settings.notification_queue_size,
+    max_batch=settings.notification_max_batch,
+    linger_ms=settings.notification_batch_linger_ms,
+    retries=settings.notification_retry_attempts,
+    retry_backoff_ms=settings.notification_retry_backoff_ms,
+    prune=lambda db, tokens: prune_device_tokens(tokens, db),
+)
+
+# Bin alerts per admin are coalesced into digests; closed windows go back
+# through the dispatcher like any other job.
+alert_digest = AlertCoalescer(
+    settings.notification_digest_window_seconds,
+    bypass_severity=settings.notification_digest_bypass_severity,
+    on_due=lambda windows: dispatcher.submit(_bin_alert_digest, windows),
+)
 
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
-# ─── Internal: send via FCM ───────────────────────────────────────────────────
-
-def _send_fcm(tokens: list, title: str, body: str, data: dict = None) -> int:
-    """
-    Send a notification to a list of FCM tokens.
-    Returns the number of messages successfully sent.
-    Falls back silently if Firebase is not configured.
-    """
-    if not tokens:
-        return 0
-
-    app = _init_firebase()
-    if app is None:
-        logger.debug("[FCM] Firebase not configured — notification skipped")
-        return 0
-
-    try:
-        from firebase_admin import messaging
-
-        notification = messaging.Notification(title=title, body=body)
-        sent = 0
-        chunk_size = 500   # FCM multicast limit
-
-        for i in range(0, len(tokens), chunk_size):
-            chunk = tokens[i: i + chunk_size]
-            message = messaging.MulticastMessage(
-                tokens=chunk,
-                notification=notification,
-                data={k: str(v) for k, v in (data or {}).items()},
-                android=messaging.AndroidConfig(
-                    priority="high",
-                    notification=messaging.AndroidNotification(
-                        sound="default",
-                        default_vibrate_timings=True,
-                    ),
-                ),
-            )
-            response = messaging.send_each_for_multicast(message)
-            sent += response.success_count
-            if response.failure_count:
-                logger.warning(f"[FCM] {response.failure_count} tokens failed in batch")
-
-        logger.info(f"[FCM] Sent '{title}' to {sent}/{len(tokens)} tokens")
-        return sent
-
-    except Exception as e:
-        logger.error(f"[FCM] Send failed: {e}")
-        return 0
-
-
-def _get_tokens_for_users(user_ids: list, db: Session) -> list:
-    if not user_ids:
-        return []
-    rows = db.query(DeviceTokenDB.token).filter(
-        DeviceTokenDB.user_id.in_(user_ids)
-    ).all()
-    return [r.token for r in rows]
-
-
-def _get_admin_tokens(db: Session) -> list:
-    admins = db.query(UserDB.id).filter(
-        UserDB.role == UserRole.ADMIN, UserDB.is_active == True  # noqa: E712
-    ).all()
-    return _get_tokens_for_users([a.id for a in admins], db)
-
-
-# ─── Public notification functions ───────────────────────────────────────────
-
-def notify_bin_fill_warning(bin_id: str, location: str, fill_level: int, db: Session) -> None:
-    """Called by the telemetry router when a bin crosses the 80% threshold."""
-    is_critical = fill_level >= 90
+# ─── Message builders (run by the dispatcher with its own session) ────────────
+# Recipients come from the in-memory index; `db` is only used to build it on
+# first use or after it has gone stale.
+
+def _bin_fill_warning(
+    db: Session, bin_id: str, location: str, fill_level: int, zone_id: Optional[str] = None,
+) -> List[PushMessage]:
+    recipients.ensure_loaded(db)
+    alert = BinAlert(bin_id, location, fill_level, zone_id)
+    tokens = [
+        token
+        for user_id, user_tokens in recipients.admin_tokens_by_user(TOPIC_BINS).items()
+        if alert_digest.offer(user_id, user_tokens, alert)
+        for token in user_tokens
+    ]
+    is_critical = alert.severity == "critical"
     title = f"Bin {bin_id} Critical" if is_critical else f"Bin {bin_id} Warning"
     body = f"{location} is {fill_level}% full — {'immediate ' if is_critical else ''}collection needed"
-
-    tokens = _get_admin_tokens(db)
-    _send_fcm(
+    return [PushMessage(
         tokens, title, body,
-        data={"bin_id": bin_id, "fill_level": str(fill_level), "type": "bin_alert"},
-    )
-
-
-def notify_task_assigned(
-    task_id: str,
-    task_title: str,
-    location: str,
-    crew_id: str,
-    db: Session,
-) -> None:
-    """Called by the tasks router when a task is assigned to a crew."""
-    crew = db.query(CrewDB).filter(CrewDB.id == crew_id).first()
-    crew_name = crew.name if crew else crew_id
-
-    user_ids = []
-    if crew and crew.email:
-        user = db.query(UserDB).filter(UserDB.email == crew.email).first()
-        if user:
-            user_ids.append(user.id)
-
-    admins = db.query(UserDB.id).filter(
-        UserDB.role == UserRole.ADMIN, UserDB.is_active == True  # noqa: E712
-    ).all()
-    user_ids += [a.id for a in admins]
-
-    tokens = _get_tokens_for_users(list(set(user_ids)), db)
-    _send_fcm(
-        tokens,
+        data={"bin_id": bin_id, "fill_level": fill_level, "type": "bin_alert"},
+    )]
+
+
+def _bin_alert_digest(db: Session, windows: List[ClosedWindow]) -> List[PushMessage]:
+    """One digest per closed window; recipients whose windows match share a message."""
+    merged = {}
+    for _, tokens, alerts in windows:
+        title, body, data = digest_content(alerts)
+        key = (title, body, tuple(sorted(data.items())))
+        merged.setdefault(key, (title, body, data, set()))[3].update(tokens)
+    return [PushMessage(sorted(tokens), title, body, data) for title, body, data, tokens in merged.values()]
+
+
+def _task_assigned(
+    db: Session, task_id: str, task_title: str, location: str, crew_id: str,
+) -> List[PushMessage]:
+    recipients.ensure_loaded(db)
+    crew_name = recipients.crew_name(crew_id) or crew_id
+    tokens = set(recipients.crew_tokens(crew_id, TOPIC_ROUTES)) | set(recipients.admin_tokens(TOPIC_ROUTES))
+    return [PushMessage(
+        sorted(tokens),
         title=f"New Task — {crew_name}",
         body=f"{task_title} at {location}",
         data={"task_id": task_id, "crew_id": crew_id, "type": "task_assigned"},
-    )
+    )]
 
 
-def notify_route_activated(route_id: str, crew_id: str, bin_count: int, db: Session) -> None:
-    """Called when a route status changes to 'active'."""
-    crew = db.query(CrewDB).filter(CrewDB.id == crew_id).first()
-    crew_name = crew.name if crew else crew_id
-
-    tokens = _get_admin_tokens(db)
-    _send_fcm(
-        tokens,
+def _route_activated(db: Session, route_id: str, crew_id: str, bin_count: int) -> List[PushMessage]:
+    recipients.ensure_loaded(db)
+    crew_name = recipients.crew_name(crew_id) or crew_id
+    return [PushMessage(
+        recipients.admin_tokens(TOPIC_ROUTES),
         title=f"Route Started — {crew_name}",
         body=f"Collecting {bin_count} bins. Route ID: {route_id}",
         data={"route_id": route_id, "crew_id": crew_id, "type": "route_active"},
-    )
+    )]
+
+
+# ─── Public notification functions (non-blocking) ────────────────────────────
+
+def notify_bin_fill_warning(bin_id: str, location: str, fill_level: int, zone_id: Optional[str] = None) -> bool:
+    """Called by the telemetry router when a bin crosses the 80% threshold."""
+    return dispatcher.submit(_bin_fill_warning, bin_id, location, fill_level, zone_id)
+
+
+def notify_task_assigned(task_id: str, task_title: str, location: str, crew_id: str) -> bool:
+    """Called by the tasks router when a task is assigned to a crew."""
+    return dispatcher.submit(_task_assigned, task_id, task_title, location, crew_id)
+
+
+def notify_route_activated(route_id: str, crew_id: str, bin_count: int) -> bool:
+    """Called when a route status changes to 'active'."""
+    return dispatcher.submit(_route_activated, route_id, crew_id, bin_count)
 
 
 # ─── Device token registration (used by auth router) ─────────────────────────
@@ -185,6 +169,7 @@ def register_device_token(
 
     db.commit()
     db.refresh(record)
+    recipients.put_token(user_id, token)
     return record
 
 
@@ -195,4 +180,17 @@ def unregister_device_token(token: str, db: Session) -> bool:
         return False
     db.delete(record)
     db.commit()
-    return True
\ No newline at end of file
+    recipients.remove_token(token)
+    return True
+
+
+def prune_device_tokens(tokens: List[str], db: Session) -> int:
+    """Delete tokens FCM no longer accepts, in one statement."""
+    removed = (
+        db.query(DeviceTokenDB)
+        .filter(DeviceTokenDB.token.in_(tokens))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    recipients.remove_tokens(tokens)
+    return removed
@@ -0,0 +1,519 @@
+"""
+services/push_dispatch.py  —  Background delivery of push notifications.
+
+Request handlers never talk to FCM or open sessions for notifications.  They
+submit a job — a builder function plus its arguments — and return at once.
+Dispatcher worker threads then:
+
+  1. take the next job plus everything else pending (up to max_batch, after a
+     short linger so a burst of threshold crossings lands in one batch),
+  2. run each builder with the worker's own DB session; a builder returns the
+     PushMessages to send (recipient tokens + title/body/data),
+  3. group the messages by recipient set and send each group in as few
+     transport calls as possible: one multicast when the group has a single
+     payload, otherwise send_each batches of up to 500 messages.
+
+Transports (settings.notification_transport):
+  fcm  — firebase_admin.messaging.  Batches are skipped while Firebase is not
+         configured, before any builder runs.
+  fake — records every call in memory; per-token error codes can be scripted.
+         Used by the tests and for local development without credentials.
+
+Every transport call returns one result per token: None on success, else the
+FCM error code.  The dispatcher acts on those codes:
+
+  - dead tokens (UNREGISTERED, SENDER_ID_MISMATCH, and INVALID_ARGUMENT when
+    other tokens of the same call went through, i.e. the payload was fine)
+    are handed to `prune` once per batch, which deletes them in one statement;
+  - transient failures (UNAVAILABLE, INTERNAL, QUOTA_EXCEEDED, … or the whole
+    call raising) are re-sent up to `retries` times, waiting `retry_backoff_ms`
+    and doubling the wait after each attempt;
+  - anything else is counted as failed and dropped.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TRANSPORTS = ("fcm", "fake")
+FCM_BATCH_LIMIT = 500   # tokens per multicast / messages per send_each call
+
+DEAD_TOKEN_ERRORS = frozenset({"UNREGISTERED", "SENDER_ID_MISMATCH"})
+TRANSIENT_ERRORS = frozenset({"UNAVAILABLE", "INTERNAL", "QUOTA_EXCEEDED", "DEADLINE_EXCEEDED", "UNKNOWN"})
+
+_STOP = object()
+
+
+@dataclass
+class PushMessage:
+    tokens: Tuple[str, ...]
+    title: str
+    body: str
+    data: Dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.tokens = tuple(self.tokens)
+        self.data = {k: str(v) for k, v in self.data.items()}
+
+    @property
+    def payload_key(self) -> tuple:
+        return self.title, self.body, tuple(sorted(self.data.items()))
+
+
+# ─── Transports ───────────────────────────────────────────────────────────────
+
+class PushTransport:
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def multicast(self, tokens: Sequence[str], message: PushMessage) -> List[Optional[str]]:
+        """Send one payload to up to FCM_BATCH_LIMIT tokens."""
+        raise NotImplementedError
+
+    def send_each(self, items: Sequence[Tuple[str, PushMessage]]) -> List[Optional[str]]:
+        """Send up to FCM_BATCH_LIMIT (token, payload) pairs in one call."""
+        raise NotImplementedError
+
+
+class FCMTransport(PushTransport):
+    name = "fcm"
+
+    def available(self) -> bool:
+        from firebase_service import _init_firebase
+        return _init_firebase() is not None
+
+    @staticmethod
+    def _android(messaging):
+        return messaging.AndroidConfig(
+            priority="high",
+            notification=messaging.AndroidNotification(sound="default", default_vibrate_timings=True),
+        )
+
+    @staticmethod
+    def _error_code(exc) -> str:
+        # The messaging-specific errors carry the generic platform code
+        # (NOT_FOUND, PERMISSION_DENIED, …); report the FCM code instead.
+        from firebase_admin import messaging
+
+        for error_type, code in (
+            (messaging.UnregisteredError, "UNREGISTERED"),
+            (messaging.SenderIdMismatchError, "SENDER_ID_MISMATCH"),
+            (messaging.QuotaExceededError, "QUOTA_EXCEEDED"),
+            (messaging.ThirdPartyAuthError, "THIRD_PARTY_AUTH_ERROR"),
+        ):
+            if isinstance(exc, error_type):
+                return code
+        return getattr(exc, "code", None) or type(exc).__name__
+
+    @classmethod
+    def _results(cls, response) -> List[Optional[str]]:
+        return [None if r.success else cls._error_code(r.exception) for r in response.responses]
+
+    def multicast(self, tokens, message):
+        from firebase_admin import messaging
+
+        response = messaging.send_each_for_multicast(messaging.MulticastMessage(
+            tokens=list(tokens),
+            notification=messaging.Notification(title=message.title, body=message.body),
+            data=message.data,
+            android=self._android(messaging),
+        ))
+        return self._results(response)
+
+    def send_each(self, items):
+        from firebase_admin import messaging
+
+        response = messaging.send_each([
+            messaging.Message(
+                token=token,
+                notification=messaging.Notification(title=message.title, body=message.body),
+                data=message.data,
+                android=self._android(messaging),
+            )
+            for token, message in items
+        ])
+        return self._results(response)
+
+
+class FakePushTransport(PushTransport):
+    """
+    In-memory transport.  `errors` maps token → error code to report on every
+    send; `fail_next` queues codes that are reported once each, in order.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self.calls: List[Tuple[str, List[Tuple[str, PushMessage]]]] = []
+        self.errors: Dict[str, str] = {}
+        self._queued: Dict[str, Deque[str]] = {}
+        self._outcomes: List[Tuple[str, PushMessage, Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, token: str, *codes: str) -> None:
+        with self._lock:
+            self._queued.setdefault(token, deque()).extend(codes)
+
+    def _result(self, token: str) -> Optional[str]:
+        queued = self._queued.get(token)
+        if queued:
+            return queued.popleft()
+        return self.errors.get(token)
+
+    def _record(self, kind: str, items: List[Tuple[str, PushMessage]]) -> List[Optional[str]]:
+        with self._lock:
+            self.calls.append((kind, items))
+            results = [self._result(token) for token, _ in items]
+            self._outcomes.extend((t, m, r) for (t, m), r in zip(items, results))
+            return results
+
+    def multicast(self, tokens, message):
+        return self._record("multicast", [(token, message) for token in tokens])
+
+    def send_each(self, items):
+        return self._record("send_each", list(items))
+
+    def delivered(self, token: str) -> List[PushMessage]:
+        """Messages that reached `token` successfully, in send order."""
+        with self._lock:
+            return [m for t, m, error in self._outcomes if t == token and error is None]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self._queued.clear()
+            self._outcomes.clear()
+
+
+def create_transport(settings) -> PushTransport:
+    """Build the transport selected by settings.notification_transport."""
+    backend = settings.notification_transport
+    if backend == "fcm":
+        return FCMTransport()
+    if backend == "fake":
+        return FakePushTransport()
+    raise ValueError(f"Unknown notification transport: {backend}")
+
+
+# ─── Dispatcher ───────────────────────────────────────────────────────────────
+
+Builder = Callable[..., Sequence[PushMessage]]
+Pruner = Callable[..., object]          # prune(db, tokens)
+Pair = Tuple[str, PushMessage]
+
+
+@dataclass
+class _Job:
+    builder: Builder
+    args: tuple
+    kwargs: dict
+    enqueued_at: float
+
+
+def _summary(samples: Sequence[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "count": n,
+        "p50": round(ordered[n // 2], 2),
+        "p95": round(ordered[min(n - 1, int(n * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+class NotificationDispatcher:
+    """Bounded job queue drained by `workers` daemon threads."""
+
+    LATENCY_SAMPLES = 1000
+
+    def __init__(
+        self,
+        transport: PushTransport,
+        workers: int = 2,
+        max_queue: int = 10000,
+        max_batch: int = 200,
+        linger_ms: int = 50,
+        retries: int = 3,
+        retry_backoff_ms: int = 500,
+        prune: Optional[Pruner] = None,
+        session_factory: Optional[Callable] = None,
+    ):
+        self.transport = transport
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.linger = linger_ms / 1000
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.prune = prune
+        self._session_factory = session_factory
+        self._sleep = time.sleep
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._lifecycle = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._unfinished = 0
+
+        self.submitted = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.transport_calls = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.pruned = 0
+        self.prune_errors = 0
+        self.skipped = 0
+        self.build_errors = 0
+        self._send_latency_ms: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+        self._call_ms: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+
+    # ── Lifecycle ──────────────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> None:
+        with self._lifecycle:
+            if self.running:
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"push-dispatch-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Finish what is queued, then stop the workers."""
+        with self._lifecycle:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def use_transport(self, transport: PushTransport) -> None:
+        self.transport = transport
+
+    # ── Producer side (request handlers) ───────────────────────────────────────
+
+    def submit(self, builder: Builder, *args, **kwargs) -> bool:
+        """Queue a job; never blocks.  False if the queue is full and the job was dropped."""
+        if not self.running:
+            self.start()
+        with self._idle:
+            self._unfinished += 1
+        try:
+            self._queue.put_nowait(_Job(builder, args, kwargs, time.perf_counter()))
+        except queue.Full:
+            self._finished(1)
+            with self._stats_lock:
+                self.dropped += 1
+            logger.warning(f"[FCM] Notification queue full — dropped {getattr(builder, '__name__', builder)}")
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every submitted job has been sent (or failed)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def _finished(self, n: int) -> None:
+        with self._idle:
+            self._unfinished -= n
+            if self._unfinished <= 0:
+                self._idle.notify_all()
+
+    # ── Worker side ────────────────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            batch, stopping = [job], False
+            deadline = time.perf_counter() + self.linger
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                batch.append(job)
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error(f"[FCM] Notification batch failed: {e}")
+            finally:
+                self._finished(len(batch))
+            if stopping:
+                return
+
+    def _session(self):
+        if self._session_factory is None:
+            from database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _process(self, batch: List[_Job]) -> None:
+        with self._stats_lock:
+            self.batches += 1
+        transport = self.transport
+        if not transport.available():
+            with self._stats_lock:
+                self.skipped += len(batch)
+            logger.debug(f"[FCM] Transport {transport.name} unavailable — {len(batch)} notifications skipped")
+            return
+
+        messages: List[Tuple[PushMessage, float]] = []
+        db = self._session()
+        try:
+            for job in batch:
+                try:
+                    built = job.builder(db, *job.args, **job.kwargs) or ()
+                except Exception as e:
+                    db.rollback()
+                    with self._stats_lock:
+                        self.build_errors += 1
+                    logger.warning(f"[FCM] Building {getattr(job.builder, '__name__', job.builder)} failed: {e}")
+                    continue
+                messages.extend((m, job.enqueued_at) for m in built if m.tokens)
+        finally:
+            db.close()
+
+        groups: Dict[Tuple[str, ...], List[Tuple[PushMessage, float]]] = {}
+        for message, enqueued_at in messages:
+            groups.setdefault(tuple(sorted(set(message.tokens))), []).append((message, enqueued_at))
+        dead: set = set()
+        for tokens, items in groups.items():
+            dead |= self._send_group(transport, tokens, items)
+        if dead:
+            self._prune(sorted(dead))
+
+    def _send_group(self, transport: PushTransport, tokens: Tuple[str, ...], items) -> set:
+        """Send one recipient set's messages; return the tokens found dead."""
+        payloads: Dict[tuple, PushMessage] = {}
+        for message, _ in items:
+            payloads.setdefault(message.payload_key, message)
+        pairs = [(token, message) for message in payloads.values() for token in tokens]
+
+        delivered = failed = 0
+        dead: set = set()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._sleep(self.retry_backoff * 2 ** (attempt - 1))
+            retry: List[Pair] = []
+            for i in range(0, len(pairs), FCM_BATCH_LIMIT):
+                chunk = pairs[i: i + FCM_BATCH_LIMIT]
+                results = self._transmit(transport, chunk)
+                payload_rejected = all(r == "INVALID_ARGUMENT" for r in results)
+                for pair, code in zip(chunk, results):
+                    if code is None:
+                        delivered += 1
+                    elif code in DEAD_TOKEN_ERRORS or (code == "INVALID_ARGUMENT" and not payload_rejected):
+                        dead.add(pair[0])
+                        failed += 1
+                    elif code in TRANSIENT_ERRORS and attempt < self.retries:
+                        retry.append(pair)
+                    else:
+                        failed += 1
+            if not retry:
+                break
+            with self._stats_lock:
+                self.retried += len(retry)
+            logger.info(f"[FCM] Retrying {len(retry)} sends after transient errors (attempt {attempt + 1})")
+            pairs = retry
+
+        done = time.perf_counter()
+        with self._stats_lock:
+            self.delivered += delivered
+            self.failed += failed
+            self._send_latency_ms.extend((done - enqueued_at) * 1000 for _, enqueued_at in items)
+        title = next(iter(payloads.values())).title
+        logger.info(
+            f"[FCM] Sent {len(payloads)} payload(s) ('{title}'…) to {len(tokens)} tokens — "
+            f"{delivered} delivered, {failed} failed"
+        )
+        return dead
+
+    def _transmit(self, transport: PushTransport, pairs: List[Pair]) -> List[Optional[str]]:
+        """One transport call: multicast when every pair carries the same payload."""
+        started = time.perf_counter()
+        try:
+            message = pairs[0][1]
+            if all(m is message for _, m in pairs):
+                results = transport.multicast([token for token, _ in pairs], message)
+            else:
+                results = transport.send_each(pairs)
+        except Exception as e:
+            logger.error(f"[FCM] Send failed: {e}")
+            results = ["UNAVAILABLE"] * len(pairs)      # whole call failed — worth a retry
+        with self._stats_lock:
+            self.transport_calls += 1
+            self._call_ms.append((time.perf_counter() - started) * 1000)
+        return results
+
+    def _prune(self, tokens: List[str]) -> None:
+        if self.prune is None:
+            return
+        db = self._session()
+        try:
+            self.prune(db, tokens)
+            with self._stats_lock:
+                self.pruned += len(tokens)
+            logger.info(f"[FCM] Pruned {len(tokens)} dead device tokens")
+        except Exception as e:
+            db.rollback()
+            with self._stats_lock:
+                self.prune_errors += 1
+            logger.warning(f"[FCM] Pruning dead device tokens failed: {e}")
+        finally:
+            db.close()
+
+    # ── Metrics ────────────────────────────────────────────────────────────────
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "transport": self.transport.name,
+                "workers": self.workers,
+                "running": self.running,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "transport_calls": self.transport_calls,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "retried": self.retried,
+                "pruned": self.pruned,
+                "prune_errors": self.prune_errors,
+                "skipped": self.skipped,
+                "build_errors": self.build_errors,
+                "send_latency_ms": _summary(list(self._send_latency_ms)),
+                "transport_call_ms": _summary(list(self._call_ms)),
+            }
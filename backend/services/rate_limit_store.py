@@ -0,0 +1,256 @@
+"""
+services/rate_limit_store.py  —  Counter storage for the API rate limiters.
+
+The limiters in security.py use sliding-window counters: per key, one count
+for the current fixed window and one for the previous window, weighted by how
+much of the previous window still overlaps the last `window` seconds.  That
+is O(1) per request whatever the limit, and the state per key is two ints.
+
+Every backend implements one primitive,
+
+    add(key, window_seconds, amount, now) -> (previous_count, current_count)
+
+which adds `amount` (may be 0 or negative) to the key's current window and
+returns both counts afterwards.
+
+Backends (settings.rate_limit_backend):
+  memory — per-process dict with LRU eviction at `max_keys` (single worker,
+           or per-worker limits)
+  shared — fixed-size table in a memory-mapped file shared by every worker
+           on the host.  Keys hash to one slot; a colliding key takes the slot
+           over and starts from zero, so memory never grows and a flood of
+           new keys can only reset counters, never block anyone.
+  redis  — INCRBY/PEXPIRE on any server speaking the Redis protocol, one
+           pipelined round trip per request over a small connection pool.
+           If the server is unreachable the limiter fails open (counts read
+           as zero) and the error is counted.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+from services import resp
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKENDS = ("memory", "shared", "redis")
+
+Counts = Tuple[int, int]
+
+
+class RateLimitStore:
+    name = "base"
+
+    async def add(self, key: str, window_seconds: int, amount: int, now: float) -> Counts:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+# ─── Process-local ────────────────────────────────────────────────────────────
+
+class MemoryRateLimitStore(RateLimitStore):
+    """key → [window index, previous count, current count], least recently used first."""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self.evictions = 0
+
+    async def add(self, key: str, window_seconds: int, amount: int, now: float) -> Counts:
+        index = int(now // window_seconds)
+        entry = self._entries.get(key)
+        if entry is None:
+            if not amount:
+                return 0, 0
+            entry = self._entries[key] = [index, 0, 0]
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._entries.move_to_end(key)
+            if entry[0] != index:
+                entry[1] = entry[2] if entry[0] == index - 1 else 0
+                entry[0], entry[2] = index, 0
+        entry[2] += amount
+        return entry[1], entry[2]
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "keys": len(self._entries), "max_keys": self.max_keys,
+                "evictions": self.evictions}
+
+
+# ─── Shared between workers on one host ───────────────────────────────────────
+
+_SLOT = struct.Struct("<Qqii")      # key hash, window index, previous, current
+
+
+def _key_hash(key: str) -> int:
+    # Stable across processes, unlike hash(); 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedMemoryRateLimitStore(RateLimitStore):
+    """
+    Slot table in a memory-mapped file.  Updates hold a POSIX record lock on
+    the file for a few microseconds; the file is re-opened after a fork so
+    each worker has its own descriptor and lock ownership.
+    """
+
+    name = "shared"
+
+    def __init__(self, path: str, max_keys: int = 100_000):
+        self.path = path
+        self.slots = max_keys
+        self._pid: Optional[int] = None
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self.takeovers = 0
+
+    def _mapping(self) -> mmap.mmap:
+        if self._pid != os.getpid():
+            size = self.slots * _SLOT.size
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map, self._pid = fd, mmap.mmap(fd, size), os.getpid()
+        return self._map
+
+    async def add(self, key: str, window_seconds: int, amount: int, now: float) -> Counts:
+        table = self._mapping()
+        key_hash = _key_hash(key)
+        offset = (key_hash % self.slots) * _SLOT.size
+        index = int(now // window_seconds)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            slot_hash, slot_index, previous, current = _SLOT.unpack_from(table, offset)
+            if slot_hash != key_hash:
+                if slot_hash:
+                    self.takeovers += 1
+                previous = current = 0
+            elif slot_index != index:
+                previous = current if slot_index == index - 1 else 0
+                current = 0
+            current += amount
+            if amount or slot_hash == key_hash:
+                _SLOT.pack_into(table, offset, key_hash, index, previous, current)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return previous, current
+
+    async def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._map = self._fd = self._pid = None
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "slots": self.slots, "takeovers": self.takeovers}
+
+
+# ─── Redis protocol ───────────────────────────────────────────────────────────
+
+class RedisRateLimitStore(RateLimitStore):
+    """
+    A small pool of connections, each carrying one request's pipelined
+    commands at a time, so concurrent requests don't queue behind each
+    other's round trips.  Waiting for a free connection counts towards the
+    timeout, so an overloaded server fails open too.  Each window is its own
+    key (`<prefix><key>:<window index>`) that expires after two windows, so
+    Redis does the eviction.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "smartwaste:rl:", timeout: float = 0.25, pool_size: int = 4):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.prefix = prefix
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle: List[resp.Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.errors = 0
+
+    async def add(self, key: str, window_seconds: int, amount: int, now: float) -> Counts:
+        index = int(now // window_seconds)
+        previous_key = f"{self.prefix}{key}:{index - 1}"
+        current_key = f"{self.prefix}{key}:{index}"
+        if not amount:
+            commands, replies = resp.encode_command("MGET", previous_key, current_key), 1
+        else:
+            commands, replies = (
+                resp.encode_command("INCRBY", current_key, amount)
+                + resp.encode_command("PEXPIRE", current_key, window_seconds * 2000)
+                + resp.encode_command("GET", previous_key)
+            ), 3
+        try:
+            results = await asyncio.wait_for(self._call(commands, replies), self.timeout)
+        except (OSError, ConnectionError, RuntimeError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            self.errors += 1
+            logger.warning(f"[ratelimit] Redis unavailable, not limiting: {e!r}")
+            return 0, 0
+
+        if not amount:
+            previous, current = results[0]
+            return int(previous or 0), int(current or 0)
+        current, _, previous = results
+        return int(previous or 0), current
+
+    async def _call(self, commands: bytes, replies: int) -> list:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            reader, writer = self._idle.pop() if self._idle else await resp.open_connection(
+                self.host, self.port, self.password
+            )
+            try:
+                writer.write(commands)
+                results = [await resp.read_reply(reader) for _ in range(replies)]
+            except BaseException:
+                writer.close()      # replies may still be in flight; never reuse it
+                raise
+            self._idle.append((reader, writer))
+            return results
+
+    async def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "connected": bool(self._idle), "idle_connections": len(self._idle),
+                "pool_size": self.pool_size, "errors": self.errors}
+
+
+# ─── Factory ──────────────────────────────────────────────────────────────────
+
+def create_rate_limit_store(settings) -> RateLimitStore:
+    """Build the store selected by settings.rate_limit_backend."""
+    backend = settings.rate_limit_backend
+    if backend == "memory":
+        return MemoryRateLimitStore(settings.rate_limit_max_keys)
+    if backend == "shared":
+        return SharedMemoryRateLimitStore(settings.rate_limit_shared_path, settings.rate_limit_max_keys)
+    if backend == "redis":
+        if not settings.redis_url:
+            raise ValueError("rate_limit_backend=redis requires REDIS_URL")
+        return RedisRateLimitStore(settings.redis_url)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
@@ -0,0 +1,392 @@
+"""
+services/realtime_bus.py  —  Cross-worker fan-out for the real-time feed.
+
+Each worker keeps its own WebSocket connections, so a telemetry reading
+handled by worker A has to reach the clients connected to worker B.  Every
+worker publishes its events on a bus and relays whatever the bus delivers —
+its own events included — to its local sockets.
+
+Backends (settings.realtime_bus):
+  memory — in-process only (single worker); publish calls the handler
+           directly, on the event loop once the bus is started
+  unix   — newline-delimited JSON over a Unix domain socket.  The first worker
+           to take the lock file runs the broker; the others connect to it and
+           one of them takes over if the broker's worker exits.
+  redis  — PUBLISH/SUBSCRIBE on one channel of any server speaking the Redis
+           protocol (RESP), spoken directly over asyncio streams by
+           services/resp.py, so no extra dependency is needed.
+
+Envelope on the wire:
+  {"origin": "<worker id>", "seq": 17, "kind": "bin_update", "data": {...}}
+
+`seq` increases by one per message from an origin.  Receivers drop anything
+at or below the last seq seen from that origin (duplicates / reordering) and
+count skipped numbers as gaps.
+"""
+
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Callable, Dict, Optional, Set
+from urllib.parse import urlparse
+
+from services import resp
+
+logger = logging.getLogger(__name__)
+
+BUS_BACKENDS = ("memory", "unix", "redis")
+
+Handler = Callable[[dict], None]
+
+
+# ─── Base bus ─────────────────────────────────────────────────────────────────
+
+class BroadcastBus:
+    """
+    Common envelope handling.  Subclasses implement `_send(line)` and the
+    connection lifecycle; they pass every received line to `_receive`.
+
+    `publish` may be called from worker threads (sync FastAPI endpoints run in
+    a threadpool); the write is then handed to the bus's event loop.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:12]
+        self._seq = itertools.count(1)
+        self._seq_lock = threading.Lock()
+        self._handler: Optional[Handler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_seq: Dict[str, int] = {}
+
+        self.published = 0
+        self.received = 0
+        self.duplicates = 0
+        self.gaps = 0
+        self.unsent = 0
+
+    def attach(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        self._loop = None
+
+    def publish(self, kind: str, data: dict) -> None:
+        with self._seq_lock:
+            envelope = {"origin": self.origin, "seq": next(self._seq), "kind": kind, "data": data}
+        self.published += 1
+        line = json.dumps(envelope, separators=(",", ":"))
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is not None and running is not self._loop:
+            self._loop.call_soon_threadsafe(self._send, line)
+        else:
+            self._send(line)
+
+    def _send(self, line: str) -> None:
+        raise NotImplementedError
+
+    def _receive(self, line) -> None:
+        """Decode one envelope, enforce per-origin ordering and hand it to the handler."""
+        try:
+            envelope = json.loads(line)
+            origin, seq = envelope["origin"], envelope["seq"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("[BUS] Dropping malformed message")
+            return
+
+        last = self._last_seq.get(origin, 0)
+        if seq <= last:
+            self.duplicates += 1
+            return
+        if last and seq > last + 1:
+            self.gaps += seq - last - 1
+        self._last_seq[origin] = seq
+        self.received += 1
+
+        if self._handler is not None:
+            try:
+                self._handler(envelope)
+            except Exception as e:
+                logger.warning(f"[BUS] Handler failed for {envelope.get('kind')}: {e}")
+
+    @property
+    def connected(self) -> bool:
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "connected": self.connected,
+            "published": self.published,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "gaps": self.gaps,
+            "unsent": self.unsent,
+        }
+
+
+class InProcessBus(BroadcastBus):
+    """
+    Single-worker delivery by a direct call.  Once started, publishes from
+    other threads are delivered on the event loop like any other backend, so
+    the handler never runs concurrently with the WebSocket code.
+    """
+
+    name = "memory"
+
+    def _send(self, line: str) -> None:
+        self._receive(line)
+
+
+# ─── Unix domain socket broker ────────────────────────────────────────────────
+
+class UnixSocketBroker:
+    """Relays every line it receives to every connected worker, sender included."""
+
+    # A worker that stops reading is cut off rather than buffered without bound
+    MAX_BUFFERED_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)   # only called while holding the lock, so it is stale
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"[BUS] Broker listening on {self.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for peer in list(self._peers):
+            peer.close()
+        self._peers.clear()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    if peer.transport.get_write_buffer_size() > self.MAX_BUFFERED_BYTES:
+                        logger.warning("[BUS] Dropping a worker that stopped reading")
+                        self._peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+
+class UnixSocketBus(BroadcastBus):
+    """
+    Host-local bus.  Whoever holds `<path>.lock` runs the broker in-process;
+    every worker (the broker's own included) is an ordinary client of it.
+    """
+
+    name = "unix"
+
+    def __init__(self, path: str, reconnect_delay: float = 0.5):
+        super().__init__()
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self.broker: Optional[UnixSocketBroker] = None
+        self._lock_fd: Optional[int] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def start(self, timeout: float = 5.0) -> None:
+        await super().start()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[BUS] Not connected to {self.path} yet — retrying in the background")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        await super().stop()
+
+    async def _become_broker_if_free(self) -> None:
+        if self.broker is not None:
+            return
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return
+        self._lock_fd = fd
+        self.broker = UnixSocketBroker(self.path)
+        await self.broker.start()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._become_broker_if_free()
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._ready.set()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._receive(line)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError) as e:
+                logger.debug(f"[BUS] Unix socket {self.path} unavailable: {e}")
+            self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _send(self, line: str) -> None:
+        if self._writer is None:
+            self.unsent += 1
+            return
+        self._writer.write(line.encode() + b"\n")
+
+
+# ─── Redis protocol backend ───────────────────────────────────────────────────
+
+class RedisBus(BroadcastBus):
+    """
+    Pub/sub over one channel.  Uses two connections (a subscribed connection
+    cannot publish); PUBLISH replies are drained in the background so
+    publishing never waits on a round trip.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str, reconnect_delay: float = 0.5):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._pub_writer is not None
+
+    async def start(self, timeout: float = 5.0) -> None:
+        await super().start()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[BUS] Not connected to Redis at {self.host}:{self.port} yet — retrying")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await super().stop()
+
+    async def _open(self):
+        return await resp.open_connection(self.host, self.port, self.password)
+
+    async def _drain_replies(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            await resp.read_reply(reader)
+
+    async def _run(self) -> None:
+        while True:
+            sub_writer = pub_writer = drain = None
+            try:
+                sub_reader, sub_writer = await self._open()
+                sub_writer.write(resp.encode_command("SUBSCRIBE", self.channel))
+                await resp.read_reply(sub_reader)   # subscribe confirmation
+
+                pub_reader, pub_writer = await self._open()
+                drain = asyncio.create_task(self._drain_replies(pub_reader))
+                self._pub_writer = pub_writer
+                self._ready.set()
+
+                while True:
+                    message = await resp.read_reply(sub_reader)
+                    if isinstance(message, list) and len(message) == 3 and message[0] == b"message":
+                        self._receive(message[2])
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ConnectionError, RuntimeError, asyncio.IncompleteReadError) as e:
+                logger.debug(f"[BUS] Redis connection lost: {e}")
+            finally:
+                self._pub_writer = None
+                if drain is not None:
+                    drain.cancel()
+                for writer in (sub_writer, pub_writer):
+                    if writer is not None:
+                        writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _send(self, line: str) -> None:
+        if self._pub_writer is None:
+            self.unsent += 1
+            return
+        self._pub_writer.write(resp.encode_command("PUBLISH", self.channel, line))
+
+
+# ─── Factory ──────────────────────────────────────────────────────────────────
+
+def create_bus(settings) -> BroadcastBus:
+    """Build the bus selected by settings.realtime_bus."""
+    backend = settings.realtime_bus
+    if backend == "memory":
+        return InProcessBus()
+    if backend == "unix":
+        return UnixSocketBus(settings.realtime_bus_socket)
+    if backend == "redis":
+        if not settings.redis_url:
+            raise ValueError("realtime_bus=redis requires REDIS_URL")
+        return RedisBus(settings.redis_url, settings.realtime_bus_channel)
+    raise ValueError(f"Unknown realtime bus backend: {backend}")
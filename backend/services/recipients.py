@@ -0,0 +1,236 @@
+"""
+services/recipients.py  —  In-memory recipient index for push notifications.
+
+Resolving who gets a push used to take two to four queries per notification
+(admins → device tokens, crew → user → tokens).  The index holds:
+
+  users   user id → email, admin / active flags and notification preferences
+  tokens  user id → FCM tokens (plus token → owner, for reassignment)
+  crews   crew id → name and the email of the crew's login user
+
+It is built with four queries at startup (or on first use, e.g. under tests)
+and kept current by the writers: device-token register / unregister / prune,
+PUT /auth/settings, signup and Firebase login, and crew create / update /
+delete.  Every change is announced as "recipients_changed" on the real-time
+bus; other workers rebuild their index on next use.  As a backstop for rows
+changed outside the API (seed scripts, SQL), an index older than `max_age`
+seconds is rebuilt on next use as well.
+
+Preferences: a user is sent pushes only with push_enabled, and per topic only
+with critical_bins (bin alerts) or route_updates (tasks and routes).  A user
+without a settings row is treated as opted in — registering a device token is
+itself the opt-in for clients that never open the settings page.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from database import CrewDB, DeviceTokenDB, UserDB, UserSettingsDB
+from models import UserRole
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+TOPIC_BINS = "critical_bins"
+TOPIC_ROUTES = "route_updates"
+
+
+@dataclass
+class _Recipient:
+    email: str
+    is_admin: bool
+    is_active: bool
+    prefs: Optional[Dict[str, bool]] = None     # None → no settings row yet
+
+    def wants(self, topic: str) -> bool:
+        if not self.is_active:
+            return False
+        if self.prefs is None:
+            return True
+        return bool(self.prefs.get("push_enabled")) and bool(self.prefs.get(topic, True))
+
+
+class RecipientIndex:
+
+    def __init__(self, max_age_seconds: float = 0, on_change: Optional[Callable[[], None]] = None):
+        self.max_age = max_age_seconds
+        self._on_change = on_change
+        self._lock = threading.RLock()
+        self._users: Dict[int, _Recipient] = {}
+        self._ids_by_email: Dict[str, int] = {}
+        self._tokens: Dict[int, Set[str]] = {}
+        self._owners: Dict[str, int] = {}
+        self._crews: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._loaded_at: Optional[float] = None
+        self.loads = 0
+
+    # ── Building ───────────────────────────────────────────────────────────────
+
+    @property
+    def loaded(self) -> bool:
+        if self._loaded_at is None:
+            return False
+        return self.max_age <= 0 or time.monotonic() - self._loaded_at < self.max_age
+
+    def load(self, db: Session) -> int:
+        users = db.query(UserDB.id, UserDB.email, UserDB.role, UserDB.is_active).all()
+        tokens = db.query(DeviceTokenDB.user_id, DeviceTokenDB.token).all()
+        prefs = db.query(
+            UserSettingsDB.user_id, UserSettingsDB.critical_bins,
+            UserSettingsDB.route_updates, UserSettingsDB.push_enabled,
+        ).all()
+        crews = db.query(CrewDB.id, CrewDB.name, CrewDB.email).all()
+
+        by_id = {
+            u.id: _Recipient(u.email, u.role == UserRole.ADMIN, bool(u.is_active))
+            for u in users
+        }
+        for p in prefs:
+            if p.user_id in by_id:
+                by_id[p.user_id].prefs = _prefs(p.critical_bins, p.route_updates, p.push_enabled)
+        token_map: Dict[int, Set[str]] = {}
+        for t in tokens:
+            token_map.setdefault(t.user_id, set()).add(t.token)
+
+        with self._lock:
+            self._users = by_id
+            self._ids_by_email = {r.email: uid for uid, r in by_id.items()}
+            self._tokens = token_map
+            self._owners = {token: uid for uid, ts in token_map.items() for token in ts}
+            self._crews = {c.id: (c.name, c.email) for c in crews}
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        return len(by_id)
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self.loaded:
+            self.load(db)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    # ── Writers ────────────────────────────────────────────────────────────────
+
+    def put_user(self, user_id: int, email: str, role: str, is_active: bool) -> None:
+        with self._lock:
+            existing = self._users.get(user_id)
+            if existing is not None and existing.email != email:
+                self._ids_by_email.pop(existing.email, None)
+            self._users[user_id] = _Recipient(
+                email, role == UserRole.ADMIN, bool(is_active), existing.prefs if existing else None,
+            )
+            self._ids_by_email[email] = user_id
+        self._changed()
+
+    def put_preferences(self, user_id: int, critical_bins: bool, route_updates: bool, push_enabled: bool) -> None:
+        with self._lock:
+            recipient = self._users.get(user_id)
+            if recipient is not None:
+                recipient.prefs = _prefs(critical_bins, route_updates, push_enabled)
+        self._changed()
+
+    def put_token(self, user_id: int, token: str) -> None:
+        with self._lock:
+            previous = self._owners.get(token)
+            if previous is not None and previous != user_id:
+                self._tokens.get(previous, set()).discard(token)
+            self._owners[token] = user_id
+            self._tokens.setdefault(user_id, set()).add(token)
+        self._changed()
+
+    def remove_token(self, token: str) -> None:
+        self.remove_tokens([token])
+
+    def remove_tokens(self, tokens: Iterable[str]) -> None:
+        with self._lock:
+            for token in tokens:
+                owner = self._owners.pop(token, None)
+                if owner is not None:
+                    self._tokens.get(owner, set()).discard(token)
+        self._changed()
+
+    def put_crew(self, crew_id: str, name: str, email: Optional[str]) -> None:
+        with self._lock:
+            self._crews[crew_id] = (name, email)
+        self._changed()
+
+    def remove_crew(self, crew_id: str) -> None:
+        with self._lock:
+            self._crews.pop(crew_id, None)
+        self._changed()
+
+    def _changed(self) -> None:
+        if self._on_change is not None:
+            self._on_change()
+
+    # ── Lookups (no queries) ───────────────────────────────────────────────────
+
+    def _tokens_of(self, user_ids: Iterable[int], topic: str) -> List[str]:
+        tokens: Set[str] = set()
+        for uid in user_ids:
+            recipient = self._users.get(uid)
+            if recipient is not None and recipient.wants(topic):
+                tokens |= self._tokens.get(uid, set())
+        return sorted(tokens)
+
+    def admin_tokens(self, topic: str) -> List[str]:
+        with self._lock:
+            return self._tokens_of((uid for uid, r in self._users.items() if r.is_admin), topic)
+
+    def admin_tokens_by_user(self, topic: str) -> Dict[int, List[str]]:
+        """Per-admin token lists, for per-recipient alert coalescing."""
+        with self._lock:
+            groups = {}
+            for uid, recipient in self._users.items():
+                if recipient.is_admin and recipient.wants(topic) and self._tokens.get(uid):
+                    groups[uid] = sorted(self._tokens[uid])
+            return groups
+
+    def crew_tokens(self, crew_id: str, topic: str) -> List[str]:
+        """Tokens of the user whose email is the crew's contact email."""
+        with self._lock:
+            crew = self._crews.get(crew_id)
+            uid = self._ids_by_email.get(crew[1]) if crew and crew[1] else None
+            return self._tokens_of([uid] if uid is not None else [], topic)
+
+    def crew_name(self, crew_id: str) -> Optional[str]:
+        crew = self._crews.get(crew_id)
+        return crew[0] if crew else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "loads": self.loads,
+                "users": len(self._users),
+                "tokens": len(self._owners),
+                "crews": len(self._crews),
+                "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+
+def _prefs(critical_bins, route_updates, push_enabled) -> Dict[str, bool]:
+    return {
+        TOPIC_BINS: bool(critical_bins),
+        TOPIC_ROUTES: bool(route_updates),
+        "push_enabled": bool(push_enabled),
+    }
+
+
+def _share_change() -> None:
+    """Tell the other workers to rebuild their index."""
+    try:
+        from routers.websocket_router import manager
+        manager.bus.publish("recipients_changed", {})
+    except Exception as e:
+        logger.warning(f"[FCM] Could not relay recipient change to other workers: {e}")
+
+
+recipients = RecipientIndex(settings.notification_recipient_refresh_seconds, on_change=_share_change)
@@ -0,0 +1,60 @@
+"""
+services/resp.py  —  Just enough of the Redis protocol (RESP2) for our clients.
+
+The Redis real-time bus and the Redis rate limit store both talk to the
+server directly over asyncio streams, so no Redis client library is needed.
+Any server speaking the protocol works.
+"""
+
+import asyncio
+from typing import Optional, Tuple
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+def encode_command(*parts) -> bytes:
+    """One command as a RESP array of bulk strings; non-bytes parts are str()-encoded."""
+    encoded = [p if isinstance(p, bytes) else str(p).encode() for p in parts]
+    out = [b"*%d\r\n" % len(encoded)]
+    for part in encoded:
+        out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(out)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one reply.  Error replies raise RuntimeError; a closed connection ConnectionError."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise RuntimeError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Unexpected RESP prefix {prefix!r}")
+
+
+async def open_connection(host: str, port: int, password: Optional[str] = None) -> Connection:
+    """Connect and, if a password is set, AUTH before returning the streams."""
+    reader, writer = await asyncio.open_connection(host, port)
+    if password:
+        writer.write(encode_command("AUTH", password))
+        try:
+            await read_reply(reader)
+        except BaseException:
+            writer.close()
+            raise
+    return reader, writer
@@ -1,264 +1,375 @@
 import math
-from typing import List, Dict, Tuple, Optional
+import time
+from typing import List, Dict, Tuple, Optional, Sequence
 from datetime import datetime
 
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+AVERAGE_SPEED_KMH = 30           # used to turn km into driving minutes
+TWO_OPT_MAX_PASSES = 50
+TWO_OPT_TIME_LIMIT_S = 10.0      # hard stop for very large routes
+
+
 class Location:
     """Represents a geographical location"""
     def __init__(self, lat: float, lon: float, name: str = ""):
         self.lat = lat
         self.lon = lon
         self.name = name
-    
+
     def distance_to(self, other: 'Location') -> float:
         """Calculate Haversine distance between two points in kilometers"""
-        R = 6371  # Earth's radius in km
-        
+        R = EARTH_RADIUS_KM
+
         lat1, lon1 = math.radians(self.lat), math.radians(self.lon)
         lat2, lon2 = math.radians(other.lat), math.radians(other.lon)
-        
+
         dlat = lat2 - lat1
         dlon = lon2 - lon1
-        
+
         a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
         c = 2 * math.asin(math.sqrt(a))
-        
+
         return R * c
 
 class WasteCollectionPoint:
     """Represents a bin/waste collection point"""
-    def __init__(self, bin_id: str, location: Location, fill_level: int, 
+    def __init__(self, bin_id: str, location: Location, fill_level: int,
                  priority: int = 1, estimated_time: int = 10):
         self.bin_id = bin_id
         self.location = location
         self.fill_level = fill_level
         self.priority = priority  # 1=low, 2=medium, 3=high
         self.estimated_time = estimated_time  # minutes to collect
-        
+
     def urgency_score(self) -> float:
         """Calculate urgency score based on fill level and priority"""
         # Higher fill level and priority = higher urgency
         return (self.fill_level * 0.7) + (self.priority * 10)
 
+
+# ─── Struct-of-arrays point model ─────────────────────────────────────────────
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Vectorised Haversine distance in kilometers.
+    All arguments are in radians and may be scalars or NumPy arrays.
+    """
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CollectionPoints:
+    """
+    Struct-of-arrays view of a set of collection points.
+
+    Holds one parallel NumPy array per attribute (lat, lon, fill, priority,
+    service time) instead of a WasteCollectionPoint + Location object per bin.
+    Algorithms work on integer index permutations into these arrays; bin ids
+    and names are only looked up again when the response is built.
+    """
+
+    def __init__(
+        self,
+        bin_ids: Sequence[str],
+        names: Sequence[str],
+        lat: Sequence[float],
+        lon: Sequence[float],
+        fill: Sequence[int],
+        priority: Sequence[int],
+        service_time: Sequence[int],
+    ):
+        self.bin_ids = list(bin_ids)
+        self.names = list(names)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.fill = np.asarray(fill, dtype=np.int32)
+        self.priority = np.asarray(priority, dtype=np.int8)
+        self.service_time = np.asarray(service_time, dtype=np.int32)
+        self.rad_lat = np.radians(self.lat)
+        self.rad_lon = np.radians(self.lon)
+
+    def __len__(self) -> int:
+        return len(self.bin_ids)
+
+    @classmethod
+    def from_points(cls, points: List[WasteCollectionPoint]) -> "CollectionPoints":
+        """Build the array view from the object model (compatibility path)."""
+        return cls(
+            bin_ids=[p.bin_id for p in points],
+            names=[p.location.name for p in points],
+            lat=[p.location.lat for p in points],
+            lon=[p.location.lon for p in points],
+            fill=[p.fill_level for p in points],
+            priority=[p.priority for p in points],
+            service_time=[p.estimated_time for p in points],
+        )
+
+    def urgency_scores(self) -> np.ndarray:
+        """Vectorised WasteCollectionPoint.urgency_score()."""
+        return self.fill * 0.7 + self.priority * 10.0
+
+    def nbytes(self) -> int:
+        """Bytes held by the numeric arrays (ids and names excluded)."""
+        return sum(
+            arr.nbytes for arr in (
+                self.lat, self.lon, self.fill, self.priority,
+                self.service_time, self.rad_lat, self.rad_lon,
+            )
+        )
+
+
 class RouteOptimizer:
     """Optimizes waste collection routes using various algorithms"""
-    
+
     def __init__(self):
         self.depot_location = None
-        
+
     def set_depot(self, location: Location):
         """Set the starting depot/base location"""
         self.depot_location = location
-    
-    def greedy_nearest_neighbor(self, points: List[WasteCollectionPoint], 
-                                start_location: Location) -> Dict:
+
+    # ── Array core ────────────────────────────────────────────────────────────
+
+    def _depot_radians(self) -> Optional[Tuple[float, float]]:
+        if not self.depot_location:
+            return None
+        return math.radians(self.depot_location.lat), math.radians(self.depot_location.lon)
+
+    def route_stats(self, points: CollectionPoints, order: np.ndarray,
+                    start_location: Location) -> Tuple[float, float]:
+        """Total distance (km) and time (minutes) of visiting `order`, plus the depot return leg."""
+        if len(order) == 0:
+            return 0.0, 0.0
+
+        depot = self._depot_radians()
+        path_lat = [math.radians(start_location.lat)]
+        path_lon = [math.radians(start_location.lon)]
+        lat = np.concatenate((path_lat, points.rad_lat[order], [depot[0]] if depot else []))
+        lon = np.concatenate((path_lon, points.rad_lon[order], [depot[1]] if depot else []))
+
+        total_distance = float(haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]).sum())
+        total_time = total_distance / AVERAGE_SPEED_KMH * 60 + float(points.service_time[order].sum())
+        return total_distance, total_time
+
+    def _nearest_neighbor_order(self, points: CollectionPoints, candidates: np.ndarray,
+                                lat: float, lon: float) -> Tuple[np.ndarray, float, float]:
         """
-        Greedy algorithm: Always visit the nearest unvisited point.
-        Fast but not optimal.
+        Nearest-neighbour ordering of `candidates` starting at (lat, lon) radians.
+        Returns the visit order plus the radian position of the last stop.
+        Ties resolve to the earliest candidate, matching min() over a list.
+        """
+        remaining = np.asarray(candidates, dtype=np.intp)
+        order = np.empty(len(remaining), dtype=np.intp)
+        r_lat = points.rad_lat[remaining]
+        r_lon = points.rad_lon[remaining]
+        r_cos = np.cos(r_lat)
+        visited = np.zeros(len(remaining), dtype=bool)
+        alive = len(remaining)
+
+        for k in range(len(order)):
+            # argmin over the inner Haversine term is argmin over distance —
+            # skips the sqrt/arcsin on every candidate.
+            term = np.sin((r_lat - lat) / 2) ** 2 + math.cos(lat) * r_cos * np.sin((r_lon - lon) / 2) ** 2
+            term[visited] = np.inf
+            j = int(np.argmin(term))
+            order[k] = remaining[j]
+            lat, lon = float(r_lat[j]), float(r_lon[j])
+            visited[j] = True
+            alive -= 1
+
+            # Compact once half the slots are dead; order-preserving so
+            # tie-breaking stays identical.
+            if alive and alive * 2 < len(remaining):
+                keep = ~visited
+                remaining, r_lat, r_lon, r_cos = remaining[keep], r_lat[keep], r_lon[keep], r_cos[keep]
+                visited = np.zeros(len(remaining), dtype=bool)
+
+        return order, lat, lon
+
+    def greedy_order(self, points: CollectionPoints, start_location: Location) -> np.ndarray:
+        order, _, _ = self._nearest_neighbor_order(
+            points, np.arange(len(points)),
+            math.radians(start_location.lat), math.radians(start_location.lon),
+        )
+        return order
+
+    def priority_order(self, points: CollectionPoints, start_location: Location) -> np.ndarray:
+        # Stable sort keeps input order among equal scores, like sorted().
+        return np.argsort(-points.urgency_scores(), kind="stable")
+
+    def hybrid_order(self, points: CollectionPoints, start_location: Location) -> np.ndarray:
+        scores = points.urgency_scores()
+        groups = (
+            np.flatnonzero(scores >= 70),
+            np.flatnonzero((scores >= 40) & (scores < 70)),
+            np.flatnonzero(scores < 40),
+        )
+        lat, lon = math.radians(start_location.lat), math.radians(start_location.lon)
+        parts = []
+        for group in groups:
+            if len(group):
+                part, lat, lon = self._nearest_neighbor_order(points, group, lat, lon)
+                parts.append(part)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+    def two_opt_order(self, points: CollectionPoints, order: np.ndarray,
+                      start_location: Location,
+                      max_passes: int = TWO_OPT_MAX_PASSES,
+                      time_limit_s: Optional[float] = TWO_OPT_TIME_LIMIT_S) -> np.ndarray:
+        """
+        2-opt on an index permutation. For every segment start the gain of all
+        possible segment ends is evaluated in one vectorised step and the best
+        improving reversal is applied. The start point is fixed; the depot
+        return leg is included when a depot is set.
         """
-        if not points:
-            return {"route": [], "total_distance": 0, "total_time": 0}
-        
-        unvisited = points.copy()
-        route = []
-        current_location = start_location
-        total_distance = 0
-        total_time = 0
-        
-        while unvisited:
-            # Find nearest unvisited point
-            nearest = min(unvisited, 
-                         key=lambda p: current_location.distance_to(p.location))
-            
-            distance = current_location.distance_to(nearest.location)
-            total_distance += distance
-            total_time += (distance / 30 * 60) + nearest.estimated_time  # Assume 30 km/h
-            
-            route.append(nearest)
-            unvisited.remove(nearest)
-            current_location = nearest.location
-        
-        # Return to depot
-        if self.depot_location:
-            total_distance += current_location.distance_to(self.depot_location)
-            total_time += current_location.distance_to(self.depot_location) / 30 * 60
-        
+        n = len(order)
+        if n < 2:
+            return np.asarray(order, dtype=np.intp)
+
+        depot = self._depot_radians()
+        route = np.array(order, dtype=np.intp)
+        # Path position 0 is the start; 1..n are the stops; n+1 the depot (optional)
+        lat = np.concatenate(([math.radians(start_location.lat)], points.rad_lat[route], [depot[0]] if depot else []))
+        lon = np.concatenate(([math.radians(start_location.lon)], points.rad_lon[route], [depot[1]] if depot else []))
+
+        def edge_lengths() -> np.ndarray:
+            edges = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+            # Open-ended route: the (absent) edge after the last stop costs nothing
+            return edges if depot else np.append(edges, 0.0)
+
+        edges = edge_lengths()
+        deadline = time.perf_counter() + time_limit_s if time_limit_s else None
+
+        for _ in range(max_passes):
+            improved = False
+            for a in range(1, n):
+                ends = np.arange(a + 1, n + 1)
+                nxt = np.minimum(ends + 1, len(lat) - 1)
+                gain_in = haversine_km(lat[a - 1], lon[a - 1], lat[ends], lon[ends])
+                gain_out = haversine_km(lat[a], lon[a], lat[nxt], lon[nxt])
+                if not depot:
+                    gain_out[-1] = 0.0
+                delta = gain_in + gain_out - edges[a - 1] - edges[ends]
+                best = int(np.argmin(delta))
+                if delta[best] < -1e-9:
+                    b = a + 1 + best
+                    lat[a:b + 1] = lat[a:b + 1][::-1].copy()
+                    lon[a:b + 1] = lon[a:b + 1][::-1].copy()
+                    route[a - 1:b] = route[a - 1:b][::-1].copy()
+                    edges = edge_lengths()
+                    improved = True
+                if deadline and time.perf_counter() > deadline:
+                    return route
+            if not improved:
+                break
+
+        return route
+
+    _ARRAY_ALGORITHMS = {
+        "greedy": ("greedy_order", "greedy_nearest_neighbor"),
+        "priority": ("priority_order", "priority_based"),
+        "hybrid": ("hybrid_order", "hybrid_optimized"),
+    }
+
+    def optimize_arrays(self, points: CollectionPoints, start_location: Location,
+                        algorithm: str = "hybrid") -> Dict:
+        """
+        Array counterpart of optimize(). Returns the visit order as an index
+        permutation into `points` instead of a list of objects.
+        """
+        if algorithm == "two_opt":
+            order = self.two_opt_order(points, self.greedy_order(points, start_location), start_location)
+            name = "two_opt_optimized"
+        else:
+            method, name = self._ARRAY_ALGORITHMS.get(algorithm, self._ARRAY_ALGORITHMS["hybrid"])
+            order = getattr(self, method)(points, start_location)
+
+        total_distance, total_time = self.route_stats(points, order, start_location)
         return {
-            "route": route,
+            "order": order,
             "total_distance": round(total_distance, 2),
             "total_time": round(total_time, 2),
-            "algorithm": "greedy_nearest_neighbor"
+            "algorithm": name,
+        }
+
+    def compare_arrays(self, points: CollectionPoints, start_location: Location) -> List[Dict]:
+        """Array counterpart of compare_algorithms()."""
+        return [
+            self.optimize_arrays(points, start_location, algo)
+            for algo in ["greedy", "priority", "hybrid", "two_opt"]
+        ]
+
+    # ── Object API (kept for callers that already hold WasteCollectionPoints) ─
+
+    def _run_on_objects(self, points: List[WasteCollectionPoint], start_location: Location,
+                        algorithm: str) -> Dict:
+        result = self.optimize_arrays(CollectionPoints.from_points(points), start_location, algorithm)
+        return {
+            "route": [points[i] for i in result["order"]],
+            "total_distance": result["total_distance"],
+            "total_time": result["total_time"],
+            "algorithm": result["algorithm"],
         }
-    
-    def priority_based(self, points: List[WasteCollectionPoint], 
+
+    def greedy_nearest_neighbor(self, points: List[WasteCollectionPoint],
+                                start_location: Location) -> Dict:
+        """
+        Greedy algorithm: Always visit the nearest unvisited point.
+        Fast but not optimal.
+        """
+        return self._run_on_objects(points, start_location, "greedy")
+
+    def priority_based(self, points: List[WasteCollectionPoint],
                       start_location: Location) -> Dict:
         """
         Priority-based algorithm: Visit bins based on urgency score.
         Prioritizes full bins and high-priority locations.
         """
-        if not points:
-            return {"route": [], "total_distance": 0, "total_time": 0}
-        
-        # Sort by urgency score (highest first)
-        sorted_points = sorted(points, key=lambda p: p.urgency_score(), reverse=True)
-        
-        route = []
-        current_location = start_location
-        total_distance = 0
-        total_time = 0
-        
-        for point in sorted_points:
-            distance = current_location.distance_to(point.location)
-            total_distance += distance
-            total_time += (distance / 30 * 60) + point.estimated_time
-            
-            route.append(point)
-            current_location = point.location
-        
-        # Return to depot
-        if self.depot_location:
-            total_distance += current_location.distance_to(self.depot_location)
-            total_time += current_location.distance_to(self.depot_location) / 30 * 60
-        
-        return {
-            "route": route,
-            "total_distance": round(total_distance, 2),
-            "total_time": round(total_time, 2),
-            "algorithm": "priority_based"
-        }
-    
-    def hybrid_optimized(self, points: List[WasteCollectionPoint], 
+        return self._run_on_objects(points, start_location, "priority")
+
+    def hybrid_optimized(self, points: List[WasteCollectionPoint],
                         start_location: Location) -> Dict:
         """
         Hybrid algorithm: Combines priority and distance optimization.
         Groups high-priority bins and finds efficient routes within groups.
         """
-        if not points:
-            return {"route": [], "total_distance": 0, "total_time": 0}
-        
-        # Separate into priority groups
-        high_priority = [p for p in points if p.urgency_score() >= 70]
-        medium_priority = [p for p in points if 40 <= p.urgency_score() < 70]
-        low_priority = [p for p in points if p.urgency_score() < 40]
-        
-        route = []
-        current_location = start_location
-        total_distance = 0
-        total_time = 0
-        
-        # Process each priority group with nearest neighbor
-        for group in [high_priority, medium_priority, low_priority]:
-            unvisited = group.copy()
-            
-            while unvisited:
-                nearest = min(unvisited, 
-                            key=lambda p: current_location.distance_to(p.location))
-                
-                distance = current_location.distance_to(nearest.location)
-                total_distance += distance
-                total_time += (distance / 30 * 60) + nearest.estimated_time
-                
-                route.append(nearest)
-                unvisited.remove(nearest)
-                current_location = nearest.location
-        
-        # Return to depot
-        if self.depot_location:
-            total_distance += current_location.distance_to(self.depot_location)
-            total_time += current_location.distance_to(self.depot_location) / 30 * 60
-        
-        return {
-            "route": route,
-            "total_distance": round(total_distance, 2),
-            "total_time": round(total_time, 2),
-            "algorithm": "hybrid_optimized"
-        }
-    
-    def two_opt_optimization(self, initial_route: List[WasteCollectionPoint], 
+        return self._run_on_objects(points, start_location, "hybrid")
+
+    def two_opt_optimization(self, initial_route: List[WasteCollectionPoint],
                             start_location: Location) -> Dict:
         """
         2-opt algorithm: Improves a route by removing crossing paths.
         Takes an initial route and optimizes it.
         """
-        if len(initial_route) < 2:
-            return {"route": initial_route, "total_distance": 0, "total_time": 0}
-        
-        def calculate_route_distance(route: List[WasteCollectionPoint]) -> float:
-            dist = start_location.distance_to(route[0].location)
-            for i in range(len(route) - 1):
-                dist += route[i].location.distance_to(route[i + 1].location)
-            if self.depot_location:
-                dist += route[-1].location.distance_to(self.depot_location)
-            return dist
-        
-        route = initial_route.copy()
-        improved = True
-        
-        while improved:
-            improved = False
-            best_distance = calculate_route_distance(route)
-            
-            for i in range(1, len(route) - 1):
-                for j in range(i + 1, len(route)):
-                    # Reverse segment between i and j
-                    new_route = route[:i] + route[i:j+1][::-1] + route[j+1:]
-                    new_distance = calculate_route_distance(new_route)
-                    
-                    if new_distance < best_distance:
-                        route = new_route
-                        best_distance = new_distance
-                        improved = True
-                        break
-                if improved:
-                    break
-        
-        # Calculate final stats
-        current_location = start_location
-        total_distance = 0
-        total_time = 0
-        
-        for point in route:
-            distance = current_location.distance_to(point.location)
-            total_distance += distance
-            total_time += (distance / 30 * 60) + point.estimated_time
-            current_location = point.location
-        
-        if self.depot_location:
-            total_distance += current_location.distance_to(self.depot_location)
-            total_time += current_location.distance_to(self.depot_location) / 30 * 60
-        
+        points = CollectionPoints.from_points(initial_route)
+        order = self.two_opt_order(points, np.arange(len(points)), start_location)
+        total_distance, total_time = self.route_stats(points, order, start_location)
         return {
-            "route": route,
+            "route": [initial_route[i] for i in order],
             "total_distance": round(total_distance, 2),
             "total_time": round(total_time, 2),
             "algorithm": "two_opt_optimized"
         }
-    
-    def optimize(self, points: List[WasteCollectionPoint], 
-                start_location: Location, 
+
+    def optimize(self, points: List[WasteCollectionPoint],
+                start_location: Location,
                 algorithm: str = "hybrid") -> Dict:
         """
         Main optimization function. Choose algorithm and return optimized route.
-        
+
         Args:
             points: List of collection points to visit
             start_location: Starting location (crew location)
             algorithm: Algorithm to use (greedy, priority, hybrid, two_opt)
-        
+
         Returns:
             Dictionary with route, distance, time, and metadata
         """
-        if algorithm == "greedy":
-            return self.greedy_nearest_neighbor(points, start_location)
-        elif algorithm == "priority":
-            return self.priority_based(points, start_location)
-        elif algorithm == "two_opt":
-            # First get greedy route, then optimize with 2-opt
-            initial = self.greedy_nearest_neighbor(points, start_location)
-            return self.two_opt_optimization(initial["route"], start_location)
-        else:  # hybrid (default)
-            return self.hybrid_optimized(points, start_location)
-    
-    def compare_algorithms(self, points: List[WasteCollectionPoint], 
+        return self._run_on_objects(points, start_location, algorithm)
+
+    def compare_algorithms(self, points: List[WasteCollectionPoint],
                           start_location: Location) -> List[Dict]:
         """
         Compare all algorithms and return results for each.
@@ -266,9 +377,9 @@ class RouteOptimizer:
         """
         algorithms = ["greedy", "priority", "hybrid", "two_opt"]
         results = []
-        
+
         for algo in algorithms:
             result = self.optimize(points, start_location, algo)
             results.append(result)
-        
-        return results
\ No newline at end of file
+
+        return results
@@ -0,0 +1,221 @@
+"""
+tests/test_firebase_auth.py
+
+Tests for the Firebase ID-token verification cache, batch revocation checks
+and initialisation backoff in firebase_service.py, against FakeFirebaseAuth,
+an in-memory stand-in for firebase_admin.auth.
+"""
+
+import logging
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict
+
+import pytest
+
+import firebase_service
+from firebase_service import GET_USERS_LIMIT, TokenRevoked, TokenVerifier
+
+
+class FakeAuthError(ValueError):
+    pass
+
+
+class FakeFirebaseAuth:
+    """
+    The parts of firebase_admin.auth that firebase_service uses.  `issue()`
+    mints opaque tokens; `revoke_refresh_tokens()` and `disable()` behave like
+    the console.  `calls` counts SDK calls by name.
+    """
+
+    class UidIdentifier:
+        def __init__(self, uid: str):
+            self.uid = uid
+
+    def __init__(self, project_id: str = "sgm-project-fc254", clock=time.time):
+        self.project_id = project_id
+        self._clock = clock
+        self._tokens: Dict[str, dict] = {}
+        self.users: Dict[str, SimpleNamespace] = {}
+        self.calls: Counter = Counter()
+
+    def issue(self, uid: str, email: str, lifetime: int = 3600, **claims) -> str:
+        now = int(self._clock())
+        self.users.setdefault(uid, SimpleNamespace(uid=uid, disabled=False, tokens_valid_after_timestamp=None))
+        token = f"fake-id-token-{len(self._tokens)}-{uid}"
+        self._tokens[token] = {
+            "uid": uid, "email": email, "aud": self.project_id,
+            "iat": now, "auth_time": now, "exp": now + lifetime,
+            "firebase": {"sign_in_provider": "password"}, **claims,
+        }
+        return token
+
+    def revoke_refresh_tokens(self, uid: str) -> None:
+        # Firebase records the revocation with one-second precision
+        self.users[uid].tokens_valid_after_timestamp = (int(self._clock()) + 1) * 1000
+
+    def disable(self, uid: str) -> None:
+        self.users[uid].disabled = True
+
+    def verify_id_token(self, id_token: str, check_revoked: bool = False, app=None) -> dict:
+        self.calls["verify_id_token"] += 1
+        claims = self._tokens.get(id_token)
+        if claims is None:
+            raise FakeAuthError("Invalid ID token")
+        if claims["exp"] <= self._clock():
+            raise FakeAuthError("ID token has expired")
+        if check_revoked:
+            self.calls["revocation_lookup"] += 1
+            user = self.users[claims["uid"]]
+            if user.disabled:
+                raise FakeAuthError("User is disabled")
+            if user.tokens_valid_after_timestamp and claims["iat"] * 1000 < user.tokens_valid_after_timestamp:
+                raise FakeAuthError("ID token has been revoked")
+        return dict(claims)
+
+    def get_users(self, identifiers):
+        self.calls["get_users"] += 1
+        if len(identifiers) > GET_USERS_LIMIT:
+            raise FakeAuthError(f"get_users takes at most {GET_USERS_LIMIT} identifiers")
+        found = [self.users[i.uid] for i in identifiers if i.uid in self.users]
+        missing = [i for i in identifiers if i.uid not in self.users]
+        return SimpleNamespace(users=found, not_found=missing)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+@pytest.fixture
+def fake(clock):
+    return FakeFirebaseAuth(clock=clock)
+
+
+class TestVerificationCache:
+
+    def test_repeated_token_is_verified_once(self, fake, clock):
+        verifier = TokenVerifier(fake, clock=clock)
+        token = fake.issue("uid-1", "one@example.com")
+
+        assert verifier.verify(token)["uid"] == "uid-1"
+        assert verifier.verify(token)["email"] == "one@example.com"
+        assert fake.calls["verify_id_token"] == 1
+        assert (verifier.hits, verifier.misses) == (1, 1)
+
+    def test_always_mode_rechecks_revocation_after_the_window(self, fake, clock):
+        verifier = TokenVerifier(fake, revocation_check="always", recheck_seconds=300, clock=clock)
+        token = fake.issue("uid-1", "one@example.com")
+        verifier.verify(token)
+        assert fake.calls["revocation_lookup"] == 1
+
+        fake.revoke_refresh_tokens("uid-1")
+        clock.now += 120
+        verifier.verify(token)                      # still cached
+        clock.now += 200
+        with pytest.raises(ValueError, match="revoked"):
+            verifier.verify(token)
+        assert fake.calls["revocation_lookup"] == 2
+
+    def test_cached_token_is_not_served_past_its_expiry(self, fake, clock):
+        verifier = TokenVerifier(fake, revocation_check="batch", clock=clock)
+        token = fake.issue("uid-1", "one@example.com", lifetime=60)
+        verifier.verify(token)
+
+        clock.now += 61
+        with pytest.raises(ValueError, match="expired"):
+            verifier.verify(token)
+
+    def test_cache_is_bounded(self, fake, clock):
+        verifier = TokenVerifier(fake, max_entries=3, clock=clock)
+        for i in range(5):
+            verifier.verify(fake.issue(f"uid-{i}", f"{i}@example.com"))
+        assert verifier.stats()["cached"] == 3
+
+
+class TestBatchRevocation:
+
+    def test_users_are_checked_in_bulk_and_revoked_tokens_dropped(self, fake, clock):
+        verifier = TokenVerifier(fake, revocation_check="batch", recheck_seconds=300, clock=clock)
+        verifier._spawn = lambda job: None          # sweeps are driven by hand below
+        tokens = {f"uid-{i}": fake.issue(f"uid-{i}", f"{i}@example.com") for i in range(150)}
+        for token in tokens.values():
+            verifier.verify(token)
+        assert fake.calls["revocation_lookup"] == 0      # no per-token round trips
+
+        fake.revoke_refresh_tokens("uid-7")
+        fake.disable("uid-8")
+        assert verifier.sweep_revocations() == 2
+        assert fake.calls["get_users"] == 2                 # 150 users, 100 per call
+
+        for uid in ("uid-7", "uid-8"):
+            with pytest.raises(TokenRevoked):
+                verifier.verify(tokens[uid])
+        assert verifier.verify(tokens["uid-9"])["uid"] == "uid-9"
+
+    def test_sweep_runs_off_the_request_path_at_most_once_per_window(self, fake, clock):
+        verifier = TokenVerifier(fake, revocation_check="batch", recheck_seconds=300, clock=clock)
+        jobs = []
+        verifier._spawn = jobs.append
+        token = fake.issue("uid-1", "one@example.com")
+        verifier.verify(token)
+        verifier.verify(token)
+        assert len(jobs) == 1 and fake.calls["get_users"] == 0    # the request did not wait
+        jobs.pop()()
+        assert fake.calls["get_users"] == 1
+
+        clock.now += 120
+        verifier.verify(token)
+        assert jobs == []
+        clock.now += 181
+        verifier.verify(token)
+        assert len(jobs) == 1 and fake.calls["get_users"] == 1
+        jobs.pop()()
+        assert fake.calls["get_users"] == 2
+
+    def test_started_verifier_sweeps_on_its_own_thread(self, fake):
+        verifier = TokenVerifier(fake, revocation_check="batch", recheck_seconds=0.02)
+        token = fake.issue("uid-1", "one@example.com")
+        verifier.verify(token)
+        fake.revoke_refresh_tokens("uid-1")
+        verifier.start()
+        try:
+            deadline = time.monotonic() + 2
+            while verifier.stats()["cached"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            verifier.stop()
+        assert verifier.stats()["cached"] == 0
+        with pytest.raises(TokenRevoked):
+            verifier.verify(token)
+
+
+class TestInitialisation:
+
+    def test_unconfigured_sdk_is_retried_with_backoff(self, monkeypatch, caplog):
+        now = [1000.0]
+        monkeypatch.setattr(firebase_service.time, "monotonic", lambda: now[0])
+        monkeypatch.setattr(firebase_service, "_firebase_app", None)
+        monkeypatch.setattr(firebase_service, "_init_failures", 0)
+        monkeypatch.setattr(firebase_service, "_init_retry_at", 0.0)
+        monkeypatch.setattr(firebase_service.settings, "firebase_service_account_path", None)
+        monkeypatch.setattr(firebase_service.settings, "firebase_credentials_json", None)
+
+        with caplog.at_level(logging.WARNING, logger="firebase_service"):
+            for _ in range(5):
+                assert firebase_service._init_firebase() is None
+            now[0] += 31
+            assert firebase_service._init_firebase() is None
+
+        retries = [r.getMessage() for r in caplog.records if "not configured" in r.getMessage()]
+        assert len(retries) == 2
+        assert retries[1].endswith("retrying in 60s")
@@ -0,0 +1,331 @@
+"""
+tests/test_push_dispatch.py
+
+Tests for services/push_dispatch.py (batching per recipient set, failure
+isolation, queue bounds and metrics, against the fake FCM transport), the
+recipient index in services/recipients.py and the alert digests in
+services/alert_digest.py.
+"""
+
+import json
+import threading
+
+import pytest
+
+from services.alert_digest import AlertCoalescer, BinAlert, digest_content
+from services.push_dispatch import FakePushTransport, NotificationDispatcher, PushMessage
+from services.recipients import TOPIC_BINS, TOPIC_ROUTES, RecipientIndex
+
+
+class _NullSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _dispatcher(transport, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("linger_ms", 100)
+    return NotificationDispatcher(transport, session_factory=_NullSession, **kwargs)
+
+
+def _alert(db, tokens, bin_id):
+    return [PushMessage(tokens, f"Bin {bin_id} Warning", "collection needed", {"bin_id": bin_id})]
+
+
+class TestBatching:
+
+    def test_burst_is_grouped_into_one_call_per_recipient_set(self):
+        fake = FakePushTransport()
+        dispatcher = _dispatcher(fake)
+        admins, crew = ("tok-a", "tok-b"), ("tok-c",)
+
+        for i in range(5):
+            dispatcher.submit(_alert, admins, f"bin{i}")
+        dispatcher.submit(_alert, crew, "bin9")
+        dispatcher.submit(_alert, crew, "bin9")      # identical payload, same set
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        calls = {kind: items for kind, items in fake.calls}
+        assert len(fake.calls) == 2
+        assert len(calls["send_each"]) == 10          # 5 payloads × 2 admin tokens
+        assert [t for t, _ in calls["multicast"]] == ["tok-c"]
+        assert len(fake.delivered("tok-a")) == 5
+
+    def test_failing_builder_does_not_sink_the_batch(self):
+        fake = FakePushTransport()
+        dispatcher = _dispatcher(fake)
+
+        def broken(db):
+            raise RuntimeError("boom")
+
+        dispatcher.submit(broken)
+        dispatcher.submit(_alert, ("tok-a",), "bin1")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert dispatcher.stats()["build_errors"] == 1
+        assert len(fake.delivered("tok-a")) == 1
+
+    def test_failed_tokens_are_counted(self):
+        fake = FakePushTransport()
+        fake.errors["tok-dead"] = "NOT_FOUND"
+        dispatcher = _dispatcher(fake)
+
+        dispatcher.submit(_alert, ("tok-a", "tok-dead"), "bin1")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        stats = dispatcher.stats()
+        assert (stats["delivered"], stats["failed"]) == (1, 1)
+
+
+class TestTokenHealth:
+
+    def test_dead_tokens_are_pruned_once_per_batch(self):
+        fake, pruned = FakePushTransport(), []
+        fake.errors.update({"tok-gone": "UNREGISTERED", "tok-bad": "INVALID_ARGUMENT"})
+        dispatcher = _dispatcher(fake, prune=lambda db, tokens: pruned.append(tokens))
+
+        dispatcher.submit(_alert, ("tok-a", "tok-gone", "tok-bad"), "bin1")
+        dispatcher.submit(_alert, ("tok-gone",), "bin2")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert pruned == [["tok-bad", "tok-gone"]]
+        assert dispatcher.stats()["pruned"] == 2
+
+    def test_invalid_argument_for_every_token_blames_the_payload(self):
+        fake, pruned = FakePushTransport(), []
+        fake.errors.update({"tok-a": "INVALID_ARGUMENT", "tok-b": "INVALID_ARGUMENT"})
+        dispatcher = _dispatcher(fake, prune=lambda db, tokens: pruned.append(tokens))
+
+        dispatcher.submit(_alert, ("tok-a", "tok-b"), "bin1")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert pruned == []
+        assert dispatcher.stats()["failed"] == 2
+
+    def test_transient_failures_are_retried_with_backoff(self):
+        fake, delays = FakePushTransport(), []
+        fake.fail_next("tok-a", "UNAVAILABLE", "QUOTA_EXCEEDED")
+        dispatcher = _dispatcher(fake, retries=3, retry_backoff_ms=200)
+        dispatcher._sleep = delays.append
+
+        dispatcher.submit(_alert, ("tok-a", "tok-b"), "bin1")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert delays == [0.2, 0.4]
+        assert [[t for t, _ in items] for _, items in fake.calls] == [["tok-a", "tok-b"], ["tok-a"], ["tok-a"]]
+        stats = dispatcher.stats()
+        assert (stats["delivered"], stats["failed"], stats["retried"]) == (2, 0, 2)
+
+    def test_retries_give_up_and_count_as_failed(self):
+        class Down(FakePushTransport):
+            def multicast(self, tokens, message):
+                super().multicast(tokens, message)
+                raise ConnectionError("fcm unreachable")
+
+        fake, pruned = Down(), []
+        dispatcher = _dispatcher(fake, retries=2, prune=lambda db, tokens: pruned.append(tokens))
+        dispatcher._sleep = lambda seconds: None
+
+        dispatcher.submit(_alert, ("tok-a",), "bin1")
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert len(fake.calls) == 3
+        assert pruned == []
+        assert dispatcher.stats()["failed"] == 1
+
+
+class TestQueue:
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        fake, release = FakePushTransport(), threading.Event()
+        dispatcher = _dispatcher(fake, max_queue=1, linger_ms=0)
+        started = threading.Event()
+
+        def slow(db):
+            started.set()
+            release.wait(2)
+            return []
+
+        assert dispatcher.submit(slow)
+        assert started.wait(2)                         # worker is busy with the first job
+        assert dispatcher.submit(_alert, ("tok-a",), "bin1")
+        assert dispatcher.submit(_alert, ("tok-a",), "bin2") is False
+        release.set()
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        stats = dispatcher.stats()
+        assert stats["dropped"] == 1
+        assert stats["max_queue_depth"] == 1
+        assert stats["send_latency_ms"]["count"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_unavailable_transport_skips_without_building(self):
+        class Offline(FakePushTransport):
+            def available(self):
+                return False
+
+        built = []
+        dispatcher = _dispatcher(Offline())
+        dispatcher.submit(lambda db: built.append(1) or [])
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        assert built == []
+        assert dispatcher.stats()["skipped"] == 1
+
+
+def _index(changes=None):
+    index = RecipientIndex(on_change=(lambda: changes.append(1)) if changes is not None else None)
+    index.put_user(1, "admin@example.com", "admin", True)
+    index.put_user(2, "crew@example.com", "user", True)
+    index.put_token(1, "tok-admin")
+    index.put_token(2, "tok-crew")
+    index.put_crew("crew1", "Team One", "crew@example.com")
+    return index
+
+
+class TestRecipientIndex:
+
+    def test_users_without_settings_are_opted_in_until_they_opt_out(self):
+        index = _index()
+        assert index.admin_tokens(TOPIC_BINS) == ["tok-admin"]
+
+        index.put_preferences(1, critical_bins=False, route_updates=True, push_enabled=True)
+        assert index.admin_tokens(TOPIC_BINS) == []
+        assert index.admin_tokens(TOPIC_ROUTES) == ["tok-admin"]
+
+        index.put_preferences(1, critical_bins=True, route_updates=True, push_enabled=False)
+        assert index.admin_tokens(TOPIC_ROUTES) == []
+
+    def test_crew_tokens_follow_the_crew_email_and_token_owner(self):
+        index = _index()
+        assert index.crew_tokens("crew1", TOPIC_ROUTES) == ["tok-crew"]
+        assert index.crew_name("crew1") == "Team One"
+
+        index.put_token(1, "tok-crew")              # device re-registered by the admin
+        assert index.crew_tokens("crew1", TOPIC_ROUTES) == []
+        assert index.admin_tokens(TOPIC_ROUTES) == ["tok-admin", "tok-crew"]
+
+        index.remove_crew("crew1")
+        assert index.crew_tokens("crew1", TOPIC_ROUTES) == []
+
+    def test_disabled_users_and_removed_tokens_are_excluded(self):
+        changes = []
+        index = _index(changes)
+        index.put_user(1, "admin@example.com", "admin", False)
+        index.remove_token("tok-crew")
+
+        assert index.admin_tokens(TOPIC_BINS) == []
+        assert index.crew_tokens("crew1", TOPIC_BINS) == []
+        assert len(changes) == 7
+
+    def test_index_goes_stale_after_max_age(self, monkeypatch):
+        import services.recipients as module
+
+        now = [1000.0]
+        monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+        index = RecipientIndex(max_age_seconds=300)
+        index._loaded_at = now[0]
+        assert index.loaded
+        now[0] += 301
+        assert not index.loaded
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _warning(i, zone="north", fill=82):
+    return BinAlert(f"bin{i:02d}", f"Market Road {i}", fill, zone)
+
+
+class TestAlertDigest:
+
+    def test_burst_is_held_after_the_first_alert_and_digested(self):
+        clock = _Clock()
+        digest = AlertCoalescer(120, clock=clock)
+
+        sent = [digest.offer("admin", ("tok-a",), _warning(i, fill=89 - i % 10)) for i in range(12)]
+        assert sent == [True] + [False] * 11
+        assert digest.take_due() == []
+
+        clock.now += 121
+        [(recipient, tokens, alerts)] = digest.take_due()
+        assert (recipient, tokens, len(alerts)) == ("admin", ("tok-a",), 12)
+
+        title, body, data = digest_content(alerts)
+        assert title == "12 bins need collection in Zone North"
+        assert body == "0 critical, fullest Market Road 0 at 89%"
+        assert data["count"] == "12" and data["zone_id"] == "north"
+        assert json.loads(data["bins"])[0]["bin_id"] == "bin00"
+
+    def test_windows_are_per_recipient(self):
+        clock = _Clock()
+        digest = AlertCoalescer(120, clock=clock)
+        assert digest.offer("admin-1", ("tok-1",), _warning(1))
+        assert digest.offer("admin-2", ("tok-2",), _warning(2))
+        assert not digest.offer("admin-1", ("tok-1",), _warning(3))
+
+        clock.now += 121
+        assert [r for r, _, _ in digest.take_due()] == ["admin-1"]   # admin-2 had nothing held
+
+    def test_repeat_of_the_delivered_bin_needs_no_digest(self):
+        clock = _Clock()
+        digest = AlertCoalescer(120, clock=clock)
+        assert digest.offer("admin", ("tok",), _warning(1))
+        assert not digest.offer("admin", ("tok",), _warning(1, fill=86))
+
+        clock.now += 121
+        assert digest.take_due() == []
+        assert digest_content([_warning(1)])[0] == "1 bin needs collection in Zone North"
+
+    @pytest.mark.parametrize("bypass, held", [("critical", False), ("none", True)])
+    def test_critical_alerts_bypass_unless_configured_otherwise(self, bypass, held):
+        digest = AlertCoalescer(120, bypass_severity=bypass, clock=_Clock())
+        digest.offer("admin", ("tok",), _warning(1))
+        assert digest.offer("admin", ("tok",), _warning(2, fill=95)) is not held
+
+    def test_zero_window_sends_everything(self):
+        digest = AlertCoalescer(0, clock=_Clock())
+        assert all(digest.offer("admin", ("tok",), _warning(i)) for i in range(5))
+
+    def test_mixed_zones_are_listed_in_the_body(self):
+        title, body, data = digest_content(
+            [_warning(1, "north"), _warning(2, "north"), _warning(3, "south_east", fill=93)]
+        )
+        assert title == "3 bins need collection"
+        assert body.startswith("Zone North (2), Zone South East (1) — 1 critical")
+        assert data["zone_id"] == ""
+
+    def test_closed_windows_reach_the_dispatcher(self):
+        fake, delivered = FakePushTransport(), threading.Event()
+        dispatcher = _dispatcher(fake, linger_ms=0)
+
+        def digest_job(db, windows):
+            delivered.set()
+            return [PushMessage(tokens, *digest_content(alerts)) for _, tokens, alerts in windows]
+
+        digest = AlertCoalescer(0.05, on_due=lambda windows: dispatcher.submit(digest_job, windows))
+        for i in range(4):
+            digest.offer("admin", ("tok-a",), _warning(i))
+        assert delivered.wait(2)
+        assert dispatcher.flush()
+        dispatcher.stop()
+
+        [message] = fake.delivered("tok-a")
+        assert message.title == "4 bins need collection in Zone North"
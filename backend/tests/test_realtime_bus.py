@@ -0,0 +1,257 @@
+"""
+tests/test_realtime_bus.py
+
+Tests for services/realtime_bus.py: envelope ordering, the Unix socket
+broker, and the Redis backend against a minimal in-test RESP server.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+
+from routers.websocket_router import ConnectionManager
+from services.realtime_bus import (
+    InProcessBus,
+    RedisBus,
+    UnixSocketBus,
+)
+from services.resp import encode_command, read_reply
+from tests.test_websocket import FakeWebSocket
+
+
+class FakeRedisServer:
+    """Just enough of the Redis protocol for SUBSCRIBE / PUBLISH and the rate limit counters."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self.values = {}
+        self.expiries = {}
+        self._server = None
+        self.port = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                name = command[0].upper()
+                if name == b"SUBSCRIBE":
+                    channel = command[1]
+                    self._subscribers.setdefault(channel, set()).add(writer)
+                    writer.write(b"*3\r\n$9\r\nsubscribe\r\n$%d\r\n%s\r\n:1\r\n" % (len(channel), channel))
+                elif name == b"PUBLISH":
+                    channel, payload = command[1], command[2]
+                    receivers = self._subscribers.get(channel, set())
+                    for sub in receivers:
+                        sub.write(encode_command("message", channel, payload))
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"INCRBY":
+                    self.values[command[1]] = self.values.get(command[1], 0) + int(command[2])
+                    writer.write(b":%d\r\n" % self.values[command[1]])
+                elif name == b"PEXPIRE":
+                    self.expiries[command[1]] = int(command[2])
+                    writer.write(b":1\r\n")
+                elif name in (b"GET", b"MGET"):
+                    found = [self.values.get(key) for key in command[1:]]
+                    reply = b"".join(
+                        b"$-1\r\n" if v is None else b"$%d\r\n%d\r\n" % (len(str(v)), v) for v in found
+                    )
+                    writer.write(reply if name == b"GET" else b"*%d\r\n%s" % (len(found), reply))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subs in self._subscribers.values():
+                subs.discard(writer)
+            writer.close()
+
+
+async def _wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def _socket_path():
+    return os.path.join(tempfile.mkdtemp(prefix="swbus"), "bus.sock")
+
+
+class TestEnvelopeOrdering:
+
+    def test_sequence_numbers_increase_per_origin(self):
+        bus, seen = InProcessBus(), []
+        bus.attach(seen.append)
+        for i in range(3):
+            bus.publish("bin_update", {"i": i})
+        assert [e["seq"] for e in seen] == [1, 2, 3]
+        assert {e["origin"] for e in seen} == {bus.origin}
+
+    def test_duplicates_dropped_and_gaps_counted(self):
+        bus, seen = InProcessBus(), []
+        bus.attach(seen.append)
+
+        def line(origin, seq):
+            return json.dumps({"origin": origin, "seq": seq, "kind": "k", "data": {}})
+
+        for origin, seq in [("a", 1), ("a", 2), ("a", 2), ("b", 1), ("a", 1), ("a", 5)]:
+            bus._receive(line(origin, seq))
+
+        assert [(e["origin"], e["seq"]) for e in seen] == [("a", 1), ("a", 2), ("b", 1), ("a", 5)]
+        assert bus.duplicates == 2
+        assert bus.gaps == 2
+
+    def test_started_in_process_bus_delivers_on_the_event_loop(self):
+        async def scenario():
+            bus, seen = InProcessBus(), []
+            bus.attach(lambda envelope: seen.append(threading.get_ident()))
+            await bus.start()
+            loop_thread = threading.get_ident()
+
+            bus.publish("bin_update", {})
+            await asyncio.to_thread(bus.publish, "bin_update", {})   # like a threadpool endpoint
+            await _wait_for(lambda: len(seen) == 2)
+            await bus.stop()
+            return loop_thread, seen
+
+        loop_thread, seen = asyncio.run(scenario())
+        assert seen == [loop_thread, loop_thread]
+
+
+class TestUnixSocketBus:
+
+    def test_workers_receive_each_others_events_in_order(self):
+        async def scenario():
+            path = _socket_path()
+            buses = [UnixSocketBus(path, reconnect_delay=0.05) for _ in range(3)]
+            inboxes = [[] for _ in buses]
+            for bus, inbox in zip(buses, inboxes):
+                bus.attach(inbox.append)
+                await bus.start()
+            brokers = [bus for bus in buses if bus.broker is not None]
+
+            for i in range(50):
+                buses[i % 3].publish("bin_update", {"i": i})
+            await _wait_for(lambda: all(len(inbox) == 50 for inbox in inboxes))
+
+            for bus in buses:
+                await bus.stop()
+            return brokers, inboxes
+
+        brokers, inboxes = asyncio.run(scenario())
+
+        assert len(brokers) == 1
+        for inbox in inboxes:
+            by_origin = {}
+            for envelope in inbox:
+                by_origin.setdefault(envelope["origin"], []).append(envelope["seq"])
+            assert all(seqs == sorted(seqs) for seqs in by_origin.values())
+
+    def test_another_worker_takes_over_when_broker_stops(self):
+        async def scenario():
+            path = _socket_path()
+            first, second = UnixSocketBus(path, reconnect_delay=0.05), UnixSocketBus(path, reconnect_delay=0.05)
+            seen = []
+            first.attach(lambda e: None)
+            second.attach(seen.append)
+            await first.start()
+            await second.start()
+
+            await first.stop()
+            await _wait_for(lambda: second.broker is not None and second.connected)
+            second.publish("bin_update", {"after": "failover"})
+            await _wait_for(lambda: seen)
+            await second.stop()
+            return seen
+
+        seen = asyncio.run(scenario())
+        assert seen[0]["data"] == {"after": "failover"}
+
+
+class TestRedisBus:
+
+    def test_publish_reaches_every_subscriber(self):
+        async def scenario():
+            server = FakeRedisServer()
+            await server.start()
+            url = f"redis://127.0.0.1:{server.port}/0"
+            a, b = RedisBus(url, "test:rt"), RedisBus(url, "test:rt")
+            seen_a, seen_b = [], []
+            a.attach(seen_a.append)
+            b.attach(seen_b.append)
+            await a.start()
+            await b.start()
+
+            a.publish("bin_update", {"bin_id": "bin1"})
+            b.publish("bin_zone", {"bin_id": "bin1", "zone_id": "north"})
+            await _wait_for(lambda: len(seen_a) == 2 and len(seen_b) == 2)
+
+            await a.stop()
+            await b.stop()
+            await server.stop()
+            return seen_a, seen_b
+
+        seen_a, seen_b = asyncio.run(scenario())
+        assert sorted(e["kind"] for e in seen_a) == ["bin_update", "bin_zone"]
+        assert sorted(e["kind"] for e in seen_b) == ["bin_update", "bin_zone"]
+
+
+class TestCrossWorkerFanOut:
+
+    def test_reading_on_one_worker_reaches_clients_on_another(self):
+        async def scenario():
+            path = _socket_path()
+            worker_a = ConnectionManager(max_queue=16, batch_window_ms=0)
+            worker_b = ConnectionManager(max_queue=16, batch_window_ms=0)
+            await worker_a.use_bus(UnixSocketBus(path, reconnect_delay=0.05))
+            await worker_b.use_bus(UnixSocketBus(path, reconnect_delay=0.05))
+
+            ws = FakeWebSocket()
+            await worker_b.connect(ws, "user@example.com")
+            worker_b.subscribe(ws, zones=["north"])
+
+            worker_a.publish_bin_zone("bin1", "north")
+            worker_a.publish_bin_update(
+                bin_id="bin1", fill_level_percent=55, status="ok", battery_percent=90,
+                temperature_c=20.0, humidity_percent=40, timestamp="t1",
+            )
+            await _wait_for(lambda: ws.received)
+
+            await worker_a.bus.stop()
+            await worker_b.bus.stop()
+            return worker_b, ws
+
+        worker_b, ws = asyncio.run(scenario())
+
+        assert worker_b.zone_for("bin1") == "north"
+        assert ws.received[0]["event"] == "bin_updates"
+        assert ws.received[0]["updates"][0]["fill_level_percent"] == 55
+        assert worker_b.stats()["bus"]["backend"] == "unix"
+
+    def test_logout_on_one_worker_revokes_everywhere(self):
+        import auth_cache
+
+        async def scenario():
+            path = _socket_path()
+            worker_a, worker_b = ConnectionManager(max_queue=4), ConnectionManager(max_queue=4)
+            await worker_a.use_bus(UnixSocketBus(path, reconnect_delay=0.05))
+            await worker_b.use_bus(UnixSocketBus(path, reconnect_delay=0.05))
+
+            worker_a.bus.publish("token_revoked", {"jti": "jti-from-worker-a", "expires_at": None})
+            await _wait_for(lambda: worker_b.bus.received == 1)
+            await worker_a.bus.stop()
+            await worker_b.bus.stop()
+
+        asyncio.run(scenario())
+        assert "jti-from-worker-a" in auth_cache.revoked_tokens
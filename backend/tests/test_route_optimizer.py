@@ -0,0 +1,219 @@
+"""
+tests/test_route_optimizer.py
+
+Unit tests for the route optimizer's struct-of-arrays core.
+"""
+
+import random
+import time
+
+import numpy as np
+
+from services.route_optimizer import (
+    CollectionPoints,
+    Location,
+    RouteOptimizer,
+    WasteCollectionPoint,
+    haversine_km,
+)
+
+DEPOT = Location(21.1458, 79.0882, "Depot")
+
+
+def _points(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    return [
+        WasteCollectionPoint(
+            bin_id=f"bin{i}",
+            location=Location(21.10 + rng.random() * 0.1, 79.00 + rng.random() * 0.1, f"Loc {i}"),
+            fill_level=rng.randint(0, 100),
+            priority=rng.randint(1, 3),
+        )
+        for i in range(n)
+    ]
+
+
+def _optimizer() -> RouteOptimizer:
+    optimizer = RouteOptimizer()
+    optimizer.set_depot(DEPOT)
+    return optimizer
+
+
+class TestCollectionPoints:
+
+    def test_from_points_keeps_columns_aligned(self):
+        points = _points(5)
+        arrays = CollectionPoints.from_points(points)
+
+        assert len(arrays) == 5
+        assert arrays.bin_ids == [p.bin_id for p in points]
+        assert arrays.lat.tolist() == [p.location.lat for p in points]
+        assert arrays.urgency_scores().tolist() == [p.urgency_score() for p in points]
+
+    def test_greedy_order_is_a_permutation(self):
+        arrays = CollectionPoints.from_points(_points(40))
+        order = _optimizer().greedy_order(arrays, DEPOT)
+
+        assert sorted(order.tolist()) == list(range(40))
+
+
+class TestRouteOptimizer:
+
+    def test_greedy_visits_nearest_first(self):
+        near = WasteCollectionPoint("near", Location(21.1460, 79.0884), 50)
+        far = WasteCollectionPoint("far", Location(21.2000, 79.2000), 50)
+
+        result = _optimizer().optimize([far, near], DEPOT, "greedy")
+
+        assert [p.bin_id for p in result["route"]] == ["near", "far"]
+        assert result["algorithm"] == "greedy_nearest_neighbor"
+
+    def test_priority_orders_by_urgency(self):
+        points = _points(20)
+        result = _optimizer().optimize(points, DEPOT, "priority")
+        scores = [p.urgency_score() for p in result["route"]]
+
+        assert scores == sorted(scores, reverse=True)
+
+    def test_two_opt_never_worse_than_greedy(self):
+        points = _points(30, seed=4)
+        optimizer = _optimizer()
+
+        greedy = optimizer.optimize(points, DEPOT, "greedy")
+        two_opt = optimizer.optimize(points, DEPOT, "two_opt")
+
+        assert two_opt["total_distance"] <= greedy["total_distance"]
+        assert sorted(p.bin_id for p in two_opt["route"]) == sorted(p.bin_id for p in points)
+
+    def test_route_stats_match_object_distances(self):
+        points = _points(8)
+        arrays = CollectionPoints.from_points(points)
+        order = np.arange(8)
+
+        distance, minutes = _optimizer().route_stats(arrays, order, DEPOT)
+
+        path = [DEPOT] + [p.location for p in points] + [DEPOT]
+        expected = sum(path[i].distance_to(path[i + 1]) for i in range(len(path) - 1))
+        assert abs(distance - expected) < 1e-9
+        assert abs(minutes - (expected / 30 * 60 + 8 * 10)) < 1e-6
+
+    def test_empty_input(self):
+        result = _optimizer().optimize([], DEPOT, "hybrid")
+
+        assert result["route"] == []
+        assert result["total_distance"] == 0
+        assert result["algorithm"] == "hybrid_optimized"
+
+
+class TestBenchmarkHarness:
+
+    def test_layouts_stay_inside_city_bbox(self):
+        from benchmarks.route_optimizer_bench import CITY_BBOXES, PATTERNS, generate_layout
+
+        lat_min, lat_max, lon_min, lon_max = CITY_BBOXES["amravati"]
+        for pattern in PATTERNS:
+            points = generate_layout("amravati", pattern, 200, seed=3)
+            assert len(points) == 200
+            assert lat_min <= points.lat.min() and points.lat.max() <= lat_max
+            assert lon_min <= points.lon.min() and points.lon.max() <= lon_max
+
+    def test_regression_check_flags_longer_tours(self):
+        from benchmarks.route_optimizer_bench import check_regressions, run_benchmark
+
+        rows = run_benchmark(["nagpur"], ["uniform"], [20], ["greedy"], verbose=False)
+        worse = [dict(rows[0], tour_km=rows[0]["tour_km"] * 1.1)]
+
+        assert check_regressions(rows, rows, 1.5, 1.5, 0.02, 20.0) == []
+        assert len(check_regressions(worse, rows, 1.5, 1.5, 0.02, 20.0)) == 1
+
+
+class TestCollectionPlanner:
+
+    def _inputs(self, n: int, seed: int = 5):
+        from services.collection_planner import urgency_weights
+
+        rng = np.random.default_rng(seed)
+        points = CollectionPoints.from_points(_points(n, seed))
+        hours = rng.uniform(0, 48, n)
+        weights = urgency_weights(points.fill, hours, rng.uniform(0, 1, n))
+        volumes = points.fill * 2.4
+        return points, weights, hours * 60, volumes
+
+    def test_fleet_routes_are_disjoint_and_within_limits(self):
+        from services.collection_planner import CollectionPlanner
+
+        points, weights, deadlines, volumes = self._inputs(300)
+        plans = CollectionPlanner(DEPOT).plan(
+            points, weights, deadlines, volumes,
+            crew_starts=[DEPOT] * 3, budgets_minutes=[120, 120, 60], capacities_liters=[1500] * 3,
+        )
+
+        visited = np.concatenate([plan.order for plan in plans]).tolist()
+        assert len(visited) == len(set(visited)) > 0
+        for plan, budget in zip(plans, (120, 120, 60)):
+            assert plan.minutes <= budget + 1e-6
+            assert plan.load_liters <= 1500 + 1e-6
+
+    def test_prefers_bins_about_to_overflow(self):
+        from services.collection_planner import CollectionPlanner, prediction_inputs
+
+        points = CollectionPoints.from_points(_points(2))
+        predictions = {
+            "bin0": {"hours_until_full": 1.0, "confidence": 0.9},
+            "bin1": {"hours_until_full": 40.0, "confidence": 0.9},
+        }
+        inputs = prediction_inputs(points.bin_ids, [50, 50], predictions)
+        plans = CollectionPlanner(DEPOT).plan(
+            points, inputs["weight"], inputs["deadline_minutes"], [100, 100],
+            crew_starts=[DEPOT], budgets_minutes=[500], capacities_liters=[100],
+        )
+
+        assert [points.bin_ids[i] for i in plans[0].order] == ["bin0"]
+
+    def test_thousands_of_candidates_within_time_limit(self):
+        import time
+
+        from services.collection_planner import CollectionPlanner
+
+        points, weights, deadlines, volumes = self._inputs(3000)
+        started = time.perf_counter()
+        CollectionPlanner(DEPOT).plan(
+            points, weights, deadlines, volumes,
+            crew_starts=[DEPOT] * 5, budgets_minutes=[480] * 5, capacities_liters=[1e9] * 5,
+            time_limit_s=0.5,
+        )
+        assert time.perf_counter() - started < 1.0
+
+    def test_bin_one_crew_rejects_is_still_offered_to_the_others(self):
+        from services.collection_planner import CollectionPlanner
+
+        # Crew 0 drives start → A and could pick up C on the way, but the
+        # extra service time would make its heavy stop A late.  Crew 1 has
+        # room, so C must end up on its route.
+        start = Location(21.30, 79.0882)
+        points = CollectionPoints(["A", "C"], ["A", "C"], [21.30, 21.30], [79.20, 79.15],
+                                  [90, 50], [1, 1], [5, 10])
+        planner = CollectionPlanner(DEPOT)
+        to_a = haversine_km(points.rad_lat[0], points.rad_lon[0],
+                            np.radians(start.lat), np.radians(start.lon)) * planner.minutes_per_km
+        weights = np.array([10.0, 1.0])
+        deadlines = np.array([to_a + 1, 1e6])
+        start_lat = np.radians([start.lat, DEPOT.lat])
+        start_lon = np.radians([start.lon, DEPOT.lon])
+
+        routes = planner._improve(points, [[0], []], weights, deadlines, np.array([1.0, 1.0]),
+                                  start_lat, start_lon, np.array([1e4, 1e4]), np.array([1e4, 1e4]),
+                                  time.perf_counter() + 5)
+
+        assert routes == [[0], [1]]
+
+    def test_construction_respects_the_time_limit(self):
+        from services.collection_planner import CollectionPlanner
+
+        points, weights, deadlines, volumes = self._inputs(300)
+        plans = CollectionPlanner(DEPOT).plan(
+            points, weights, deadlines, volumes,
+            crew_starts=[DEPOT], budgets_minutes=[1e6], capacities_liters=[1e9], time_limit_s=0,
+        )
+
+        assert len(plans[0].order) == 0
@@ -19,8 +19,10 @@ New coverage added:
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from contextlib import contextmanager
 from datetime import datetime, timezone
 import os
 
@@ -200,6 +202,67 @@ def _make_task(task_id: str, bin_id: str = None, priority: str = "medium", heade
     return r
 
 
+@contextmanager
+def _recorded_statements():
+    """Collect the SQL statements run against the test engine inside the block."""
+    from sqlalchemy import event
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])   # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+@pytest.fixture
+def loaded_revocations(monkeypatch):
+    """Load the in-memory revocation set as startup would; restored afterwards."""
+    import auth_cache
+    monkeypatch.setattr(auth_cache, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(auth_cache.revoked_tokens, "loaded", auth_cache.revoked_tokens.loaded)
+    db = TestingSessionLocal()
+    try:
+        auth_cache.revoked_tokens.load(db)
+    finally:
+        db.close()
+    return auth_cache
+
+
+@pytest.fixture
+def fake_push(monkeypatch):
+    """Route the notification dispatcher to the fake FCM transport and the test DB."""
+    import services.notifications as notifications
+    from services.alert_digest import AlertCoalescer
+    from services.push_dispatch import FakePushTransport
+    from services.recipients import recipients
+
+    dispatcher = notifications.dispatcher
+    fake = FakePushTransport()
+    monkeypatch.setattr(dispatcher, "transport", fake)
+    monkeypatch.setattr(dispatcher, "_session_factory", TestingSessionLocal)
+    monkeypatch.setattr(notifications, "alert_digest", AlertCoalescer(
+        window_seconds=60, on_due=lambda windows: dispatcher.submit(notifications._bin_alert_digest, windows),
+    ))
+    recipients.invalidate()     # rebuilt from the test DB on first use
+    yield fake
+    dispatcher.flush()
+
+
+@contextmanager
+def _notification_settings(headers, **notifications):
+    """Apply notification preferences for the block, then restore the previous ones."""
+    current = client.get("/auth/settings", headers=headers).json()
+    body = {"notifications": {**current["notifications"], **notifications}, "display": current["display"]}
+    assert client.put("/auth/settings", json=body, headers=headers).status_code == 200
+    try:
+        yield
+    finally:
+        body["notifications"] = current["notifications"]
+        client.put("/auth/settings", json=body, headers=headers)
+
+
 # ─── Health ───────────────────────────────────────────────────────────────────
 
 class TestHealthCheck:
@@ -279,6 +342,161 @@ class TestAuth:
         r = client.get("/auth/me", headers=fresh_headers)
         assert r.status_code == 401
 
+    def test_cached_auth_needs_no_queries(self, auth_headers, loaded_revocations):
+        client.get("/auth/me", headers=auth_headers)   # warm the user cache
+        with _recorded_statements() as statements:
+            r = client.get("/auth/me", headers=auth_headers)
+        assert r.status_code == 200
+        assert statements == []
+
+    def test_logout_revocation_is_enforced_from_memory(self, loaded_revocations):
+        resp = client.post("/auth/login", json={"email": "testadmin@example.com", "password": "Admin@1234"})
+        headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        assert client.post("/auth/logout", headers=headers).status_code == 200
+
+        with _recorded_statements() as statements:
+            r = client.get("/auth/me", headers=headers)
+        assert r.status_code == 401
+        assert statements == []
+
+    def test_settings_change_refreshes_cached_user(self, user_headers):
+        client.get("/auth/me", headers=user_headers)
+        current = client.get("/auth/settings", headers=user_headers).json()
+        body = {"full_name": "Renamed User", "notifications": current["notifications"], "display": current["display"]}
+        assert client.put("/auth/settings", json=body, headers=user_headers).status_code == 200
+        try:
+            assert client.get("/auth/me", headers=user_headers).json()["full_name"] == "Renamed User"
+        finally:
+            body["full_name"] = current["full_name"]
+            client.put("/auth/settings", json=body, headers=user_headers)
+
+    def test_user_disabled_outside_the_api_is_locked_out_at_once(self, user_headers):
+        assert client.get("/auth/me", headers=user_headers).status_code == 200   # cached
+        db = TestingSessionLocal()
+        user = db.query(UserDB).filter(UserDB.email == "testuser@example.com").first()
+        user.is_active = False
+        db.commit()
+        try:
+            assert client.get("/auth/me", headers=user_headers).status_code == 401
+        finally:
+            user.is_active = True
+            db.commit()
+            db.close()
+
+    def test_expired_revocations_are_pruned(self, monkeypatch):
+        from datetime import timedelta
+        from auth_cache import RevocationSet
+
+        revoked = RevocationSet()
+        revoked.add("expired-jti", datetime.now(timezone.utc) - timedelta(minutes=1))
+        revoked.add("live-jti", datetime.now(timezone.utc) + timedelta(minutes=10))
+        assert "expired-jti" in revoked
+
+        monkeypatch.setattr(revoked, "_next_prune", 0)
+        revoked.add("new-jti")
+        assert "expired-jti" not in revoked
+        assert {"live-jti", "new-jti"} <= set(revoked._revoked)
+
+    def test_firebase_login_with_cached_verification(self, monkeypatch):
+        import firebase_service
+        from firebase_service import TokenVerifier
+        from tests.test_firebase_auth import FakeFirebaseAuth
+
+        fake = FakeFirebaseAuth()
+        monkeypatch.setattr(firebase_service, "verifier", TokenVerifier(fake))
+        token = fake.issue("firebase-uid-1", "firebase.user@example.com", name="Firebase User")
+
+        for _ in range(2):
+            r = client.post("/auth/firebase", json={"id_token": token})
+            assert r.status_code == 200
+            assert r.json()["user"]["email"] == "firebase.user@example.com"
+        assert fake.calls["verify_id_token"] == 1
+
+        r = client.post("/auth/firebase", json={"id_token": "forged"})
+        assert r.status_code == 401
+
+
+# ─── Push notifications ───────────────────────────────────────────────────────
+
+class TestPushRecipients:
+    def test_opted_out_admin_gets_no_bin_alerts(self, auth_headers, fake_push):
+        from services.notifications import dispatcher
+
+        client.post("/auth/device-token", json={"token": "fcm-admin-optout"}, headers=auth_headers)
+        _make_bin("push_optout_bin", fill=50)
+        with _notification_settings(auth_headers, pushEnabled=True, criticalBins=False):
+            client.post("/telemetry/", json={"bin_id": "push_optout_bin", "fill_level_percent": 95},
+                        headers=auth_headers)
+            assert dispatcher.flush()
+
+        assert fake_push.delivered("fcm-admin-optout") == []
+
+    def test_task_assignment_reaches_crew_user_without_queries(self, user_headers, fake_push):
+        from services.notifications import _task_assigned, dispatcher
+
+        client.post("/auth/device-token", json={"token": "fcm-crew-user"}, headers=user_headers)
+        _make_crew("push_crew", email="testuser@example.com")
+        _make_task("push_task")
+        with _notification_settings(user_headers, pushEnabled=True, routeUpdates=True):
+            r = _req("POST", "/tasks/push_task/assign", json={"crew_id": "push_crew"})
+            assert r.status_code == 200
+            assert dispatcher.flush()
+            assert [m.data["task_id"] for m in fake_push.delivered("fcm-crew-user")] == ["push_task"]
+
+            with _recorded_statements() as statements:
+                [message] = _task_assigned(None, "t", "title", "here", "push_crew")
+            assert statements == []
+            assert "fcm-crew-user" in message.tokens
+            assert message.title == "New Task — Team push_crew"
+
+        with _recorded_statements() as statements:
+            [message] = _task_assigned(None, "t", "title", "here", "push_crew")
+        assert statements == []
+        assert "fcm-crew-user" not in message.tokens       # pushEnabled restored to off
+
+
+    def test_unregistered_tokens_are_pruned(self, auth_headers, fake_push):
+        from database import DeviceTokenDB
+        from services.notifications import dispatcher
+        from services.recipients import TOPIC_BINS, recipients
+
+        client.post("/auth/device-token", json={"token": "fcm-admin-stale"}, headers=auth_headers)
+        fake_push.errors["fcm-admin-stale"] = "UNREGISTERED"
+        _make_bin("stale_token_bin", fill=50)
+        with _notification_settings(auth_headers, pushEnabled=True, criticalBins=True):
+            client.post("/telemetry/", json={"bin_id": "stale_token_bin", "fill_level_percent": 85},
+                        headers=auth_headers)
+            assert dispatcher.flush()
+
+        db = TestingSessionLocal()
+        try:
+            assert db.query(DeviceTokenDB).filter(DeviceTokenDB.token == "fcm-admin-stale").count() == 0
+        finally:
+            db.close()
+        assert "fcm-admin-stale" not in recipients.admin_tokens(TOPIC_BINS)
+
+    def test_alert_burst_becomes_one_digest(self, auth_headers, fake_push):
+        import json
+        import services.notifications as notifications
+
+        client.post("/auth/device-token", json={"token": "fcm-admin-digest"}, headers=auth_headers)
+        for i in range(6):
+            _make_bin(f"digest_bin_{i}", fill=50)
+            client.patch(f"/bins/digest_bin_{i}/zone?zone_id=north", headers=auth_headers)
+        with _notification_settings(auth_headers, pushEnabled=True, criticalBins=True):
+            for i in range(6):
+                client.post("/telemetry/", json={"bin_id": f"digest_bin_{i}", "fill_level_percent": 81 + i},
+                            headers=auth_headers)
+            assert notifications.dispatcher.flush()
+            notifications.alert_digest.stop()       # close the window now instead of in 60 s
+            assert notifications.dispatcher.flush()
+
+        first, digest = fake_push.delivered("fcm-admin-digest")
+        assert first.data["bin_id"] == "digest_bin_0"
+        assert digest.title == "6 bins need collection in Zone North"
+        assert digest.data["type"] == "bin_alert_digest"
+        assert [b["bin_id"] for b in json.loads(digest.data["bins"])][0] == "digest_bin_5"
+
 
 # ─── Bins ─────────────────────────────────────────────────────────────────────
 
@@ -431,6 +649,23 @@ class TestTelemetryRouter:
         assert isinstance(r.json(), list)
         assert len(r.json()) >= 1
 
+    def test_threshold_crossing_is_pushed_off_the_request(self, auth_headers, fake_push):
+        from services.notifications import dispatcher
+
+        client.post("/auth/device-token", json={"token": "fcm-admin-1"}, headers=auth_headers)
+        _make_bin("tel_push_bin", fill=50)
+        with _notification_settings(auth_headers, pushEnabled=True, criticalBins=True):
+            r = client.post("/telemetry/", json={
+                "bin_id": "tel_push_bin",
+                "fill_level_percent": 85,
+            }, headers=auth_headers)
+            assert r.status_code == 202
+            assert dispatcher.flush()
+
+        [message] = [m for m in fake_push.delivered("fcm-admin-1") if m.data["bin_id"] == "tel_push_bin"]
+        assert message.title == "Bin tel_push_bin Warning"
+        assert _req("GET", "/health/notifications").json()["transport"] == "fake"
+
     def test_telemetry_history_bin_not_found(self):
         r = _req("GET", "/telemetry/ghost_bin")
         assert r.status_code == 404
@@ -735,6 +970,26 @@ class TestRouteRouter:
         assert "recommended" in data
         assert len(data["algorithms"]) == 4   # greedy, priority, hybrid, two_opt
 
+    def test_plan_collection_respects_shift_budget(self):
+        r = _req("POST", "/routes/plan", json={
+            "crew_ids": ["route_crew_1"],
+            "bin_ids": [f"route_bin_{i}" for i in range(1, 6)],
+            "shift_minutes": 35,   # room for three 10-minute stops
+        })
+        assert r.status_code == 200
+        data = r.json()
+        assert data["candidates_considered"] == 5
+        route = data["routes"][0]
+        assert route["crew_id"] == "route_crew_1"
+        assert route["bin_count"] == 3
+        assert route["estimated_time_minutes"] <= 35
+        # Fullest bins are the most urgent without predictions
+        assert {w["bin_id"] for w in route["waypoints"]} == {"route_bin_3", "route_bin_4", "route_bin_5"}
+
+    def test_plan_collection_unknown_crew(self):
+        r = _req("POST", "/routes/plan", json={"crew_ids": ["no_such_crew"]})
+        assert r.status_code == 404
+
     def test_list_routes(self):
         r = _req("GET", "/routes/")
         assert r.status_code == 200
@@ -747,6 +1002,87 @@ class TestRouteRouter:
         assert "total_routes_completed" in data
         assert "total_distance_km" in data
 
+    def test_route_analytics_filters(self):
+        _make_crew("analytics_crew")
+        route_id = _req("POST", "/routes/optimize", json={
+            "bin_ids": ["route_bin_1", "route_bin_2", "route_bin_3"],
+            "crew_id": "analytics_crew",
+            "save_route": True,
+        }).json()["route_id"]
+        _req("PATCH", f"/routes/{route_id}/status", json={"status": "completed", "actual_time_minutes": 30})
+
+        data = _req("GET", "/routes/analytics/performance", params={"crew_id": "analytics_crew"}).json()
+        assert data["total_routes_completed"] == 1
+        assert data["total_bins_collected"] == 3
+        assert data["average_time_minutes"] == 30
+
+        # Re-completing rewrites the history row; the rollup must not double count
+        _req("PATCH", f"/routes/{route_id}/status", json={"status": "completed", "actual_time_minutes": 50})
+        data = _req("GET", "/routes/analytics/performance", params={"crew_id": "analytics_crew"}).json()
+        assert data["total_routes_completed"] == 1
+        assert data["average_time_minutes"] == 50
+
+        future = _req("GET", "/routes/analytics/performance", params={
+            "crew_id": "analytics_crew", "from": "2999-01-01",
+        }).json()
+        assert future["total_routes_completed"] == 0
+
+    def test_daily_stats_upsert_keeps_one_row_per_key(self):
+        from datetime import date
+
+        from database import RouteDailyStatsDB
+        from routers.routes import _bump_daily_stats
+
+        db = TestingSessionLocal()
+        try:
+            key = (date(2001, 2, 3), "", "")      # no crew, no zone
+            for _ in range(3):
+                _bump_daily_stats(db, key, {"routes_completed": 1, "bins_collected": 4})
+            db.commit()
+
+            rows = db.query(RouteDailyStatsDB).filter(RouteDailyStatsDB.day == date(2001, 2, 3)).all()
+            assert [(r.crew_id, r.zone_id, r.routes_completed, r.bins_collected) for r in rows] == [("", "", 3, 12)]
+
+            db.add(RouteDailyStatsDB(day=date(2001, 2, 3), crew_id="", zone_id=""))
+            with pytest.raises(IntegrityError):
+                db.commit()
+        finally:
+            db.rollback()
+            db.close()
+
+    def test_list_routes_keyset_pagination(self):
+        for _ in range(3):
+            _req("POST", "/routes/optimize", json={"bin_ids": ["route_bin_1"], "save_route": True})
+        # created_at is nullable; undated routes must page too
+        from database import RouteDB
+        db = TestingSessionLocal()
+        for suffix in ("a", "b", "c"):
+            db.add(RouteDB(id=f"route_undated_{suffix}", status="planned", algorithm_used="greedy",
+                           total_distance_km=1.0, estimated_time_minutes=10.0, bin_ids=["route_bin_1"]))
+        db.commit()
+        db.close()
+
+        everything = _req("GET", "/routes/", params={"view": "summary", "limit": 500}).json()
+        assert len(everything) >= 3
+        assert "waypoints" not in everything[0]
+        assert "bin_count" in everything[0]
+
+        seen, cursor = [], None
+        while True:
+            params = {"view": "summary", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            r = _req("GET", "/routes/", params=params)
+            assert r.status_code == 200
+            seen.extend(route["id"] for route in r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == [route["id"] for route in everything]
+        assert seen[:3] == ["route_undated_c", "route_undated_b", "route_undated_a"]
+
+        assert _req("GET", "/routes/", params={"cursor": "not-a-cursor"}).status_code == 400
+
     def test_route_status_lifecycle(self):
         """Create a route, activate it, then complete it."""
         create = _req("POST", "/routes/optimize", json={
@@ -774,6 +1110,46 @@ class TestRouteRouter:
         assert r.json()["status"] == "completed"
         assert r.json()["completed_at"] is not None
 
+    def test_route_status_statement_count_independent_of_length(self):
+        """Activation and completion run a fixed number of SQL statements, however many stops."""
+        from sqlalchemy import event
+
+        def run(stops: int):
+            bin_ids = [f"count_bin_{stops}_{i}" for i in range(stops)]
+            for bin_id in bin_ids:
+                _make_bin(bin_id, fill=75)
+            _make_crew(f"count_crew_{stops}")
+            _make_task(f"count_task_{stops}", bin_id=bin_ids[0])   # one bin already has a task
+            route_id = _req("POST", "/routes/optimize", json={
+                "bin_ids": bin_ids, "crew_id": f"count_crew_{stops}", "save_route": True,
+            }).json()["route_id"]
+
+            statements = []
+            listener = lambda *args: statements.append(args[2])   # noqa: E731
+            counts = {}
+            event.listen(engine, "before_cursor_execute", listener)
+            try:
+                for status in ("active", "completed"):
+                    statements.clear()
+                    r = _req("PATCH", f"/routes/{route_id}/status", json={"status": status})
+                    assert r.status_code == 200
+                    counts[status] = len(statements)
+            finally:
+                event.remove(engine, "before_cursor_execute", listener)
+            return counts
+
+        short, long = run(3), run(40)
+        assert short == long
+        assert short["active"] <= 18
+        assert short["completed"] <= 18
+
+        bins = _req("GET", "/bins/").json()
+        serviced = [b for b in bins if b["id"].startswith("count_bin_40_")]
+        assert len(serviced) == 40
+        assert all(b["fill_level_percent"] == 0 for b in serviced)
+        crew = _req("GET", "/crews/count_crew_40").json()
+        assert crew["status"] == "available"
+
     def test_get_route_not_found(self):
         r = _req("GET", "/routes/ghost_route_xyz")
         assert r.status_code == 404
@@ -878,6 +1254,56 @@ class TestDriverRouter:
         r = client.post("/driver/tasks/other_task_x/complete", headers=driver_headers)
         assert r.status_code == 403
 
+    def test_waypoint_done_updates_single_row(self, driver_headers):
+        from sqlalchemy import event
+
+        _make_bin("driver_wp_bin_1", fill=80)
+        _make_bin("driver_wp_bin_2", fill=60)
+        route_id = _req("POST", "/routes/optimize", json={
+            "bin_ids": ["driver_wp_bin_1", "driver_wp_bin_2"],
+            "crew_id": "driver_crew",
+            "algorithm": "greedy",
+            "save_route": True,
+        }).json()["route_id"]
+        assert _req("PATCH", f"/routes/{route_id}/status", json={"status": "active"}).status_code == 200
+
+        current = client.get("/driver/route/current", headers=driver_headers).json()
+        assert current["id"] == route_id
+        assert [w["order"] for w in current["waypoints"]] == [1, 2]
+        assert current["completed_waypoints"] == 0
+
+        waypoint_updates = []
+
+        def listener(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("UPDATE ROUTE_WAYPOINTS"):
+                waypoint_updates.append(statement)
+
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            first = current["waypoints"][0]["bin_id"]
+            r = client.post(f"/driver/route/{route_id}/waypoint-done", json={"bin_id": first}, headers=driver_headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert r.status_code == 200
+        assert r.json()["route_completed"] is False
+        assert len(waypoint_updates) == 1
+
+        current = client.get("/driver/route/current", headers=driver_headers).json()
+        assert current["completed_waypoints"] == 1
+        assert current["progress_percent"] == 50
+        assert current["waypoints"][0]["completed_at"] is not None
+
+        second = current["waypoints"][1]["bin_id"]
+        r = client.post(f"/driver/route/{route_id}/waypoint-done", json={"bin_id": second}, headers=driver_headers)
+        assert r.json()["route_completed"] is True
+
+        route = _req("GET", f"/routes/{route_id}").json()
+        assert route["status"] == "completed"
+        assert all(w["done"] for w in route["waypoints"])
+        assert set(route["waypoints"][0]) >= {
+            "bin_id", "location", "latitude", "longitude", "fill_level", "order", "estimated_collection_time", "done",
+        }
+
 
 # ─── Admin-only enforcement ───────────────────────────────────────────────────
 
@@ -923,3 +1349,184 @@ class TestAdminOnly:
         r = client.get("/auth/api-keys", headers=auth_headers)
         assert r.status_code == 200
         assert isinstance(r.json(), list)
+
+    def test_api_key_auth_is_served_from_memory(self, auth_headers):
+        from auth_cache import key_usage
+
+        created = client.post("/auth/api-keys", json={"label": "cached sensor"}, headers=auth_headers).json()
+        device = {"X-API-Key": created["key"]}
+        _make_bin("api_key_cached_bin", fill=20)
+        reading = {"bin_id": "api_key_cached_bin", "fill_level_percent": 30}
+        assert client.post("/telemetry/", json=reading, headers=device).status_code == 202
+
+        with _recorded_statements() as statements:
+            assert client.post("/telemetry/", json=reading, headers=device).status_code == 202
+        assert not [s for s in statements if "api_keys" in s]
+
+        listed = {k["key_id"]: k for k in client.get("/auth/api-keys", headers=auth_headers).json()}
+        assert listed[created["key_id"]]["last_used_at"] is not None    # pending use flushed
+        assert key_usage.flush(TestingSessionLocal()) == 0
+
+        assert client.delete(f"/auth/api-keys/{created['key_id']}", headers=auth_headers).status_code == 204
+        assert client.post("/telemetry/", json=reading, headers=device).status_code == 401
+
+    def test_signed_device_token_is_bound_to_its_bins(self, auth_headers):
+        _make_bin("signed_bin_a", fill=20)
+        _make_bin("signed_bin_b", fill=20)
+        r = client.post("/auth/api-keys", json={"label": "signed sensor", "bin_ids": ["signed_bin_a"]},
+                        headers=auth_headers)
+        assert r.status_code == 200
+        minted = r.json()
+        assert minted["token"].startswith("wsd_live_") and minted["bin_ids"] == ["signed_bin_a"]
+        device = {"X-Device-Token": minted["token"]}
+
+        with _recorded_statements() as statements:
+            r = client.post("/telemetry/", json={"bin_id": "signed_bin_b", "fill_level_percent": 30}, headers=device)
+        assert r.status_code == 403
+        assert statements == []         # rejected on the token alone
+        r = client.post("/telemetry/", json={"bin_id": "signed_bin_a", "fill_level_percent": 30}, headers=device)
+        assert r.status_code == 202
+
+        forged = minted["token"][:-2] + ("AA" if not minted["token"].endswith("AA") else "BB")
+        r = client.post("/telemetry/", json={"bin_id": "signed_bin_a", "fill_level_percent": 30},
+                        headers={"X-Device-Token": forged})
+        assert r.status_code == 401
+
+        assert client.delete(f"/auth/api-keys/{minted['key_id']}", headers=auth_headers).status_code == 204
+        r = client.post("/telemetry/", json={"bin_id": "signed_bin_a", "fill_level_percent": 30}, headers=device)
+        assert r.status_code == 401
+
+    def test_device_token_for_unknown_bins_is_refused(self, auth_headers):
+        _make_bin("known_bin", fill=20)
+        before = len(client.get("/auth/api-keys", headers=auth_headers).json())
+        r = client.post("/auth/api-keys", json={"label": "typo", "bin_ids": ["known_bin", "knwon_bin"]},
+                        headers=auth_headers)
+        assert r.status_code == 404
+        assert "knwon_bin" in r.json()["detail"] and "'known_bin'" not in r.json()["detail"]
+        assert len(client.get("/auth/api-keys", headers=auth_headers).json()) == before
+
+    @pytest.mark.parametrize("token", [
+        "wsd_live_a.\u00e9",                  # non-ASCII signature
+        "wsd_live_\u00e9.abc",                # non-ASCII payload
+        "wsd_live_no-signature",
+        "wsd_live_" + "A" * 40 + ".",
+    ])
+    def test_malformed_device_token_is_unauthorised(self, token):
+        import api_key_services
+
+        assert api_key_services.verify_device_token(token) is None
+        r = client.post("/telemetry/", json={"bin_id": "any_bin", "fill_level_percent": 30},
+                        headers={"X-Device-Token": token.encode("latin-1")})
+        assert r.status_code == 401
+
+    def test_expired_device_token_is_rejected(self, monkeypatch):
+        import api_key_services
+        from datetime import timedelta
+
+        db = TestingSessionLocal()
+        try:
+            token = api_key_services.mint_device_token("expiring sensor", ["any_bin"], db, expires_in_days=1)["token"]
+        finally:
+            db.close()
+        assert api_key_services.verify_device_token(token).bin_ids == {"any_bin"}
+
+        later = datetime.now(timezone.utc) + timedelta(days=2)
+        monkeypatch.setattr(api_key_services, "_now", lambda: later)
+        assert api_key_services.verify_device_token(token) is None
+
+    def test_rate_limit_identity_needs_no_database(self, auth_headers):
+        from api_key_services import rate_limit_identity
+
+        _make_bin("limited_bin", fill=20)
+        key = client.post("/auth/api-keys", json={"label": "limited sensor"}, headers=auth_headers).json()
+        minted = client.post("/auth/api-keys", json={"label": "limited signed", "bin_ids": ["limited_bin"]},
+                             headers=auth_headers).json()
+        with _recorded_statements() as statements:
+            assert rate_limit_identity(key["key"], None) == f"key:{key['key_id']}"
+            assert rate_limit_identity(None, minted["token"]) == f"key:{minted['key_id']}"
+            assert rate_limit_identity("wsk_live_unknown", None) is None
+            assert rate_limit_identity(None, minted["token"] + "x") is None
+        assert statements == []
+
+
+# ─── Real-time feed ───────────────────────────────────────────────────────────
+
+class TestWebSocketFeed:
+
+    def test_auth_handshake_and_ping(self, admin_token, monkeypatch):
+        import auth_cache
+        monkeypatch.setattr(auth_cache, "SessionLocal", TestingSessionLocal)
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "auth", "token": admin_token})
+            connected = ws.receive_json()
+            assert connected["event"] == "connected"
+            assert connected["resume"] == "snapshot"
+            assert ws.receive_json()["event"] == "snapshot"
+            ws.send_text("ping")
+            assert ws.receive_json() == {"event": "pong"}
+
+    def test_subscribe_round_trip(self, admin_token, monkeypatch):
+        import auth_cache
+        monkeypatch.setattr(auth_cache, "SessionLocal", TestingSessionLocal)
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "auth", "token": admin_token})
+            assert ws.receive_json()["event"] == "connected"
+            assert ws.receive_json()["event"] == "snapshot"
+            ws.send_json({"type": "subscribe", "zones": ["north"], "events": ["bin_alert"]})
+            assert ws.receive_json() == {
+                "event": "subscribed", "zones": ["north"], "bins": [], "events": ["bin_alert"],
+            }
+            ws.send_json({"type": "subscribe", "events": ["nope"]})
+            assert ws.receive_json()["event"] == "error"
+
+    def test_msgpack_frames_negotiated_in_handshake(self, admin_token, monkeypatch):
+        import msgpack
+        import auth_cache
+        monkeypatch.setattr(auth_cache, "SessionLocal", TestingSessionLocal)
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "auth", "token": admin_token, "format": "msgpack"})
+            connected = msgpack.unpackb(ws.receive_bytes())
+            assert connected["event"] == "connected"
+            assert connected["format"] == "msgpack"
+
+    def test_resume_with_current_seq_replays_instead_of_snapshot(self, admin_token, monkeypatch):
+        import auth_cache
+        monkeypatch.setattr(auth_cache, "SessionLocal", TestingSessionLocal)
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "auth", "token": admin_token})
+            first = ws.receive_json()
+            ws.receive_json()   # snapshot
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({
+                "type": "auth", "token": admin_token,
+                "stream": first["stream"], "last_seq": first["seq"],
+            })
+            assert ws.receive_json()["resume"] == "replay"
+            ws.send_text("ping")
+            assert ws.receive_json() == {"event": "pong"}
+
+    def test_handshake_needs_no_queries_when_cached(self, admin_token, loaded_revocations):
+        with client.websocket_connect("/ws") as ws:   # first connect warms the user cache
+            ws.send_json({"type": "auth", "token": admin_token})
+            ws.receive_json()
+
+        with _recorded_statements() as statements:
+            with client.websocket_connect("/ws") as ws:
+                ws.send_json({"type": "auth", "token": admin_token})
+                assert ws.receive_json()["event"] == "connected"
+                ws.receive_json()   # snapshot
+        assert statements == []
+
+    def test_rejects_bad_token(self):
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"type": "auth", "token": "not-a-jwt"})
+            assert ws.receive_json()["event"] == "auth_error"
+
+    def test_stats_reports_queue_metrics(self):
+        data = client.get("/ws/stats").json()
+        assert {"active_connections", "dropped_messages", "max_lag_ms"} <= set(data)
@@ -0,0 +1,241 @@
+"""
+tests/test_security.py
+
+Tests for SecurityMiddleware in security.py (security headers, general and
+/auth/* rate limits with lockout, body size limit, streaming and WebSocket
+pass-through) on a small app of its own, since the main app runs with rate
+limiting disabled under tests; and for the sliding-window counter stores in
+services/rate_limit_store.py.
+"""
+
+import asyncio
+import os
+import tempfile
+
+from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from security import RequestRateLimiter, SecurityMiddleware
+from services.rate_limit_store import (
+    MemoryRateLimitStore,
+    RedisRateLimitStore,
+    SharedMemoryRateLimitStore,
+)
+from tests.test_realtime_bus import FakeRedisServer
+
+
+def _client(**options) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.post("/auth/login")
+    def login(ok: bool = False):
+        if not ok:
+            raise HTTPException(status_code=401, detail="bad credentials")
+        return {"token": "t"}
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((f"chunk{i}\n" for i in range(3)), media_type="text/plain")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text("hello")
+        await websocket.close()
+
+    @app.post("/telemetry/")
+    def ingest():
+        return {"accepted": True}
+
+    app.add_middleware(SecurityMiddleware, **options)
+    return TestClient(app)
+
+
+def _sensor_identity(api_key, device_token):
+    credential = device_token or api_key
+    return f"key:{credential[len('sensor-'):]}" if credential.startswith("sensor-") else None
+
+
+class TestHeaders:
+
+    def test_app_responses_carry_security_and_rate_headers(self):
+        r = _client(requests_per_minute=10).get("/ping")
+        assert r.status_code == 200
+        assert r.headers["x-frame-options"] == "DENY"
+        assert r.headers["server"] == "SmartWaste/1.0"
+        assert r.headers["x-ratelimit-limit"] == "10"
+        assert r.headers["x-ratelimit-remaining"] == "9"
+
+    def test_streaming_responses_pass_through(self):
+        r = _client().get("/stream")
+        assert r.text == "chunk0\nchunk1\nchunk2\n"
+        assert r.headers["x-content-type-options"] == "nosniff"
+
+    def test_websockets_are_untouched(self):
+        with _client(requests_per_minute=1).websocket_connect("/ws") as ws:
+            assert ws.receive_text() == "hello"
+
+
+class TestLimits:
+
+    def test_general_limit_returns_bare_429(self):
+        client = _client(requests_per_minute=2)
+        assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 429]
+        r = client.get("/ping")
+        assert r.headers["retry-after"] == "60"
+        assert "x-frame-options" not in r.headers
+
+    def test_auth_failures_lock_the_client_out(self):
+        client = _client(enable_rate_limiting=False, auth_requests_per_minute=100)
+        for _ in range(10):
+            r = client.post("/auth/login")
+            assert r.status_code == 401
+            assert r.headers["x-ratelimit-limit"] == "100"
+        r = client.post("/auth/login", params={"ok": True})
+        assert r.status_code == 429
+        assert r.json()["error"] == "Too many authentication attempts"
+        assert client.get("/ping").status_code == 200       # only /auth/* is locked
+
+    def test_oversized_body_is_rejected_before_the_app(self):
+        r = _client(max_body_bytes=10).post("/auth/login", content=b"x" * 11)
+        assert r.status_code == 413
+        assert r.json() == {"error": "Payload too large", "max_bytes": 10}
+        assert "x-ratelimit-limit" in r.headers and "x-frame-options" not in r.headers
+
+
+class TestIngestLimits:
+
+    def test_gateway_devices_have_their_own_budgets(self):
+        client = _client(requests_per_minute=200, identify_device=_sensor_identity, device_requests_per_minute=2)
+        for i in range(300):            # 300 bins behind one NAT address
+            r = client.post("/telemetry/", headers={"X-API-Key": f"sensor-{i}"})
+            assert r.status_code == 200
+        assert r.headers["x-ratelimit-limit"] == "2"
+        assert client.get("/ping").headers["x-ratelimit-remaining"] == "199"     # dashboard budget untouched
+
+    def test_one_noisy_device_is_throttled_alone(self):
+        client = _client(identify_device=_sensor_identity, device_requests_per_minute=3)
+        noisy = {"X-Device-Token": "sensor-noisy"}
+        assert [client.post("/telemetry/", headers=noisy).status_code for _ in range(4)] == [200, 200, 200, 429]
+        assert client.post("/telemetry/", headers={"X-Device-Token": "sensor-quiet"}).status_code == 200
+
+    def test_gateway_budget_caps_all_of_its_devices(self):
+        client = _client(identify_device=_sensor_identity, gateway_requests_per_minute=5)
+        codes = [client.post("/telemetry/", headers={"X-API-Key": f"sensor-{i}"}).status_code for i in range(6)]
+        assert codes == [200] * 5 + [429]
+        assert "Gateway" in client.post("/telemetry/", headers={"X-API-Key": "sensor-9"}).json()["message"]
+
+    def test_credential_that_fails_to_parse_uses_the_ip_budget(self):
+        def broken(api_key, device_token):
+            raise TypeError("comparing strings with non-ASCII characters is not supported")
+
+        client = _client(requests_per_minute=2, identify_device=broken)
+        garbled = {"X-Device-Token": "wsd_live_a.\u00e9".encode("latin-1")}
+        assert [client.post("/telemetry/", headers=garbled).status_code for _ in range(3)] == [200, 200, 429]
+
+    def test_real_identity_lookup_survives_non_ascii_tokens(self):
+        from api_key_services import rate_limit_identity
+
+        client = _client(requests_per_minute=5, identify_device=rate_limit_identity)
+        r = client.post("/telemetry/", headers={"X-Device-Token": "wsd_live_a.\u00e9".encode("latin-1")})
+        assert r.status_code == 200 and r.headers["x-ratelimit-limit"] == "5"
+
+    def test_unidentified_ingestion_uses_the_ip_budget(self):
+        client = _client(requests_per_minute=2, identify_device=_sensor_identity)
+        bogus = {"X-API-Key": "forged"}
+        assert [client.post("/telemetry/", headers=bogus).status_code for _ in range(3)] == [200, 200, 429]
+
+
+def _hits(limiter, times, client_ip="10.0.0.1"):
+    async def run():
+        return [await limiter.hit(client_ip, t) for t in times]
+    return asyncio.run(run())
+
+
+class TestSlidingWindow:
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        limiter = RequestRateLimiter(10)
+        assert _hits(limiter, [0.0] * 10)[-1] == 0
+        assert _hits(limiter, [59.0]) == [None]
+        # 45 s into the next minute a quarter of the last window still counts
+        assert _hits(limiter, [105.0] * 8) == [6, 5, 4, 3, 2, 1, 0, None]
+        assert _hits(limiter, [180.0]) == [9]         # two windows later nothing counts
+
+    def test_memory_store_is_lru_bounded(self):
+        store = MemoryRateLimitStore(max_keys=100)
+        limiter = RequestRateLimiter(5, store)
+        for i in range(1000):
+            _hits(limiter, [1.0], client_ip=f"10.0.{i // 256}.{i % 256}")
+        assert store.stats()["keys"] == 100
+        assert store.stats()["evictions"] == 900
+
+    def test_rejected_requests_are_not_counted(self):
+        store = MemoryRateLimitStore()
+        limiter = RequestRateLimiter(2, store)
+        assert _hits(limiter, [1.0] * 50) == [1, 0] + [None] * 48
+        assert asyncio.run(store.add("req:10.0.0.1", 60, 0, 1.0)) == (0, 2)
+
+
+class TestSharedStores:
+
+    def test_workers_on_one_host_share_counters(self):
+        path = os.path.join(tempfile.mkdtemp(prefix="swrl"), "ratelimit.bin")
+        worker_a = RequestRateLimiter(3, SharedMemoryRateLimitStore(path, max_keys=64))
+        worker_b = RequestRateLimiter(3, SharedMemoryRateLimitStore(path, max_keys=64))
+        assert _hits(worker_a, [1.0, 1.0]) == [2, 1]
+        assert _hits(worker_b, [1.0, 1.0]) == [0, None]
+        assert _hits(worker_a, [1.0], client_ip="10.0.0.2") == [2]
+
+    def test_redis_store_counts_across_instances_and_fails_open(self):
+        async def scenario():
+            server = FakeRedisServer()
+            await server.start()
+            url = f"redis://127.0.0.1:{server.port}/0"
+            a = RequestRateLimiter(2, RedisRateLimitStore(url))
+            b = RequestRateLimiter(2, RedisRateLimitStore(url))
+            seen = [await a.hit("10.0.0.1", 1.0), await b.hit("10.0.0.1", 1.0), await a.hit("10.0.0.1", 1.0)]
+            expiry = server.expiries[b"smartwaste:rl:req:10.0.0.1:0"]
+
+            await server.stop()
+            await a.store.close()
+            seen.append(await a.hit("10.0.0.1", 1.0))
+            return seen, expiry, a.store.stats()
+
+        seen, expiry, stats = asyncio.run(scenario())
+        assert seen == [1, 0, None, 2]
+        assert expiry == 120_000
+        assert stats["errors"] == 1
+
+    def test_redis_store_runs_concurrent_requests_on_a_bounded_pool(self):
+        async def scenario():
+            server = FakeRedisServer()
+            await server.start()
+            store = RedisRateLimitStore(f"redis://127.0.0.1:{server.port}/0", pool_size=3)
+            counts = await asyncio.gather(*(store.add("k", 60, 1, 1.0) for _ in range(10)))
+            stats = store.stats()
+            await store.close()
+            await server.stop()
+            return counts, stats
+
+        counts, stats = asyncio.run(scenario())
+        assert sorted(current for _, current in counts) == list(range(1, 11))
+        assert stats["idle_connections"] == 3
+        assert stats["errors"] == 0
+
+
+class TestBenchmarkHarness:
+
+    def test_speedup_is_null_when_asgi_overhead_is_noise(self):
+        from benchmarks.middleware_overhead import _speedup
+
+        bare = {"stderr_us": 3.0}
+        legacy = {"overhead_us": 2000.0}
+        assert _speedup(bare, legacy, {"overhead_us": 50.0, "stderr_us": 2.0}) == 40.0
+        assert _speedup(bare, legacy, {"overhead_us": 5.0, "stderr_us": 2.0}) is None
+        assert _speedup(bare, legacy, {"overhead_us": -532.1, "stderr_us": 2.0}) is None
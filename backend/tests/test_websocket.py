@@ -0,0 +1,586 @@
+"""
+tests/test_websocket.py
+
+Unit tests for the real-time fan-out in routers/websocket_router.py, using
+in-memory stand-ins for Starlette WebSockets.
+"""
+
+import asyncio
+import json
+import time
+
+import msgpack
+import pytest
+
+import routers.websocket_router as ws_router
+from routers.websocket_router import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records what the writer task sends; `stalled` sockets block forever on send."""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.received = []
+        self.raw = []
+        self.received_at = []
+        self.closed_with = None
+        self._release = asyncio.Event()
+
+    async def send_text(self, data):
+        await self._record(json.loads(data), data)
+
+    async def send_bytes(self, data):
+        await self._record(msgpack.unpackb(data), data)
+
+    async def _record(self, message, raw):
+        if self.stalled:
+            await self._release.wait()
+        self.received.append(message)
+        self.raw.append(raw)
+        self.received_at.append(time.monotonic())
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def _update(manager: ConnectionManager, bin_id: str, fill: int):
+    return manager.broadcast_bin_update(bin_id, fill, "ok", None, None, None, "2026-01-01T00:00:00Z")
+
+
+class TestConnectionManagerFanOut:
+
+    def test_stalled_client_does_not_delay_others(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=16, policy="drop_oldest")
+            fast, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+            await manager.connect(stalled, "slow@example.com")
+            await manager.connect(fast, "fast@example.com")
+
+            sent_at = []
+            for i in range(100):
+                sent_at.append(time.monotonic())
+                await _update(manager, f"bin{i}", 10)
+                await asyncio.sleep(0)
+
+            await asyncio.sleep(0.05)
+            return manager, fast, stalled, sent_at
+
+        manager, fast, stalled, sent_at = asyncio.run(scenario())
+
+        assert len(fast.received) == 100
+        latencies = [received - sent for received, sent in zip(fast.received_at, sent_at)]
+        assert max(latencies) < 0.05
+        assert stalled.received == []
+        stats = manager.stats()
+        assert stats["max_queue_depth"] == 16
+        assert stats["dropped_messages"] >= 100 - 16 - 1
+
+    def test_coalesce_keeps_latest_state_per_bin(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=8, policy="coalesce")
+            ws = FakeWebSocket(stalled=True)
+            await manager.connect(ws, "user@example.com")
+            await _update(manager, "bin1", 10)
+            await asyncio.sleep(0)           # writer takes the first message and blocks on it
+            for fill in (20, 30, 40):
+                await _update(manager, "bin1", fill)
+            ws.stalled = False
+            ws._release.set()
+            await asyncio.sleep(0.01)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+
+        fills = [message["fill_level_percent"] for message in ws.received]
+        assert fills == [10, 40]
+        assert manager.stats()["coalesced_messages"] == 2
+
+    def test_disconnect_policy_closes_slow_client(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=4, policy="disconnect")
+            ws = FakeWebSocket(stalled=True)
+            await manager.connect(ws, "user@example.com")
+            for i in range(10):
+                await _update(manager, f"bin{i}", 10)
+            await asyncio.sleep(0.01)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+
+        assert manager.connection_count == 0
+        assert ws.closed_with == 1013
+        assert manager.stats()["slow_consumer_disconnects"] == 1
+
+
+class TestFrameEncoding:
+
+    def test_broadcast_encodes_once_regardless_of_client_count(self, monkeypatch):
+        calls = {"json": 0, "msgpack": 0}
+        encode_json, encode_msgpack = ws_router._encode_json, ws_router._encode_msgpack
+
+        def counting_json(message):
+            calls["json"] += 1
+            return encode_json(message)
+
+        def counting_msgpack(message):
+            calls["msgpack"] += 1
+            return encode_msgpack(message)
+
+        monkeypatch.setattr(ws_router, "_encode_json", counting_json)
+        monkeypatch.setattr(ws_router, "_encode_msgpack", counting_msgpack)
+
+        async def scenario():
+            manager = ConnectionManager(max_queue=8)
+            text_clients = [FakeWebSocket() for _ in range(50)]
+            binary_clients = [FakeWebSocket() for _ in range(10)]
+            for i, ws in enumerate(text_clients):
+                await manager.connect(ws, f"t{i}@example.com")
+            for i, ws in enumerate(binary_clients):
+                await manager.connect(ws, f"b{i}@example.com", frame_format="msgpack")
+            await _update(manager, "bin1", 42)
+            await asyncio.sleep(0.01)
+            return text_clients, binary_clients
+
+        text_clients, binary_clients = asyncio.run(scenario())
+
+        assert calls == {"json": 1, "msgpack": 1}
+        assert all(ws.received[0]["fill_level_percent"] == 42 for ws in text_clients + binary_clients)
+        assert all(isinstance(ws.raw[0], str) for ws in text_clients)
+        assert all(isinstance(ws.raw[0], bytes) for ws in binary_clients)
+        # Every client got the very same encoded object
+        assert len({id(ws.raw[0]) for ws in text_clients}) == 1
+
+    @pytest.mark.parametrize("requested, expected", [
+        ("msgpack", "msgpack"), ("json", "json"), (None, "json"), ("xml", "json"),
+    ])
+    def test_negotiate_format(self, requested, expected):
+        assert ws_router.negotiate_format(requested) == expected
+
+    def test_msgpack_falls_back_when_unavailable(self, monkeypatch):
+        monkeypatch.setattr(ws_router, "msgpack", None)
+        assert ws_router.negotiate_format("msgpack") == "json"
+
+    def test_json_fallback_matches_orjson(self, monkeypatch):
+        message = {"event": "bin_update", "bin_id": "bin1", "temperature_c": 21.5, "battery_percent": None}
+        fast = ws_router._encode_json(message)
+        monkeypatch.setattr(ws_router, "orjson", None)
+        assert json.loads(ws_router._encode_json(message)) == json.loads(fast) == message
+
+
+class TestSubscriptions:
+
+    def _scenario(self, subscriptions, zones=None):
+        """Connect one client per subscription, publish a fixed set of updates, return received messages."""
+        async def scenario():
+            manager = ConnectionManager(max_queue=64)
+            for bin_id, zone_id in (zones or {}).items():
+                manager.set_bin_zone(bin_id, zone_id)
+            sockets = []
+            for i, filters in enumerate(subscriptions):
+                ws = FakeWebSocket()
+                await manager.connect(ws, f"user{i}@example.com")
+                if filters is not None:
+                    manager.subscribe(ws, **filters)
+                sockets.append(ws)
+            await _update(manager, "bin1", 50)     # north, update only
+            await _update(manager, "bin2", 95)     # south, update + critical alert
+            await _update(manager, "bin3", 20)     # no zone
+            await asyncio.sleep(0.01)
+            return manager, sockets
+
+        return asyncio.run(scenario())
+
+    def test_zone_bin_and_event_filters(self):
+        zones = {"bin1": "north", "bin2": "south"}
+        manager, (everyone, north, bin3, alerts, mixed) = self._scenario([
+            None,
+            {"zones": ["north"]},
+            {"bins": ["bin3"]},
+            {"events": ["bin_alert"]},
+            {"zones": ["south"], "bins": ["bin1"], "events": ["bin_update"]},
+        ], zones)
+
+        def seen(ws):
+            return [(m["event"], m["bin_id"]) for m in ws.received]
+
+        assert len(everyone.received) == 4
+        assert seen(north) == [("bin_update", "bin1")]
+        assert seen(bin3) == [("bin_update", "bin3")]
+        assert seen(alerts) == [("bin_alert", "bin2")]
+        assert seen(mixed) == [("bin_update", "bin1"), ("bin_update", "bin2")]
+        assert manager.stats()["filtered_connections"] == 3
+
+    def test_broadcast_only_touches_interested_clients(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=4)
+            manager.set_bin_zone("bin1", "north")
+            sockets = [FakeWebSocket() for _ in range(200)]
+            for i, ws in enumerate(sockets):
+                await manager.connect(ws, f"user{i}@example.com")
+                manager.subscribe(ws, zones=[f"zone{i}"])
+            watcher = FakeWebSocket()
+            await manager.connect(watcher, "north@example.com")
+            manager.subscribe(watcher, zones=["north"])
+
+            touched = list(manager._targets("bin1"))
+            await _update(manager, "bin1", 30)
+            await asyncio.sleep(0.01)
+            return touched, watcher, sockets
+
+        touched, watcher, sockets = asyncio.run(scenario())
+
+        assert [client.websocket for client in touched] == [watcher]
+        assert watcher.received[0]["bin_id"] == "bin1"
+        assert not any(ws.received for ws in sockets)
+
+    def test_resubscribe_and_disconnect_clean_the_index(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=4)
+            ws = FakeWebSocket()
+            await manager.connect(ws, "user@example.com")
+            manager.subscribe(ws, zones=["north"], bins=["bin9"])
+            manager.subscribe(ws, zones=["south"])
+            after_resubscribe = (set(manager._by_zone), set(manager._by_bin))
+            manager.subscribe(ws)
+            reset_to_all = ws in {c.websocket for c in manager._unfiltered}
+            manager.disconnect(ws)
+            return manager, after_resubscribe, reset_to_all
+
+        manager, after_resubscribe, reset_to_all = asyncio.run(scenario())
+
+        assert after_resubscribe == ({"south"}, set())
+        assert reset_to_all
+        assert not manager._unfiltered and not manager._by_zone and not manager._by_bin
+
+    def test_zone_map_follows_telemetry_zone(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=4)
+            ws = FakeWebSocket()
+            await manager.connect(ws, "user@example.com")
+            manager.subscribe(ws, zones=["east"])
+            await manager.broadcast_bin_update("bin5", 10, "ok", None, None, None, "t", zone_id="east")
+            await asyncio.sleep(0.01)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+
+        assert manager.zone_for("bin5") == "east"
+        assert [m["bin_id"] for m in ws.received] == ["bin5"]
+
+    @pytest.mark.parametrize("msg", [
+        {"type": "subscribe", "zones": "north"},
+        {"type": "subscribe", "bins": [1, 2]},
+        {"type": "subscribe", "events": ["telemetry"]},
+    ])
+    def test_parse_subscription_rejects_bad_input(self, msg):
+        with pytest.raises(ValueError):
+            ws_router._parse_subscription(msg)
+
+
+def _reading(manager: ConnectionManager, bin_id: str, fill: int, battery: int = 80, ts: str = "t0"):
+    status = "full" if fill >= 90 else "warning" if fill >= 80 else "ok"
+    manager.queue_bin_update(bin_id, fill, status, battery, 21.0, 50, ts)
+
+
+class TestBatchedUpdates:
+
+    def test_window_folds_readings_into_one_frame(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=64, batch_window_ms=20)
+            ws = FakeWebSocket()
+            await manager.connect(ws, "user@example.com")
+            for i in range(1000):
+                _reading(manager, f"bin{i % 10}", i % 70, ts=f"t{i}")
+            await asyncio.sleep(0.06)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+
+        assert len(ws.received) == 1
+        frame = ws.received[0]
+        assert frame["event"] == "bin_updates"
+        assert len(frame["updates"]) == 10
+        latest = {u["bin_id"]: u for u in frame["updates"]}
+        assert latest["bin9"]["timestamp"] == "t999"
+        assert latest["bin9"]["fill_level_percent"] == 999 % 70
+        assert manager.stats()["readings_batched"] == 1000
+
+    def test_later_frames_carry_only_changed_fields(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=64, batch_window_ms=10)
+            ws = FakeWebSocket()
+            await manager.connect(ws, "user@example.com")
+            _reading(manager, "bin1", 40, battery=90, ts="t1")
+            _reading(manager, "bin2", 10, battery=90, ts="t1")
+            manager.flush_bin_updates()
+            _reading(manager, "bin1", 45, battery=90, ts="t2")
+            _reading(manager, "bin2", 10, battery=85, ts="t2")
+            manager.flush_bin_updates()
+            await asyncio.sleep(0.01)
+            return ws
+
+        ws = asyncio.run(scenario())
+
+        first, second = ws.received
+        assert set(first["updates"][0]) == {"bin_id", "fill_level_percent", "status", "battery_percent",
+                                            "temperature_c", "humidity_percent", "timestamp"}
+        assert second["updates"] == [
+            {"bin_id": "bin1", "fill_level_percent": 45, "timestamp": "t2"},
+            {"bin_id": "bin2", "battery_percent": 85, "timestamp": "t2"},
+        ]
+
+    @pytest.mark.parametrize("policy", ["drop_oldest", "coalesce"])
+    def test_slow_client_that_loses_deltas_converges_via_snapshot(self, policy):
+        async def scenario():
+            manager = ConnectionManager(max_queue=3, policy=policy, batch_window_ms=0)
+            ws = FakeWebSocket(stalled=True)
+            await manager.connect(ws, "slow@example.com")
+            _reading(manager, "bin1", 10, ts="t0")
+            await asyncio.sleep(0)           # writer takes the first frame and blocks on it
+            for i in range(1, 8):            # bin2 only changes early, so later deltas omit it
+                _reading(manager, "bin1", 10 + i, ts=f"t{i}")
+                if i <= 2:
+                    _reading(manager, "bin2", 50 + i, ts=f"t{i}")
+            ws.stalled = False
+            ws._release.set()
+            await asyncio.sleep(0.01)
+            return manager, ws
+
+        manager, ws = asyncio.run(scenario())
+
+        view = {}                                # what useRealtimeBins.ts would hold
+        for frame in ws.received:
+            if frame["event"] == "snapshot":
+                view = {b["bin_id"]: b for b in frame["bins"]}
+            elif frame["event"] == "bin_updates":
+                for delta in frame["updates"]:
+                    view[delta["bin_id"]] = {**view.get(delta["bin_id"], {}), **delta}
+        assert view["bin1"]["fill_level_percent"] == 17
+        assert view["bin2"]["fill_level_percent"] == 52
+        assert manager.stats()["resyncs"] >= 1
+
+    def test_frames_respect_subscriptions_and_alert_on_level_change(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=64, batch_window_ms=0)
+            manager.set_bin_zone("bin1", "north")
+            manager.set_bin_zone("bin2", "south")
+            north, alerts_only = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(north, "north@example.com")
+            manager.subscribe(north, zones=["north"], events=["bin_update"])
+            await manager.connect(alerts_only, "alerts@example.com")
+            manager.subscribe(alerts_only, events=["bin_alert"])
+            _reading(manager, "bin1", 50)
+            _reading(manager, "bin2", 85)
+            _reading(manager, "bin2", 86)      # still "warning" — no second alert
+            _reading(manager, "bin2", 95)
+            await asyncio.sleep(0.01)
+            return north, alerts_only
+
+        north, alerts_only = asyncio.run(scenario())
+
+        assert [m["event"] for m in north.received] == ["bin_updates"]
+        assert north.received[0]["updates"][0]["bin_id"] == "bin1"
+        assert [(m["event"], m["level"]) for m in alerts_only.received] == [
+            ("bin_alert", "warning"), ("bin_alert", "critical"),
+        ]
+
+    def test_identical_interests_share_one_encoding(self, monkeypatch):
+        calls = []
+        encode_json = ws_router._encode_json
+        monkeypatch.setattr(ws_router, "_encode_json", lambda m: calls.append(m) or encode_json(m))
+
+        async def scenario():
+            manager = ConnectionManager(max_queue=8, batch_window_ms=10)
+            manager.set_bin_zone("bin1", "north")
+            for i in range(30):
+                ws = FakeWebSocket()
+                await manager.connect(ws, f"user{i}@example.com")
+                if i % 2:
+                    manager.subscribe(ws, zones=["north"])
+            _reading(manager, "bin1", 30)
+            _reading(manager, "bin2", 30)
+            manager.flush_bin_updates()
+            await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+
+        # one frame for unfiltered clients (bin1+bin2), one for north subscribers (bin1)
+        assert len(calls) == 2
+
+
+class _FakeBinQuery:
+    """Stands in for db.query(BinDB.id, ...).all() in load_bin_state."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def query(self, *columns):
+        self.queries += 1
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def _bin_row(bin_id, zone_id, fill):
+    from types import SimpleNamespace
+    return SimpleNamespace(
+        id=bin_id, zone_id=zone_id, fill_level_percent=fill, status="ok", battery_percent=90,
+        temperature_c=20.0, humidity_percent=40, last_telemetry=None,
+    )
+
+
+class TestResume:
+
+    def test_snapshot_comes_from_cache_and_is_shared(self):
+        db = _FakeBinQuery([_bin_row("bin1", "north", 40), _bin_row("bin2", "south", 85)])
+
+        async def scenario():
+            manager = ConnectionManager(max_queue=16, batch_window_ms=0)
+            manager.load_bin_state(db)
+            _reading(manager, "bin1", 55, ts="t1")
+            sockets = []
+            for i in range(20):
+                ws = FakeWebSocket()
+                await manager.connect(ws, f"user{i}@example.com")
+                manager.resume(ws)
+                sockets.append(ws)
+            north = FakeWebSocket()
+            await manager.connect(north, "north@example.com")
+            manager.subscribe(north, zones=["north"])
+            manager.resume(north)
+            await asyncio.sleep(0.01)
+            return manager, sockets, north
+
+        manager, sockets, north = asyncio.run(scenario())
+
+        assert db.queries == 1
+        snapshot = sockets[0].received[0]
+        assert snapshot["event"] == "snapshot" and snapshot["seq"] == manager.seq == 1
+        state = {b["bin_id"]: b for b in snapshot["bins"]}
+        assert state["bin1"]["fill_level_percent"] == 55
+        assert state["bin2"]["zone_id"] == "south"
+        assert len({id(ws.raw[0]) for ws in sockets}) == 1
+        assert [b["bin_id"] for b in north.received[0]["bins"]] == ["bin1"]
+        assert manager.stats()["resumes_snapshot"] == 21
+
+    def test_replay_merges_missed_windows_for_the_client_filters(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=16, batch_window_ms=0)
+            manager.set_bin_zone("bin1", "north")
+            manager.set_bin_zone("bin2", "south")
+            _reading(manager, "bin1", 10, ts="t1")
+            last_seq = manager.seq
+            _reading(manager, "bin1", 20, battery=70, ts="t2")
+            _reading(manager, "bin2", 30, ts="t2")
+            _reading(manager, "bin1", 85, ts="t3")
+
+            ws = FakeWebSocket()
+            await manager.connect(ws, "north@example.com")
+            manager.subscribe(ws, zones=["north"])
+            mode = manager.resume(ws, last_seq, manager.stream_id)
+            await asyncio.sleep(0.01)
+            return manager, ws, mode
+
+        manager, ws, mode = asyncio.run(scenario())
+
+        assert mode == "replay"
+        updates, alert = ws.received
+        assert updates["seq"] == manager.seq and updates["replay"] is True
+        assert updates["updates"] == [{
+            "bin_id": "bin1", "fill_level_percent": 85, "status": "warning",
+            "battery_percent": 80, "timestamp": "t3",
+        }]
+        assert alert["event"] == "bin_alert" and alert["level"] == "warning"
+
+    def test_widening_a_subscription_sends_the_new_bins_state(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=16, batch_window_ms=0)
+            manager.set_bin_zone("bin1", "north")
+            manager.set_bin_zone("bin2", "south")
+            _reading(manager, "bin1", 10, ts="t1")
+            _reading(manager, "bin2", 85, ts="t1")
+
+            ws = FakeWebSocket()
+            await manager.connect(ws, "north@example.com")
+            manager.subscribe(ws, zones=["north"])
+            manager.resume(ws)
+            manager.resubscribe(ws, zones=["north", "south"])
+            manager.resubscribe(ws, zones=["south"])      # narrowing needs no snapshot
+            await asyncio.sleep(0.01)
+            return ws
+
+        ws = asyncio.run(scenario())
+
+        events = [m["event"] for m in ws.received]
+        assert events == ["snapshot", "subscribed", "snapshot", "subscribed"]
+        widened = {b["bin_id"]: b for b in ws.received[2]["bins"]}
+        assert set(widened) == {"bin1", "bin2"}
+        assert widened["bin2"]["fill_level_percent"] == 85
+        assert ws.received[3]["zones"] == ["south"]
+
+    def test_falls_back_to_snapshot_when_replay_is_impossible(self):
+        async def scenario():
+            manager = ConnectionManager(max_queue=16, batch_window_ms=0, replay_size=3)
+            for i in range(10):
+                _reading(manager, "bin1", i, ts=f"t{i}")
+            modes = []
+            for last_seq, stream in [(2, manager.stream_id), (8, "other-worker"), (99, manager.stream_id),
+                                     (None, manager.stream_id), (7, manager.stream_id)]:
+                ws = FakeWebSocket()
+                await manager.connect(ws, "user@example.com")
+                modes.append(manager.resume(ws, last_seq, stream))
+            return modes
+
+        assert asyncio.run(scenario()) == ["snapshot", "snapshot", "snapshot", "snapshot", "replay"]
+
+
+class TestLoadHarness:
+
+    def test_deliveries_match_the_reading_that_produced_them(self):
+        from benchmarks.ws_load import LatencyTracker, summarize
+
+        tracker = LatencyTracker()
+        tracker.mark_sent("bin1", "2026-01-01T00:00:00.000001Z", at=10.0)
+        tracker.mark_sent("bin1", "2026-01-01T00:00:01.000001Z", at=11.0)
+
+        assert tracker.observe({"bin_id": "bin1", "timestamp": "2026-01-01T00:00:01.000001Z"}, at=11.25) == 250
+        assert tracker.observe({"bin_id": "bin2", "timestamp": "2026-01-01T00:00:01.000001Z"}, at=11.5) is None
+        assert tracker.unmatched == 1
+        assert summarize(tracker.samples_ms)["p99"] == 250
+        assert summarize([]) == {"count": 0}
+
+    def test_regression_check_flags_slower_delivery_and_drops(self):
+        from benchmarks.ws_load import check_regressions
+
+        def result(p99, dropped, cpu):
+            return {
+                "delivery": {"latency_ms": {"p50": 100.0, "p99": p99}},
+                "connections": {"dropped": dropped},
+                "server": {"cpu_percent_mean": cpu},
+            }
+
+        baseline = result(300.0, 0, 40.0)
+        assert check_regressions(result(320.0, 0, 45.0), baseline, 1.5, 1.5, 20.0) == []
+        assert len(check_regressions(result(600.0, 2, 90.0), baseline, 1.5, 1.5, 20.0)) == 3
+
+    def test_rate_limited_readings_invalidate_the_run(self):
+        from benchmarks.ws_load import check_validity
+
+        assert check_validity({"ingest": {"readings_sent": 60, "rate_limited": 0}}) == []
+        assert check_validity({"ingest": {"readings_sent": 60, "rate_limited": 40}}) == [
+            "40 of 60 readings were rate limited (429)"
+        ]
+
+    def test_spawned_server_lifts_the_ingest_budgets(self):
+        from types import SimpleNamespace
+
+        from benchmarks.ws_load import server_env
+
+        args = SimpleNamespace(database_url=None, send_queue_size=256, slow_consumer_policy="drop_oldest",
+                               batch_window_ms=250, workers=2)
+        env = server_env(args, "/tmp")
+        for name in ("RATE_LIMIT_PER_MINUTE", "RATE_LIMIT_DEVICE_PER_MINUTE", "RATE_LIMIT_GATEWAY_PER_MINUTE"):
+            assert int(env[name]) >= 10 ** 9
@@ -16,6 +16,22 @@ export interface BinUpdate {
   timestamp: string
 }
 
+/** One entry of a batched `bin_updates` frame — only the fields that changed. */
+export type BinUpdateDelta = { bin_id: string } & Partial<Omit<BinUpdate, "event" | "bin_id">>
+
+export interface BinUpdatesFrame {
+  event: "bin_updates"
+  seq: number
+  updates: BinUpdateDelta[]
+}
+
+/** Sent after connect when the missed frames are no longer buffered server-side. */
+export interface BinSnapshotFrame {
+  event: "snapshot"
+  seq: number
+  bins: BinUpdateDelta[]
+}
+
 export interface BinAlert {
   event: "bin_alert"
   bin_id: string
@@ -39,15 +55,17 @@ const INITIAL_RETRY_MS = 2_000
 const MAX_RETRY_MS = 30_000
 const MAX_ALERTS = 10
 
+// Entries built from deltas may lack fields the server has not sent yet;
+// those keep the value fetched over REST.
 function mergeBin(bin: Bin, update: BinUpdate): Bin {
   return {
     ...bin,
-    fill_level_percent: update.fill_level_percent,
-    status: update.status,
-    battery_percent: update.battery_percent ?? undefined,
-    temperature_c: update.temperature_c ?? undefined,
-    humidity_percent: update.humidity_percent ?? undefined,
-    last_telemetry: update.timestamp,
+    fill_level_percent: update.fill_level_percent ?? bin.fill_level_percent,
+    status: update.status ?? bin.status,
+    battery_percent: "battery_percent" in update ? update.battery_percent ?? undefined : bin.battery_percent,
+    temperature_c: "temperature_c" in update ? update.temperature_c ?? undefined : bin.temperature_c,
+    humidity_percent: "humidity_percent" in update ? update.humidity_percent ?? undefined : bin.humidity_percent,
+    last_telemetry: update.timestamp ?? bin.last_telemetry,
   }
 }
 
@@ -97,6 +115,10 @@ export function useRealtimeBins(
   // When true, the onclose handler skips the retry so we don't hammer the
   // server with reconnects that will always fail with the same bad token.
   const authFailed = useRef(false)
+  // Resume position in the server's feed; sent on reconnect so the server can
+  // replay what was missed from memory instead of every dashboard refetching.
+  const stream = useRef<string | null>(null)
+  const lastSeq = useRef<number | null>(null)
 
   const connect = useCallback(() => {
     if (!token || !enabled || unmounted.current) return
@@ -113,14 +135,22 @@ export function useRealtimeBins(
         socket.close()
         return
       }
-      socket.send(JSON.stringify({ type: "auth", token }))
+      socket.send(
+        JSON.stringify({ type: "auth", token, stream: stream.current, last_seq: lastSeq.current })
+      )
     }
 
     socket.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data)
 
+        if (typeof data.seq === "number" && data.event !== "connected") {
+          lastSeq.current = Math.max(lastSeq.current ?? 0, data.seq)
+        }
+
         if (data.event === "connected") {
+          stream.current = data.stream ?? null
+          if (data.resume !== "replay") lastSeq.current = data.seq ?? null
           setConnected(true)
           retryDelay.current = INITIAL_RETRY_MS
           return
@@ -132,6 +162,26 @@ export function useRealtimeBins(
           return
         }
 
+        if (data.event === "snapshot") {
+          const { bins } = data as BinSnapshotFrame
+          setBinUpdates(
+            new Map(bins.map((entry) => [entry.bin_id, { ...entry, event: "bin_update" } as BinUpdate]))
+          )
+          return
+        }
+
+        if (data.event === "bin_updates") {
+          const { updates } = data as BinUpdatesFrame
+          setBinUpdates((prev) => {
+            const next = new Map(prev)
+            for (const delta of updates) {
+              next.set(delta.bin_id, { ...prev.get(delta.bin_id), ...delta, event: "bin_update" } as BinUpdate)
+            }
+            return next
+          })
+          return
+        }
+
         if (data.event === "bin_update") {
           setBinUpdates((prev) => {
             const next = new Map(prev)